@@ -3,7 +3,8 @@
 API REST para el sistema de predicción y recomendaciones de anemia infantil
 Cumple con Recomendación Técnica 4: Interoperabilidad
 """
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, BackgroundTasks
+from fastapi.responses import FileResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field, validator
@@ -126,6 +127,20 @@ class MenuResponse(BaseModel):
     preparaciones: List[str]
     evaluacion: str
 
+class ReportesLoteRequest(BaseModel):
+    """Modelo para generación masiva de reportes PDF"""
+    pacientes: List[Dict[str, Any]] = Field(..., min_length=1, max_length=50000,
+                                            description="Filas del padrón (hemoglobina, edad_meses, ...)")
+    formato: str = Field("zip", pattern="^(zip|directorio)$")
+
+class TriajeRequest(BaseModel):
+    """Modelo para registrar un diagnóstico en la cola de seguimiento"""
+    id_paciente: str = Field(..., min_length=1, description="DNI o identificador del niño")
+    prioridad: int = Field(..., ge=1, le=7, description="Prioridad del semáforo (1 = más urgente)")
+    probabilidad: float = Field(..., ge=0, le=1, description="Probabilidad ML de anemia")
+    fecha_limite: Optional[str] = Field(None, description="Vencimiento del control (YYYY-MM-DD); default según prioridad")
+    datos: Dict[str, Any] = Field(default_factory=dict, description="Datos a mostrar (nombre, teléfono, nivel...)")
+
 # ========================================================================
 # FUNCIONES DE AUTENTICACIÓN
 # ========================================================================
@@ -171,6 +186,7 @@ async def root():
             "autenticacion": "/api/v1/auth/login",
             "prediccion": "/api/v1/predict",
             "menu": "/api/v1/menu",
+            "reportes_lote": "/api/v1/reportes/lote",
             "salud": "/health"
         }
     }
@@ -293,6 +309,126 @@ async def generar_menu(
         logger.error(f"Error en generación de menú: {e}")
         raise HTTPException(status_code=500, detail=f"Error en menú: {str(e)}")
 
+# ===== REPORTES PDF POR LOTE =====
+
+@app.on_event("startup")
+async def reanudar_reportes_lote():
+    """Retoma en segundo plano los lotes que un reinicio dejó a medias"""
+    import threading
+    from services.reportes_lote import reanudar_trabajos
+
+    threading.Thread(target=reanudar_trabajos, name="reanudar-lotes", daemon=True).start()
+
+@app.post("/api/v1/reportes/lote", status_code=status.HTTP_202_ACCEPTED, tags=["Reportes"])
+async def crear_reportes_lote(
+    request: ReportesLoteRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Encola la generación de reportes médico + cuidador para un padrón
+
+    Requiere autenticación. Consultar el avance en /api/v1/reportes/lote/{trabajo_id}.
+    """
+    import pandas as pd
+    from services.reportes_lote import crear_trabajo, ejecutar_trabajo, COLUMNAS_REQUERIDAS
+
+    padron = pd.DataFrame(request.pacientes)
+    faltantes = [c for c in COLUMNAS_REQUERIDAS if c not in padron.columns]
+    if faltantes:
+        raise HTTPException(status_code=422, detail=f"Padrón sin columnas requeridas: {', '.join(faltantes)}")
+
+    trabajo_id = crear_trabajo(padron, request.formato)
+    background_tasks.add_task(ejecutar_trabajo, trabajo_id)
+    logger.info(f"Lote {trabajo_id} encolado por {current_user.username}: {len(padron)} pacientes")
+
+    return {"trabajo_id": trabajo_id, "estado": "pendiente", "total": len(padron)}
+
+@app.get("/api/v1/reportes/lote/{trabajo_id}", tags=["Reportes"])
+async def consultar_reportes_lote(
+    trabajo_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Estado, progreso y throughput de un lote de reportes"""
+    from services.reportes_lote import estado_trabajo
+
+    estado = estado_trabajo(trabajo_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return estado
+
+@app.get("/api/v1/reportes/lote/{trabajo_id}/descarga", tags=["Reportes"])
+async def descargar_reportes_lote(
+    trabajo_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Descarga el ZIP de un lote completado"""
+    from services.reportes_lote import estado_trabajo
+
+    estado = estado_trabajo(trabajo_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    if estado['estado'] != 'completado' or estado['formato'] != 'zip':
+        raise HTTPException(status_code=409, detail=f"Lote no descargable (estado: {estado['estado']})")
+
+    return FileResponse(estado['destino'], media_type="application/zip",
+                        filename=f"reportes_{trabajo_id}.zip")
+
+# ===== COLA DE SEGUIMIENTO (TRIAJE) =====
+
+@app.post("/api/v1/triaje/{diresa}", tags=["Triaje"])
+async def registrar_triaje(
+    diresa: str,
+    request: TriajeRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Inserta o actualiza un niño en la cola de seguimiento de una DIRESA
+
+    Requiere autenticación.
+    """
+    from services.cola_triaje import get_cola_triaje
+
+    cola = get_cola_triaje(diresa)
+    if request.fecha_limite:
+        try:
+            fecha_limite = datetime.fromisoformat(request.fecha_limite).date()
+        except ValueError:
+            raise HTTPException(status_code=422, detail="fecha_limite debe ser YYYY-MM-DD")
+        cola.registrar(request.id_paciente, request.prioridad, request.probabilidad,
+                       fecha_limite, request.datos)
+    else:
+        cola.registrar_diagnostico(request.id_paciente, {'prioridad': request.prioridad},
+                                   request.probabilidad, datos=request.datos)
+    return {"diresa": cola.diresa, "id_paciente": request.id_paciente, "en_cola": len(cola)}
+
+@app.get("/api/v1/triaje/{diresa}", tags=["Triaje"])
+async def obtener_triaje(
+    diresa: str,
+    top: int = 20,
+    current_user: User = Depends(get_current_user)
+):
+    """Los `top` niños a llamar hoy en una DIRESA, en orden de prioridad"""
+    from services.cola_triaje import get_cola_triaje
+
+    if not 1 <= top <= 1000:
+        raise HTTPException(status_code=422, detail="top debe estar entre 1 y 1000")
+    cola = get_cola_triaje(diresa)
+    return {**cola.resumen(), "pacientes": cola.top(top)}
+
+@app.delete("/api/v1/triaje/{diresa}/{id_paciente}", tags=["Triaje"])
+async def retirar_triaje(
+    diresa: str,
+    id_paciente: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Retira a un niño de la cola (atendido o trasladado)"""
+    from services.cola_triaje import get_cola_triaje
+
+    if not get_cola_triaje(diresa).retirar(id_paciente):
+        raise HTTPException(status_code=404, detail="Paciente no está en la cola")
+    return {"diresa": diresa.upper(), "id_paciente": id_paciente, "retirado": True}
+
 # ===== ESTADÍSTICAS (Sin autenticación para demo) =====
 
 @app.get("/api/v1/stats", tags=["Estadísticas"])
@@ -211,6 +211,7 @@ def mostrar_sidebar():
             ("🍽️ Menús Personalizados", "menus"),
             ("🔮 ¿Qué pasaría si...?", "simulador"),
              ("📍 Decisiones Entidad", "decisiones"),
+            ("📞 Lista de Seguimiento", "triaje"),
             ("🗺️ Mapa Territorial", "mapa"),
             ("📊 Telemetría", "telemetria"),
         ]
@@ -307,6 +308,14 @@ def enrutador():
             else:
                 st.error("❌ No tienes permiso para acceder a esta página")
 
+        elif pagina == 'triaje':
+            user_obj = st.session_state.user_object
+            if user_obj.is_demo or RoleManager.tiene_permiso(user_obj, 'read_assigned_patients'):
+                from pages.lista_triaje import pagina_lista_triaje
+                pagina_lista_triaje()
+            else:
+                st.error("❌ No tienes permiso para acceder a esta página")
+
     except Exception as e:
         st.error(f"❌ Error al cargar la página: {str(e)}")
         with st.expander("🔍 Ver detalles del error"):
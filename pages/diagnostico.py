@@ -438,6 +438,7 @@ def pagina_diagnostico():
         explicacion_shap = None
         proyeccion_3m = None
         proyeccion_6m = None
+        trayectoria_hb = []
         recomendaciones = None
         X_features_ml = None
 
@@ -589,8 +590,10 @@ def pagina_diagnostico():
         # 7. Generar proyecciones temporales
         try:
             predictor_temporal = get_temporal_predictor(anemia_predictor)
-            proyeccion_3m = predictor_temporal.predecir_futuro(datos_paciente, meses=3)
-            proyeccion_6m = predictor_temporal.predecir_futuro(datos_paciente, meses=6)
+            horizontes = predictor_temporal.predecir_horizontes(datos_paciente, range(1, 7))
+            proyeccion_3m = horizontes['proyecciones'][3]
+            proyeccion_6m = horizontes['proyecciones'][6]
+            trayectoria_hb = horizontes['trayectoria']
             
             logger.info("✅ Proyecciones temporales generadas")
         
@@ -693,6 +696,24 @@ def pagina_diagnostico():
                 st.caption("ℹ️ Sistema de historial no disponible")
             except Exception as e:
                 logger.error(f"❌ Error guardando historial: {e}")
+
+            # Actualizar la cola de seguimiento de la DIRESA
+            try:
+                from services.cola_triaje import get_cola_triaje
+
+                clasificacion = clasificar_nivel_riesgo(
+                    probabilidad_ml,
+                    resultado['tiene_anemia'],
+                    edad_meses,
+                    factores_riesgo_detectados,
+                    resultado['hemoglobina_ajustada']
+                )
+                get_cola_triaje(departamento).registrar_diagnostico(
+                    dni_paciente, clasificacion, probabilidad_ml,
+                    datos={'nombre': nombre_paciente}
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo actualizar la cola de seguimiento: {e}")
         else:
             logger.info("ℹ️ No se guardará historial (DNI no válido o vacío)")
         
@@ -1078,6 +1099,23 @@ def pagina_diagnostico():
             {int((1-prob_con_accion_6m)*10)} de cada 10 niños **se mantienen sanos**.
             """)
 
+        # Trayectoria proyectada mes a mes (predictor temporal, situación actual)
+        if trayectoria_hb:
+            fig = go.Figure(go.Scatter(
+                x=[p['mes'] for p in trayectoria_hb],
+                y=[p['hemoglobina'] for p in trayectoria_hb],
+                mode='lines+markers',
+                line=dict(color='#667eea', width=3),
+                customdata=[[p['fecha'], p['probabilidad'] * 100, p['severidad']] for p in trayectoria_hb],
+                hovertemplate="Mes %{x} (%{customdata[0]})<br>Hb %{y:.1f} g/dL<br>"
+                              "Riesgo %{customdata[1]:.0f}% • %{customdata[2]}<extra></extra>"
+            ))
+            fig.add_hline(y=11.0, line_dash="dash", line_color="#ff6b6b", annotation_text="Umbral anemia (11 g/dL)")
+            fig.update_layout(title="Hemoglobina proyectada (sin cambios en el cuidado actual)",
+                              xaxis_title="Meses", yaxis_title="Hb (g/dL)", height=300,
+                              template='plotly_white', margin=dict(l=10, r=10, t=50, b=10))
+            st.plotly_chart(fig, use_container_width=True)
+
         st.divider()
 
         
@@ -1373,7 +1411,7 @@ def pagina_diagnostico():
             with col_pdf1:
                 try:
                     from datetime import datetime
-                    from utils.pdf_generator import ReportePDFGenerator
+                    from utils.pdf_generator import get_generador_pdf
 
                     if st.button(
                         "📄 PDF Cuidador", 
@@ -1432,19 +1470,14 @@ def pagina_diagnostico():
                                     }
 
                                     # Generar PDF cuidador (simplificado vs médico)
-                                    generator = ReportePDFGenerator()
-                                    pdf_path = generator.generar_reporte_madre(datos_paciente, plan_alimentario)
-
-                                    # Leer PDF y ofrecer descarga
-                                    with open(pdf_path, "rb") as f:
-                                        pdf_bytes = f.read()
-                                        st.session_state.pdf_cuidador = {
-                                            'bytes': pdf_bytes,
-                                            'nombre': nombre_archivo
-                                        }
-
+                                    generator = get_generador_pdf()
+                                    pdf_bytes = generator.renderizar_reporte_madre(datos_paciente, plan_alimentario)
 
                                     nombre_archivo = f"Plan_Nutricional_{nombre_paciente.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
+                                    st.session_state.pdf_cuidador = {
+                                        'bytes': pdf_bytes,
+                                        'nombre': nombre_archivo
+                                    }
 
                                     st.download_button(
                                         label="⬇️ Descargar PDF Cuidador",
@@ -1471,7 +1504,7 @@ def pagina_diagnostico():
             with col_pdf2:
                 try:
                     from datetime import datetime
-                    from utils.pdf_generator import ReportePDFGenerator
+                    from utils.pdf_generator import get_generador_pdf
 
                     if st.button(
                         "📊 PDF Profesional", 
@@ -1515,19 +1548,14 @@ def pagina_diagnostico():
                                 }
 
                                 # Generar PDF profesional
-                                generator = ReportePDFGenerator()
-                                pdf_path = generator.generar_reporte_medico(datos_paciente, datos_clinicos)
-
-                                # Leer PDF y ofrecer descarga
-                                with open(pdf_path, "rb") as f:
-                                    pdf_bytes = f.read()
-                                    st.session_state.pdf_cuidador = {
-                                                'bytes': pdf_bytes,
-                                                'nombre': nombre_archivo
-                                            }
-
+                                generator = get_generador_pdf()
+                                pdf_bytes = generator.renderizar_reporte_medico(datos_paciente, datos_clinicos)
 
                                 nombre_archivo = f"Reporte_Clinico_{nombre_paciente.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
+                                st.session_state.pdf_cuidador = {
+                                    'bytes': pdf_bytes,
+                                    'nombre': nombre_archivo
+                                }
 
                                 if st.session_state.pdf_cuidador:
                                     st.download_button(
@@ -1560,46 +1588,27 @@ def pagina_diagnostico():
                     ):
                         with st.spinner('📝 Generando reporte de entidad...'):
                             try:
-                                # Preparar datos agregados
-                                datos_agregados = {
-                                    'fecha_reporte': datetime.now().strftime('%Y-%m-%d'),
-                                    'paciente_actual': nombre_paciente,
-                                    'probabilidad': probabilidad_ml,
-                                    'nivel_riesgo': score['nivel'],
-                                    # Datos poblacionales (simulados - integrar reales)
-                                    'total_evaluados': 150,
-                                    'casos_riesgo_bajo': 30,
-                                    'casos_riesgo_medio': 60,
-                                    'casos_riesgo_alto': 45,
-                                    'casos_riesgo_critico': 15,
-                                    'prevalencia_regional': 35.2,  # Porcentaje
-                                    'altitud_promedio': altitud_sugerida,
+                                # Reporte desde agregados SIEN precalculados del departamento
+                                from utils.pdf_generator import generar_pdf_entidad
+                                pdf_bytes = generar_pdf_entidad(region=departamento)
+
+                                nombre_archivo = f"Analisis_Entidad_{departamento.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
+                                st.session_state.pdf_entidad = {
+                                    'bytes': pdf_bytes,
+                                    'nombre': nombre_archivo
                                 }
 
-                                generator = ReportePDFGenerator()
-                                pdf_path = generator.generar_reporte_entidad(datos_agregados)
-
-                                # Leer PDF y ofrecer descarga
-                                with open(pdf_path, "rb") as f:
-                                    pdf_bytes = f.read()
-                                    st.session_state.pdf_cuidador = {
-                                                'bytes': pdf_bytes,
-                                                'nombre': nombre_archivo
-                                            }
-
-
-                                nombre_archivo = f"Analisis_Entidad_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
-
-                                if st.session_state.pdf_cuidador:
-                                    st.download_button(
-                                        label="⬇️ Descargar PDF Cuidador",
-                                        data=st.session_state.pdf_cuidador['bytes'],
-                                        file_name=st.session_state.pdf_cuidador['nombre'],
-                                        mime="application/pdf"
-                                    )
+                                st.download_button(
+                                    label="⬇️ Descargar PDF Entidad",
+                                    data=pdf_bytes,
+                                    file_name=nombre_archivo,
+                                    mime="application/pdf"
+                                )
 
                                 st.success("✅ Reporte descargado. Incluye análisis agregado.")
 
+                            except FileNotFoundError as e:
+                                st.warning(f"⚠️ Agregados SIEN no disponibles: {e}")
                             except Exception as e:
                                 st.error(f"❌ Error generando reporte: {e}")
                                 with st.expander("🔍 Ver detalles"):
@@ -1717,6 +1726,9 @@ def pagina_diagnostico():
                     # Obtener nombre
                     nombre_actual = nombre_paciente if 'nombre_paciente' in locals() else st.session_state.get('nombre_consulta', 'Paciente')
 
+                    # El DNI enlaza el recordatorio con el historial (análisis A/B)
+                    dni_actual = (st.session_state.get('datos_diagnostico') or {}).get('dni') or None
+
                     resultados = sistema.programar_recordatorios_multiples(
                         telefono_actual,
                         nombre_actual,
@@ -1724,7 +1736,8 @@ def pagina_diagnostico():
                             {'tipo': 'Control inmediato', 'dias': 7},
                             {'tipo': 'Seguimiento 1 mes', 'dias': 30},
                             {'tipo': 'Evaluación 3 meses', 'dias': 90}
-                        ]
+                        ],
+                        id_paciente=dni_actual
                     )
 
                 except ImportError:
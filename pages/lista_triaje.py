@@ -0,0 +1,97 @@
+"""
+pages/lista_triaje.py
+Lista de trabajo del puesto de salud: niños a llamar hoy por prioridad
+Cola de triaje por DIRESA (services/cola_triaje.py)
+"""
+
+import streamlit as st
+import pandas as pd
+import logging
+
+from services.cola_triaje import get_cola_triaje, diresas_con_cola
+from utils.constants import ALTITUDES_DEPARTAMENTO
+
+logger = logging.getLogger(__name__)
+
+
+def pagina_lista_triaje():
+    """Lista priorizada de seguimiento por DIRESA"""
+
+    # ════════════════════════════════════════════════════════════════════════
+    # HEADER
+    # ════════════════════════════════════════════════════════════════════════
+    st.markdown("""
+    <div style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+                padding: 2.5rem; border-radius: 15px; margin-bottom: 2rem;
+                box-shadow: 0 10px 30px rgba(0,0,0,0.2);'>
+        <h1 style='color: white; margin: 0; font-size: 2.5rem;'>
+            📞 Lista de Seguimiento
+        </h1>
+        <p style='color: rgba(255,255,255,0.95); margin: 0.8rem 0 0 0; font-size: 1.1rem;'>
+            Niños a contactar hoy, ordenados por prioridad, riesgo y atraso del control
+        </p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # ════════════════════════════════════════════════════════════════════════
+    # SELECCIÓN DE DIRESA
+    # ════════════════════════════════════════════════════════════════════════
+    con_cola = diresas_con_cola()
+    opciones = con_cola + sorted(d for d in ALTITUDES_DEPARTAMENTO if d not in con_cola)
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        diresa = st.selectbox("🏥 DIRESA:", opciones, key="triaje_diresa")
+    with col2:
+        top = st.number_input("Niños a mostrar", min_value=5, max_value=500, value=20, step=5)
+
+    cola = get_cola_triaje(diresa)
+    resumen = cola.resumen()
+
+    if resumen['total'] == 0:
+        st.info(f"ℹ️ No hay niños en la cola de {cola.diresa}. "
+                "Se agregan automáticamente al registrar un diagnóstico.")
+        return
+
+    # ════════════════════════════════════════════════════════════════════════
+    # RESUMEN POR PRIORIDAD
+    # ════════════════════════════════════════════════════════════════════════
+    por_prioridad = resumen['por_prioridad']
+    criticos = sum(n for p, n in por_prioridad.items() if p <= 3)
+    alto_riesgo = sum(n for p, n in por_prioridad.items() if 4 <= p <= 5)
+
+    c1, c2, c3 = st.columns(3)
+    c1.metric("👶 Niños en cola", f"{resumen['total']:,}")
+    c2.metric("🔴 Con anemia (P1-P3)", f"{criticos:,}")
+    c3.metric("🟠 Riesgo alto/moderado (P4-P5)", f"{alto_riesgo:,}")
+
+    st.markdown("---")
+
+    # ════════════════════════════════════════════════════════════════════════
+    # LISTA DE TRABAJO
+    # ════════════════════════════════════════════════════════════════════════
+    st.markdown(f"## 📋 Top {int(top)} a contactar hoy")
+
+    pacientes = cola.top(int(top))
+    df = pd.DataFrame(pacientes)
+    df['probabilidad'] = (df['probabilidad'] * 100).round(0).astype(int).astype(str) + '%'
+    df['dias_atraso'] = df['dias_atraso'].clip(lower=0)
+
+    columnas = {
+        'posicion': '#', 'emoji': '', 'id_paciente': 'DNI', 'nombre': 'Niño/a',
+        'nivel': 'Nivel', 'probabilidad': 'Riesgo ML', 'dias_atraso': 'Días de atraso',
+        'fecha_limite': 'Control vence', 'accion': 'Acción',
+    }
+    df = df[[c for c in columnas if c in df.columns]].rename(columns=columnas)
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+    # ════════════════════════════════════════════════════════════════════════
+    # MARCAR COMO ATENDIDO
+    # ════════════════════════════════════════════════════════════════════════
+    with st.expander("✅ Marcar niño como atendido"):
+        atendido = st.selectbox("DNI:", [p['id_paciente'] for p in pacientes], key="triaje_atendido")
+        if st.button("Retirar de la cola", key="btn_triaje_retirar"):
+            cola.retirar(atendido)
+            logger.info(f"✅ {atendido} retirado de la cola {cola.diresa}")
+            st.success(f"✅ {atendido} retirado de la cola")
+            st.rerun()
@@ -16,8 +16,10 @@ Características implementadas:
 
 import streamlit as st
 from utils.menu_recommender import MenuRecommender
-from utils.menu_substitutions import MenuSubstitutionEngine
-from utils.pdf_menu_generator import generar_pdf_menu, generar_pdf_semanal
+from utils.menu_substitutions import get_motor_sustituciones
+from services.planificador_semanal import get_planificador_semanal
+from services.lista_compras import get_agregador_compras
+from utils.pdf_menu_generator import renderizar_pdf_menu, renderizar_pdf_semanal
 from utils.whatsapp_sender import enviar_menu_whatsapp
 from datetime import datetime, timedelta
 import uuid
@@ -157,7 +159,7 @@ def pagina_menus():
     # INICIALIZAR MOTORES
     # ============================================
     recomendador = MenuRecommender()
-    motor_sustitucion = MenuSubstitutionEngine()
+    motor_sustitucion = get_motor_sustituciones()
 
     contexto_paciente = {
         'departamento': departamento,
@@ -383,32 +385,18 @@ def pagina_menus():
     # ============================================
     st.markdown("---")
     st.markdown("### 🗓️ Menú Semanal Completo")
-    st.caption("Rotación automática de los Top 3 para variedad nutricional")
+    st.caption("Plan optimizado: máximo hierro absorbible, variedad y vitamina C en comidas vegetales")
 
-    dias = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
-    semanal = [
-        {
-            'dia': d,
-            'desayuno': top3_menus[i % 3],
-            'almuerzo': top3_menus[(i + 1) % 3],
-            'cena': top3_menus[(i + 2) % 3]
-        }
-        for i, d in enumerate(dias)
-    ]
-
-    # Calcular costo semanal
-    costo_semanal = sum(
-        m['desayuno']['desglose']['costo_s'] +
-        m['almuerzo']['desglose']['costo_s'] +
-        m['cena']['desglose']['costo_s']
-        for m in semanal
-    )
+    try:
+        plan_semanal = get_planificador_semanal().planificar(menus_base, contexto_paciente)
+    except Exception as e:
+        logger.error(f"Error planificando semana: {e}")
+        st.error(f"❌ Error al planificar la semana: {str(e)}")
+        return
 
-    hierro_semanal = sum(
-        m['desayuno']['desglose']['hierro_mg'] +
-        m['almuerzo']['desglose']['hierro_mg'] +
-        m['cena']['desglose']['costo_s'] for m in semanal
-    )
+    semanal = plan_semanal['semanal']
+    costo_semanal = plan_semanal['costo_total']
+    hierro_semanal = plan_semanal['hierro_total_mg']
 
     # Métricas semanales
     col_sem1, col_sem2, col_sem3 = st.columns(3)
@@ -451,6 +439,19 @@ def pagina_menus():
 
     st.dataframe(tabla, use_container_width=True, hide_index=True)
 
+    # Lista de compras de la semana
+    with st.expander("🛒 Lista de compras de la semana"):
+        lista_compras = get_agregador_compras().lista_hogar(semanal, departamento)
+        st.dataframe(pd.DataFrame([
+            {
+                'Ingrediente': item['ingrediente'],
+                'Cantidad': item['cantidad'],
+                'Costo (S/)': f"{item['costo_s']:.2f}" if item['costo_s'] is not None else "—",
+                'Disponible en tu zona': "✅" if item['disponible_local'] else "⚠️ Buscar sustituto"
+            }
+            for item in lista_compras
+        ]), use_container_width=True, hide_index=True)
+
     # Acciones semanal
     col_accion1, col_accion2 = st.columns(2)
 
@@ -458,15 +459,13 @@ def pagina_menus():
         if st.button("📥 **Guardar Menú Semanal (PDF)**", use_container_width=True, type="primary", key="btn_pdf_semanal"):
             with st.spinner("Generando PDF..."):
                 try:
-                    pdf_path = generar_pdf_semanal(semanal)
-                    with open(pdf_path, "rb") as f:
-                        st.download_button(
-                            "⬇️ Descargar Ahora",
-                            f,
-                            file_name=f"menu_semanal_{caso_id}.pdf",
-                            mime="application/pdf",
-                            use_container_width=True
-                        )
+                    st.download_button(
+                        "⬇️ Descargar Ahora",
+                        renderizar_pdf_semanal(semanal),
+                        file_name=f"menu_semanal_{caso_id}.pdf",
+                        mime="application/pdf",
+                        use_container_width=True
+                    )
                 except Exception as e:
                     st.error(f"Error generando PDF: {e}")
 
@@ -693,16 +692,14 @@ def mostrar_detalle_menu(menu, idx, recomendador, motor_sustitucion, departament
         ):
             with st.spinner("Generando PDF..."):
                 try:
-                    pdf_path = generar_pdf_menu(menu)
-                    with open(pdf_path, "rb") as f:
-                        st.download_button(
-                            "⬇️ Descargar Ahora",
-                            f,
-                            file_name=f"menu_{menu['id']}.pdf",
-                            mime="application/pdf",
-                            use_container_width=True,
-                            key=f"download_{menu['id']}"
-                        )
+                    st.download_button(
+                        "⬇️ Descargar Ahora",
+                        renderizar_pdf_menu(menu),
+                        file_name=f"menu_{menu['id']}.pdf",
+                        mime="application/pdf",
+                        use_container_width=True,
+                        key=f"download_{menu['id']}"
+                    )
                 except Exception as e:
                     st.error(f"Error generando PDF: {e}")
 
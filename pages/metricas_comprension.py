@@ -176,3 +176,53 @@ def pagina_metricas_comprension():
                     "🌙 Cena",
                     f"{por_tipo['cena']['adherencia_pct']:.1f}%"
                 )
+    
+    st.markdown("---")
+    
+    # =====================================================
+    # MÉTRICA 3: A/B DE RECORDATORIOS (NUDGES)
+    # =====================================================
+    st.markdown("## 📲 A/B de Recordatorios (Nudges)")
+    st.caption("Conversión por variante: asistencia al control CRED y menú preparado tras el recordatorio")
+    
+    from utils.nudges import SistemaNudges
+    from services.analisis_ab import METRICAS
+    
+    stats_ab = SistemaNudges.obtener_estadisticas_ab()
+    
+    if stats_ab is None:
+        st.info("ℹ️ Aún no hay recordatorios enviados para analizar.")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("📤 Envíos registrados", stats_ab['total_envios'])
+    with col2:
+        st.metric("👥 Pacientes expuestos", sum(stats_ab['expuestos'].values()))
+    with col3:
+        st.metric("✅ Ventanas cerradas", sum(stats_ab['cerrados'].values()))
+    if stats_ab['sin_dni']:
+        st.caption(f"ℹ️ {stats_ab['sin_dni']} recordatorios sin DNI no se incluyen en la conversión "
+                   f"(no se pueden enlazar con el historial)")
+    
+    for metrica, titulo in METRICAS.items():
+        resultados = stats_ab['metricas'][metrica]
+        if not any(r['n'] for r in resultados.values()):
+            continue
+        st.markdown(f"### {titulo}")
+        st.dataframe(
+            [
+                {
+                    'Variante': variante,
+                    'Cerrados': r['n'],
+                    'Conversiones': r['conversiones'],
+                    'Tasa': f"{r['tasa']:.1%}" if r['tasa'] is not None else "-",
+                    'IC 95%': f"{r['ic_inf']:.1%} – {r['ic_sup']:.1%}" if r['tasa'] is not None else "-",
+                    'P(mejor)': f"{r['prob_mejor']:.0%}",
+                    'P(> control)': f"{r['prob_supera_control']:.0%}" if r['prob_supera_control'] is not None else "-",
+                }
+                for variante, r in resultados.items()
+            ],
+            use_container_width=True,
+            hide_index=True
+        )
@@ -44,13 +44,27 @@ def pagina_reportes_entidad_decisiones():
     st.markdown("---")
 
     # ════════════════════════════════════════════════════════════════════════
-    # DATOS SINTÉTICOS
+    # DATOS: AGREGADOS SIEN PRECALCULADOS (respaldo: datos sintéticos)
     # ════════════════════════════════════════════════════════════════════════
-    hotspots = [
-        {'nombre': 'Ayacucho', 'prevalencia': 68, 'evaluados': 1247, 'criticos': 847},
-        {'nombre': 'Apurímac', 'prevalencia': 62, 'evaluados': 856, 'criticos': 531},
-        {'nombre': 'Huancavelica', 'prevalencia': 58, 'evaluados': 1102, 'criticos': 639},
-    ]
+    resumen_nacional = obtener_resumen_entidad()
+
+    if resumen_nacional and resumen_nacional['hotspots']:
+        hotspots = [
+            {
+                'nombre': f"{h['distrito'].title()} ({h['departamento'].title()})",
+                'prevalencia': h['prevalencia_pct'],
+                'evaluados': h['evaluados'],
+                'criticos': h['criticos'],
+            }
+            for h in resumen_nacional['hotspots'][:3]
+        ]
+    else:
+        st.caption("ℹ️ Agregados SIEN no disponibles: se muestran datos de ejemplo")
+        hotspots = [
+            {'nombre': 'Ayacucho', 'prevalencia': 68, 'evaluados': 1247, 'criticos': 847},
+            {'nombre': 'Apurímac', 'prevalencia': 62, 'evaluados': 856, 'criticos': 531},
+            {'nombre': 'Huancavelica', 'prevalencia': 58, 'evaluados': 1102, 'criticos': 639},
+        ]
 
     # ════════════════════════════════════════════════════════════════════════
     # SEMÁFORO DE HOTSPOTS (MEJORADO)
@@ -192,6 +206,13 @@ def pagina_reportes_entidad_decisiones():
 
     st.markdown("---")
 
+    # ════════════════════════════════════════════════════════════════════════
+    # INCERTIDUMBRE DEL ROI
+    # ════════════════════════════════════════════════════════════════════════
+    mostrar_incertidumbre_roi()
+
+    st.markdown("---")
+
     # ════════════════════════════════════════════════════════════════════════
     # EXPORTACIÓN MEJORADA (CSV + PDF + EMAIL)
     # ════════════════════════════════════════════════════════════════════════
@@ -223,10 +244,23 @@ def pagina_reportes_entidad_decisiones():
 
     # ✅ DESCARGAR PDF PROFESIONAL
     with col_exp2:
+        region_pdf, periodo_pdf = None, None
+        if resumen_nacional:
+            ambito = st.selectbox("Ámbito", ["NACIONAL"] + obtener_opciones_entidad()['departamentos'],
+                                  key="ambito_pdf_entidad")
+            periodo = st.selectbox("Periodo", ["Todos"] + obtener_opciones_entidad()['periodos'],
+                                   key="periodo_pdf_entidad")
+            region_pdf = None if ambito == "NACIONAL" else ambito
+            periodo_pdf = None if periodo == "Todos" else periodo
+
         if st.button("📄 PDF", use_container_width=True, key="btn_pdf_entidad"):
             with st.spinner("🔄 Generando PDF profesional..."):
                 try:
-                    pdf_buffer = generar_pdf_reportes_entidad(hotspots, opciones)
+                    if resumen_nacional:
+                        from utils.pdf_generator import generar_pdf_entidad
+                        pdf_buffer = generar_pdf_entidad(region_pdf, periodo_pdf)
+                    else:
+                        pdf_buffer = generar_pdf_reportes_entidad(hotspots, opciones)
                     if pdf_buffer:
                         st.download_button(
                             label="⬇️ Descargar PDF",
@@ -339,6 +373,92 @@ def mostrar_grafico_comparativo(opcion):
     st.plotly_chart(fig, use_container_width=True)
 
 
+@st.cache_data(ttl=600, show_spinner=False)
+def _resumen_entidad_cacheado(region=None, periodo=None):
+    from services.agregados_entidad import get_agregados_entidad
+    return get_agregados_entidad().resumen(region, periodo)
+
+
+def obtener_resumen_entidad(region=None, periodo=None):
+    """
+    Resumen de agregados SIEN precalculados (None si no hay datos)
+
+    Los errores no se cachean: mientras los agregados se generan en segundo
+    plano, la siguiente visita vuelve a intentarlo.
+    """
+    try:
+        return _resumen_entidad_cacheado(region, periodo)
+    except Exception:
+        return None
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def obtener_opciones_entidad():
+    """Departamentos y periodos disponibles en los agregados"""
+    from services.agregados_entidad import get_agregados_entidad
+    agregados = get_agregados_entidad()
+    return {'departamentos': agregados.departamentos(), 'periodos': agregados.periodos()}
+
+
+@st.cache_data(show_spinner=False)
+def obtener_analisis_roi_cacheado(n_muestras=200_000):
+    """Análisis Monte Carlo del ROI (cacheado entre sesiones)"""
+    from services.analisis_roi import obtener_analisis_roi
+    return obtener_analisis_roi(n_muestras)
+
+
+def mostrar_incertidumbre_roi():
+    """Distribución del ROI y parámetros que más la explican"""
+
+    st.markdown("## 🎲 ROI con Incertidumbre Conjunta")
+    st.caption("Prevalencia, costo HemoCue, reducción de severos y cobertura CRED variando a la vez")
+
+    try:
+        with st.spinner("🔄 Simulando escenarios de ROI..."):
+            analisis = obtener_analisis_roi_cacheado()
+    except Exception as e:
+        st.warning(f"⚠️ Análisis de ROI no disponible: {e}")
+        return
+
+    resumen = analisis['resumen']
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("ROI mediana", f"{resumen['roi_percentiles'][50]:,.0f}%",
+                  help=f"P5–P95: {resumen['roi_percentiles'][5]:,.0f}% – {resumen['roi_percentiles'][95]:,.0f}%")
+    with col2:
+        st.metric("Payback mediana", f"{resumen['payback_percentiles'][50]:.1f} meses")
+    with col3:
+        st.metric("Prob. ROI > 0", f"{resumen['prob_roi_positivo']:.0%}")
+
+    col_hist, col_tornado = st.columns(2)
+
+    with col_hist:
+        fig = go.Figure(go.Bar(
+            x=analisis['histograma']['roi_pct'],
+            y=analisis['histograma']['frecuencia'],
+            marker_color='#667eea'
+        ))
+        fig.update_layout(title="Distribución del ROI", xaxis_title="ROI (%)",
+                          yaxis_title="Frecuencia", height=320, template='plotly_white')
+        st.plotly_chart(fig, use_container_width=True)
+
+    with col_tornado:
+        tornado = analisis['tornado'].iloc[::-1]
+        roi_base = tornado['roi_base'].iloc[0]
+        fig = go.Figure()
+        fig.add_trace(go.Bar(y=tornado['parametro'], x=tornado['roi_minimo'] - roi_base,
+                             base=roi_base, orientation='h', name='Mínimo', marker_color='#ff6b6b'))
+        fig.add_trace(go.Bar(y=tornado['parametro'], x=tornado['roi_maximo'] - roi_base,
+                             base=roi_base, orientation='h', name='Máximo', marker_color='#28a745'))
+        fig.update_layout(title="Tornado (ROI %)", barmode='overlay', height=320,
+                          template='plotly_white')
+        st.plotly_chart(fig, use_container_width=True)
+
+    with st.expander("📋 Índices de sensibilidad (primer orden)"):
+        st.dataframe(analisis['sobol'], use_container_width=True, hide_index=True)
+
+
 def generar_pdf_reportes_entidad(hotspots, opciones):
     """Genera PDF PROFESIONAL con todas las opciones"""
 
@@ -22,6 +22,38 @@ simulador = SimuladorIntervencion()
 # FUNCIONES AUXILIARES
 # ============================================================================
 
+@st.cache_data(show_spinner=False)
+def obtener_grilla(hb_actual):
+    """Grilla completa de escenarios (se calcula una vez por valor de Hb)"""
+    return simulador.simular_grilla(hb_actual)
+
+def crear_grafico_sensibilidad(grilla, grupo_edad, semanas):
+    """Crea gráfico de sensibilidad: Hb final por adherencia y combinación"""
+
+    df = grilla[(grilla['grupo_edad'] == grupo_edad) & (grilla['semana'] == semanas)].copy()
+    df['Intervención'] = df.apply(
+        lambda r: 'Suplemento + Menú' if r['suplementacion'] and r['alimentacion_mejorada']
+        else 'Solo suplemento' if r['suplementacion']
+        else 'Solo menú' if r['alimentacion_mejorada']
+        else 'Sin intervención',
+        axis=1
+    )
+
+    fig = px.bar(
+        df,
+        x='adherencia',
+        y='incremento_total',
+        color='Intervención',
+        barmode='group',
+        category_orders={'adherencia': ['baja', 'media', 'alta']},
+        title=f'Sensibilidad a la adherencia ({semanas} semanas)',
+        labels={'adherencia': 'Adherencia', 'incremento_total': 'Incremento esperado (g/dL)'},
+        height=400
+    )
+    fig.update_layout(template='plotly_white')
+
+    return fig
+
 def crear_grafico_comparacion(escenarios):
     """Crea gráfico de barras comparando escenarios"""
 
@@ -332,6 +364,13 @@ def pagina_simulador():
         fig_comparacion = crear_grafico_comparacion(escenarios)
         st.plotly_chart(fig_comparacion, use_container_width=True)
 
+        with st.expander("🧮 Análisis de sensibilidad (todas las combinaciones)"):
+            grilla = obtener_grilla(hb_actual)
+            fig_sensibilidad = crear_grafico_sensibilidad(
+                grilla, resultado['grupo_edad'], semanas
+            )
+            st.plotly_chart(fig_sensibilidad, use_container_width=True)
+
         # Tabla de comparación
         with st.expander("📋 Ver tabla comparativa detallada"):
             df_comparacion = pd.DataFrame({
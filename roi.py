@@ -8,6 +8,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 from pathlib import Path
 
+from services.analisis_roi import calcular_roi, simular_montecarlo
+
 OUTPUT_DIR = "outputs/"
 Path(OUTPUT_DIR).mkdir(exist_ok=True)
 
@@ -55,17 +57,26 @@ print("="*80)
 
 poblacion = supuestos['Población objetivo (niños < 5 años)']
 cobertura = supuestos['Cobertura CRED actual']
-poblacion_cubierta = int(poblacion * cobertura)
 
-# Método tradicional
-costo_hemocue_universal = poblacion_cubierta * supuestos['Costo HemoCue universal (S/ por niño)']
-casos_anemia_detectados = supuestos['Casos detectables con cobertura']
-costo_tratamiento_tradicional = casos_anemia_detectados * (
-    supuestos['Costo tratamiento anemia (S/ por caso)'] +
-    supuestos['Costo seguimiento anemia (S/ por caso/mes)'] * supuestos['Duración promedio tratamiento (meses)']
-)
+# Modelo vectorizado (services/analisis_roi.py) con los supuestos base
+base = {k: float(v) for k, v in calcular_roi({
+    'poblacion': poblacion,
+    'prevalencia': supuestos['Prevalencia de anemia'],
+    'cobertura_cred': cobertura,
+    'costo_hemocue': supuestos['Costo HemoCue universal (S/ por niño)'],
+    'costo_tratamiento': supuestos['Costo tratamiento anemia (S/ por caso)'],
+    'costo_seguimiento_mes': supuestos['Costo seguimiento anemia (S/ por caso/mes)'],
+    'duracion_tratamiento': supuestos['Duración promedio tratamiento (meses)'],
+    'costo_prediccion': supuestos['Costo predicción NutriSenseIA (S/ por niño)'],
+    'costo_hemocue_alto_riesgo': supuestos['Costo HemoCue focalizado (S/ por niño alto riesgo)'],
+    'reduccion_hemocue': supuestos['Reducción en HemoCue innecesarios'],
+    'reduccion_severos': supuestos['Reducción en casos severos'],
+}).items()}
 
-costo_total_tradicional = costo_hemocue_universal + costo_tratamiento_tradicional
+# Método tradicional
+costo_hemocue_universal = base['costo_hemocue_universal']
+costo_tratamiento_tradicional = base['costo_tratamiento_tradicional']
+costo_total_tradicional = base['costo_total_tradicional']
 
 print(f"\n🔴 MÉTODO TRADICIONAL (Sin NutriSenseIA):")
 print(f"   • Costo screening universal (HemoCue): S/ {costo_hemocue_universal:,.0f}")
@@ -73,17 +84,10 @@ print(f"   • Costo tratamiento casos detectados: S/ {costo_tratamiento_tradici
 print(f"   • COSTO TOTAL: S/ {costo_total_tradicional:,.0f}")
 
 # Con NutriSenseIA
-costo_prediccion_total = poblacion_cubierta * supuestos['Costo predicción NutriSenseIA (S/ por niño)']
-poblacion_alto_riesgo = poblacion_cubierta * (1 - supuestos['Reducción en HemoCue innecesarios'])
-costo_hemocue_focalizado = poblacion_alto_riesgo * supuestos['Costo HemoCue focalizado (S/ por niño alto riesgo)']
-
-reduccion_severidad = supuestos['Reducción en casos severos']
-costo_tratamiento_nutrisense = casos_anemia_detectados * (
-    supuestos['Costo tratamiento anemia (S/ por caso)'] * (1 - reduccion_severidad * 0.4) +
-    supuestos['Costo seguimiento anemia (S/ por caso/mes)'] * supuestos['Duración promedio tratamiento (meses)'] * (1 - reduccion_severidad * 0.3)
-)
-
-costo_total_nutrisense = costo_prediccion_total + costo_hemocue_focalizado + costo_tratamiento_nutrisense
+costo_prediccion_total = base['costo_prediccion_total']
+costo_hemocue_focalizado = base['costo_hemocue_focalizado']
+costo_tratamiento_nutrisense = base['costo_tratamiento_nutrisense']
+costo_total_nutrisense = base['costo_total_nutrisense']
 
 print(f"\n🟢 CON NUTRISENSEIA:")
 print(f"   • Costo predicción (población cubierta): S/ {costo_prediccion_total:,.0f}")
@@ -92,10 +96,10 @@ print(f"   • Costo tratamiento optimizado: S/ {costo_tratamiento_nutrisense:,.
 print(f"   • COSTO TOTAL: S/ {costo_total_nutrisense:,.0f}")
 
 # ROI
-ahorro_total = costo_total_tradicional - costo_total_nutrisense
+ahorro_total = base['ahorro_anual']
 inversion_nutrisense = 5_000_000
-roi = (ahorro_total - inversion_nutrisense) / inversion_nutrisense * 100
-payback_meses = inversion_nutrisense / (ahorro_total / 12)
+roi = base['roi_pct']
+payback_meses = base['payback_meses']
 
 print(f"\n" + "="*80)
 print(f"📈 RETORNO DE INVERSIÓN (ROI)")
@@ -207,6 +211,25 @@ except ImportError:
     df_roi.to_csv(csv_path, index=False)
     print(f"✅ CSV guardado en: {csv_path}")
 
+# =====================================================
+# INCERTIDUMBRE CONJUNTA (HIPERCUBO LATINO)
+# =====================================================
+
+print(f"\n" + "="*80)
+print(f"🎲 INCERTIDUMBRE CONJUNTA (Hipercubo Latino)")
+print(f"="*80)
+
+# n_procesos=1: este script no protege su código con __main__; para
+# 1M+ muestras en paralelo usar: python -m services.analisis_roi
+montecarlo = simular_montecarlo(n_muestras=200_000, n_procesos=1)
+resumen = montecarlo['resumen']
+print(f"   🎯 ROI mediana: {resumen['roi_percentiles'][50]:.1f}% "
+      f"(P5-P95: {resumen['roi_percentiles'][5]:.1f}% – {resumen['roi_percentiles'][95]:.1f}%)")
+print(f"   ⏱️  Payback mediana: {resumen['payback_percentiles'][50]:.2f} meses")
+print(f"   ✅ Probabilidad ROI > 0: {resumen['prob_roi_positivo']:.1%}")
+print(f"\n   Tornado:\n{montecarlo['tornado'].to_string(index=False)}")
+print(f"\n   Índices de primer orden:\n{montecarlo['sobol'].to_string(index=False)}")
+
 print("\n" + "="*80)
 print("✅ ANÁLISIS DE ROI COMPLETADO")
 print("="*80)
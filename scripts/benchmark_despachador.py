@@ -0,0 +1,127 @@
+"""
+scripts/benchmark_despachador.py
+Benchmark: envío de nudges por WhatsApp/SMS secuencial vs despachador asíncrono
+
+Levanta un servidor HTTP local que imita la API del proveedor (latencia y
+tasa de 429/503 configurables) y compara:
+
+- un POST por mensaje, uno tras otro (como un bucle sobre enviar_recordatorio)
+- DespachadorMensajes con límites de concurrencia y tasa por canal
+
+Uso:
+    python scripts/benchmark_despachador.py [n_mensajes] [--latencia-ms 50] [--fallos 0.02]
+"""
+
+import sys
+import json
+import time
+import random
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.despachador_mensajes import DespachadorMensajes, TransporteHTTP
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(puerto: int, latencia_ms: float, tasa_fallos: float):
+    """API local: responde 200 tras `latencia_ms` y 429/503 con `tasa_fallos`"""
+
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            time.sleep(latencia_ms / 1000 * random.uniform(0.5, 1.5))
+            codigo = random.choice([429, 503]) if random.random() < tasa_fallos else 200
+            cuerpo = json.dumps({'status': 'queued' if codigo == 200 else 'error'}).encode()
+            self.send_response(codigo)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', puerto), Manejador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def mensajes_campana(n: int) -> list:
+    return [
+        {
+            'canal': 'whatsapp' if i % 3 else 'sms',
+            'destino': f'9{i:08d}',
+            'texto': f'Tu bebé necesita su control CRED (caso {i}).',
+            'variante': 'B' if i % 3 else 'A',
+            'tipo_control': 'Control CRED',
+            'dias': 1,
+        }
+        for i in range(n)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del despachador de nudges")
+    parser.add_argument("n", type=int, nargs='?', default=300)
+    parser.add_argument("--latencia-ms", type=float, default=50.0, help="Latencia media de la API simulada")
+    parser.add_argument("--fallos", type=float, default=0.02, help="Proporción de respuestas 429/503")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    puerto = puerto_libre()
+    iniciar_servidor(puerto, args.latencia_ms, args.fallos)
+    url = f'http://127.0.0.1:{puerto}/mensajes'
+    mensajes = mensajes_campana(args.n)
+
+    print("=" * 80)
+    print("📲 BENCHMARK: NUDGES WHATSAPP/SMS (secuencial vs despachador asíncrono)")
+    print("=" * 80)
+    print(f"\n🖥️  API de prueba en {url} | latencia ~{args.latencia_ms:.0f} ms | "
+          f"429/503: {args.fallos:.0%} | {args.n} mensajes")
+
+    # Antes: un POST por mensaje, sin reintentos
+    fallidos = 0
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto)
+    inicio = time.perf_counter()
+    for mensaje in mensajes:
+        conexion.request('POST', '/mensajes', body=json.dumps(mensaje).encode(),
+                         headers={'Content-Type': 'application/json'})
+        respuesta = conexion.getresponse()
+        respuesta.read()
+        fallidos += respuesta.status != 200
+    duracion = time.perf_counter() - inicio
+    conexion.close()
+    print(f"\n⏱️  Secuencial: {(args.n - fallidos) / duracion:8.1f} msg/s | {fallidos} fallidos | {duracion:.1f} s")
+
+    # Después: despachador con límites por canal
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = Path(tmp) / 'nudges_ab_test.csv'
+        despachador = DespachadorMensajes(
+            transportes={canal: TransporteHTTP(url, max_conexiones=20) for canal in ('whatsapp', 'sms')},
+            log_file=log_file, backoff_base=0.05
+        )
+        resumen = despachador.despachar_sync(mensajes)
+        filas_log = sum(1 for _ in open(log_file, encoding='utf-8')) - 1
+
+    print(f"⏱️  Despachador: {args.n / resumen['duracion_s']:8.1f} msg/s en total | {resumen['duracion_s']:.1f} s | "
+          f"{filas_log} filas en el log A/B")
+    for canal, m in resumen['por_canal'].items():
+        limite = despachador.limites[canal]
+        print(f"   • {canal:<8} (≤{limite['concurrencia']} en vuelo, ≤{limite['tasa']:.0f}/s): "
+              f"{m['mensajes_por_segundo']:7.1f} msg/s | {m['enviados']} enviados, {m['fallidos']} fallidos, "
+              f"{m['reintentos']} reintentos | p50 {m['latencia_p50_ms']} ms, p95 {m['latencia_p95_ms']} ms")
@@ -0,0 +1,92 @@
+"""
+scripts/benchmark_pdf.py
+Benchmark: tiempo de render de reportes PDF (en memoria)
+
+Compara el camino "frío" (generador nuevo por reporte, sin estilos ni
+gráficos cacheados, como antes) con el generador del proceso
+(get_generador_pdf) que reutiliza estilos, secciones estáticas y el PNG
+de evolución Hb.
+"""
+
+import sys
+import time
+import logging
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.pdf_generator import ReportePDFGenerator, get_generador_pdf
+
+DATOS_PACIENTE = {
+    'nombre_nino': 'Juan Pérez',
+    'nombre_madre': 'María',
+    'edad_meses': 18,
+    'hemoglobina': 10.2
+}
+
+DATOS_CLINICOS = {
+    'hemoglobina': 10.2,
+    'edad_meses': 18,
+    'peso_kg': 11.5,
+    'talla_cm': 78.5,
+    'altitud_msnm': 2800,
+    'peso_p50': 12.0,
+    'talla_p50': 79.0,
+    'nivel_riesgo': 'RIESGO MODERADO',
+    'probabilidad_ml': 0.42,
+    'factor_1': 'Hemoglobina baja',
+    'factor_2': 'Mayor altitud',
+    'factor_3': 'Baja adherencia al suplemento',
+    'evolucion_hb': {
+        'fechas': ['01/Oct', '15/Oct', '01/Nov'],
+        'valores': [9.8, 10.2, 10.5]
+    },
+}
+
+PLAN_ALIMENTARIO = {
+    'menu_semanal': [
+        {'dia': 'Lunes', 'desayuno': 'Avena con plátano', 'almuerzo': 'Hígado frito', 'cena': 'Sopa de lentejas'},
+        {'dia': 'Martes', 'desayuno': 'Huevo y pan', 'almuerzo': 'Sangrecita', 'cena': 'Puré con pollo'},
+    ],
+    'lista_compras': [
+        {'ingrediente': 'Hígado', 'cantidad': '500g'},
+        {'ingrediente': 'Huevos', 'cantidad': '1 docena'},
+    ]
+}
+
+
+def medir(fabrica, repeticiones: int, frio: bool) -> dict:
+    tiempos = {'medico': 0.0, 'madre': 0.0}
+    for _ in range(repeticiones):
+        if frio:
+            ReportePDFGenerator.limpiar_caches()
+        inicio = time.perf_counter()
+        fabrica().renderizar_reporte_medico(DATOS_PACIENTE, DATOS_CLINICOS)
+        tiempos['medico'] += time.perf_counter() - inicio
+
+        if frio:
+            ReportePDFGenerator.limpiar_caches()
+        inicio = time.perf_counter()
+        fabrica().renderizar_reporte_madre(DATOS_PACIENTE, PLAN_ALIMENTARIO)
+        tiempos['madre'] += time.perf_counter() - inicio
+    return {k: v / repeticiones * 1000 for k, v in tiempos.items()}
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    print("=" * 80)
+    print("📄 BENCHMARK: RENDER DE REPORTES PDF")
+    print("=" * 80)
+
+    # Calentar imports de reportlab/matplotlib fuera de la medición
+    get_generador_pdf().renderizar_reporte_medico(DATOS_PACIENTE, DATOS_CLINICOS)
+
+    antes = medir(ReportePDFGenerator, repeticiones, frio=True)
+    despues = medir(get_generador_pdf, repeticiones, frio=False)
+
+    print(f"\n⏱️  Promedio de {repeticiones} reportes:")
+    for tipo in ('medico', 'madre'):
+        print(f"   • {tipo:<6}: sin caché {antes[tipo]:7.1f} ms | "
+              f"generador del proceso {despues[tipo]:7.1f} ms "
+              f"({antes[tipo] / despues[tipo]:.1f}x)")
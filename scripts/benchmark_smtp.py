@@ -0,0 +1,118 @@
+"""
+scripts/benchmark_smtp.py
+Benchmark: envío de recordatorios por email con y sin pool de conexiones
+
+Levanta un servidor SMTP local de prueba (aiosmtpd si está instalado; si
+no, el módulo smtpd de la librería estándar) y compara:
+
+- una conexión por mensaje (como antes)
+- PoolSMTP con conexiones reutilizadas y envío por lotes
+
+Uso:
+    python scripts/benchmark_smtp.py [n_mensajes] [--fallos 0.05]
+"""
+
+import sys
+import time
+import random
+import socket
+import smtplib
+import logging
+import argparse
+import threading
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.notificaciones import SistemaNotificaciones
+from utils.smtp_pool import PoolSMTP
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(puerto: int, tasa_fallos: float):
+    """Servidor SMTP local que descarta mensajes y responde 451 con `tasa_fallos`"""
+    try:
+        from aiosmtpd.controller import Controller
+
+        class Manejador:
+            async def handle_DATA(self, server, session, envelope):
+                if random.random() < tasa_fallos:
+                    return '451 Falla temporal simulada'
+                return '250 OK'
+
+        controlador = Controller(Manejador(), hostname='127.0.0.1', port=puerto)
+        controlador.start()
+        return 'aiosmtpd'
+    except ImportError:
+        import warnings
+        warnings.filterwarnings('ignore', category=DeprecationWarning)
+        import asyncore
+        import smtpd
+
+        class Servidor(smtpd.SMTPServer):
+            def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+                if random.random() < tasa_fallos:
+                    return '451 Falla temporal simulada'
+                return None
+
+        Servidor(('127.0.0.1', puerto), None)
+        threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.05}, daemon=True).start()
+        return 'smtpd (stdlib)'
+
+
+def recordatorios(n: int) -> list:
+    return [
+        {
+            'email_destino': f'madre{i}@ejemplo.pe',
+            'nombre_paciente': f'Niño {i}',
+            'fecha_control': '15/11/2026',
+            'tipo_control': 'Control CRED',
+            'objetivo': 'Control de hemoglobina',
+        }
+        for i in range(n)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de envío SMTP")
+    parser.add_argument("n", type=int, nargs='?', default=1000)
+    parser.add_argument("--fallos", type=float, default=0.0, help="Proporción de respuestas 451 del servidor")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    puerto = puerto_libre()
+    servidor = iniciar_servidor(puerto, args.fallos)
+    time.sleep(0.2)
+
+    print("=" * 80)
+    print("📨 BENCHMARK: ENVÍO SMTP (una conexión por mensaje vs pool)")
+    print("=" * 80)
+    print(f"\n🖥️  Servidor de prueba: {servidor} en 127.0.0.1:{puerto} | fallos 451: {args.fallos:.0%}")
+
+    sistema = SistemaNotificaciones('127.0.0.1', puerto, usar_tls=False)
+    mensajes = [sistema._mensaje_recordatorio(**r) for r in recordatorios(args.n)]
+
+    # Antes: conexión nueva por mensaje, sin reintentos
+    fallidos = 0
+    inicio = time.perf_counter()
+    for mensaje in mensajes:
+        try:
+            with smtplib.SMTP('127.0.0.1', puerto) as server:
+                server.send_message(mensaje)
+        except smtplib.SMTPException:
+            fallidos += 1
+    duracion = time.perf_counter() - inicio
+    print(f"\n⏱️  Una conexión por mensaje: {(args.n - fallidos) / duracion:8.1f} msg/s | "
+          f"{fallidos} fallidos | {args.n} conexiones")
+
+    # Después: pool
+    pool = PoolSMTP('127.0.0.1', puerto, usar_tls=False, backoff_base=0.01)
+    resumen = pool.enviar_lote(mensajes)
+    pool.cerrar()
+    print(f"⏱️  PoolSMTP ({pool.tamano} conexiones, {pool.max_mensajes_por_conexion} msg/conexión): "
+          f"{resumen['mensajes_por_segundo']:8.1f} msg/s | {resumen['fallidos']} fallidos | "
+          f"{resumen['conexiones_abiertas']} conexiones | {pool.estadisticas()['reintentos']} reintentos")
@@ -0,0 +1,68 @@
+"""
+scripts/generar_reportes_lote.py
+Genera reportes PDF (médico + cuidador) para todo un padrón de pacientes
+
+Uso:
+    python scripts/generar_reportes_lote.py padron.csv --salida reportes/lote.zip
+    python scripts/generar_reportes_lote.py padron.parquet --formato directorio \\
+        --salida reportes/distrito_x --procesos 8
+
+Si el trabajo se interrumpe, volver a ejecutar el mismo comando lo reanuda:
+los pacientes ya generados se leen del manifiesto y no se repiten.
+"""
+
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.reportes_lote import cargar_padron, generar_reportes_lote, FORMATOS_SALIDA
+
+
+def mostrar_progreso(inicio: float):
+    def progreso(hechos: int, total: int):
+        if hechos == total or hechos % 25 == 0:
+            transcurrido = time.perf_counter() - inicio
+            print(f"\r   • {hechos:,}/{total:,} pacientes ({hechos / total:.0%}) - {transcurrido:.1f} s",
+                  end='', flush=True)
+    return progreso
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generación masiva de reportes PDF")
+    parser.add_argument("padron", help="CSV o Parquet con una fila por paciente")
+    parser.add_argument("--salida", default="reportes/lote.zip", help="Archivo .zip o directorio de salida")
+    parser.add_argument("--formato", choices=FORMATOS_SALIDA, default="zip")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos de render (default: núcleos)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    print("=" * 80)
+    print("📦 GENERACIÓN MASIVA DE REPORTES PDF")
+    print("=" * 80)
+
+    try:
+        padron = cargar_padron(args.padron)
+    except ValueError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
+    print(f"\n📂 Padrón: {len(padron):,} pacientes ({args.padron})")
+
+    resumen = generar_reportes_lote(padron, args.salida, args.formato, args.procesos,
+                                    progreso=mostrar_progreso(time.perf_counter()))
+
+    print(f"\n\n✅ {resumen['reportes']:,} reportes en {resumen['duracion_s']:.1f} s → {resumen['destino']}")
+    if resumen['omitidos']:
+        print(f"   • Reanudado: {resumen['omitidos']:,} pacientes ya estaban generados")
+    print(f"   • Throughput: {resumen['reportes_por_segundo']:.1f} reportes/s "
+          f"({resumen['reportes_por_segundo_nucleo']:.1f} por núcleo, {resumen['procesos']} procesos)")
+    if resumen['invalidos']:
+        print(f"   ⚠️ {resumen['invalidos']} filas con hemoglobina o edad inválidas (corregir el padrón)")
+    if len(resumen['errores']) > resumen['invalidos']:
+        print(f"   ⚠️ {len(resumen['errores']) - resumen['invalidos']} pacientes con error "
+              f"(se reintentan al re-ejecutar)")
+    if resumen['errores']:
+        sys.exit(1)
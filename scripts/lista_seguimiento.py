@@ -0,0 +1,49 @@
+"""
+scripts/lista_seguimiento.py
+Actualiza la detección de cambios del historial y muestra la lista de trabajo
+
+Uso:
+    python scripts/lista_seguimiento.py                 # incremental, top 50
+    python scripts/lista_seguimiento.py --completo --top 200 --csv lista.csv
+"""
+
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.seguimiento_cohorte import get_detector_cambios
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lista de trabajo de seguimiento de pacientes")
+    parser.add_argument("--completo", action="store_true", help="Recalcular todos los pacientes")
+    parser.add_argument("--top", type=int, default=50, help="Pacientes a mostrar")
+    parser.add_argument("--csv", default=None, help="Exportar la lista completa a CSV")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    print("=" * 80)
+    print("📋 LISTA DE TRABAJO: DETECCIÓN DE CAMBIOS EN EL HISTORIAL")
+    print("=" * 80)
+
+    detector = get_detector_cambios()
+    inicio = time.perf_counter()
+    recalculados = detector.actualizar(completo=args.completo)
+    print(f"\n🔄 {recalculados:,} pacientes recalculados en {time.perf_counter() - inicio:.2f} s")
+
+    lista = detector.lista_trabajo(actualizar=False)
+    if lista.empty:
+        print("\n✅ Ningún paciente requiere seguimiento")
+        sys.exit(0)
+
+    print(f"\n⚠️ {len(lista):,} pacientes requieren seguimiento. Top {min(args.top, len(lista))}:\n")
+    for fila in lista.head(args.top).itertuples():
+        print(f"   {fila.prioridad:6.2f}  {fila.id_paciente:<12} {' | '.join(fila.motivos)}")
+
+    if args.csv:
+        lista.assign(motivos=lista['motivos'].str.join('; ')).to_csv(args.csv, index=False)
+        print(f"\n💾 Lista exportada → {args.csv}")
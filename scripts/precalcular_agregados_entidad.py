@@ -0,0 +1,39 @@
+"""
+scripts/precalcular_agregados_entidad.py
+Genera los agregados del reporte de entidad (data/processed/agregados_entidad.json)
+
+Recorre el SIEN procesado una sola vez: evaluados, casos y críticos por
+distrito × periodo, más los escenarios de intervención por departamento.
+El reporte se regenera solo si cambian el SIEN o el modelo; este script
+permite hacerlo por adelantado (p. ej. tras cada carga mensual del SIEN).
+"""
+
+import sys
+import time
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.agregados_entidad import get_agregados_entidad, AGREGADOS_ENTIDAD_PATH
+from utils.pdf_generator import get_generador_pdf
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🏢 PRECÁLCULO DE AGREGADOS DE ENTIDAD")
+    print("=" * 80)
+
+    agregados = get_agregados_entidad()
+
+    inicio = time.perf_counter()
+    tabla = agregados.precalcular()
+    duracion = time.perf_counter() - inicio
+
+    print(f"\n✅ {len(tabla['distritos']['distrito']):,} filas distrito×periodo en {duracion:.1f} s")
+    print(f"   • Huella de fuentes: {tabla['huella'][:12]}")
+    print(f"   • Archivo: {AGREGADOS_ENTIDAD_PATH}")
+
+    generador = get_generador_pdf()
+    for intento in ('frío', 'caché'):
+        inicio = time.perf_counter()
+        pdf = generador.renderizar_reporte_entidad(agregados.resumen())
+        print(f"   • Reporte nacional ({intento}): {(time.perf_counter() - inicio):.2f} s, {len(pdf):,} bytes")
@@ -0,0 +1,35 @@
+"""
+scripts/precalcular_menus.py
+Genera la tabla de menús precalculados (data/processed/menus_precalculados.json)
+
+Recorre la grilla región × presupuesto (cada S/ 0.50) × exclusiones comunes y
+guarda la selección óptima de cada celda. El generador la regenera en segundo
+plano si cambian base_alimentos_hierro.csv o el catálogo de costos; este
+script permite hacerlo por adelantado (p. ej. en el despliegue).
+"""
+
+import sys
+import time
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.menu_generator import menu_generator, TABLA_MENUS_PATH
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🍽️  PRECÁLCULO DE MENÚS")
+    print("=" * 80)
+
+    inicio = time.perf_counter()
+    tabla = menu_generator.precalcular_tabla()
+    duracion = time.perf_counter() - inicio
+
+    print(f"\n✅ {len(tabla['menus']):,} menús en {duracion:.1f} s")
+    print(f"   • Huella de fuentes: {tabla['huella'][:12]}")
+    print(f"   • Archivo: {TABLA_MENUS_PATH}")
+
+    inicio = time.perf_counter()
+    for _ in range(1000):
+        menu_generator.generar_menu(24, 5.0, "Sierra")
+    print(f"   • Consulta desde tabla: {(time.perf_counter() - inicio):.3f} ms/menú")
@@ -0,0 +1,45 @@
+"""
+scripts/worker_recordatorios.py
+Worker de la cola persistente de recordatorios (CRED / seguimiento)
+
+Uso:
+    python scripts/worker_recordatorios.py              # bucle cada 30 s
+    python scripts/worker_recordatorios.py --una-pasada # procesa vencidos y termina (cron)
+
+Se pueden lanzar varios workers en paralelo: cada lote se reclama con un
+lease y, si un worker muere, sus trabajos vuelven a la cola al vencer.
+"""
+
+import sys
+import logging
+import argparse
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.cola_recordatorios import get_cola_recordatorios, procesar_vencidos, ejecutar_worker
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker de recordatorios programados")
+    parser.add_argument("--una-pasada", action="store_true", help="Procesar vencidos una vez y salir")
+    parser.add_argument("--intervalo", type=float, default=30, help="Segundos entre pasadas")
+    parser.add_argument("--lote", type=int, default=100, help="Trabajos reclamados por lote")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    print("=" * 80)
+    print("📨 WORKER DE RECORDATORIOS")
+    print("=" * 80)
+
+    cola = get_cola_recordatorios()
+    print(f"\n📊 Cola: {cola.resumen()}")
+
+    if args.una_pasada:
+        totales = procesar_vencidos(cola, lote=args.lote)
+        print(f"\n✅ {totales['enviados']} enviados, {totales['fallidos']} con error")
+    else:
+        try:
+            ejecutar_worker(cola, intervalo_segundos=args.intervalo, lote=args.lote)
+        except KeyboardInterrupt:
+            print("\n⏹️ Worker detenido")
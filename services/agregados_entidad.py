@@ -0,0 +1,310 @@
+"""
+services/agregados_entidad.py
+Tablas agregadas para el reporte de entidad (DIRESA / MINSA)
+
+El reporte de entidad no recorre el SIEN al renderizar: lee una tabla
+precalculada (data/processed/agregados_entidad.json) con evaluados, casos y
+críticos por distrito × periodo y los resultados de escenarios de
+intervención por departamento. La tabla se regenera solo cuando cambian el
+SIEN procesado, el modelo o VERSION_AGREGADOS; la regeneración corre en un
+hilo de fondo (o en scripts/precalcular_agregados_entidad.py), nunca dentro
+de una petición, y mientras tanto se sirve la tabla anterior.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import BASE_DIR, DATA_DIR, data_loader
+
+logger = logging.getLogger(__name__)
+
+
+AGREGADOS_ENTIDAD_PATH = DATA_DIR / "agregados_entidad.json"
+# Subir al cambiar el cálculo (2: escenarios puntuados con la cobertura del escenario)
+VERSION_AGREGADOS = 2
+FUENTES_AGREGADOS = [
+    DATA_DIR / "sien_nacional_procesado.csv",
+    BASE_DIR / "models" / "predictor_anemia_ml.pkl",
+]
+
+# Columnas SIEN de las que se deriva el periodo (YYYY-MM)
+COLUMNAS_PERIODO = ['periodo', 'FechaHemoglobina', 'FechaAtencion', 'Fecha']
+PERIODO_TOTAL = 'TOTAL'
+
+ESCENARIOS_REPORTE = ['suplementacion_universal', 'menus_comunitarios',
+                      'cred_reforzado', 'intervencion_integral']
+
+# Un distrito con pocos evaluados no entra al ranking de hotspots
+MIN_EVALUADOS_HOTSPOT = 30
+UMBRAL_CRITICO_HB = 10.0  # anemia moderada o severa (Hb ajustada, g/dL)
+
+
+class AgregadosEntidad:
+    """Agregados territoriales precalculados para reportes de entidad"""
+
+    def __init__(self):
+        self._tabla = None
+        self._firma_fuentes = None
+        self._distritos = None
+        self._escenarios = None
+        self._regenerando: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # ════════════════════════════════════════════════════════════════════
+    # PRECÁLCULO
+    # ════════════════════════════════════════════════════════════════════
+
+    @staticmethod
+    def _periodos(df: pd.DataFrame) -> np.ndarray:
+        """Periodo YYYY-MM de cada fila (TOTAL si el SIEN no trae fechas)"""
+        for columna in COLUMNAS_PERIODO:
+            if columna in df.columns:
+                fechas = pd.to_datetime(df[columna], errors='coerce')
+                return np.where(fechas.notna(), fechas.dt.strftime('%Y-%m'), PERIODO_TOTAL)
+        return np.full(len(df), PERIODO_TOTAL, dtype=object)
+
+    def _huella_fuentes(self) -> str:
+        """Hash del contenido de los archivos de los que dependen los agregados"""
+        h = hashlib.sha256()
+        for ruta in FUENTES_AGREGADOS:
+            if not ruta.exists():
+                h.update(b'ausente')
+                continue
+            with open(ruta, 'rb') as f:
+                for bloque in iter(lambda: f.read(1 << 20), b''):
+                    h.update(bloque)
+        return h.hexdigest()
+
+    def _firma_stat(self) -> tuple:
+        """Firma barata (tamaño + mtime) para detectar cambios sin leer archivos"""
+        return tuple(
+            (r.stat().st_size, r.stat().st_mtime_ns) if r.exists() else None
+            for r in FUENTES_AGREGADOS
+        )
+
+    def precalcular(self, cohorte: Optional[pd.DataFrame] = None, guardar: bool = True) -> Dict[str, Any]:
+        """
+        Recorre la cohorte SIEN una vez y materializa los agregados
+
+        No usa el simulador global, la caché de data_loader ni el modelo
+        cargado al importar: la cohorte se lee del disco y el modelo se
+        recarga, así la huella describe lo que realmente se calculó. La
+        huella se toma antes de leer; si una fuente cambia durante el
+        cálculo, la tabla queda obsoleta y se regenera en la próxima consulta.
+
+        Args:
+            cohorte: DataFrame SIEN (default: sien_nacional_procesado.csv, sin caché)
+            guardar: Escribir data/processed/agregados_entidad.json
+
+        Returns:
+            Dict con huella, fecha de generación, 'distritos' (departamento,
+            provincia, distrito, periodo, evaluados, casos, criticos, hb_media)
+            y 'escenarios' (departamento × escenario)
+        """
+        from services.predictor import AnemiaPredictor
+        from services.simulador_poblacional import SimuladorPoblacional
+
+        firma = self._firma_stat()
+        huella = self._huella_fuentes()
+        if cohorte is None:
+            cohorte = data_loader.load_csv(FUENTES_AGREGADOS[0].name, use_cache=False)
+            if cohorte is None:
+                raise FileNotFoundError(f"{FUENTES_AGREGADOS[0].name} no disponible")
+        simulador = SimuladorPoblacional(predictor=AnemiaPredictor(), cohorte=cohorte)
+        df = simulador.cohorte
+        if df.empty:
+            raise FileNotFoundError("Cohorte SIEN vacía: no se pueden calcular agregados")
+
+        hb_ajustada = simulador.predictor.ajustar_hemoglobina_altitud_lote(
+            df['hemoglobina'].to_numpy(), df['altitud'].to_numpy()
+        )
+        base = pd.DataFrame({
+            'departamento': df['departamento'].to_numpy(),
+            'provincia': df['provincia'].astype(str).str.upper().to_numpy() if 'provincia' in df.columns else 'SIN PROVINCIA',
+            'distrito': df['distrito'].astype(str).str.upper().to_numpy() if 'distrito' in df.columns else 'SIN DISTRITO',
+            'periodo': self._periodos(df),
+            'evaluados': 1,
+            'casos': (hb_ajustada < 11.0).astype(int),
+            'criticos': (hb_ajustada < UMBRAL_CRITICO_HB).astype(int),
+            'hb_suma': hb_ajustada,
+        })
+        distritos = base.groupby(['departamento', 'provincia', 'distrito', 'periodo'],
+                                 sort=True, as_index=False).sum()
+        distritos['hb_media'] = (distritos.pop('hb_suma') / distritos['evaluados']).round(2)
+
+        escenarios = simulador.comparar_escenarios(ESCENARIOS_REPORTE, agrupar_por='departamento')
+        if not escenarios.empty:
+            escenarios = escenarios.rename(columns={'region': 'departamento'})[
+                ['departamento', 'escenario', 'ninos', 'casos_base', 'casos_escenario', 'casos_evitados']
+            ]
+
+        tabla = {
+            'version': VERSION_AGREGADOS,
+            'huella': huella,
+            'generado': datetime.now().isoformat(timespec='seconds'),
+            'distritos': distritos.to_dict('list'),
+            'escenarios': escenarios.to_dict('list'),
+        }
+
+        if guardar:
+            AGREGADOS_ENTIDAD_PATH.parent.mkdir(parents=True, exist_ok=True)
+            temporal = AGREGADOS_ENTIDAD_PATH.with_name(f".{AGREGADOS_ENTIDAD_PATH.name}.{os.getpid()}.tmp")
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(tabla, f, ensure_ascii=False)
+            os.replace(temporal, AGREGADOS_ENTIDAD_PATH)
+            logger.info(f"✅ Agregados de entidad: {len(distritos):,} filas distrito×periodo → "
+                        f"{AGREGADOS_ENTIDAD_PATH}")
+
+        self._usar_tabla(tabla, firma)
+        return tabla
+
+    def _usar_tabla(self, tabla: Dict[str, Any], firma: tuple):
+        self._tabla = tabla
+        self._firma_fuentes = firma
+        self._distritos = pd.DataFrame(tabla['distritos'])
+        self._escenarios = pd.DataFrame(tabla['escenarios'])
+
+    def _regenerar_en_fondo(self):
+        """Lanza precalcular() en un hilo si no hay uno en curso"""
+        with self._lock:
+            if self._regenerando is not None and self._regenerando.is_alive():
+                return
+
+            def tarea():
+                try:
+                    self.precalcular()
+                except Exception as e:
+                    logger.error(f"❌ No se pudieron regenerar los agregados de entidad: {e}")
+
+            self._regenerando = threading.Thread(target=tarea, name="agregados-entidad", daemon=True)
+            self._regenerando.start()
+
+    def _asegurar(self) -> Dict[str, Any]:
+        """
+        Carga la tabla; si cambió el SIEN, el modelo o la versión, la
+        regenera en segundo plano y sigue sirviendo la anterior
+
+        Raises:
+            FileNotFoundError: Aún no hay ninguna tabla generada
+        """
+        firma = self._firma_stat()
+        if self._tabla is not None and firma == self._firma_fuentes:
+            return self._tabla
+
+        tabla = self._tabla
+        if AGREGADOS_ENTIDAD_PATH.exists():
+            try:
+                with open(AGREGADOS_ENTIDAD_PATH, 'r', encoding='utf-8') as f:
+                    tabla = json.load(f)
+            except Exception as e:
+                logger.warning(f"⚠️ Agregados de entidad ilegibles, se regenerarán: {e}")
+
+        if tabla is None or tabla.get('version') != VERSION_AGREGADOS \
+                or tabla.get('huella') != self._huella_fuentes():
+            logger.info("🔄 SIEN, modelo o versión modificados: regenerando agregados de entidad en segundo plano")
+            self._regenerar_en_fondo()
+            if tabla is None:
+                raise FileNotFoundError("Agregados de entidad en preparación "
+                                        "(scripts/precalcular_agregados_entidad.py los genera por adelantado)")
+            # Se vuelve a comprobar en la próxima consulta
+            firma = None
+
+        self._usar_tabla(tabla, firma)
+        return tabla
+
+    # ════════════════════════════════════════════════════════════════════
+    # CONSULTA
+    # ════════════════════════════════════════════════════════════════════
+
+    def periodos(self) -> List[str]:
+        """Periodos disponibles en la tabla"""
+        self._asegurar()
+        return sorted(self._distritos['periodo'].unique())
+
+    def departamentos(self) -> List[str]:
+        """Departamentos disponibles en la tabla"""
+        self._asegurar()
+        return sorted(self._distritos['departamento'].unique())
+
+    def resumen(self, region: Optional[str] = None, periodo: Optional[str] = None,
+                top_hotspots: int = 10) -> Dict[str, Any]:
+        """
+        Indicadores, ranking de hotspots y escenarios para un ámbito
+
+        Args:
+            region: Departamento (None = nacional)
+            periodo: YYYY-MM (None = todos los periodos)
+            top_hotspots: Distritos a incluir en el ranking
+
+        Returns:
+            Dict con region, periodo, huella, evaluados, casos, criticos,
+            prevalencia_pct, 'unidades' (departamentos en ámbito nacional,
+            distritos en ámbito regional), 'hotspots' y 'escenarios'. Los
+            escenarios se simulan sobre la cohorte completa, no sobre el
+            periodo: 'periodo_escenarios' lo indica (siempre TOTAL)
+        """
+        tabla = self._asegurar()
+        df = self._distritos
+        if region:
+            df = df[df['departamento'] == region.upper()]
+        if periodo:
+            df = df[df['periodo'] == periodo]
+
+        nivel = 'distrito' if region else 'departamento'
+        unidades = df.groupby(nivel, as_index=False)[['evaluados', 'casos', 'criticos']].sum()
+        unidades['prevalencia_pct'] = (unidades['casos'] / unidades['evaluados'] * 100).round(1)
+        unidades = unidades.sort_values('prevalencia_pct', ascending=False)
+
+        por_distrito = df.groupby(['departamento', 'provincia', 'distrito'], as_index=False)[
+            ['evaluados', 'casos', 'criticos']].sum()
+        por_distrito = por_distrito[por_distrito['evaluados'] >= MIN_EVALUADOS_HOTSPOT]
+        por_distrito['prevalencia_pct'] = (por_distrito['casos'] / por_distrito['evaluados'] * 100).round(1)
+        hotspots = por_distrito.nlargest(top_hotspots, ['prevalencia_pct', 'criticos'])
+
+        escenarios = self._escenarios
+        if region and not escenarios.empty:
+            escenarios = escenarios[escenarios['departamento'] == region.upper()]
+        if not escenarios.empty:
+            escenarios = escenarios.groupby('escenario', as_index=False, sort=False)[
+                ['ninos', 'casos_base', 'casos_escenario', 'casos_evitados']].sum()
+            escenarios['prevalencia_base_pct'] = (escenarios['casos_base'] / escenarios['ninos'] * 100).round(1)
+            escenarios['prevalencia_escenario_pct'] = (escenarios['casos_escenario'] / escenarios['ninos'] * 100).round(1)
+            escenarios = escenarios.sort_values('casos_evitados', ascending=False)
+
+        evaluados = int(df['evaluados'].sum())
+        casos = int(df['casos'].sum())
+        return {
+            'region': region.upper() if region else 'NACIONAL',
+            'periodo': periodo or PERIODO_TOTAL,
+            'huella': tabla['huella'],
+            'generado': tabla['generado'],
+            'evaluados': evaluados,
+            'casos': casos,
+            'criticos': int(df['criticos'].sum()),
+            'prevalencia_pct': round(casos / evaluados * 100, 1) if evaluados else 0.0,
+            'nivel_unidades': nivel,
+            'unidades': unidades.to_dict('records'),
+            'hotspots': hotspots.to_dict('records'),
+            'escenarios': escenarios.to_dict('records') if not escenarios.empty else [],
+            'periodo_escenarios': PERIODO_TOTAL,
+        }
+
+
+# Instancia global (singleton pattern)
+_agregados_instance = None
+
+
+def get_agregados_entidad() -> AgregadosEntidad:
+    """Factory para obtener instancia única de agregados de entidad"""
+    global _agregados_instance
+    if _agregados_instance is None:
+        _agregados_instance = AgregadosEntidad()
+    return _agregados_instance
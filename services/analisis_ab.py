@@ -0,0 +1,466 @@
+"""
+services/analisis_ab.py
+Análisis A/B incremental de las variantes de nudges
+
+Cada actualización procesa solo lo nuevo desde la anterior:
+
+- log de envíos (data/logs/nudges_ab_test.csv): se lee desde el último
+  byte procesado y suma envíos por variante y canal
+- recordatorios enviados por la cola (utils/cola_recordatorios.py): cada
+  uno es una exposición (paciente, variante) con ventana de observación
+  desde el envío hasta VENTANA_ASISTENCIA_DIAS después del control
+- resultados: consultas nuevas del historial (asistió al control CRED) y
+  registros nuevos de adherencia (preparó el menú), buscados por índice
+  solo para los pacientes con exposiciones abiertas
+
+Al cerrarse la ventana, la exposición se suma a las estadísticas
+suficientes de su variante (expuestos, conversiones por métrica): el
+tablero calcula tasas, intervalos de Wilson y posteriores Beta en
+O(variantes), sin releer el log.
+"""
+
+import io
+import os
+import hashlib
+import re
+import csv
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from utils.adherencia import get_adherencia_store
+from utils.cola_recordatorios import get_cola_recordatorios, parsear_fecha
+from utils.despachador_mensajes import NUDGES_LOG_PATH
+from utils.historial import get_historial_store
+from utils.sqlite_wal import AlmacenSQLite
+
+logger = logging.getLogger(__name__)
+
+
+ANALISIS_AB_DB_PATH = Path(os.getenv("ANALISIS_AB_DB", "data/logs/analisis_ab.db"))
+
+VENTANA_ASISTENCIA_DIAS = 14   # días después del control en que aún cuenta la asistencia
+VARIANTE_CONTROL = 'A'         # formal institucional (línea base)
+METRICAS = {
+    'asistio': 'Asistió al control CRED',
+    'preparo': 'Preparó el menú',
+}
+NIVEL_CONFIANZA = 0.95
+MUESTRAS_POSTERIOR = 20000
+IDS_POR_CONSULTA = 5000        # pacientes por query (límite de parámetros SQLite)
+BLOQUE_LOG_BYTES = 8 * 1024 * 1024
+
+# Solo los recordatorios programados con DNI se enlazan con historial y
+# adherencia; los que usan el teléfono como id no entran al denominador
+PATRON_DNI = re.compile(r'\d{8}')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS envios (
+    variante TEXT NOT NULL,
+    canal TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (variante, canal)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS exposiciones (
+    id_trabajo INTEGER PRIMARY KEY,
+    id_paciente TEXT NOT NULL,
+    variante TEXT NOT NULL,
+    canal TEXT NOT NULL,
+    desde TEXT NOT NULL,
+    hasta TEXT NOT NULL,
+    asistio INTEGER NOT NULL DEFAULT 0,
+    preparo INTEGER NOT NULL DEFAULT 0,
+    cerrada INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_exposiciones_abiertas ON exposiciones (id_paciente) WHERE cerrada = 0;
+CREATE INDEX IF NOT EXISTS idx_exposiciones_vencen ON exposiciones (hasta) WHERE cerrada = 0;
+CREATE TABLE IF NOT EXISTS suficientes (
+    variante TEXT PRIMARY KEY,
+    n_expuestos INTEGER NOT NULL DEFAULT 0,
+    n_cerrados INTEGER NOT NULL DEFAULT 0,
+    n_asistio INTEGER NOT NULL DEFAULT 0,
+    n_preparo INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT);
+"""
+
+
+def _misma_identidad(anterior: str, actual: str) -> bool:
+    """Mismo inodo y, si ambos la tienen, misma primera fila de datos"""
+    dev_a, ino_a, hash_a = anterior.split(':')
+    dev_b, ino_b, hash_b = actual.split(':')
+    return (dev_a, ino_a) == (dev_b, ino_b) and (not hash_a or not hash_b or hash_a == hash_b)
+
+
+def _eventos(ids_paciente: pd.Series, fechas: pd.Series) -> pd.DataFrame:
+    """(id_paciente, dia ISO) para cruzar con las ventanas de exposición"""
+    return pd.DataFrame({'id_paciente': ids_paciente.astype(str).to_numpy(),
+                         'dia': fechas.astype(str).str[:10].to_numpy()})
+
+
+def _preparaciones(registros: pd.DataFrame) -> pd.DataFrame:
+    preparados = registros[registros['preparado'] == 1]
+    return _eventos(preparados['caso_id'], preparados['timestamp'])
+
+
+def comparar_variantes(conteos: Dict[str, Tuple[int, int]], control: str = VARIANTE_CONTROL,
+                       nivel: float = NIVEL_CONFIANZA, muestras: int = MUESTRAS_POSTERIOR,
+                       semilla: int = 0) -> Dict[str, Dict]:
+    """
+    Tasa de conversión por variante con intervalo de Wilson y posterior Beta
+
+    Args:
+        conteos: {variante: (conversiones, expuestos)}
+        control: Variante de referencia para la comparación
+        nivel: Nivel de confianza / credibilidad
+        muestras: Muestras de la posterior para P(mejor)
+        semilla: Semilla (resultados estables entre refrescos)
+
+    Returns:
+        {variante: {n, conversiones, tasa, ic_inf, ic_sup, posterior_media,
+        cred_inf, cred_sup, prob_mejor, prob_supera_control, diferencia_vs_control}}
+    """
+    variantes = sorted(conteos)
+    if not variantes:
+        return {}
+    k = np.array([conteos[v][0] for v in variantes], dtype=float)
+    n = np.array([conteos[v][1] for v in variantes], dtype=float)
+    con_datos = n > 0
+    n_seguro = np.where(con_datos, n, 1.0)
+
+    # Intervalo de Wilson
+    z = stats.norm.ppf(0.5 + nivel / 2)
+    tasa = k / n_seguro
+    denominador = 1 + z ** 2 / n_seguro
+    centro = (tasa + z ** 2 / (2 * n_seguro)) / denominador
+    radio = z * np.sqrt(tasa * (1 - tasa) / n_seguro + z ** 2 / (4 * n_seguro ** 2)) / denominador
+
+    # Posterior Beta(1 + k, 1 + n - k) con prior uniforme
+    a, b = 1 + k, 1 + n - k
+    cola = (1 - nivel) / 2
+    cred_inf, cred_sup = stats.beta.ppf(cola, a, b), stats.beta.ppf(1 - cola, a, b)
+    muestras_post = np.random.default_rng(semilla).beta(a, b, size=(muestras, len(variantes)))
+    muestras_post[:, ~con_datos] = -1.0  # sin expuestos no compite por "mejor"
+    prob_mejor = (np.bincount(muestras_post.argmax(axis=1), minlength=len(variantes)) / muestras
+                  if con_datos.any() else np.zeros(len(variantes)))
+
+    i_control = variantes.index(control) if control in variantes and con_datos[variantes.index(control)] else None
+
+    resultado = {}
+    for i, variante in enumerate(variantes):
+        comparar = i_control is not None and i != i_control and con_datos[i]
+        resultado[variante] = {
+            'n': int(n[i]),
+            'conversiones': int(k[i]),
+            'tasa': round(float(tasa[i]), 4) if con_datos[i] else None,
+            'ic_inf': round(float(max(centro[i] - radio[i], 0.0)), 4) if con_datos[i] else None,
+            'ic_sup': round(float(min(centro[i] + radio[i], 1.0)), 4) if con_datos[i] else None,
+            'posterior_media': round(float(a[i] / (a[i] + b[i])), 4),
+            'cred_inf': round(float(cred_inf[i]), 4),
+            'cred_sup': round(float(cred_sup[i]), 4),
+            'prob_mejor': round(float(prob_mejor[i]), 4),
+            'prob_supera_control': (round(float((muestras_post[:, i] > muestras_post[:, i_control]).mean()), 4)
+                                    if comparar else None),
+            'diferencia_vs_control': round(float(tasa[i] - tasa[i_control]), 4) if comparar else None,
+        }
+    return resultado
+
+
+class MotorAB(AlmacenSQLite):
+    """
+    Estadísticas suficientes A/B mantenidas de forma incremental
+
+    Una conexión por hilo; cada actualización corre en una transacción
+    BEGIN IMMEDIATE, así dos refrescos simultáneos no cuentan dos veces.
+    """
+
+    def __init__(self, ruta: Path = ANALISIS_AB_DB_PATH, log_file: Optional[Path] = NUDGES_LOG_PATH,
+                 cola=None, historial=None, adherencia=None,
+                 ventana_dias: int = VENTANA_ASISTENCIA_DIAS):
+        """
+        Args:
+            ruta: Archivo SQLite con las estadísticas
+            log_file: Log A/B de envíos (None = no contar envíos)
+            cola: ColaRecordatorios (default: get_cola_recordatorios())
+            historial: HistorialStore (default: get_historial_store())
+            adherencia: AdherenciaStore (default: get_adherencia_store())
+            ventana_dias: Días después del control en que cuenta la asistencia
+        """
+        self.log_file = Path(log_file) if log_file is not None else None
+        self.cola = cola or get_cola_recordatorios()
+        self.historial = historial or get_historial_store()
+        self.adherencia = adherencia or get_adherencia_store()
+        self.ventana_dias = ventana_dias
+        super().__init__(ruta, ESQUEMA)
+
+    @staticmethod
+    def _meta(conn: sqlite3.Connection, clave: str, defecto: str = '') -> str:
+        fila = conn.execute("SELECT valor FROM meta WHERE clave = ?", (clave,)).fetchone()
+        return fila[0] if fila else defecto
+
+    @staticmethod
+    def _guardar_meta(conn: sqlite3.Connection, **valores):
+        conn.executemany(
+            "INSERT INTO meta (clave, valor) VALUES (?, ?) ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor",
+            [(clave, str(valor)) for clave, valor in valores.items()]
+        )
+
+    # ════════════════════════════════════════════════════════════════════
+    # ACTUALIZACIÓN INCREMENTAL
+    # ════════════════════════════════════════════════════════════════════
+
+    def actualizar(self, hoy: Optional[date] = None, completo: bool = False) -> Dict[str, int]:
+        """
+        Procesa lo nuevo desde la última actualización
+
+        Args:
+            hoy: Fecha de referencia para cerrar ventanas (default: hoy)
+            completo: Descartar lo acumulado y reprocesar todo
+
+        Returns:
+            Dict con envios, exposiciones nuevas, asistencias, preparaciones
+            y exposiciones cerradas en esta pasada
+        """
+        hoy = hoy or date.today()
+        with self._transaccion() as conn:
+            if completo:
+                for tabla in ('envios', 'exposiciones', 'suficientes', 'meta'):
+                    conn.execute(f"DELETE FROM {tabla}")
+
+            resumen = {'envios': self._leer_log(conn)}
+            resumen['exposiciones'], resumen['asistencias'], resumen['preparaciones'] = \
+                self._registrar_exposiciones(conn)
+            resumen['asistencias'] += self._procesar_consultas(conn)
+            resumen['preparaciones'] += self._procesar_adherencia(conn)
+            resumen['cerradas'] = self._cerrar_vencidas(conn, hoy)
+
+        if any(resumen.values()):
+            logger.info(f"✅ A/B nudges: {resumen}")
+        return resumen
+
+    def _leer_log(self, conn: sqlite3.Connection) -> int:
+        """Cuenta las filas nuevas del log A/B desde el último byte leído"""
+        if self.log_file is None or not self.log_file.exists():
+            return 0
+
+        offset = int(self._meta(conn, 'offset_log', '0'))
+        with open(self.log_file, 'rb') as f:
+            # Identidad del log: inodo + hash de la primera fila de datos.
+            # Un archivo rotado que ya creció más allá del offset guardado
+            # no se detecta por tamaño.
+            info = os.fstat(f.fileno())
+            cabecera = f.readline()
+            primera = f.readline()
+            huella = hashlib.sha1(primera).hexdigest() if primera.endswith(b'\n') else ''
+            identidad = f"{info.st_dev}:{info.st_ino}:{huella}"
+            anterior = self._meta(conn, 'identidad_log')
+            if info.st_size < offset or (anterior and not _misma_identidad(anterior, identidad)):
+                # Log truncado o rotado: se recuentan los envíos
+                conn.execute("DELETE FROM envios")
+                conn.execute("DELETE FROM meta WHERE clave = 'ultimo_envio'")
+                offset = 0
+
+            conteo = Counter()
+            ultimo = self._meta(conn, 'ultimo_envio')
+            columnas = next(csv.reader([cabecera.decode('utf-8')]), [])
+            if not {'timestamp', 'variante', 'canal'} <= set(columnas):
+                return 0
+            i_ts, i_var, i_canal = (columnas.index(c) for c in ('timestamp', 'variante', 'canal'))
+            offset = max(offset, len(cabecera))
+            f.seek(offset)
+            while True:
+                bloque = f.read(BLOQUE_LOG_BYTES)
+                # Solo líneas completas: el despachador puede estar escribiendo
+                fin = bloque.rfind(b'\n') + 1
+                if fin == 0:
+                    break
+                for fila in csv.reader(io.StringIO(bloque[:fin].decode('utf-8'))):
+                    if len(fila) < len(columnas):
+                        continue
+                    conteo[(fila[i_var], fila[i_canal])] += 1
+                    ultimo = max(ultimo, fila[i_ts])
+                offset += fin
+                f.seek(offset)
+
+        conn.executemany(
+            "INSERT INTO envios (variante, canal, n) VALUES (?, ?, ?)"
+            " ON CONFLICT (variante, canal) DO UPDATE SET n = n + excluded.n",
+            [(variante, canal, n) for (variante, canal), n in conteo.items()]
+        )
+        self._guardar_meta(conn, offset_log=offset, ultimo_envio=ultimo, identidad_log=identidad)
+        return sum(conteo.values())
+
+    def _registrar_exposiciones(self, conn: sqlite3.Connection) -> Tuple[int, int, int]:
+        """
+        Recordatorios enviados desde el cursor → exposiciones abiertas
+
+        Los resultados que ya ocurrieron (consulta o menú registrados antes
+        de esta pasada) se buscan al crear la exposición. Los recordatorios
+        sin DNI no son exposiciones: solo se cuentan en 'sin_dni'.
+        """
+        secuencia = self._meta(conn, 'cursor_envios')
+        if secuencia:
+            secuencia = int(secuencia)
+        else:
+            # Cursor anterior (enviado_at, id) → secuencia de envío equivalente
+            secuencia = self.cola.secuencia_hasta(*map(int, self._meta(conn, 'cursor_cola', '0,0').split(',')))
+        sin_dni = int(self._meta(conn, 'sin_dni', '0'))
+        nuevas = asistencias = preparaciones = 0
+        while True:
+            trabajos = self.cola.enviados_desde(secuencia)
+            if not trabajos:
+                break
+            secuencia = trabajos[-1]['secuencia_envio']
+
+            con_variante = [t for t in trabajos if t['payload'].get('variante')]  # emails: sin variante A/B
+            filas = [
+                (t['id'], str(t['id_paciente']), t['payload']['variante'], t['canal'],
+                 datetime.fromtimestamp(t['enviado_at']).date().isoformat(),
+                 (parsear_fecha(t['fecha_control']) + timedelta(days=self.ventana_dias)).isoformat())
+                for t in con_variante if PATRON_DNI.fullmatch(str(t['id_paciente']))
+            ]
+            sin_dni += len(con_variante) - len(filas)
+            if not filas:
+                continue
+            conn.executemany(
+                "INSERT OR IGNORE INTO exposiciones (id_trabajo, id_paciente, variante, canal, desde, hasta)"
+                " VALUES (?, ?, ?, ?, ?, ?)", filas
+            )
+            conn.executemany(
+                "INSERT INTO suficientes (variante, n_expuestos) VALUES (?, ?)"
+                " ON CONFLICT (variante) DO UPDATE SET n_expuestos = n_expuestos + excluded.n_expuestos",
+                list(Counter(f[2] for f in filas).items())
+            )
+
+            ids = [f[1] for f in filas]
+            asistencias += self._marcar(conn, 'asistio', ids, self._consultas_en_ventanas)
+            preparaciones += self._marcar(
+                conn, 'preparo', ids,
+                lambda abiertas: _preparaciones(self.adherencia.registros_desde(0, abiertas['id_paciente'].unique()))
+            )
+            nuevas += len(filas)
+
+        self._guardar_meta(conn, cursor_envios=secuencia, sin_dni=sin_dni)
+        return nuevas, asistencias, preparaciones
+
+    def _procesar_consultas(self, conn: sqlite3.Connection) -> int:
+        """Consultas nuevas del historial → asistencias de exposiciones abiertas"""
+        ids, maximo = self.historial.pacientes_modificados(int(self._meta(conn, 'cursor_historial', '0')))
+        n = self._marcar(conn, 'asistio', ids, self._consultas_en_ventanas)
+        self._guardar_meta(conn, cursor_historial=maximo)
+        return n
+
+    def _procesar_adherencia(self, conn: sqlite3.Connection) -> int:
+        """Registros nuevos de adherencia → preparaciones de exposiciones abiertas"""
+        registros = self.adherencia.registros_desde(int(self._meta(conn, 'cursor_adherencia', '0')))
+        if registros.empty:
+            return 0
+        eventos = _preparaciones(registros)
+        n = self._marcar(conn, 'preparo', eventos['id_paciente'], lambda abiertas: eventos)
+        self._guardar_meta(conn, cursor_adherencia=int(registros['id'].max()))
+        return n
+
+    def _consultas_en_ventanas(self, abiertas: pd.DataFrame) -> pd.DataFrame:
+        hasta = date.fromisoformat(abiertas['hasta'].max()) + timedelta(days=1)
+        consultas = self.historial.consultas_periodo(desde=abiertas['desde'].min(), hasta=hasta,
+                                                     ids=abiertas['id_paciente'].unique())
+        return _eventos(consultas['id_paciente'], consultas['fecha'])
+
+    def _marcar(self, conn: sqlite3.Connection, columna: str, ids_paciente: Iterable[str],
+                buscar: Callable[[pd.DataFrame], pd.DataFrame]) -> int:
+        """
+        Marca `columna` en las exposiciones abiertas de esos pacientes que
+        tengan un evento (de `buscar`) dentro de su ventana
+        """
+        ids = list(dict.fromkeys(str(i) for i in ids_paciente))
+        n = 0
+        for i in range(0, len(ids), IDS_POR_CONSULTA):
+            bloque = ids[i:i + IDS_POR_CONSULTA]
+            abiertas = pd.read_sql_query(
+                f"SELECT id_trabajo, id_paciente, desde, hasta FROM exposiciones"
+                f" WHERE cerrada = 0 AND {columna} = 0 AND id_paciente IN ({', '.join('?' * len(bloque))})",
+                conn, params=bloque
+            )
+            if abiertas.empty:
+                continue
+            cruce = abiertas.merge(buscar(abiertas), on='id_paciente')
+            marcadas = cruce.loc[(cruce['dia'] >= cruce['desde']) & (cruce['dia'] <= cruce['hasta']),
+                                 'id_trabajo'].unique()
+            conn.executemany(f"UPDATE exposiciones SET {columna} = 1 WHERE id_trabajo = ?",
+                             [(int(i),) for i in marcadas])
+            n += len(marcadas)
+        return n
+
+    def _cerrar_vencidas(self, conn: sqlite3.Connection, hoy: date) -> int:
+        """Exposiciones con la ventana vencida → estadísticas suficientes"""
+        filas = conn.execute(
+            "SELECT variante, COUNT(*), SUM(asistio), SUM(preparo) FROM exposiciones"
+            " WHERE cerrada = 0 AND hasta < ? GROUP BY variante", (hoy.isoformat(),)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE suficientes SET n_cerrados = n_cerrados + ?, n_asistio = n_asistio + ?,"
+            " n_preparo = n_preparo + ? WHERE variante = ?",
+            [(n, asistio, preparo, variante) for variante, n, asistio, preparo in filas]
+        )
+        conn.execute("UPDATE exposiciones SET cerrada = 1 WHERE cerrada = 0 AND hasta < ?", (hoy.isoformat(),))
+        return sum(f[1] for f in filas)
+
+    # ════════════════════════════════════════════════════════════════════
+    # LECTURA (O(variantes))
+    # ════════════════════════════════════════════════════════════════════
+
+    def estadisticas(self) -> Dict:
+        """
+        Envíos y conversiones por variante desde los contadores
+
+        Returns:
+            Dict con total_envios, por_variante, por_canal, ultimo_envio,
+            expuestos, sin_dni (recordatorios excluidos), cerrados y metricas {metrica: comparar_variantes(...)}
+        """
+        conn = self._conexion()
+        por_variante, por_canal = Counter(), Counter()
+        for variante, canal, n in conn.execute("SELECT variante, canal, n FROM envios"):
+            if variante:
+                por_variante[variante] += n
+            por_canal[canal] += n
+
+        suficientes = conn.execute(
+            "SELECT variante, n_expuestos, n_cerrados, n_asistio, n_preparo FROM suficientes ORDER BY variante"
+        ).fetchall()
+
+        return {
+            'total_envios': sum(por_canal.values()),
+            'por_variante': dict(por_variante),
+            'por_canal': dict(por_canal),
+            'ultimo_envio': self._meta(conn, 'ultimo_envio') or None,
+            'expuestos': {v: expuestos for v, expuestos, *_ in suficientes},
+            'sin_dni': int(self._meta(conn, 'sin_dni', '0')),
+            'cerrados': {v: cerrados for v, _, cerrados, *_ in suficientes},
+            'metricas': {
+                'asistio': comparar_variantes({v: (asistio, cerrados) for v, _, cerrados, asistio, _ in suficientes}),
+                'preparo': comparar_variantes({v: (preparo, cerrados) for v, _, cerrados, _, preparo in suficientes}),
+            },
+        }
+
+
+# Instancia global (singleton pattern)
+_motor_ab_instance = None
+_motor_ab_lock = threading.Lock()
+
+
+def get_motor_ab() -> MotorAB:
+    """Factory para obtener instancia única del motor A/B"""
+    global _motor_ab_instance
+    if _motor_ab_instance is None:
+        with _motor_ab_lock:
+            if _motor_ab_instance is None:
+                _motor_ab_instance = MotorAB()
+    return _motor_ab_instance
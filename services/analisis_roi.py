@@ -0,0 +1,320 @@
+"""
+services/analisis_roi.py
+Modelo de ROI vectorizado + análisis de incertidumbre conjunta
+Monte Carlo / Hipercubo Latino en paralelo, tornado e índices tipo Sobol
+
+Uso por línea de comandos:
+    python -m services.analisis_roi --n 1000000 --procesos 4
+"""
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+# Supuestos del escenario base (ver roi.py)
+SUPUESTOS_BASE = {
+    'poblacion': 3_500_000,                 # Niños < 5 años
+    'prevalencia': 0.40,                    # Prevalencia de anemia
+    'cobertura_cred': 0.75,                 # Cobertura CRED actual
+    'costo_hemocue': 25.0,                  # S/ por niño (screening universal)
+    'costo_hemocue_alto_riesgo': 25.0,      # S/ por niño alto riesgo (focalizado)
+    'costo_tratamiento': 180.0,             # S/ por caso
+    'costo_seguimiento_mes': 45.0,          # S/ por caso/mes
+    'duracion_tratamiento': 6.0,            # Meses
+    'costo_prediccion': 2.0,                # S/ por niño
+    'reduccion_hemocue': 0.70,              # Reducción en HemoCue innecesarios
+    'reduccion_severos': 0.30,              # Reducción en casos severos
+    'inversion': 5_000_000.0,               # Inversión inicial NutriSenseIA
+}
+
+# Rangos de incertidumbre (distribución uniforme) para el análisis conjunto
+RANGOS_INCERTIDUMBRE = {
+    'prevalencia': (0.30, 0.50),
+    'cobertura_cred': (0.60, 0.90),
+    'costo_hemocue': (18.0, 35.0),
+    'costo_hemocue_alto_riesgo': (18.0, 35.0),
+    'reduccion_hemocue': (0.50, 0.90),
+    'reduccion_severos': (0.10, 0.50),
+}
+
+# Bins para estimar E[ROI | X_i] (índices de primer orden)
+N_BINS_SOBOL = 20
+
+
+def calcular_roi(params: Dict) -> Dict[str, np.ndarray]:
+    """
+    Modelo de ROI vectorizado
+
+    Args:
+        params: Dict con las claves de SUPUESTOS_BASE; cada valor puede
+                ser escalar o array NumPy (se aplica broadcasting)
+
+    Returns:
+        Dict con costos por método, ahorro anual, ROI (%) y payback (meses)
+    """
+    p = {**SUPUESTOS_BASE, **params}
+
+    poblacion_cubierta = np.asarray(p['poblacion']) * np.asarray(p['cobertura_cred'])
+    # Casos esperados (1.05M) y detectables (787.5k) en el escenario base
+    casos_esperados = poblacion_cubierta * np.asarray(p['prevalencia'])
+    casos_detectados = casos_esperados * np.asarray(p['cobertura_cred'])
+
+    costo_seguimiento = np.asarray(p['costo_seguimiento_mes']) * np.asarray(p['duracion_tratamiento'])
+
+    # Método tradicional
+    costo_hemocue_universal = poblacion_cubierta * p['costo_hemocue']
+    costo_tratamiento_tradicional = casos_detectados * (p['costo_tratamiento'] + costo_seguimiento)
+    costo_total_tradicional = costo_hemocue_universal + costo_tratamiento_tradicional
+
+    # Con NutriSenseIA
+    reduccion_severos = np.asarray(p['reduccion_severos'])
+    costo_prediccion_total = poblacion_cubierta * p['costo_prediccion']
+    costo_hemocue_focalizado = poblacion_cubierta * (1 - np.asarray(p['reduccion_hemocue'])) * p['costo_hemocue_alto_riesgo']
+    costo_tratamiento_nutrisense = casos_detectados * (
+        p['costo_tratamiento'] * (1 - reduccion_severos * 0.4) +
+        costo_seguimiento * (1 - reduccion_severos * 0.3)
+    )
+    costo_total_nutrisense = costo_prediccion_total + costo_hemocue_focalizado + costo_tratamiento_nutrisense
+
+    ahorro = costo_total_tradicional - costo_total_nutrisense
+    inversion = np.asarray(p['inversion'])
+    roi = (ahorro - inversion) / inversion * 100
+
+    with np.errstate(divide='ignore'):
+        payback = np.where(ahorro > 0, inversion / (ahorro / 12), np.inf)
+
+    return {
+        'poblacion_cubierta': poblacion_cubierta,
+        'casos_detectados': casos_detectados,
+        'costo_hemocue_universal': costo_hemocue_universal,
+        'costo_tratamiento_tradicional': costo_tratamiento_tradicional,
+        'costo_total_tradicional': costo_total_tradicional,
+        'costo_prediccion_total': costo_prediccion_total,
+        'costo_hemocue_focalizado': costo_hemocue_focalizado,
+        'costo_tratamiento_nutrisense': costo_tratamiento_nutrisense,
+        'costo_total_nutrisense': costo_total_nutrisense,
+        'ahorro_anual': ahorro,
+        'roi_pct': roi,
+        'payback_meses': payback,
+    }
+
+
+def muestrear_parametros(n: int, rng: np.random.Generator, metodo: str = 'lhs',
+                         rangos: Optional[Dict] = None) -> Dict[str, np.ndarray]:
+    """
+    Muestrea parámetros inciertos
+
+    Args:
+        n: Número de muestras
+        rng: Generador NumPy
+        metodo: 'lhs' (Hipercubo Latino) o 'mc' (Monte Carlo simple)
+        rangos: Rangos (min, max) por parámetro (default RANGOS_INCERTIDUMBRE)
+
+    Returns:
+        Dict parámetro → array de n valores
+    """
+    rangos = rangos or RANGOS_INCERTIDUMBRE
+    muestras = {}
+    for nombre, (minimo, maximo) in rangos.items():
+        if metodo == 'lhs':
+            # Un valor por estrato, estratos en orden aleatorio
+            u = (rng.permutation(n) + rng.random(n)) / n
+        else:
+            u = rng.random(n)
+        muestras[nombre] = minimo + u * (maximo - minimo)
+    return muestras
+
+
+def _evaluar_lote(n: int, semilla, metodo: str, rangos: Dict) -> Dict:
+    """
+    Evalúa un lote de muestras (se ejecuta en un proceso del pool)
+
+    Retorna ROI/payback en float32 y sumas por bin para los índices de
+    primer orden, que se combinan entre lotes sin guardar las muestras.
+    """
+    rng = np.random.default_rng(semilla)
+    muestras = muestrear_parametros(n, rng, metodo, rangos)
+    resultado = calcular_roi(muestras)
+    roi = resultado['roi_pct']
+
+    bins = {}
+    for nombre, (minimo, maximo) in rangos.items():
+        idx = np.minimum(((muestras[nombre] - minimo) / (maximo - minimo) * N_BINS_SOBOL).astype(int),
+                         N_BINS_SOBOL - 1)
+        bins[nombre] = (
+            np.bincount(idx, minlength=N_BINS_SOBOL),
+            np.bincount(idx, weights=roi, minlength=N_BINS_SOBOL)
+        )
+
+    return {
+        'roi': roi.astype(np.float32),
+        'payback': resultado['payback_meses'].astype(np.float32),
+        'bins': bins,
+    }
+
+
+def simular_montecarlo(n_muestras: int = 1_000_000, tamano_lote: int = 100_000,
+                       n_procesos: Optional[int] = None, metodo: str = 'lhs',
+                       semilla: int = 42, rangos: Optional[Dict] = None) -> Dict:
+    """
+    Análisis de incertidumbre conjunta del ROI
+
+    Reparte n_muestras en lotes de tamano_lote evaluados en un pool de
+    procesos (n_procesos=1 evalúa en el proceso actual).
+
+    Returns:
+        Dict con 'roi_pct' y 'payback_meses' (arrays), 'resumen'
+        (percentiles), 'tornado' y 'sobol' (DataFrames)
+    """
+    rangos = rangos or RANGOS_INCERTIDUMBRE
+    tamanos = [min(tamano_lote, n_muestras - i) for i in range(0, n_muestras, tamano_lote)]
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamanos))
+    n_procesos = n_procesos or os.cpu_count() or 1
+
+    args = [(t, s, metodo, rangos) for t, s in zip(tamanos, semillas)]
+    if n_procesos == 1 or len(args) == 1:
+        lotes = [_evaluar_lote(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=n_procesos) as pool:
+            lotes = list(pool.map(_evaluar_lote, *zip(*args)))
+
+    roi = np.concatenate([l['roi'] for l in lotes])
+    payback = np.concatenate([l['payback'] for l in lotes])
+
+    logger.info(f"💰 Monte Carlo ROI: {len(roi):,} muestras ({metodo}, {n_procesos} procesos)")
+
+    return {
+        'roi_pct': roi,
+        'payback_meses': payback,
+        'resumen': resumir_distribucion(roi, payback),
+        'tornado': calcular_tornado(rangos),
+        'sobol': _indices_primer_orden(lotes, roi, rangos),
+    }
+
+
+def resumir_distribucion(roi: np.ndarray, payback: np.ndarray) -> Dict:
+    """Percentiles de ROI y payback + probabilidad de ROI positivo"""
+    percentiles = [5, 25, 50, 75, 95]
+    return {
+        'n_muestras': int(len(roi)),
+        'roi_media': float(roi.mean()),
+        'roi_percentiles': dict(zip(percentiles, np.percentile(roi, percentiles).round(1).tolist())),
+        'payback_percentiles': dict(zip(percentiles, np.percentile(payback, percentiles).round(2).tolist())),
+        'prob_roi_positivo': float((roi > 0).mean()),
+    }
+
+
+def calcular_tornado(rangos: Optional[Dict] = None) -> pd.DataFrame:
+    """
+    Diagrama tornado: ROI con cada parámetro en su mínimo y máximo,
+    manteniendo el resto en el escenario base (una sola evaluación vectorizada)
+    """
+    rangos = rangos or RANGOS_INCERTIDUMBRE
+    nombres = list(rangos)
+    k = len(nombres)
+
+    params = {n: np.full(2 * k, SUPUESTOS_BASE[n], dtype=float) for n in nombres}
+    for i, nombre in enumerate(nombres):
+        params[nombre][2 * i] = rangos[nombre][0]
+        params[nombre][2 * i + 1] = rangos[nombre][1]
+
+    roi = calcular_roi(params)['roi_pct']
+    roi_base = float(calcular_roi({})['roi_pct'])
+
+    tornado = pd.DataFrame({
+        'parametro': nombres,
+        'roi_minimo': roi[0::2],
+        'roi_maximo': roi[1::2],
+    })
+    tornado['amplitud'] = (tornado['roi_maximo'] - tornado['roi_minimo']).abs()
+    tornado['roi_base'] = roi_base
+    return tornado.sort_values('amplitud', ascending=False).reset_index(drop=True)
+
+
+def _indices_primer_orden(lotes, roi: np.ndarray, rangos: Dict) -> pd.DataFrame:
+    """
+    Índices de primer orden tipo Sobol: S_i = Var(E[ROI | X_i]) / Var(ROI),
+    con E[ROI | X_i] estimado por bins equiespaciados de X_i
+    """
+    var_total = roi.astype(float).var()
+    media_total = roi.astype(float).mean()
+    filas = []
+    for nombre in rangos:
+        conteo = sum(l['bins'][nombre][0] for l in lotes)
+        suma = sum(l['bins'][nombre][1] for l in lotes)
+        validos = conteo > 0
+        medias = suma[validos] / conteo[validos]
+        pesos = conteo[validos] / conteo.sum()
+        var_condicional = float(np.sum(pesos * (medias - media_total) ** 2))
+        filas.append({
+            'parametro': nombre,
+            'indice_primer_orden': var_condicional / var_total if var_total > 0 else 0.0
+        })
+    return pd.DataFrame(filas).sort_values('indice_primer_orden', ascending=False).reset_index(drop=True)
+
+
+@lru_cache(maxsize=8)
+def obtener_analisis_roi(n_muestras: int = 200_000, semilla: int = 42) -> Dict:
+    """
+    Análisis cacheado para la página de decisiones (sin arrays crudos)
+
+    Evalúa en el proceso actual (n_procesos=1): un ProcessPoolExecutor
+    dentro de Streamlit re-importa la app en cada worker. El pool queda
+    para la CLI y los procesos batch.
+
+    Returns:
+        Dict con 'base', 'resumen', 'tornado', 'sobol' e 'histograma'
+    """
+    resultado = simular_montecarlo(n_muestras=n_muestras, n_procesos=1, semilla=semilla)
+    conteos, bordes = np.histogram(resultado['roi_pct'], bins=50)
+
+    base = {k: float(v) for k, v in calcular_roi({}).items()}
+    return {
+        'base': base,
+        'resumen': resultado['resumen'],
+        'tornado': resultado['tornado'],
+        'sobol': resultado['sobol'],
+        'histograma': pd.DataFrame({
+            'roi_pct': (bordes[:-1] + bordes[1:]) / 2,
+            'frecuencia': conteos
+        }),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser(description="Análisis Monte Carlo del ROI de NutriSenseIA")
+    parser.add_argument('--n', type=int, default=1_000_000, help="Número de muestras")
+    parser.add_argument('--lote', type=int, default=100_000, help="Muestras por lote")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos (default: todos los núcleos)")
+    parser.add_argument('--metodo', choices=['lhs', 'mc'], default='lhs')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', default='outputs/')
+    args = parser.parse_args()
+
+    inicio = time.time()
+    resultado = simular_montecarlo(args.n, args.lote, args.procesos, args.metodo, args.semilla)
+    duracion = time.time() - inicio
+
+    salida = Path(args.salida)
+    salida.mkdir(exist_ok=True)
+    resultado['tornado'].to_csv(salida / 'roi_tornado.csv', index=False)
+    resultado['sobol'].to_csv(salida / 'roi_indices_sobol.csv', index=False)
+    with open(salida / 'roi_montecarlo_resumen.json', 'w', encoding='utf-8') as f:
+        json.dump(resultado['resumen'], f, indent=2, ensure_ascii=False)
+
+    print(json.dumps(resultado['resumen'], indent=2, ensure_ascii=False))
+    print(resultado['tornado'].to_string(index=False))
+    print(resultado['sobol'].to_string(index=False))
+    print(f"\n✅ {args.n:,} muestras en {duracion:.1f}s ({args.n / duracion:,.0f} muestras/s)")
@@ -0,0 +1,442 @@
+"""
+services/cola_triaje.py
+Cola de seguimiento priorizada por DIRESA (triaje de niños a llamar hoy)
+
+Cada niño se ordena por la clave (prioridad 1-7 del semáforo, probabilidad
+ML descendente, días de atraso del control descendente). La cola vive en
+memoria como un heap binario con borrado perezoso:
+
+- registrar un diagnóstico nuevo es O(log n): se empuja la entrada nueva y
+  la anterior queda invalidada (se descarta al salir del heap)
+- los top-k se obtienen en O(k log n) sacando k entradas vigentes y
+  devolviéndolas al heap
+
+Los días de atraso crecen con el calendario, así que el heap guarda la
+fecha límite del control (más antigua = más atrasada) y el orden no cambia
+de un día a otro. El estado se persiste en SQLite (WAL) con un UPSERT por
+actualización y el heap se reconstruye con heapify al iniciar.
+
+La API y Streamlit son procesos distintos, cada uno con su heap: cada
+escritura anota el paciente en la tabla `cambios` y, antes de leer, la
+cola compara PRAGMA data_version y aplica solo los cambios de otros
+procesos desde su último cursor.
+"""
+
+import os
+import heapq
+import json
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+COLA_TRIAJE_DB_PATH = Path(os.getenv("COLA_TRIAJE_DB", "data/triaje/cola_triaje.db"))
+
+# Días hasta el siguiente control según la prioridad del semáforo
+# (utils/risk_classifier.py: 1 = anemia severa ... 7 = bajo riesgo)
+DIAS_CONTROL_POR_PRIORIDAD = {1: 0, 2: 7, 3: 14, 4: 14, 5: 30, 6: 60, 7: 90}
+
+# Reconstruir el heap cuando las entradas invalidadas superan a las vigentes
+FACTOR_COMPACTACION = 2
+
+# Cambios que se conservan para sincronizar otros procesos (si un proceso
+# se atrasa más que esto, recarga su cola completa)
+MAX_CAMBIOS = 200_000
+IDS_POR_CONSULTA = 5000
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cola (
+    diresa TEXT NOT NULL,
+    id_paciente TEXT NOT NULL,
+    prioridad INTEGER NOT NULL,
+    probabilidad REAL NOT NULL,
+    fecha_limite TEXT NOT NULL,
+    datos TEXT,
+    actualizado TEXT NOT NULL,
+    PRIMARY KEY (diresa, id_paciente)
+);
+CREATE TABLE IF NOT EXISTS cambios (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    diresa TEXT NOT NULL,
+    id_paciente TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cambios_diresa ON cambios (diresa, seq);
+"""
+
+
+def _fecha(valor) -> date:
+    if valor is None:
+        return date.today()
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return datetime.fromisoformat(str(valor)).date()
+
+
+class ColaTriaje:
+    """Cola de seguimiento de una DIRESA (heap + índice por paciente)"""
+
+    def __init__(self, diresa: str, ruta: Optional[Path] = COLA_TRIAJE_DB_PATH):
+        """
+        Args:
+            diresa: DIRESA / departamento dueño de la cola
+            ruta: Archivo SQLite (None = solo en memoria)
+        """
+        self.diresa = diresa.upper()
+        self.ruta = Path(ruta) if ruta else None
+        self._heap: List[list] = []
+        self._vigentes: Dict[str, list] = {}
+        self._secuencia = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._cursor = 0
+        self._data_version = None
+
+        if self.ruta is not None:
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None,
+                                         check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(ESQUEMA)
+            self._cargar()
+
+    def _entrada(self, id_paciente: str, prioridad: int, probabilidad: float,
+                 fecha_limite: date, datos: Dict) -> list:
+        # [clave..., secuencia (desempate estable), id, datos, vigente]
+        self._secuencia += 1
+        return [int(prioridad), -float(probabilidad), fecha_limite.toordinal(),
+                self._secuencia, id_paciente, datos, True]
+
+    def _entrada_desde_fila(self, fila: tuple) -> list:
+        id_paciente, prioridad, probabilidad, fecha_limite, datos = fila
+        return self._entrada(id_paciente, prioridad, probabilidad,
+                             date.fromisoformat(fecha_limite), json.loads(datos or '{}'))
+
+    def _cargar(self):
+        """Carga la cola completa y fija el cursor de cambios (misma lectura)"""
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._conn.execute("BEGIN")
+        try:
+            filas = self._conn.execute(
+                "SELECT id_paciente, prioridad, probabilidad, fecha_limite, datos FROM cola WHERE diresa = ?",
+                (self.diresa,)
+            ).fetchall()
+            self._cursor = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM cambios").fetchone()[0]
+        finally:
+            self._conn.execute("COMMIT")
+
+        self._heap = [self._entrada_desde_fila(f) for f in filas]
+        self._vigentes = {e[4]: e for e in self._heap}
+        heapq.heapify(self._heap)
+        if filas:
+            logger.info(f"✅ Cola de triaje {self.diresa}: {len(filas):,} niños cargados")
+
+    def _sincronizar(self):
+        """
+        Aplica lo que otros procesos escribieron desde el último cursor
+
+        PRAGMA data_version solo cambia con commits de otras conexiones, así
+        que sin escrituras ajenas esto es una consulta trivial.
+        """
+        if self._conn is None:
+            return
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        self._data_version = version
+
+        self._conn.execute("BEGIN")
+        try:
+            minimo, maximo = self._conn.execute("SELECT MIN(seq), MAX(seq) FROM cambios").fetchone()
+            if minimo is not None and self._cursor < minimo - 1:
+                recargar = True
+            else:
+                recargar = False
+                ids = [f[0] for f in self._conn.execute(
+                    "SELECT DISTINCT id_paciente FROM cambios WHERE diresa = ? AND seq > ?",
+                    (self.diresa, self._cursor)
+                )]
+                filas = {}
+                for i in range(0, len(ids), IDS_POR_CONSULTA):
+                    bloque = ids[i:i + IDS_POR_CONSULTA]
+                    for fila in self._conn.execute(
+                            "SELECT id_paciente, prioridad, probabilidad, fecha_limite, datos FROM cola"
+                            f" WHERE diresa = ? AND id_paciente IN ({', '.join('?' * len(bloque))})",
+                            (self.diresa, *bloque)):
+                        filas[fila[0]] = fila
+                self._cursor = maximo or self._cursor
+        finally:
+            self._conn.execute("COMMIT")
+
+        if recargar:
+            # Este proceso se atrasó más que MAX_CAMBIOS: recarga completa
+            self._cargar()
+            return
+
+        for id_paciente in ids:
+            anterior = self._vigentes.pop(id_paciente, None)
+            if anterior is not None:
+                anterior[-1] = False
+            if id_paciente in filas:
+                entrada = self._entrada_desde_fila(filas[id_paciente])
+                heapq.heappush(self._heap, entrada)
+                self._vigentes[id_paciente] = entrada
+        self._compactar_si_necesario()
+
+    @contextmanager
+    def _transaccion(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _anotar_cambios(self, ids: List[str]):
+        """Registra los pacientes modificados (dentro de la transacción de escritura)"""
+        self._conn.executemany(
+            "INSERT INTO cambios (diresa, id_paciente) VALUES (?, ?)", [(self.diresa, i) for i in ids]
+        )
+        ultimo = self._conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        self._conn.execute("DELETE FROM cambios WHERE seq <= ?", (ultimo - MAX_CAMBIOS,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._sincronizar()
+            return len(self._vigentes)
+
+    def __contains__(self, id_paciente: str) -> bool:
+        with self._lock:
+            self._sincronizar()
+            return id_paciente in self._vigentes
+
+    # ════════════════════════════════════════════════════════════════════
+    # ACTUALIZACIÓN
+    # ════════════════════════════════════════════════════════════════════
+
+    def registrar(self, id_paciente: str, prioridad: int, probabilidad: float,
+                  fecha_limite=None, datos: Optional[Dict[str, Any]] = None):
+        """
+        Inserta o actualiza un niño en la cola (O(log n))
+
+        SQLite primero, heap después del COMMIT: si la escritura falla, la
+        cola en memoria queda como estaba.
+
+        Args:
+            id_paciente: DNI / identificador
+            prioridad: 1 (más urgente) a 7
+            probabilidad: Probabilidad ML de anemia (0-1)
+            fecha_limite: Fecha en que vence su control (default: hoy)
+            datos: Datos a mostrar en la lista (nombre, nivel, teléfono...)
+        """
+        fecha_limite = _fecha(fecha_limite)
+        datos = datos or {}
+        with self._lock:
+            if self._conn is not None:
+                with self._transaccion():
+                    self._conn.execute(
+                        "INSERT INTO cola (diresa, id_paciente, prioridad, probabilidad, fecha_limite, datos, actualizado)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                        " ON CONFLICT (diresa, id_paciente) DO UPDATE SET prioridad = excluded.prioridad,"
+                        " probabilidad = excluded.probabilidad, fecha_limite = excluded.fecha_limite,"
+                        " datos = excluded.datos, actualizado = excluded.actualizado",
+                        (self.diresa, id_paciente, int(prioridad), float(probabilidad),
+                         fecha_limite.isoformat(), json.dumps(datos, ensure_ascii=False, default=str),
+                         datetime.now().isoformat(timespec='seconds'))
+                    )
+                    self._anotar_cambios([id_paciente])
+
+            anterior = self._vigentes.get(id_paciente)
+            if anterior is not None:
+                anterior[-1] = False
+            entrada = self._entrada(id_paciente, prioridad, probabilidad, fecha_limite, datos)
+            heapq.heappush(self._heap, entrada)
+            self._vigentes[id_paciente] = entrada
+            self._compactar_si_necesario()
+
+    def registrar_diagnostico(self, id_paciente: str, clasificacion: Dict[str, Any],
+                              probabilidad: float, fecha_consulta=None,
+                              datos: Optional[Dict[str, Any]] = None):
+        """
+        Registra el resultado de clasificar_nivel_riesgo / calcular_score_simple
+
+        La fecha límite del siguiente control sale de la prioridad
+        (DIAS_CONTROL_POR_PRIORIDAD) contada desde la consulta.
+        """
+        prioridad = int(clasificacion.get('prioridad', 7))
+        fecha_limite = _fecha(fecha_consulta) + timedelta(days=DIAS_CONTROL_POR_PRIORIDAD.get(prioridad, 90))
+        datos = {
+            'nivel': clasificacion.get('nivel'),
+            'emoji': clasificacion.get('emoji'),
+            'accion': clasificacion.get('accion_inmediata'),
+            **(datos or {}),
+        }
+        self.registrar(id_paciente, prioridad, probabilidad, fecha_limite, datos)
+
+    def registrar_cohorte(self, cohorte: pd.DataFrame, fecha_consulta=None) -> int:
+        """
+        Clasifica y encola una cohorte completa (p. ej. un corte SIEN)
+
+        Usa clasificar_nivel_riesgo_lote en lugar de una llamada por fila; los
+        datos de cada niño guardan solo el nivel, el resto se expande al mostrar.
+
+        Args:
+            cohorte: DataFrame con id_paciente, probabilidad_ml, tiene_anemia,
+                     edad_meses, hemoglobina y opcionalmente n_factores y nombre
+            fecha_consulta: Fecha desde la que se cuentan los días de control
+
+        Returns:
+            Número de niños registrados
+        """
+        from utils.risk_classifier import clasificar_nivel_riesgo_lote, NIVELES_SEMAFORO
+
+        n_factores = cohorte['n_factores'] if 'n_factores' in cohorte.columns else np.zeros(len(cohorte))
+        prioridades = clasificar_nivel_riesgo_lote(
+            cohorte['probabilidad_ml'], cohorte['tiene_anemia'], cohorte['edad_meses'],
+            n_factores, cohorte['hemoglobina']
+        )
+        dias_control = np.array([DIAS_CONTROL_POR_PRIORIDAD[p] for p in range(1, 8)])[prioridades - 1]
+        base = _fecha(fecha_consulta).toordinal()
+        nombres = cohorte['nombre'].tolist() if 'nombre' in cohorte.columns else [None] * len(cohorte)
+        ids = cohorte['id_paciente'].astype(str).tolist()
+        probabilidades = cohorte['probabilidad_ml'].astype(float).tolist()
+        ahora = datetime.now().isoformat(timespec='seconds')
+
+        entradas, filas = [], []
+        with self._lock:
+            for id_paciente, prioridad, probabilidad, dias, nombre in zip(
+                    ids, prioridades.tolist(), probabilidades, dias_control.tolist(), nombres):
+                nivel = NIVELES_SEMAFORO[prioridad - 1]
+                datos = {'nivel': nivel['nivel'], 'emoji': nivel['emoji'], 'accion': nivel['accion_inmediata']}
+                if nombre is not None:
+                    datos['nombre'] = nombre
+                entradas.append(self._entrada(id_paciente, prioridad, probabilidad, date.fromordinal(base + dias), datos))
+                filas.append((self.diresa, id_paciente, prioridad, probabilidad,
+                              date.fromordinal(base + dias).isoformat(),
+                              json.dumps(datos, ensure_ascii=False), ahora))
+
+            # SQLite primero: si falla, el heap no se toca
+            if self._conn is not None:
+                with self._transaccion():
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO cola (diresa, id_paciente, prioridad, probabilidad,"
+                        " fecha_limite, datos, actualizado) VALUES (?, ?, ?, ?, ?, ?, ?)", filas
+                    )
+                    self._anotar_cambios(ids)
+
+            for entrada in entradas:
+                anterior = self._vigentes.get(entrada[4])
+                if anterior is not None:
+                    anterior[-1] = False
+                self._heap.append(entrada)
+                self._vigentes[entrada[4]] = entrada
+            self._heap = [e for e in self._heap if e[-1]]
+            heapq.heapify(self._heap)
+
+        logger.info(f"✅ Cola de triaje {self.diresa}: {len(filas):,} niños clasificados y encolados")
+        return len(filas)
+
+    def retirar(self, id_paciente: str) -> bool:
+        """Quita a un niño de la cola (atendido / trasladado). O(1) amortizado"""
+        with self._lock:
+            self._sincronizar()
+            if id_paciente not in self._vigentes:
+                return False
+            if self._conn is not None:
+                with self._transaccion():
+                    self._conn.execute("DELETE FROM cola WHERE diresa = ? AND id_paciente = ?",
+                                       (self.diresa, id_paciente))
+                    self._anotar_cambios([id_paciente])
+            self._vigentes.pop(id_paciente)[-1] = False
+            self._compactar_si_necesario()
+            return True
+
+    def _compactar_si_necesario(self):
+        if len(self._heap) > FACTOR_COMPACTACION * max(len(self._vigentes), 1024):
+            self._heap = list(self._vigentes.values())
+            heapq.heapify(self._heap)
+
+    # ════════════════════════════════════════════════════════════════════
+    # CONSULTA
+    # ════════════════════════════════════════════════════════════════════
+
+    def top(self, k: int = 20, hoy=None) -> List[Dict[str, Any]]:
+        """
+        Los k niños a llamar primero (O(k log n))
+
+        Returns:
+            Lista de dicts con posicion, id_paciente, prioridad, probabilidad,
+            fecha_limite, dias_atraso (negativo = aún no vence) y los datos
+            registrados
+        """
+        hoy = _fecha(hoy).toordinal()
+        with self._lock:
+            self._sincronizar()
+            seleccion = []
+            while self._heap and len(seleccion) < k:
+                entrada = heapq.heappop(self._heap)
+                if entrada[-1]:
+                    seleccion.append(entrada)
+            for entrada in seleccion:
+                heapq.heappush(self._heap, entrada)
+
+        return [
+            {
+                'posicion': i,
+                'id_paciente': e[4],
+                'prioridad': e[0],
+                'probabilidad': -e[1],
+                'fecha_limite': date.fromordinal(e[2]).isoformat(),
+                'dias_atraso': hoy - e[2],
+                **e[5],
+            }
+            for i, e in enumerate(seleccion, start=1)
+        ]
+
+    def resumen(self) -> Dict[str, Any]:
+        """Niños en cola por prioridad"""
+        with self._lock:
+            self._sincronizar()
+            por_prioridad = {}
+            for entrada in self._vigentes.values():
+                por_prioridad[entrada[0]] = por_prioridad.get(entrada[0], 0) + 1
+        return {
+            'diresa': self.diresa,
+            'total': sum(por_prioridad.values()),
+            'por_prioridad': dict(sorted(por_prioridad.items())),
+        }
+
+
+# Instancias globales (una cola por DIRESA)
+_colas: Dict[str, ColaTriaje] = {}
+_colas_lock = threading.Lock()
+
+
+def get_cola_triaje(diresa: str) -> ColaTriaje:
+    """Factory para obtener la cola única de una DIRESA"""
+    clave = diresa.upper()
+    with _colas_lock:
+        if clave not in _colas:
+            _colas[clave] = ColaTriaje(clave)
+        return _colas[clave]
+
+
+def diresas_con_cola() -> List[str]:
+    """DIRESAs con niños registrados en la base de la cola"""
+    if not COLA_TRIAJE_DB_PATH.exists():
+        return sorted(_colas)
+    with sqlite3.connect(COLA_TRIAJE_DB_PATH) as conn:
+        filas = conn.execute("SELECT DISTINCT diresa FROM cola").fetchall()
+    return sorted({f[0] for f in filas} | set(_colas))
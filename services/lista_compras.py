@@ -0,0 +1,283 @@
+"""
+services/lista_compras.py
+Motor de listas de compras y costos
+Agrega la demanda de ingredientes de muchos planes semanales (por hogar o
+por cohorte Qali Warma / establecimiento de salud), la valoriza con
+costo_s_kg y la disponibilidad regional del catálogo, y produce listas por
+hogar y totales de abastecimiento por distrito. Las cohortes grandes se
+procesan por lotes en memoria acotada.
+"""
+
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+CATALOGO_INGREDIENTES_PATH = BASE_DIR / "data" / "catalogo_ingredientes_costo.json"
+TIPOS_COMIDA = ["desayuno", "almuerzo", "cena"]
+
+
+def formatear_cantidad(gramos: float) -> str:
+    """Cantidad legible para la lista impresa"""
+    if gramos >= 1000:
+        return f"{gramos / 1000:.1f} kg"
+    return f"{gramos:.0f} g"
+
+
+class AgregadorCompras:
+    """
+    Agrega ingredientes de planes semanales con un group-by vectorizado
+    (np.bincount por plan, np.add.reduceat por distrito)
+
+    Un hogar es un dict con:
+        hogar_id, distrito, departamento, ninos (default 1) y
+        semanal (formato de PlanificadorSemanal: lista de días con
+        desayuno/almuerzo/cena, cada uno con 'ingredientes')
+    """
+
+    def __init__(self, catalogo_path: Path = CATALOGO_INGREDIENTES_PATH):
+        with open(catalogo_path, 'r', encoding='utf-8') as f:
+            ingredientes = json.load(f)['ingredientes']
+
+        # Vocabulario: ingredientes del catálogo; los desconocidos se agregan al verlos
+        self._ids = [ing['id'] for ing in ingredientes]
+        self._indice = {ing_id: j for j, ing_id in enumerate(self._ids)}
+        self._nombres = [ing['nombre'] for ing in ingredientes]
+        self._costo_kg = np.array([ing['costo_s_kg'] for ing in ingredientes], dtype=float)
+        self._disponibilidad = [ing.get('disponibilidad_regiones', "todas") for ing in ingredientes]
+
+        self._disponible_cache = {}
+        self._lock_vocabulario = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Limpia los acumulados por distrito"""
+        self._totales_distrito = {}
+        self._hogares_distrito = {}
+
+    def _indice_ingrediente(self, ing_id: str) -> int:
+        j = self._indice.get(ing_id)
+        if j is not None:
+            return j
+        # Fuera del catálogo (limón, papa...): se lista sin costo. El agregador
+        # global se comparte entre sesiones: el vocabulario crece bajo lock y
+        # _ids / _indice se publican al final, cuando las columnas ya existen
+        with self._lock_vocabulario:
+            j = self._indice.get(ing_id)
+            if j is None:
+                j = len(self._ids)
+                self._nombres.append(ing_id.replace('_', ' ').capitalize())
+                self._costo_kg = np.append(self._costo_kg, np.nan)
+                self._disponibilidad.append("todas")
+                self._disponible_cache.clear()
+                self._ids.append(ing_id)
+                self._indice[ing_id] = j
+        return j
+
+    def _disponibles_en(self, departamento: Optional[str]) -> np.ndarray:
+        """Vector booleano de disponibilidad local por ingrediente"""
+        clave = (departamento, len(self._ids))
+        if clave not in self._disponible_cache:
+            self._disponible_cache[clave] = np.array([
+                d == "todas" or (departamento is not None and departamento in d)
+                for d in self._disponibilidad
+            ], dtype=bool)
+        return self._disponible_cache[clave]
+
+    def _vector_plan(self, semanal) -> np.ndarray:
+        """Gramos por ingrediente de un plan semanal (un niño)"""
+        if isinstance(semanal, dict):
+            semanal = semanal['semanal']
+        columnas, gramos = [], []
+        for dia in semanal:
+            for tipo in TIPOS_COMIDA:
+                comida = dia.get(tipo)
+                if not isinstance(comida, dict):
+                    continue
+                for ing in comida.get('ingredientes', []):
+                    columnas.append(self._indice_ingrediente(ing['id']))
+                    gramos.append(ing['cantidad_g'])
+        return np.bincount(np.asarray(columnas, dtype=np.int64),
+                           weights=np.asarray(gramos, dtype=float), minlength=len(self._ids))
+
+    def _matriz_lote(self, hogares: List[Dict]) -> np.ndarray:
+        """
+        Gramos por hogar × ingrediente del lote. Los hogares de una cohorte
+        suelen compartir planes: cada plan distinto se agrega una sola vez
+        """
+        vectores = {}
+        filas = []
+        for hogar in hogares:
+            clave = id(hogar['semanal'])
+            if clave not in vectores:
+                vectores[clave] = self._vector_plan(hogar['semanal'])
+            filas.append(vectores[clave])
+
+        n_ing = len(self._ids)
+        matriz = np.vstack([np.pad(v, (0, n_ing - len(v))) if len(v) < n_ing else v for v in filas])
+        ninos = np.array([hogar.get('ninos', 1) for hogar in hogares], dtype=float)
+        return matriz * ninos[:, None]
+
+    def _acumular_distritos(self, hogares: List[Dict], matriz: np.ndarray):
+        """Suma el lote a los totales por (departamento, distrito)"""
+        departamentos = np.array([str(h.get('departamento', '')).upper() for h in hogares])
+        distritos = np.array([str(h.get('distrito', 'SIN DISTRITO')).upper() for h in hogares])
+        claves, inversa = np.unique(np.char.add(np.char.add(departamentos, '|'), distritos),
+                                    return_inverse=True)
+
+        # Group-by: ordenar por grupo y sumar tramos contiguos
+        orden = np.argsort(inversa, kind='stable')
+        inicios = np.flatnonzero(np.r_[True, np.diff(inversa[orden]) != 0])
+        sumas = np.add.reduceat(matriz[orden], inicios, axis=0)
+        conteo = np.bincount(inversa, minlength=len(claves))
+
+        for k, clave_texto in enumerate(claves):
+            clave = tuple(clave_texto.split('|', 1))
+            acumulado = self._totales_distrito.get(clave)
+            if acumulado is None:
+                acumulado = np.zeros(matriz.shape[1])
+            elif len(acumulado) < matriz.shape[1]:
+                acumulado = np.pad(acumulado, (0, matriz.shape[1] - len(acumulado)))
+            self._totales_distrito[clave] = acumulado + sumas[k]
+            self._hogares_distrito[clave] = self._hogares_distrito.get(clave, 0) + int(conteo[k])
+
+    def procesar(self, hogares: Iterable[Dict], tamano_lote: int = 5000) -> Iterator[pd.DataFrame]:
+        """
+        Procesa hogares en lotes; acumula totales por distrito y entrega
+        las líneas de compra por hogar de cada lote
+
+        Yields:
+            DataFrame por lote con hogar_id, distrito, ingrediente_id,
+            ingrediente, gramos, costo_s y disponible_local
+        """
+        lote = []
+        for hogar in hogares:
+            lote.append(hogar)
+            if len(lote) >= tamano_lote:
+                yield self._procesar_lote(lote)
+                lote = []
+        if lote:
+            yield self._procesar_lote(lote)
+
+    def _procesar_lote(self, hogares: List[Dict]) -> pd.DataFrame:
+        matriz = self._matriz_lote(hogares)
+        self._acumular_distritos(hogares, matriz)
+
+        h, j = np.nonzero(matriz)
+        gramos = matriz[h, j]
+        departamentos = np.array([str(x.get('departamento', '')).upper() for x in hogares])
+
+        disponible = np.zeros(len(h), dtype=bool)
+        for depto in np.unique(departamentos):
+            en_depto = departamentos[h] == depto
+            disponible[en_depto] = self._disponibles_en(depto)[j[en_depto]]
+
+        return pd.DataFrame({
+            'hogar_id': np.array([x.get('hogar_id', i) for i, x in enumerate(hogares)], dtype=object)[h],
+            'distrito': np.array([str(x.get('distrito', 'SIN DISTRITO')).upper() for x in hogares])[h],
+            'ingrediente_id': np.array(self._ids, dtype=object)[j],
+            'ingrediente': np.array(self._nombres, dtype=object)[j],
+            'gramos': gramos,
+            'costo_s': np.round(gramos / 1000 * self._costo_kg[j], 2),
+            'disponible_local': disponible,
+        })
+
+    def lista_hogar(self, semanal, departamento: Optional[str] = None, ninos: int = 1) -> List[Dict]:
+        """
+        Lista de compras de un hogar, en el formato que espera el PDF
+        (ingrediente, cantidad) más gramos, costo y disponibilidad
+
+        No modifica los acumulados por distrito
+        """
+        matriz = self._matriz_lote([{'semanal': semanal, 'ninos': ninos}])[0]
+        disponible = self._disponibles_en(departamento.upper() if departamento else None)
+
+        lista = []
+        for j in np.argsort(-matriz, kind='stable'):
+            if matriz[j] <= 0:
+                break
+            costo = matriz[j] / 1000 * self._costo_kg[j]
+            lista.append({
+                'ingrediente': self._nombres[j],
+                'cantidad': formatear_cantidad(matriz[j]),
+                'gramos': float(matriz[j]),
+                'costo_s': None if np.isnan(costo) else round(float(costo), 2),
+                'disponible_local': bool(disponible[j]),
+            })
+        return lista
+
+    def totales_distrito(self) -> pd.DataFrame:
+        """
+        Totales de abastecimiento por distrito (formato largo)
+
+        Returns:
+            DataFrame con departamento, distrito, hogares, ingrediente,
+            kg, costo_s y disponible_local
+        """
+        if not self._totales_distrito:
+            return pd.DataFrame()
+
+        n_ing = len(self._ids)
+        claves = list(self._totales_distrito)
+        matriz = np.vstack([np.pad(v, (0, n_ing - len(v))) for v in self._totales_distrito.values()])
+        d, j = np.nonzero(matriz)
+        kg = matriz[d, j] / 1000
+
+        disponible = np.array([self._disponibles_en(claves[k][0] or None)[jj] for k, jj in zip(d, j)], dtype=bool)
+
+        return pd.DataFrame({
+            'departamento': [claves[k][0] for k in d],
+            'distrito': [claves[k][1] for k in d],
+            'hogares': [self._hogares_distrito[claves[k]] for k in d],
+            'ingrediente': np.array(self._nombres, dtype=object)[j],
+            'kg': np.round(kg, 3),
+            'costo_s': np.round(kg * self._costo_kg[j], 2),
+            'disponible_local': disponible,
+        }).sort_values(['departamento', 'distrito', 'costo_s'], ascending=[True, True, False]).reset_index(drop=True)
+
+    def agregar_cohorte(self, hogares: Iterable[Dict], destino_hogares: Optional[Path] = None,
+                        tamano_lote: int = 5000) -> pd.DataFrame:
+        """
+        Recorre una cohorte completa en streaming
+
+        Args:
+            hogares: Iterable (puede ser un generador) de hogares
+            destino_hogares: CSV donde escribir las listas por hogar a medida
+                             que se procesan (None = descartarlas)
+            tamano_lote: Hogares por lote (acota la memoria)
+
+        Returns:
+            Totales por distrito
+        """
+        self.reiniciar()
+        for k, lineas in enumerate(self.procesar(hogares, tamano_lote)):
+            if destino_hogares is not None:
+                lineas.to_csv(destino_hogares, mode='w' if k == 0 else 'a', header=(k == 0), index=False)
+
+        totales = self.totales_distrito()
+        n_hogares = sum(self._hogares_distrito.values())
+        logger.info(f"🛒 Compras agregadas: {n_hogares:,} hogares, "
+                    f"{totales['distrito'].nunique() if not totales.empty else 0} distritos, "
+                    f"S/ {totales['costo_s'].sum() if not totales.empty else 0:,.2f}")
+        return totales
+
+
+# Instancia global (singleton pattern)
+_agregador_instance = None
+
+
+def get_agregador_compras() -> AgregadorCompras:
+    """Factory para obtener instancia única del agregador de compras"""
+    global _agregador_instance
+    if _agregador_instance is None:
+        _agregador_instance = AgregadorCompras()
+    return _agregador_instance
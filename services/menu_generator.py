@@ -5,12 +5,32 @@ Basado en Notebook 5: Motor Alimentario
 """
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+import os
+import hashlib
+import json
 import logging
-from utils.data_loader import data_loader
+import threading
+from utils.data_loader import data_loader, BASE_DIR, DATA_DIR
+from services.menu_optimizer import hierro_absorbible, optimizar_seleccion, seleccion_greedy
 
 logger = logging.getLogger(__name__)
 
+# Tabla de menús precalculados y archivos de los que depende
+TABLA_MENUS_PATH = DATA_DIR / "menus_precalculados.json"
+# Subir al cambiar el formato de la tabla (2: una entrada por celda, sin banda)
+VERSION_TABLA_MENUS = 2
+FUENTES_TABLA_MENUS = [
+    DATA_DIR / "base_alimentos_hierro.csv",
+    BASE_DIR / "data" / "catalogo_ingredientes_costo.json",
+]
+
+# Grilla de la tabla precalculada
+REGIONES_MENU = ["Costa", "Sierra", "Selva"]
+PASO_PRESUPUESTO = 0.50
+PRESUPUESTO_MIN_TABLA = 1.0
+PRESUPUESTO_MAX_TABLA = 100.0
+
 
 class MenuGenerator:
     """Generador de menús personalizados para combatir anemia"""
@@ -18,14 +38,43 @@ class MenuGenerator:
     def __init__(self):
         """Inicializa el generador"""
         self.alimentos_df = None
+        self._alimentos_por_nombre = {}
+        self._huella_base = None
+        self._lock_base = threading.Lock()
+        self._tabla_menus = None
+        self._firma_fuentes = None
+        self._firma_obsoleta = None
+        self._regenerando: Optional[threading.Thread] = None
+        self._lock_tabla = threading.Lock()
         self._cargar_base_alimentos()
     
-    def _cargar_base_alimentos(self):
-        """Carga base de datos de alimentos"""
-        self.alimentos_df = data_loader.load_alimentos_hierro()
-        if self.alimentos_df is None:
+    def _cargar_base_alimentos(self, recargar: bool = False):
+        """
+        Carga base de datos de alimentos
+        
+        La base, su índice por nombre y la huella de las fuentes con que se
+        leyó se reemplazan juntos (las sesiones leen una copia coherente con _base()).
+        
+        Args:
+            recargar: Leer el CSV del disco aunque data_loader lo tenga en caché
+        """
+        huella = self._huella_fuentes()
+        if recargar:
+            alimentos = data_loader.load_csv("base_alimentos_hierro.csv", use_cache=False)
+        else:
+            alimentos = data_loader.load_alimentos_hierro()
+        columnas = {'nombre', 'categoria', 'hierro_mg_100g', 'precio_porcion', 'tipo'}
+        if alimentos is None or not columnas.issubset(alimentos.columns):
             logger.warning("Base de alimentos no disponible, usando datos por defecto")
-            self.alimentos_df = self._crear_base_default()
+            alimentos = self._crear_base_default()
+        por_nombre = {fila['nombre']: fila for fila in alimentos.to_dict('records')}
+        with self._lock_base:
+            self.alimentos_df, self._alimentos_por_nombre, self._huella_base = alimentos, por_nombre, huella
+    
+    def _base(self) -> Tuple[pd.DataFrame, Dict[str, Dict]]:
+        """(alimentos_df, alimentos por nombre) de una misma carga"""
+        with self._lock_base:
+            return self.alimentos_df, self._alimentos_por_nombre
     
     def _crear_base_default(self) -> pd.DataFrame:
         """Crea base de alimentos por defecto"""
@@ -68,7 +117,8 @@ class MenuGenerator:
         presupuesto_diario: float = 5.0,
         region: str = "Costa",
         preferencias: Optional[List[str]] = None,
-        excluir: Optional[List[str]] = None
+        excluir: Optional[List[str]] = None,
+        metodo: str = "optimo"
     ) -> Dict[str, Any]:
         """
         Genera un menú personalizado
@@ -79,6 +129,8 @@ class MenuGenerator:
             region: Costa, Sierra o Selva
             preferencias: Lista de alimentos preferidos
             excluir: Lista de alimentos a excluir
+            metodo: "optimo" (mochila por programación dinámica que maximiza
+                    hierro absorbible) o "greedy" (selección original)
             
         Returns:
             Diccionario con menú completo
@@ -86,58 +138,33 @@ class MenuGenerator:
         # 1. Calcular requerimiento
         req_hierro = self.calcular_requerimiento_hierro(edad_meses)
         
-        # 2. Filtrar alimentos disponibles
-        alimentos = self.alimentos_df.copy()
+        # 2-4. Selección: tabla precalculada (O(1)) o optimización en vivo
+        seleccion = None
+        if metodo == "optimo" and not preferencias:
+            seleccion = self._buscar_precalculado(region, presupuesto_diario, excluir)
+        alimentos, por_nombre = self._base()
+        if seleccion is not None and not all(nombre in por_nombre for nombre in seleccion):
+            # Tabla de otra versión de la base (p. ej. recién regenerada): en vivo
+            seleccion = None
+        if seleccion is None:
+            seleccion = self._seleccionar_alimentos(req_hierro, presupuesto_diario, region, excluir,
+                                                    metodo, alimentos)
         
-        if excluir:
-            alimentos = alimentos[~alimentos['nombre'].isin(excluir)]
-        
-        # 3. Priorizar hierro hemo (mejor absorción)
-        alimentos = alimentos.sort_values(
-            ['tipo', 'hierro_mg_100g'],
-            ascending=[False, False]  # Hemo primero, luego más hierro
-        )
-        
-        # 4. Seleccionar alimentos dentro del presupuesto
         menu_items = []
-        hierro_total = 0
-        costo_total = 0
-        
-        # Prioridad 1: Al menos 1 fuente de hierro hemo
-        hemo_foods = alimentos[alimentos['tipo'] == 'hemo']
-        if not hemo_foods.empty and costo_total < presupuesto_diario:
-            mejor_hemo = hemo_foods.iloc[0]
+        hierro_total = 0.0
+        costo_total = 0.0
+        for nombre in seleccion:
+            alimento = por_nombre[nombre]
             menu_items.append({
-                'alimento': mejor_hemo['nombre'],
-                'categoria': mejor_hemo['categoria'],
-                'hierro_mg': mejor_hemo['hierro_mg_100g'],
-                'precio': mejor_hemo['precio_porcion'],
+                'alimento': alimento['nombre'],
+                'categoria': alimento['categoria'],
+                'hierro_mg': alimento['hierro_mg_100g'],
+                'precio': alimento['precio_porcion'],
                 'porcion': '100g',
-                'tipo': 'hemo'
+                'tipo': alimento['tipo']
             })
-            hierro_total += mejor_hemo['hierro_mg_100g']
-            costo_total += mejor_hemo['precio_porcion']
-        
-        # Prioridad 2: Complementar con fuentes no-hemo
-        presupuesto_restante = presupuesto_diario - costo_total
-        no_hemo_foods = alimentos[alimentos['tipo'] == 'no_hemo']
-        
-        for _, alimento in no_hemo_foods.iterrows():
-            if costo_total + alimento['precio_porcion'] <= presupuesto_diario:
-                if hierro_total < req_hierro * 1.5:  # 150% para asegurar cobertura
-                    menu_items.append({
-                        'alimento': alimento['nombre'],
-                        'categoria': alimento['categoria'],
-                        'hierro_mg': alimento['hierro_mg_100g'],
-                        'precio': alimento['precio_porcion'],
-                        'porcion': '100g',
-                        'tipo': 'no_hemo'
-                    })
-                    hierro_total += alimento['hierro_mg_100g']
-                    costo_total += alimento['precio_porcion']
-            
-            if len(menu_items) >= 4:  # Máximo 4 alimentos por día
-                break
+            hierro_total += alimento['hierro_mg_100g']
+            costo_total += alimento['precio_porcion']
         
         # 5. Calcular cobertura
         cobertura_pct = (hierro_total / req_hierro) * 100
@@ -162,6 +189,200 @@ class MenuGenerator:
         logger.info(f"Menú generado: {len(menu_items)} alimentos, {cobertura_pct:.1f}% cobertura, S/ {costo_total:.2f}")
         return resultado
     
+    def _seleccionar_alimentos(self, req_hierro: float, presupuesto_diario: float, region: str,
+                               excluir: Optional[List[str]], metodo: str = "optimo",
+                               alimentos: Optional[pd.DataFrame] = None) -> List[str]:
+        """
+        Selecciona alimentos dentro del presupuesto
+        
+        Args:
+            alimentos: Base a usar (default: la cargada actualmente)
+        
+        Returns:
+            Nombres de los alimentos elegidos
+        """
+        # Filtrar alimentos disponibles
+        if alimentos is None:
+            alimentos = self._base()[0]
+        
+        if excluir:
+            alimentos = alimentos[~alimentos['nombre'].isin(excluir)]
+        
+        # Disponibilidad regional (columna opcional 'regiones': "todas" o "Costa;Sierra")
+        if 'regiones' in alimentos.columns:
+            regiones = alimentos['regiones'].fillna('todas').astype(str)
+            alimentos = alimentos[(regiones == 'todas') | regiones.str.contains(region, regex=False)]
+        
+        # Priorizar hierro hemo (mejor absorción)
+        alimentos = alimentos.sort_values(
+            ['tipo', 'hierro_mg_100g'],
+            ascending=[False, False]  # Hemo primero, luego más hierro
+        ).reset_index(drop=True)
+        
+        hierro = alimentos['hierro_mg_100g'].to_numpy(dtype=float)
+        precios = alimentos['precio_porcion'].to_numpy(dtype=float)
+        es_hemo = (alimentos['tipo'] == 'hemo').to_numpy()
+        
+        if metodo == "greedy":
+            seleccion = seleccion_greedy(hierro, precios, es_hemo, presupuesto_diario, req_hierro)
+        else:
+            seleccion = optimizar_seleccion(
+                hierro_absorbible(hierro, alimentos['tipo'].to_numpy()),
+                precios, es_hemo, presupuesto_diario
+            )
+        
+        return alimentos['nombre'].iloc[seleccion].tolist()
+    
+    # === TABLA DE MENÚS PRECALCULADOS ===
+    
+    @staticmethod
+    def _clave_tabla(region: str, presupuesto: float, excluir: Optional[List[str]]) -> str:
+        """
+        Clave de la tabla: región | presupuesto | exclusiones
+
+        La selección óptima no depende de la banda de requerimiento, así que
+        no forma parte de la clave.
+        """
+        exclusiones = ",".join(sorted(excluir or []))
+        return f"{region}|{presupuesto:.2f}|{exclusiones}"
+    
+    @staticmethod
+    def _exclusiones_comunes(alimentos: pd.DataFrame) -> List[Tuple[str, ...]]:
+        """Sin exclusiones + excluir cada fuente de hierro hemo (rechazo frecuente)"""
+        hemo = alimentos.loc[alimentos['tipo'] == 'hemo', 'nombre']
+        return [()] + [(nombre,) for nombre in hemo]
+    
+    def _huella_fuentes(self) -> str:
+        """Hash del contenido de los archivos de los que depende la tabla"""
+        h = hashlib.sha256()
+        for ruta in FUENTES_TABLA_MENUS:
+            h.update(ruta.read_bytes() if ruta.exists() else b'ausente')
+        return h.hexdigest()
+    
+    def _firma_stat(self) -> tuple:
+        """Firma barata (tamaño + mtime) para detectar cambios sin leer archivos"""
+        return tuple(
+            (r.stat().st_size, r.stat().st_mtime_ns) if r.exists() else None
+            for r in FUENTES_TABLA_MENUS
+        )
+    
+    def precalcular_tabla(self, guardar: bool = True) -> Dict[str, Any]:
+        """
+        Materializa menús óptimos para la grilla
+        (región × presupuesto cada S/ 0.50 × exclusiones comunes)
+        
+        Returns:
+            Dict con 'version', 'huella' de las fuentes con que se cargó la
+            base usada y 'menus' (clave → nombres de alimentos)
+        """
+        with self._lock_base:
+            alimentos, huella = self.alimentos_df, self._huella_base
+        
+        # La selección óptima no usa el requerimiento: cualquier banda sirve
+        req_hierro = self.calcular_requerimiento_hierro(12)
+        presupuestos = np.arange(PRESUPUESTO_MIN_TABLA, PRESUPUESTO_MAX_TABLA + 1e-9, PASO_PRESUPUESTO)
+        
+        menus = {}
+        for region in REGIONES_MENU:
+            for excluir in self._exclusiones_comunes(alimentos):
+                for presupuesto in presupuestos:
+                    menus[self._clave_tabla(region, presupuesto, excluir)] = self._seleccionar_alimentos(
+                        req_hierro, presupuesto, region, list(excluir), alimentos=alimentos)
+        
+        tabla = {'version': VERSION_TABLA_MENUS, 'huella': huella, 'menus': menus}
+        
+        if guardar:
+            TABLA_MENUS_PATH.parent.mkdir(parents=True, exist_ok=True)
+            temporal = TABLA_MENUS_PATH.with_name(f".{TABLA_MENUS_PATH.name}.{os.getpid()}.tmp")
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(tabla, f, ensure_ascii=False)
+            os.replace(temporal, TABLA_MENUS_PATH)
+            logger.info(f"✅ Tabla de menús precalculada: {len(menus):,} entradas → {TABLA_MENUS_PATH}")
+        
+        return tabla
+    
+    def _regenerar_en_fondo(self, recargar_base: bool):
+        """Lanza precalcular_tabla() en un hilo si no hay uno en curso"""
+        with self._lock_tabla:
+            if self._regenerando is not None and self._regenerando.is_alive():
+                return
+            
+            def tarea():
+                try:
+                    firma = self._firma_stat()
+                    if recargar_base:
+                        self._cargar_base_alimentos(recargar=True)
+                    self._tabla_menus = self.precalcular_tabla()
+                    self._firma_fuentes = firma
+                except Exception as e:
+                    logger.error(f"❌ No se pudo regenerar la tabla de menús: {e}")
+            
+            self._regenerando = threading.Thread(target=tarea, name="tabla-menus", daemon=True)
+            self._regenerando.start()
+    
+    def _asegurar_tabla(self) -> Optional[Dict[str, Any]]:
+        """
+        Carga la tabla; si falta o cambió base_alimentos / el catálogo, la
+        regenera en segundo plano (None mientras tanto: optimización en vivo)
+        
+        El veredicto "obsoleta" se recuerda por la firma stat de las fuentes y
+        de la tabla, así no se relee el JSON ni se rehashea en cada petición.
+        """
+        firma = self._firma_stat()
+        if self._tabla_menus is not None and firma == self._firma_fuentes:
+            return self._tabla_menus
+        firma_tabla = (firma, TABLA_MENUS_PATH.stat().st_mtime_ns if TABLA_MENUS_PATH.exists() else None)
+        if firma_tabla == self._firma_obsoleta:
+            return None
+        
+        tabla = None
+        if TABLA_MENUS_PATH.exists():
+            try:
+                with open(TABLA_MENUS_PATH, 'r', encoding='utf-8') as f:
+                    tabla = json.load(f)
+            except Exception as e:
+                logger.warning(f"⚠️ Tabla de menús ilegible, se regenerará: {e}")
+        
+        huella = self._huella_fuentes()
+        if tabla is None or tabla.get('version') != VERSION_TABLA_MENUS or tabla.get('huella') != huella:
+            recargar_base = self._tabla_menus is not None or tabla is not None
+            if tabla is not None:
+                logger.info("🔄 Fuentes de alimentos o formato modificados: regenerando tabla de menús")
+            self._firma_obsoleta = firma_tabla
+            self._regenerar_en_fondo(recargar_base)
+            return None
+        
+        if huella != self._huella_base:
+            # Tabla al día (p. ej. regenerada por otro proceso) pero base en
+            # memoria anterior: recargarla antes de resolver sus nombres
+            self._cargar_base_alimentos(recargar=True)
+        self._tabla_menus = tabla
+        self._firma_fuentes = firma
+        return tabla
+    
+    def _buscar_precalculado(self, region: str, presupuesto_diario: float,
+                             excluir: Optional[List[str]]) -> Optional[List[str]]:
+        """
+        Busca el menú en la tabla precalculada (presupuesto redondeado hacia
+        abajo a S/ 0.50, así nunca se excede el presupuesto real)
+        
+        Returns:
+            Nombres de alimentos o None si la combinación no está en la tabla
+        """
+        presupuesto = np.floor(presupuesto_diario / PASO_PRESUPUESTO) * PASO_PRESUPUESTO
+        if not PRESUPUESTO_MIN_TABLA <= presupuesto <= PRESUPUESTO_MAX_TABLA:
+            return None
+        
+        try:
+            tabla = self._asegurar_tabla()
+        except Exception as e:
+            logger.warning(f"⚠️ Tabla de menús no disponible: {e}")
+            return None
+        if tabla is None:
+            return None
+        
+        return tabla['menus'].get(self._clave_tabla(region, presupuesto, excluir))
+    
     def _generar_preparaciones(self, menu_items: List[Dict], edad_meses: int) -> List[str]:
         """Genera sugerencias de preparación según edad"""
         preparaciones = []
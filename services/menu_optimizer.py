@@ -0,0 +1,140 @@
+"""
+services/menu_optimizer.py
+Optimizador de selección de alimentos para el menú diario
+Mochila 0/1 con límite de alimentos resuelta por programación dinámica
+sobre el costo discretizado (céntimos)
+"""
+import numpy as np
+from typing import List
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Fracción de hierro absorbible por tipo (hierro hemo se absorbe mejor)
+ABSORCION_HIERRO = {
+    'hemo': 0.25,
+    'no_hemo': 0.10
+}
+
+# Tope de celdas de la tabla DP (alimentos × cantidad × hemo × costo).
+# Si el problema lo supera, se aumenta el paso de costo: el tiempo de
+# cómputo queda acotado de forma determinista, sin depender del reloj.
+MAX_CELDAS_DP = 20_000_000
+
+
+def hierro_absorbible(hierro_mg: np.ndarray, tipos: np.ndarray) -> np.ndarray:
+    """Hierro absorbible estimado (mg) según tipo de hierro"""
+    factor = np.where(np.asarray(tipos) == 'hemo', ABSORCION_HIERRO['hemo'], ABSORCION_HIERRO['no_hemo'])
+    return np.asarray(hierro_mg, dtype=float) * factor
+
+
+def optimizar_seleccion(valores: np.ndarray, costos: np.ndarray, es_hemo: np.ndarray,
+                        presupuesto: float, max_items: int = 4,
+                        exigir_hemo: bool = True, paso_costo: float = 0.01) -> List[int]:
+    """
+    Selecciona alimentos maximizando el valor total dentro del presupuesto
+
+    Args:
+        valores: Valor de cada alimento (ej. hierro absorbible en mg)
+        costos: Precio por porción en soles
+        es_hemo: True si el alimento aporta hierro hemo
+        presupuesto: Presupuesto diario en soles
+        max_items: Máximo de alimentos en el menú
+        exigir_hemo: Incluir al menos una fuente hemo si alguna cabe
+        paso_costo: Resolución del costo en soles (se redondea hacia arriba,
+                    así la solución nunca excede el presupuesto real)
+
+    Returns:
+        Índices de los alimentos elegidos (ordenados por valor descendente)
+    """
+    valores = np.asarray(valores, dtype=float)
+    costos = np.asarray(costos, dtype=float)
+    es_hemo = np.asarray(es_hemo, dtype=bool)
+    n = len(valores)
+    if n == 0 or presupuesto <= 0 or max_items <= 0:
+        return []
+
+    K = max_items
+    # Ajustar resolución para respetar el tope de celdas
+    while n * (K + 1) * 2 * (int(presupuesto / paso_costo) + 1) > MAX_CELDAS_DP:
+        paso_costo *= 2
+    C = int(np.floor(presupuesto / paso_costo + 1e-9))
+    pesos = np.ceil(costos / paso_costo - 1e-9).astype(int)
+
+    # dp[k, h, c]: mejor valor con k alimentos, h = ¿incluye hemo?, costo ≤ c
+    dp = np.full((K + 1, 2, C + 1), -np.inf)
+    dp[0, 0, :] = 0.0
+    elegido = np.zeros((n, K + 1, 2, C + 1), dtype=bool)
+    origen_h = np.zeros((n, K + 1, 2, C + 1), dtype=np.int8)
+
+    for i in range(n):
+        w = pesos[i]
+        if w > C:
+            continue
+        nuevo = dp.copy()
+        for h in (0, 1):
+            destino = 1 if es_hemo[i] else h
+            candidato = dp[:-1, h, :C + 1 - w] + valores[i]
+            actual = nuevo[1:, destino, w:]
+            mejora = candidato > actual
+            actual[mejora] = candidato[mejora]
+            elegido[i, 1:, destino, w:][mejora] = True
+            origen_h[i, 1:, destino, w:][mejora] = h
+        dp = nuevo
+
+    # Estado final: con hemo si se exige y es factible, si no el mejor
+    if exigir_hemo and np.isfinite(dp[:, 1, C]).any():
+        h = 1
+    else:
+        h = int(dp[:, 1, C].max() > dp[:, 0, C].max())
+    k = int(np.argmax(dp[:, h, C]))
+
+    # Reconstrucción hacia atrás
+    seleccion = []
+    c = C
+    for i in range(n - 1, -1, -1):
+        if k == 0:
+            break
+        if elegido[i, k, h, c]:
+            seleccion.append(i)
+            h_previo = int(origen_h[i, k, h, c])
+            c -= pesos[i]
+            k -= 1
+            h = h_previo
+
+    return sorted(seleccion, key=lambda j: -valores[j])
+
+
+def seleccion_greedy(valores_hierro: np.ndarray, costos: np.ndarray, es_hemo: np.ndarray,
+                     presupuesto: float, requerimiento: float, max_items: int = 4) -> List[int]:
+    """
+    Selección greedy original (referencia para el benchmark): el hemo con
+    más hierro y luego no-hemo por hierro descendente hasta presupuesto,
+    150% de cobertura o max_items
+    """
+    valores_hierro = np.asarray(valores_hierro, dtype=float)
+    costos = np.asarray(costos, dtype=float)
+    es_hemo = np.asarray(es_hemo, dtype=bool)
+
+    seleccion = []
+    hierro_total = 0.0
+    costo_total = 0.0
+
+    hemo = np.flatnonzero(es_hemo)
+    if len(hemo):
+        mejor = hemo[np.argmax(valores_hierro[hemo])]
+        seleccion.append(int(mejor))
+        hierro_total += valores_hierro[mejor]
+        costo_total += costos[mejor]
+
+    no_hemo = np.flatnonzero(~es_hemo)
+    for i in no_hemo[np.argsort(-valores_hierro[no_hemo], kind='stable')]:
+        if costo_total + costos[i] <= presupuesto and hierro_total < requerimiento * 1.5:
+            seleccion.append(int(i))
+            hierro_total += valores_hierro[i]
+            costo_total += costos[i]
+        if len(seleccion) >= max_items:
+            break
+
+    return seleccion
@@ -0,0 +1,320 @@
+"""
+services/planificador_semanal.py
+Planificador de menú semanal (7 días × desayuno/almuerzo/cena)
+Maximiza hierro absorbible semanal dentro del presupuesto con restricciones
+de variedad, mínimo de comidas con hierro hemo y vitamina C en comidas no hemo.
+Búsqueda local con límite de tiempo sobre el conteo de cada plato.
+"""
+
+import copy
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from services.menu_optimizer import ABSORCION_HIERRO
+from utils.menu_recommender import MenuRecommender
+
+logger = logging.getLogger(__name__)
+
+
+DIAS_SEMANA = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+TIPOS_COMIDA = ["desayuno", "almuerzo", "cena"]
+
+# Ingredientes que aportan vitamina C (potencian hierro no hemo)
+FUENTES_VITAMINA_C = {
+    'limon', 'naranja', 'mandarina', 'maracuya', 'camu_camu', 'papaya',
+    'kiwi', 'fresa', 'guayaba', 'pimiento', 'brocoli', 'tomate'
+}
+
+# Multiplicador de absorción del hierro no hemo acompañado de vitamina C
+# (conservador frente al 3-4x reportado por OMS)
+FACTOR_VITAMINA_C = 2.0
+
+# La búsqueda se detiene al agotar el tiempo o tras estas perturbaciones sin mejora
+MAX_PERTURBACIONES_SIN_MEJORA = 50
+
+# Penalizaciones de la búsqueda local por unidad de violación
+PENALIZACION_PRESUPUESTO = 100.0   # por sol excedido
+PENALIZACION_HEMO = 10.0           # por comida hemo faltante
+
+MAX_PLANES_CACHE = 512
+
+
+class PlanificadorSemanal:
+    """
+    Arma el plan semanal a partir del pool de menús candidatos
+
+    Las 7 comidas de un mismo tipo son intercambiables, así que el estado de
+    la búsqueda es cuántas veces aparece cada plato; luego se reparten los
+    platos en los días evitando repetirlos en días consecutivos.
+    """
+
+    def __init__(self, recomendador: Optional[MenuRecommender] = None):
+        self.recomendador = recomendador or MenuRecommender()
+        self._cache = OrderedDict()
+
+    @staticmethod
+    def _banda_edad(edad_meses: int) -> str:
+        """Banda de edad para la clave de caché"""
+        if edad_meses < 12:
+            return '6-11m'
+        if edad_meses < 36:
+            return '12-35m'
+        return '36-59m'
+
+    def _metricas_pool(self, menus: List[Dict], contexto: Dict) -> Dict[str, np.ndarray]:
+        """Costo, hierro, hierro absorbible, hemo y vitamina C por menú"""
+        scores = self.recomendador.calcular_scores_lote(menus, contexto)
+
+        catalogo = self.recomendador.catalogo_dict
+        absorbible = np.zeros(len(menus))
+        es_hemo = np.zeros(len(menus), dtype=bool)
+        tiene_vitamina_c = np.zeros(len(menus), dtype=bool)
+
+        for i, menu in enumerate(menus):
+            ids = [ing['id'] for ing in menu['ingredientes']]
+            tiene_vitamina_c[i] = any(ing_id in FUENTES_VITAMINA_C for ing_id in ids)
+            factor_c = FACTOR_VITAMINA_C if tiene_vitamina_c[i] else 1.0
+
+            for ing in menu['ingredientes']:
+                info = catalogo.get(ing['id'])
+                if not info:
+                    continue
+                hierro = info['hierro_mg_100g'] * ing['cantidad_g'] / 100
+                if info.get('tipo_hierro') == 'hemo':
+                    es_hemo[i] = True
+                    absorbible[i] += hierro * ABSORCION_HIERRO['hemo']
+                else:
+                    absorbible[i] += hierro * ABSORCION_HIERRO['no_hemo'] * factor_c
+
+        return {
+            'scores': scores,
+            'costo': scores['costo_s'],
+            'hierro': scores['hierro_mg'],
+            'absorbible': absorbible,
+            'es_hemo': es_hemo,
+            'vitamina_c': tiene_vitamina_c,
+        }
+
+    def planificar(self, menus: List[Dict], contexto: Dict,
+                   max_repeticiones: int = 2, min_comidas_hemo: int = 7,
+                   exigir_vitamina_c: bool = True, limite_segundos: float = 0.2,
+                   semilla: int = 0) -> Dict:
+        """
+        Genera el plan semanal óptimo
+
+        Args:
+            menus: Pool de menús candidatos (con 'tipo' desayuno/almuerzo/cena)
+            contexto: {'departamento', 'edad_meses', 'presupuesto_diario_s'}
+            max_repeticiones: Máximo de veces que se repite un plato en la semana
+            min_comidas_hemo: Mínimo de comidas con hierro hemo
+            exigir_vitamina_c: Descartar comidas no hemo sin fuente de vitamina C
+            limite_segundos: Tiempo máximo de la búsqueda local
+            semilla: Semilla de las perturbaciones
+
+        Returns:
+            Dict con 'semanal' (lista por día con desayuno/almuerzo/cena, mismo
+            formato que recomendar_top3), totales y cumplimiento de restricciones
+        """
+        # Presupuesto redondeado hacia abajo a S/ 0.50: el plan cacheado
+        # nunca excede el presupuesto real de quien lo reutiliza
+        presupuesto_diario = np.floor(contexto.get('presupuesto_diario_s', 15.0) * 2) / 2
+        clave = (
+            contexto['departamento'],
+            self._banda_edad(contexto['edad_meses']),
+            presupuesto_diario,
+            tuple(m['id'] for m in menus),
+            max_repeticiones, min_comidas_hemo, exigir_vitamina_c
+        )
+        if clave in self._cache:
+            self._cache.move_to_end(clave)
+            # Copia: quien modifique el plan no altera el que reciben los demás
+            return copy.deepcopy(self._cache[clave])
+
+        inicio = time.perf_counter()
+        # Los scores usan el mismo presupuesto redondeado que la clave de caché
+        metricas = self._metricas_pool(menus, {**contexto, 'presupuesto_diario_s': float(presupuesto_diario)})
+        presupuesto_semanal = presupuesto_diario * 7
+
+        # Candidatos por tipo de comida
+        validos = np.ones(len(menus), dtype=bool)
+        if exigir_vitamina_c:
+            validos = metricas['es_hemo'] | metricas['vitamina_c']
+
+        grupos = {}
+        for tipo in TIPOS_COMIDA:
+            del_tipo = np.array([m.get('tipo', tipo) == tipo for m in menus], dtype=bool)
+            candidatos = np.flatnonzero(del_tipo & validos)
+            if len(candidatos) == 0:
+                candidatos = np.flatnonzero(del_tipo) if del_tipo.any() else np.arange(len(menus))
+                logger.warning(f"⚠️ Sin candidatos válidos para {tipo}, se relaja vitamina C")
+            grupos[tipo] = candidatos
+
+        # Con pocos platos no se puede cumplir el tope de repeticiones
+        topes = {
+            tipo: max(max_repeticiones, int(np.ceil(len(DIAS_SEMANA) / len(idx))))
+            for tipo, idx in grupos.items()
+        }
+
+        conteos = self._buscar(grupos, topes, metricas, presupuesto_semanal,
+                               min_comidas_hemo, limite_segundos, semilla)
+
+        plan = self._armar_plan(menus, grupos, conteos, metricas)
+        costo_total = float(sum(metricas['costo'][i] * c for i, c in conteos.items()))
+        hierro_total = float(sum(metricas['hierro'][i] * c for i, c in conteos.items()))
+        absorbible_total = float(sum(metricas['absorbible'][i] * c for i, c in conteos.items()))
+        comidas_hemo = int(sum(c for i, c in conteos.items() if metricas['es_hemo'][i]))
+
+        resultado = {
+            'semanal': plan,
+            'costo_total': round(costo_total, 2),
+            'hierro_total_mg': round(hierro_total, 1),
+            'hierro_absorbible_mg': round(absorbible_total, 2),
+            'comidas_hemo': comidas_hemo,
+            'presupuesto_semanal': round(float(presupuesto_semanal), 2),
+            'cumple_presupuesto': bool(costo_total <= presupuesto_semanal + 1e-9),
+            'cumple_hemo': comidas_hemo >= min_comidas_hemo,
+            'max_repeticiones': max(conteos.values()),
+            'presupuesto_diario': float(presupuesto_diario),
+            'tiempo_ms': round((time.perf_counter() - inicio) * 1000, 1),
+        }
+
+        self._cache[clave] = copy.deepcopy(resultado)
+        if len(self._cache) > MAX_PLANES_CACHE:
+            self._cache.popitem(last=False)
+
+        logger.info(f"🗓️ Plan semanal: {absorbible_total:.1f} mg absorbibles, "
+                    f"S/ {costo_total:.2f} de S/ {presupuesto_semanal:.2f} "
+                    f"({resultado['tiempo_ms']} ms)")
+        return resultado
+
+    def _buscar(self, grupos: Dict[str, np.ndarray], topes: Dict[str, int], metricas: Dict,
+                presupuesto: float, min_hemo: int, limite_segundos: float,
+                semilla: int) -> Dict[int, int]:
+        """
+        Búsqueda local sobre conteos por plato: mover una comida de un plato
+        a otro del mismo tipo (mejor mejora), con perturbaciones aleatorias
+        hasta agotar el tiempo
+
+        Returns:
+            {índice de menú: veces en la semana}
+        """
+        rng = np.random.default_rng(semilla)
+        valor, costo, hemo = metricas['absorbible'], metricas['costo'], metricas['es_hemo'].astype(int)
+        n_dias = len(DIAS_SEMANA)
+
+        def objetivo(v, c, h):
+            return (v - PENALIZACION_PRESUPUESTO * np.maximum(0.0, c - presupuesto)
+                    - PENALIZACION_HEMO * np.maximum(0, min_hemo - h))
+
+        # Solución inicial: platos más baratos de cada tipo, hasta el tope
+        x = np.zeros(len(valor), dtype=int)
+        for tipo, idx in grupos.items():
+            restantes = n_dias
+            for i in idx[np.argsort(costo[idx], kind='stable')]:
+                usar = min(topes[tipo], restantes)
+                x[i] = usar
+                restantes -= usar
+                if restantes == 0:
+                    break
+
+        def mejorar(x):
+            """Mejor mejora: evalúa todos los movimientos origen→destino a la vez"""
+            while True:
+                v, c, h = x @ valor, x @ costo, x @ hemo
+                actual = objetivo(v, c, h)
+                mejor_delta, mejor_mov = 1e-9, None
+                for tipo, idx in grupos.items():
+                    origen = idx[x[idx] > 0]
+                    destino = idx[x[idx] < topes[tipo]]
+                    if len(origen) == 0 or len(destino) == 0:
+                        continue
+                    delta = objetivo(
+                        v + valor[destino][None, :] - valor[origen][:, None],
+                        c + costo[destino][None, :] - costo[origen][:, None],
+                        h + hemo[destino][None, :] - hemo[origen][:, None]
+                    ) - actual
+                    delta[origen[:, None] == destino[None, :]] = -np.inf
+                    k = np.argmax(delta)
+                    if delta.flat[k] > mejor_delta:
+                        fila, col = np.unravel_index(k, delta.shape)
+                        mejor_delta, mejor_mov = delta.flat[k], (origen[fila], destino[col])
+                if mejor_mov is None:
+                    return x, actual
+                x[mejor_mov[0]] -= 1
+                x[mejor_mov[1]] += 1
+
+        x, mejor_valor = mejorar(x)
+        mejor_x = x.copy()
+        limite = time.perf_counter() + limite_segundos
+
+        # Perturbaciones: mover 1-3 comidas al azar y volver a mejorar
+        tipos = [t for t, idx in grupos.items() if len(idx) > 1]
+        sin_mejora = 0
+        while tipos and time.perf_counter() < limite and sin_mejora < MAX_PERTURBACIONES_SIN_MEJORA:
+            x = mejor_x.copy()
+            for _ in range(rng.integers(1, 4)):
+                tipo = tipos[rng.integers(len(tipos))]
+                idx = grupos[tipo]
+                origen = idx[x[idx] > 0]
+                destino = idx[x[idx] < topes[tipo]]
+                if len(origen) and len(destino):
+                    x[rng.choice(origen)] -= 1
+                    x[rng.choice(destino)] += 1
+            x, valor_x = mejorar(x)
+            if valor_x > mejor_valor + 1e-9:
+                mejor_x, mejor_valor = x.copy(), valor_x
+                sin_mejora = 0
+            else:
+                sin_mejora += 1
+
+        return {int(i): int(c) for i, c in enumerate(mejor_x) if c > 0}
+
+    @staticmethod
+    def _armar_plan(menus: List[Dict], grupos: Dict[str, np.ndarray],
+                    conteos: Dict[int, int], metricas: Dict) -> List[Dict]:
+        """Reparte los platos en la semana intercalando repeticiones"""
+        scores = metricas['scores']
+        por_tipo = {}
+        for tipo, idx in grupos.items():
+            elegidos = sorted(
+                (i for i in idx if i in conteos),
+                key=lambda i: (-conteos[i], i)
+            )
+            # Intercalado por rondas: A B C A B C A (evita días consecutivos)
+            secuencia = []
+            restantes = {i: conteos[i] for i in elegidos}
+            while len(secuencia) < len(DIAS_SEMANA) and any(restantes.values()):
+                for i in elegidos:
+                    if restantes[i] > 0:
+                        secuencia.append(i)
+                        restantes[i] -= 1
+            por_tipo[tipo] = secuencia
+
+        def con_score(i):
+            menu = menus[i].copy()
+            menu['score'] = float(scores['score_final'][i])
+            menu['desglose'] = {clave: float(valores[i]) for clave, valores in scores.items()}
+            menu['hierro_absorbible_mg'] = round(float(metricas['absorbible'][i]), 2)
+            return menu
+
+        return [
+            {'dia': dia, **{tipo: con_score(por_tipo[tipo][d]) for tipo in TIPOS_COMIDA}}
+            for d, dia in enumerate(DIAS_SEMANA)
+        ]
+
+
+# Instancia global (singleton pattern)
+_planificador_instance = None
+
+
+def get_planificador_semanal() -> PlanificadorSemanal:
+    """Factory para obtener instancia única del planificador semanal"""
+    global _planificador_instance
+    if _planificador_instance is None:
+        _planificador_instance = PlanificadorSemanal()
+        logger.info("🗓️ Planificador semanal creado (primera vez)")
+    return _planificador_instance
@@ -189,6 +189,134 @@ class AnemiaPredictor:
             logger.error(traceback.format_exc())
             return None
     
+    def _preparar_features_ml_lote(self, datos: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """
+        Versión vectorizada de _preparar_features_ml para muchas filas
+
+        Args:
+            datos: DataFrame con una fila por niño y las mismas claves que
+                   acepta _preparar_features_ml (columnas ausentes toman el
+                   mismo valor por defecto que en la versión escalar)
+
+        Returns:
+            DataFrame de features en el orden de self.features_list
+        """
+        if self.model is None:
+            return None
+
+        n = len(datos)
+
+        def columna(nombre, defecto):
+            if nombre in datos.columns:
+                return datos[nombre].to_numpy()
+            return np.full(n, defecto)
+
+        def bandera(condicion):
+            return np.asarray(condicion, dtype=float)
+
+        edad_meses = columna('edad_meses', 12).astype(float)
+        hemoglobina = columna('hemoglobina', 11.0).astype(float)
+        altitud = columna('altitud', 0).astype(float)
+
+        recibe_suplemento = (columna('tiene_suplemento', False).astype(bool) |
+                             columna('recibe_suplemento', False).astype(bool))
+        asiste_cred = columna('asiste_cred', True).astype(bool)
+        area_rural = columna('area_rural', False).astype(bool)
+        departamento = columna('departamento', 'OTRO').astype(str)
+
+        features = {
+            'edad_meses': edad_meses,
+            'edad_anos': edad_meses / 12,
+            'hemoglobina': hemoglobina,
+            'hb_baja': bandera(hemoglobina < 11.0),
+            'hb_muy_baja': bandera(hemoglobina < 10.0),
+            'altitud': altitud,
+            'altitud_muy_alta': bandera(altitud > 3000),
+            'altitud_alta': bandera((altitud > 2500) & (altitud <= 3000)),
+            'edad_6_11m': bandera((edad_meses >= 6) & (edad_meses < 12)),
+            'edad_12_23m': bandera((edad_meses >= 12) & (edad_meses < 24)),
+            'edad_24_35m': bandera((edad_meses >= 24) & (edad_meses < 36)),
+            'edad_36_59m': bandera(edad_meses >= 36),
+            'recibe_suplemento': bandera(recibe_suplemento),
+            'sin_suplemento': bandera(~recibe_suplemento),
+            'asiste_cred': bandera(asiste_cred),
+            'sin_cred': bandera(~asiste_cred),
+            'area_rural': bandera(area_rural),
+            'area_urbana': bandera(~area_rural),
+            'juntos': bandera(columna('tiene_juntos', False).astype(bool)),
+            'sis': bandera(columna('tiene_sis', True).astype(bool)),
+            'qaliwarma': bandera(columna('tiene_qaliwarma', False).astype(bool)),
+        }
+
+        for dept in ['PUNO', 'CUSCO', 'HUANCAVELICA', 'APURIMAC', 'AYACUCHO', 'PASCO', 'JUNIN', 'CAJAMARCA']:
+            features[f'dept_{dept}'] = bandera(departamento == dept)
+
+        features['altitud_sin_supl'] = features['altitud_muy_alta'] * features['sin_suplemento']
+        features['rural_sin_cred'] = features['area_rural'] * features['sin_cred']
+        features['hb_x_altitud'] = features['hb_baja'] * features['altitud_muy_alta']
+
+        columnas = {
+            feat: features.get(feat, np.zeros(n)) for feat in self.features_list
+        }
+        return pd.DataFrame(columnas, index=datos.index).astype(float)
+
+    @staticmethod
+    def ajustar_hemoglobina_altitud_lote(hb: np.ndarray, altitud: np.ndarray) -> np.ndarray:
+        """Versión vectorizada de ajustar_hemoglobina_altitud (sin logging por fila)"""
+        altitud = np.asarray(altitud, dtype=float)
+        factor = np.select(
+            [altitud < 1000, altitud < 2000, altitud < 3000, altitud < 4000, altitud < 4500],
+            [0.0, 0.2, 0.5, 1.0, 1.5],
+            default=2.0
+        )
+        return np.asarray(hb, dtype=float) - factor
+
+    @staticmethod
+    def _aplicar_reglas_clinicas_v3_lote(prob_base: np.ndarray, hb_ajustada: np.ndarray,
+                                         edad_meses: np.ndarray, tiene_factores_riesgo: np.ndarray,
+                                         altitud: np.ndarray) -> np.ndarray:
+        """
+        Versión vectorizada de _aplicar_reglas_clinicas_v3
+
+        Produce exactamente las mismas probabilidades que la versión escalar
+        aplicada fila por fila.
+        """
+        hb = np.asarray(hb_ajustada, dtype=float)
+        edad = np.asarray(edad_meses, dtype=float)
+        factores = np.asarray(tiene_factores_riesgo, dtype=bool)
+        altitud = np.asarray(altitud, dtype=float)
+
+        # REGLAS 1-2: pisos de probabilidad según Hb ajustada
+        piso = np.select(
+            [
+                hb < 7.0,
+                hb < 9.0,
+                hb < 10.0,
+                hb < 10.5,
+                hb < 11.0,
+                (hb < 11.5) & (factores | ((edad >= 6) & (edad <= 12))),
+            ],
+            [
+                0.90,
+                0.70,
+                0.40,
+                0.40 - (hb - 10.0) * 0.30,
+                0.25 - (hb - 10.5) * 0.20,
+                0.10,
+            ],
+            default=0.0
+        )
+        prob = np.maximum(np.asarray(prob_base, dtype=float), piso)
+
+        # REGLA 3: casos sanos (Hb >12.5) → máximo 10%
+        prob = np.where(hb > 12.5, np.minimum(prob, 0.10), prob)
+
+        # REGLA 4: alta altitud con Hb borderline
+        regla_altitud = (altitud > 3000) & (hb >= 10.0) & (hb <= 11.5) & factores
+        prob = np.where(regla_altitud, np.maximum(prob, 0.30), prob)
+
+        return np.clip(prob, 0, 1)
+
     def _aplicar_reglas_clinicas_v3(self, prob_base: float, hb_ajustada: float, 
                                      edad_meses: int, tiene_factores_riesgo: bool, 
                                      altitud: int) -> float:
@@ -289,6 +417,76 @@ class AnemiaPredictor:
             logger.error(traceback.format_exc())
             return None
     
+    def predecir_ml_lote(self, datos: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """
+        Predicción ML + reglas clínicas v3 para muchas filas con una sola
+        llamada al modelo
+
+        Args:
+            datos: DataFrame con una fila por niño (mismas claves que predecir_ml)
+
+        Returns:
+            DataFrame alineado con `datos` con columnas probabilidad,
+            probabilidad_base, prediccion_ml y categoria_riesgo_ml,
+            o None si no hay modelo ML
+        """
+        if self.model is None:
+            return None
+
+        try:
+            X = self._preparar_features_ml_lote(datos)
+            if X is None:
+                return None
+
+            n = len(datos)
+            prob_base = self.model.predict_proba(X)[:, 1] if n else np.zeros(0)
+
+            def columna(nombre, defecto):
+                if nombre in datos.columns:
+                    return datos[nombre].to_numpy()
+                return np.full(n, defecto)
+
+            altitud = columna('altitud', 0).astype(float)
+            hb_ajustada = self.ajustar_hemoglobina_altitud_lote(
+                columna('hemoglobina', 11.0), altitud
+            )
+
+            con_suplemento = (columna('tiene_suplemento', False).astype(bool) |
+                              columna('recibe_suplemento', False).astype(bool))
+            tiene_factores_riesgo = (
+                ~con_suplemento |
+                ~columna('asiste_cred', True).astype(bool) |
+                columna('area_rural', False).astype(bool)
+            )
+
+            probabilidad = self._aplicar_reglas_clinicas_v3_lote(
+                prob_base,
+                hb_ajustada,
+                columna('edad_meses', 12),
+                tiene_factores_riesgo,
+                altitud
+            )
+
+            prediccion = probabilidad >= self.threshold
+            categoria_riesgo = np.select(
+                [prediccion & (probabilidad > 0.85), prediccion, probabilidad < 0.30],
+                ["Alto", "Medio-Alto", "Bajo"],
+                default="Medio-Bajo"
+            )
+
+            return pd.DataFrame({
+                'probabilidad': probabilidad,
+                'probabilidad_base': prob_base,
+                'prediccion_ml': prediccion,
+                'categoria_riesgo_ml': categoria_riesgo
+            }, index=datos.index)
+
+        except Exception as e:
+            logger.error(f"Error en predicción ML por lote: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return None
+    
     def calcular_riesgo(self, datos: Dict[str, Any]) -> Dict[str, Any]:
         """Calcula score de riesgo basado en factores conocidos"""
         score = 0
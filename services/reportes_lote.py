@@ -0,0 +1,516 @@
+"""
+services/reportes_lote.py
+Generación masiva de reportes PDF (médico + cuidador) a partir de un padrón
+
+Un puesto de salud o una DIRESA entrega un padrón (CSV/Parquet, una fila por
+niño). Las predicciones y los menús se calculan por lote en el proceso
+principal; el render de PDFs, que es lo costoso, se reparte en un pool de
+procesos. Cada paciente terminado se anota en un manifiesto, de modo que un
+trabajo interrumpido se reanuda con el mismo comando sin repetir reportes.
+"""
+
+import re
+import json
+import time
+import uuid
+import shutil
+import logging
+import zipfile
+import threading
+import multiprocessing
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import BASE_DIR
+from utils.pdf_almacen import escribir_atomico
+
+logger = logging.getLogger(__name__)
+
+
+DIRECTORIO_LOTES = BASE_DIR / "reportes" / "lotes"
+MANIFIESTO = "_completados.txt"
+FORMATOS_SALIDA = ("zip", "directorio")
+COLUMNAS_REQUERIDAS = ["hemoglobina", "edad_meses"]
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+# Severidad OMS → clasificación que colorea el reporte médico
+NIVEL_POR_SEVERIDAD = {
+    'Normal': 'RIESGO BAJO',
+    'Leve': 'RIESGO MODERADO',
+    'Moderada': 'RIESGO ALTO',
+    'Severa': 'RIESGO ALTO',
+}
+
+
+def cargar_padron(ruta) -> pd.DataFrame:
+    """
+    Lee el padrón de pacientes (CSV o Parquet)
+
+    Columnas requeridas: hemoglobina, edad_meses. Opcionales: id_paciente
+    (o dni), nombre_nino, nombre_madre, altitud, peso_kg, talla_cm, region,
+    presupuesto_diario, tiene_suplemento, area_rural, asiste_cred...
+    """
+    ruta = Path(ruta)
+    if ruta.suffix.lower() in ('.parquet', '.pq'):
+        try:
+            padron = pd.read_parquet(ruta)
+        except ImportError as e:
+            raise ValueError(
+                f"Leer Parquet requiere pyarrow (pip install pyarrow); "
+                f"o convierta {ruta.name} a CSV"
+            ) from e
+    else:
+        padron = pd.read_csv(ruta, encoding='utf-8')
+
+    faltantes = [c for c in COLUMNAS_REQUERIDAS if c not in padron.columns]
+    if faltantes:
+        raise ValueError(f"Padrón sin columnas requeridas: {', '.join(faltantes)}")
+    return padron.reset_index(drop=True)
+
+
+def _nombre_archivo(texto: str) -> str:
+    """Identificador seguro para nombre de archivo"""
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', str(texto)).strip('_') or 'sin_id'
+
+
+def _ids_unicos(ids) -> List[str]:
+    """
+    Identificadores de archivo únicos: los DNI repetidos en el padrón (o que
+    colisionan al sanearlos) llevan el número de fila para no sobrescribirse
+    """
+    seguros = [_nombre_archivo(i) for i in ids]
+    repetidos = {i for i, n in pd.Series(seguros).value_counts().items() if n > 1}
+    if repetidos:
+        logger.warning(f"⚠️ Padrón con {len(repetidos)} identificadores repetidos: "
+                       f"se agrega el número de fila a sus reportes")
+    return [f"{i}_fila{fila + 1}" if i in repetidos else i for fila, i in enumerate(seguros)]
+
+
+def _plan_desde_menu(menu: Dict) -> Dict:
+    """Plan semanal y lista de compras del reporte cuidador a partir del menú diario"""
+    from services.lista_compras import formatear_cantidad
+
+    alimentos = [item['alimento'] for item in menu.get('menu_items', [])]
+    if not alimentos:
+        return {'menu_semanal': [], 'lista_compras': []}
+
+    n = len(alimentos)
+    menu_semanal = [
+        {
+            'dia': dia,
+            'desayuno': alimentos[d % n],
+            'almuerzo': alimentos[(d + 1) % n],
+            'cena': alimentos[(d + 2) % n],
+        }
+        for d, dia in enumerate(DIAS_SEMANA)
+    ]
+
+    lista_compras = []
+    for item in menu['menu_items']:
+        gramos = float(str(item.get('porcion', '100g')).rstrip('g') or 100) * len(DIAS_SEMANA)
+        lista_compras.append({'ingrediente': item['alimento'], 'cantidad': formatear_cantidad(gramos)})
+
+    return {'menu_semanal': menu_semanal, 'lista_compras': lista_compras}
+
+
+def preparar_lote(padron: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Calcula predicciones y menús para todo el padrón y arma los datos de
+    cada reporte
+
+    La clasificación y la probabilidad ML se obtienen con las versiones
+    vectorizadas del predictor; los menús se memorizan por
+    (edad, presupuesto, región), que se repiten mucho en un padrón.
+
+    Returns:
+        Lista de trabajos: id, datos_paciente, datos_clinicos, plan_alimentario.
+        Las filas con hemoglobina o edad_meses vacías o no numéricas van al
+        final solo con id y 'error'
+    """
+    from services.predictor import anemia_predictor
+    from services.menu_generator import menu_generator
+
+    if 'id_paciente' in padron.columns:
+        ids = padron['id_paciente'].astype(str).to_numpy()
+    elif 'dni' in padron.columns:
+        ids = padron['dni'].astype(str).to_numpy()
+    else:
+        ids = np.array([f"{i + 1:06d}" for i in range(len(padron))])
+    ids_archivo = np.array(_ids_unicos(ids), dtype=object)
+
+    hemoglobina = pd.to_numeric(padron['hemoglobina'], errors='coerce')
+    edad = pd.to_numeric(padron['edad_meses'], errors='coerce')
+    validas = (hemoglobina.notna() & edad.notna()).to_numpy()
+    invalidos = [
+        {'id': ids_archivo[i],
+         'error': f"Fila {i + 1}: hemoglobina='{padron['hemoglobina'].iloc[i]}', "
+                  f"edad_meses='{padron['edad_meses'].iloc[i]}' (se requieren valores numéricos)"}
+        for i in np.flatnonzero(~validas)
+    ]
+    if invalidos:
+        logger.warning(f"⚠️ Padrón con {len(invalidos)} filas sin hemoglobina o edad válidas: "
+                       f"van al reporte de errores")
+    padron = padron[validas].assign(
+        hemoglobina=hemoglobina[validas].astype(float), edad_meses=edad[validas].astype(int)
+    ).reset_index(drop=True)
+    ids, ids_archivo = ids[validas], ids_archivo[validas]
+    hemoglobina = padron['hemoglobina'].to_numpy()
+    edad = padron['edad_meses'].to_numpy()
+    n = len(padron)
+
+    def columna(nombre, defecto):
+        if nombre in padron.columns:
+            return padron[nombre].fillna(defecto).to_numpy()
+        return np.full(n, defecto, dtype=object)
+
+    altitud = columna('altitud', 0).astype(float)
+    hb_ajustada = anemia_predictor.ajustar_hemoglobina_altitud_lote(hemoglobina, altitud)
+    severidad = np.select(
+        [hb_ajustada >= 11.0, hb_ajustada >= 10.0, hb_ajustada >= 7.0],
+        ['Normal', 'Leve', 'Moderada'],
+        default='Severa'
+    )
+
+    ml = anemia_predictor.predecir_ml_lote(padron)
+    region = columna('region', 'Costa')
+    presupuesto = columna('presupuesto_diario', 5.0).astype(float)
+
+    menus = {}
+    trabajos = []
+    registros = padron.astype(object).where(padron.notna(), None).to_dict('records')
+    for i, fila in enumerate(registros):
+        riesgo = anemia_predictor.calcular_riesgo(fila)
+        probabilidad = float(ml['probabilidad'].iloc[i]) if ml is not None else riesgo['probabilidad_anemia']
+        factores = riesgo['factores_riesgo'] + ['No especificado'] * 3
+
+        clave_menu = (int(edad[i]), float(presupuesto[i]), str(region[i]))
+        if clave_menu not in menus:
+            menus[clave_menu] = menu_generator.generar_menu(*clave_menu)
+
+        nombre_nino = fila.get('nombre_nino') or f"Paciente {ids[i]}"
+        trabajos.append({
+            'id': ids_archivo[i],
+            'datos_paciente': {
+                'nombre_nino': nombre_nino,
+                'nombre_madre': fila.get('nombre_madre') or 'Mamá',
+                'edad_meses': int(edad[i]),
+                'hemoglobina': float(hemoglobina[i]),
+                'dni': str(fila.get('dni', 'N/A')),
+            },
+            'datos_clinicos': {
+                'hemoglobina': float(hemoglobina[i]),
+                'hemoglobina_ajustada': round(float(hb_ajustada[i]), 2),
+                'edad_meses': int(edad[i]),
+                'peso_kg': fila.get('peso_kg'),
+                'talla_cm': fila.get('talla_cm'),
+                'altitud_msnm': int(altitud[i]),
+                'nivel_riesgo': NIVEL_POR_SEVERIDAD[severidad[i]],
+                'probabilidad_ml': probabilidad,
+                'factor_1': factores[0],
+                'factor_2': factores[1],
+                'factor_3': factores[2],
+            },
+            'plan_alimentario': _plan_desde_menu(menus[clave_menu]),
+        })
+
+    logger.info(f"📋 Lote preparado: {n:,} pacientes, {len(menus)} menús distintos, "
+                f"ML={'Sí' if ml is not None else 'No'}")
+    return trabajos + invalidos
+
+
+# ════════════════════════════════════════════════════════════════════════════
+# WORKERS (se ejecutan en procesos hijos)
+# ════════════════════════════════════════════════════════════════════════════
+
+def _inicializar_worker():
+    """Precarga el generador PDF del proceso hijo (estilos y fuentes)"""
+    logging.getLogger('utils.pdf_generator').setLevel(logging.WARNING)
+    from utils.pdf_generator import get_generador_pdf
+    get_generador_pdf()
+
+
+def _renderizar_paciente(trabajo: Dict) -> Tuple[str, List[Tuple[str, bytes]], Optional[str]]:
+    """
+    Renderiza los dos reportes de un paciente
+
+    Returns:
+        (id, [(nombre_archivo, bytes), ...], error)
+    """
+    from utils.pdf_generator import get_generador_pdf
+
+    generador = get_generador_pdf()
+    try:
+        medico = generador.renderizar_reporte_medico(trabajo['datos_paciente'], trabajo['datos_clinicos'])
+        madre = generador.renderizar_reporte_madre(trabajo['datos_paciente'], trabajo['plan_alimentario'])
+    except Exception as e:
+        return trabajo['id'], [], str(e)
+
+    return trabajo['id'], [
+        (f"{trabajo['id']}_medico.pdf", medico),
+        (f"{trabajo['id']}_cuidador.pdf", madre),
+    ], None
+
+
+# ════════════════════════════════════════════════════════════════════════════
+# ORQUESTACIÓN
+# ════════════════════════════════════════════════════════════════════════════
+
+def _directorio_trabajo(destino: Path, formato: str) -> Path:
+    """Directorio donde se escriben los PDFs (para ZIP, uno temporal al lado)"""
+    if formato == 'zip':
+        return destino.with_name(destino.stem + '.parcial')
+    return destino
+
+
+def _leer_manifiesto(directorio: Path) -> set:
+    ruta = directorio / MANIFIESTO
+    if not ruta.exists():
+        return set()
+    return set(ruta.read_text(encoding='utf-8').split())
+
+
+def _renderizar(pendientes: List[Dict], procesos: int) -> Iterator[Tuple[str, List, Optional[str]]]:
+    """Render en el propio proceso (procesos=1) o en un pool 'spawn'"""
+    if procesos <= 1:
+        _inicializar_worker()
+        for trabajo in pendientes:
+            yield _renderizar_paciente(trabajo)
+        return
+
+    # spawn: seguro aunque el proceso padre tenga hilos (Streamlit, FastAPI)
+    contexto = multiprocessing.get_context('spawn')
+    tamano_bloque = max(1, min(16, len(pendientes) // (procesos * 8)))
+    with contexto.Pool(procesos, initializer=_inicializar_worker) as pool:
+        yield from pool.imap_unordered(_renderizar_paciente, pendientes, chunksize=tamano_bloque)
+
+
+def generar_reportes_lote(padron: pd.DataFrame, destino, formato: str = 'zip',
+                          procesos: Optional[int] = None,
+                          progreso: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Genera reporte médico y de cuidador para cada fila del padrón
+
+    Args:
+        padron: DataFrame de pacientes (ver cargar_padron)
+        destino: Archivo .zip (formato='zip') o directorio (formato='directorio')
+        formato: 'zip' o 'directorio'
+        procesos: Procesos de render (None = núcleos disponibles)
+        progreso: Callback (hechos, total) por paciente terminado
+
+    Returns:
+        Resumen con pacientes, reportes, omitidos (ya hechos), errores
+        (render fallido o fila inválida), invalidos, duración y throughput
+        (reportes/s y reportes/s por núcleo). Las filas inválidas no impiden
+        armar el ZIP: re-ejecutar no las arregla
+    """
+    if formato not in FORMATOS_SALIDA:
+        raise ValueError(f"Formato inválido: {formato} (use {' o '.join(FORMATOS_SALIDA)})")
+
+    destino = Path(destino)
+    procesos = procesos or multiprocessing.cpu_count()
+    directorio = _directorio_trabajo(destino, formato)
+    directorio.mkdir(parents=True, exist_ok=True)
+
+    inicio = time.perf_counter()
+    trabajos = preparar_lote(padron)
+    invalidos = {t['id']: t['error'] for t in trabajos if 'error' in t}
+    completados = _leer_manifiesto(directorio)
+    pendientes = [t for t in trabajos if t['id'] not in completados and 'error' not in t]
+    omitidos = len(trabajos) - len(pendientes) - len(invalidos)
+    if omitidos:
+        logger.info(f"⏩ Reanudando: {omitidos:,} pacientes ya generados")
+
+    total = len(trabajos)
+    hechos = omitidos + len(invalidos)
+    reportes = 0
+    errores = {}
+    inicio_render = time.perf_counter()
+
+    with open(directorio / MANIFIESTO, 'a', encoding='utf-8') as manifiesto:
+        for id_paciente, archivos, error in _renderizar(pendientes, procesos):
+            if error:
+                errores[id_paciente] = error
+                logger.warning(f"⚠️ Reporte fallido para {id_paciente}: {error}")
+            else:
+                for nombre, contenido in archivos:
+                    escribir_atomico(contenido, directorio / nombre)
+                reportes += len(archivos)
+                # Solo se anota cuando ambos PDFs están en disco
+                manifiesto.write(f"{id_paciente}\n")
+                manifiesto.flush()
+            hechos += 1
+            if progreso:
+                progreso(hechos, total)
+
+    duracion_render = time.perf_counter() - inicio_render
+
+    if formato == 'zip' and not errores:
+        # PDFs ya comprimidos: ZIP_STORED evita recomprimir
+        temporal = destino.with_name(f".{destino.name}.tmp")
+        with zipfile.ZipFile(temporal, 'w', compression=zipfile.ZIP_STORED) as zf:
+            for ruta in sorted(directorio.glob('*.pdf')):
+                zf.write(ruta, ruta.name)
+        temporal.replace(destino)
+        shutil.rmtree(directorio)
+
+    duracion = time.perf_counter() - inicio
+    por_segundo = reportes / duracion_render if duracion_render > 0 else 0.0
+    resumen = {
+        'pacientes': total,
+        'reportes': reportes,
+        'omitidos': omitidos,
+        'errores': {**invalidos, **errores},
+        'invalidos': len(invalidos),
+        'destino': str(destino if formato == 'zip' and not errores else directorio),
+        'procesos': procesos,
+        'duracion_s': round(duracion, 2),
+        'reportes_por_segundo': round(por_segundo, 2),
+        'reportes_por_segundo_nucleo': round(por_segundo / procesos, 2),
+    }
+    logger.info(f"📦 Lote terminado: {reportes:,} reportes en {duracion:.1f} s "
+                f"({resumen['reportes_por_segundo']} rep/s, "
+                f"{resumen['reportes_por_segundo_nucleo']} rep/s/núcleo), {len(errores)} errores, "
+                f"{len(invalidos)} filas inválidas")
+    return resumen
+
+
+# ════════════════════════════════════════════════════════════════════════════
+# TRABAJOS EN SEGUNDO PLANO (API)
+# ════════════════════════════════════════════════════════════════════════════
+
+# Estado de cada trabajo en DIRECTORIO_LOTES/<id>.json y su padrón en
+# <id>.padron.csv: tras un reinicio, reanudar_trabajos() los retoma desde el
+# manifiesto como la CLI. En memoria solo quedan los trabajos activos.
+ESTADOS_ACTIVOS = ('pendiente', 'en_proceso')
+PATRON_TRABAJO_ID = re.compile(r'[0-9a-f]{12}')
+
+_trabajos: Dict[str, Dict[str, Any]] = {}
+_lock_trabajos = threading.Lock()
+
+
+def _ruta_estado(trabajo_id: str) -> Path:
+    return DIRECTORIO_LOTES / f"{trabajo_id}.json"
+
+
+def _ruta_padron(trabajo_id: str) -> Path:
+    return DIRECTORIO_LOTES / f"{trabajo_id}.padron.csv"
+
+
+def _publico(trabajo: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in trabajo.items() if not k.startswith('_')}
+
+
+def _guardar_estado(trabajo: Dict[str, Any]):
+    contenido = json.dumps(_publico(trabajo), ensure_ascii=False, default=str)
+    escribir_atomico(contenido.encode('utf-8'), _ruta_estado(trabajo['trabajo_id']))
+
+
+def _leer_estado(trabajo_id: str) -> Optional[Dict[str, Any]]:
+    if not PATRON_TRABAJO_ID.fullmatch(trabajo_id):
+        return None
+    ruta = _ruta_estado(trabajo_id)
+    if not ruta.exists():
+        return None
+    return json.loads(ruta.read_text(encoding='utf-8'))
+
+
+def crear_trabajo(padron: pd.DataFrame, formato: str = 'zip') -> str:
+    """Registra un trabajo de lote y devuelve su id (se ejecuta con ejecutar_trabajo)"""
+    if formato not in FORMATOS_SALIDA:
+        raise ValueError(f"Formato inválido: {formato}")
+
+    trabajo_id = uuid.uuid4().hex[:12]
+    destino = DIRECTORIO_LOTES / (f"{trabajo_id}.zip" if formato == 'zip' else trabajo_id)
+    trabajo = {
+        'trabajo_id': trabajo_id,
+        'estado': 'pendiente',
+        'formato': formato,
+        'destino': str(destino),
+        'hechos': 0,
+        'total': len(padron),
+        'resumen': None,
+        'error': None,
+        '_padron': padron,
+    }
+    # Padrón antes que el estado: un estado pendiente siempre tiene su padrón
+    escribir_atomico(padron.to_csv(index=False).encode('utf-8'), _ruta_padron(trabajo_id))
+    _guardar_estado(trabajo)
+    with _lock_trabajos:
+        _trabajos[trabajo_id] = trabajo
+    return trabajo_id
+
+
+def ejecutar_trabajo(trabajo_id: str, procesos: Optional[int] = None):
+    """
+    Ejecuta un trabajo registrado actualizando su progreso
+
+    El progreso se ve en memoria mientras corre; al terminar, el estado
+    queda solo en disco (el trabajo sale de _trabajos).
+    """
+    with _lock_trabajos:
+        trabajo = _trabajos.get(trabajo_id) or _leer_estado(trabajo_id)
+        if trabajo is None:
+            raise KeyError(f"Trabajo no encontrado: {trabajo_id}")
+        _trabajos[trabajo_id] = trabajo
+
+    def progreso(hechos, total):
+        trabajo['hechos'] = hechos
+        trabajo['total'] = total
+
+    trabajo['estado'] = 'en_proceso'
+    try:
+        padron = trabajo.pop('_padron', None)
+        if padron is None:
+            padron = cargar_padron(_ruta_padron(trabajo_id))
+        _guardar_estado(trabajo)
+        trabajo['resumen'] = generar_reportes_lote(
+            padron, trabajo['destino'], trabajo['formato'], procesos, progreso
+        )
+        trabajo['estado'] = 'completado' if not trabajo['resumen']['errores'] else 'completado_con_errores'
+    except Exception as e:
+        logger.error(f"❌ Error en lote {trabajo_id}: {e}", exc_info=True)
+        trabajo['estado'] = 'error'
+        trabajo['error'] = str(e)
+    finally:
+        _guardar_estado(trabajo)
+        _ruta_padron(trabajo_id).unlink(missing_ok=True)
+        with _lock_trabajos:
+            _trabajos.pop(trabajo_id, None)
+
+
+def reanudar_trabajos(procesos: Optional[int] = None) -> List[str]:
+    """
+    Retoma los trabajos que un reinicio dejó pendientes o en proceso
+
+    Los reportes ya anotados en el manifiesto no se repiten. Pensado para
+    correr una vez al arrancar la API, en un hilo aparte.
+
+    Returns:
+        Ids de los trabajos reanudados
+    """
+    reanudados = []
+    for ruta in sorted(DIRECTORIO_LOTES.glob('*.json')):
+        trabajo_id = ruta.stem
+        with _lock_trabajos:
+            if trabajo_id in _trabajos:
+                continue
+        estado = _leer_estado(trabajo_id)
+        if estado is None or estado.get('estado') not in ESTADOS_ACTIVOS \
+                or not _ruta_padron(trabajo_id).exists():
+            continue
+        logger.info(f"⏩ Reanudando lote {trabajo_id} ({estado.get('hechos', 0)}/{estado.get('total', 0)})")
+        ejecutar_trabajo(trabajo_id, procesos)
+        reanudados.append(trabajo_id)
+    return reanudados
+
+
+def estado_trabajo(trabajo_id: str) -> Optional[Dict[str, Any]]:
+    """Estado público de un trabajo (None si no existe)"""
+    with _lock_trabajos:
+        trabajo = _trabajos.get(trabajo_id)
+        if trabajo is not None:
+            return _publico(trabajo)
+    return _leer_estado(trabajo_id)
@@ -0,0 +1,295 @@
+"""
+services/seguimiento_cohorte.py
+Detección de cambios sobre todos los historiales de pacientes
+
+Produce la lista de trabajo diaria del puesto de salud: niños con Hb en
+descenso, CRED vencido o riesgo en aumento. Las métricas por paciente
+(deltas, pendientes por mínimos cuadrados, última visita) se calculan con
+operaciones vectorizadas por grupo y se guardan; cada actualización solo
+recalcula los pacientes con consultas nuevas en el historial.
+"""
+
+import os
+import pickle
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.historial import HISTORIAL_DIR, get_historial_store
+
+logger = logging.getLogger(__name__)
+
+
+SEGUIMIENTO_PATH = HISTORIAL_DIR / "seguimiento.pkl"
+IDS_POR_CONSULTA = 5000  # pacientes por query (límite de parámetros SQLite)
+
+# Intervalo CRED esperado según edad (NTS 137-MINSA) + margen de tolerancia
+INTERVALO_CRED_DIAS = [(12, 30), (24, 60), (60, 90)]  # (edad_meses <, días)
+GRACIA_CRED_DIAS = 15
+
+# Umbrales para que un cambio se considere relevante
+UMBRAL_CAIDA_HB = 0.3          # g/dL entre las dos últimas consultas
+UMBRAL_PENDIENTE_HB = -0.2     # g/dL por mes
+UMBRAL_SUBIDA_RIESGO = 0.05    # probabilidad (5 pp)
+
+# Peso de cada señal en la prioridad de la lista de trabajo
+PESOS_PRIORIDAD = {
+    'caida_hb': 2.0,        # por g/dL perdido
+    'pendiente_hb': 4.0,    # por g/dL/mes de descenso
+    'subida_riesgo': 10.0,  # por unidad de probabilidad (0.1 → 1 punto)
+    'cred_vencido': 1.0,
+    'anemia_actual': 1.0,
+}
+
+
+def _pendiente_por_grupo(codigos: np.ndarray, n_grupos: int, t: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Pendiente de mínimos cuadrados y ~ t por grupo con sumas acumuladas
+    (NaN en y se ignora; NaN si el grupo tiene < 2 puntos o t constante)
+    """
+    valido = ~np.isnan(y)
+    w = valido.astype(float)
+    y0 = np.where(valido, y, 0.0)
+
+    n = np.bincount(codigos, weights=w, minlength=n_grupos)
+    st = np.bincount(codigos, weights=t * w, minlength=n_grupos)
+    sy = np.bincount(codigos, weights=y0, minlength=n_grupos)
+    stt = np.bincount(codigos, weights=t * t * w, minlength=n_grupos)
+    sty = np.bincount(codigos, weights=t * y0, minlength=n_grupos)
+
+    denominador = n * stt - st * st
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pendiente = (n * sty - st * sy) / denominador
+    pendiente[(n < 2) | (np.abs(denominador) < 1e-9)] = np.nan
+    return pendiente
+
+
+def calcular_metricas(consultas: pd.DataFrame) -> pd.DataFrame:
+    """
+    Métricas por paciente a partir de sus consultas
+
+    Args:
+        consultas: DataFrame de HistorialStore.consultas_periodo
+                   (ordenado por id_paciente, fecha)
+
+    Returns:
+        DataFrame indexado por id_paciente con n_consultas, fecha_ultima,
+        hb_ultima, delta_hb, pendiente_hb_mes, riesgo_ultimo, delta_riesgo,
+        pendiente_riesgo_mes, edad_meses, asiste_cred y tiene_anemia
+    """
+    if consultas.empty:
+        return pd.DataFrame()
+
+    consultas = consultas.sort_values(['id_paciente', 'fecha'], kind='stable')
+    codigos, pacientes = pd.factorize(consultas['id_paciente'], sort=False)
+    n_grupos = len(pacientes)
+
+    fechas = pd.to_datetime(consultas['fecha'], format='ISO8601')
+    dias = (fechas - fechas.min()).dt.total_seconds().to_numpy() / 86400
+
+    n = np.bincount(codigos, minlength=n_grupos)
+    ultimo = np.cumsum(n) - 1
+    previo = np.where(n >= 2, ultimo - 1, ultimo)
+
+    # Tiempo relativo a la primera consulta del paciente (estabilidad numérica)
+    inicio = ultimo - n + 1
+    t = dias - dias[inicio][codigos]
+
+    # Hb ajustada por altitud si está registrada (comparable entre sedes)
+    hb = consultas['hemoglobina_ajustada'].fillna(consultas['hemoglobina']).to_numpy(dtype=float)
+    riesgo = consultas['score_riesgo'].to_numpy(dtype=float)
+    con_previa = n >= 2
+
+    metricas = pd.DataFrame({
+        'n_consultas': n,
+        'fecha_ultima': fechas.to_numpy()[ultimo],
+        'hb_ultima': hb[ultimo],
+        'delta_hb': np.where(con_previa, hb[ultimo] - hb[previo], np.nan),
+        'pendiente_hb_mes': _pendiente_por_grupo(codigos, n_grupos, t, hb) * 30,
+        'riesgo_ultimo': riesgo[ultimo],
+        'delta_riesgo': np.where(con_previa, riesgo[ultimo] - riesgo[previo], np.nan),
+        'pendiente_riesgo_mes': _pendiente_por_grupo(codigos, n_grupos, t, riesgo) * 30,
+        'edad_meses': consultas['edad_meses'].to_numpy(dtype=float)[ultimo],
+        'asiste_cred': consultas['asiste_cred'].to_numpy(dtype=object)[ultimo],
+        'tiene_anemia': consultas['tiene_anemia'].to_numpy(dtype=object)[ultimo],
+    }, index=pd.Index(pacientes, name='id_paciente'))
+
+    return metricas
+
+
+class DetectorCambios:
+    """
+    Lista de trabajo incremental sobre el historial de consultas
+
+    El estado (métricas por paciente + último id de consulta procesado)
+    se guarda en data/historial/seguimiento.pkl. Si el historial aplicó
+    retención desde la última actualización, se recalcula todo.
+    """
+
+    def __init__(self, store=None, ruta_estado: Optional[Path] = SEGUIMIENTO_PATH):
+        """
+        Args:
+            store: HistorialStore (default: instancia global)
+            ruta_estado: Archivo de estado (None = solo en memoria)
+        """
+        self.store = store or get_historial_store()
+        self.ruta_estado = Path(ruta_estado) if ruta_estado else None
+        self._ultimo_id = 0
+        self._marca_retencion = None
+        self._metricas = pd.DataFrame()
+        self._cargar_estado()
+
+    def _cargar_estado(self):
+        if self.ruta_estado is None or not self.ruta_estado.exists():
+            return
+        try:
+            with open(self.ruta_estado, 'rb') as f:
+                estado = pickle.load(f)
+            self._ultimo_id = estado['ultimo_id']
+            self._metricas = estado['metricas']
+            self._marca_retencion = estado.get('marca_retencion')
+        except Exception as e:
+            logger.warning(f"⚠️ Estado de seguimiento ilegible, se recalculará: {e}")
+
+    def _guardar_estado(self):
+        if self.ruta_estado is None:
+            return
+        self.ruta_estado.parent.mkdir(parents=True, exist_ok=True)
+        temporal = self.ruta_estado.with_name(f".{self.ruta_estado.name}.{os.getpid()}.tmp")
+        with open(temporal, 'wb') as f:
+            pickle.dump({'ultimo_id': self._ultimo_id, 'metricas': self._metricas,
+                         'marca_retencion': self._marca_retencion}, f)
+        os.replace(temporal, self.ruta_estado)
+
+    def actualizar(self, completo: bool = False) -> int:
+        """
+        Recalcula las métricas de los pacientes con consultas nuevas
+
+        Args:
+            completo: Recalcular todos los pacientes (p. ej. tras aplicar
+                      retención en el historial)
+
+        Returns:
+            Número de pacientes recalculados
+        """
+        marca = self.store.marca_retencion()
+        if marca != self._marca_retencion:
+            completo = True
+        pacientes, maximo = self.store.pacientes_modificados(0 if completo else self._ultimo_id)
+        if completo:
+            self._metricas = pd.DataFrame()
+        self._marca_retencion = marca
+        if not pacientes:
+            self._ultimo_id = maximo
+            if completo:
+                self._guardar_estado()
+            return 0
+
+        nuevas = []
+        for i in range(0, len(pacientes), IDS_POR_CONSULTA):
+            consultas = self.store.consultas_periodo(ids=pacientes[i:i + IDS_POR_CONSULTA])
+            nuevas.append(calcular_metricas(consultas))
+        nuevas = pd.concat(nuevas)
+
+        if self._metricas.empty:
+            self._metricas = nuevas
+        else:
+            self._metricas = pd.concat([self._metricas.drop(nuevas.index, errors='ignore'), nuevas])
+
+        self._ultimo_id = maximo
+        self._guardar_estado()
+        logger.info(f"🔄 Seguimiento: {len(nuevas):,} pacientes recalculados "
+                    f"({len(self._metricas):,} en total)")
+        return len(nuevas)
+
+    @staticmethod
+    def _intervalo_cred(edad_meses: np.ndarray) -> np.ndarray:
+        condiciones = [edad_meses < limite for limite, _ in INTERVALO_CRED_DIAS]
+        return np.select(condiciones, [dias for _, dias in INTERVALO_CRED_DIAS],
+                         default=INTERVALO_CRED_DIAS[-1][1])
+
+    def lista_trabajo(self, hoy: Optional[datetime] = None, top: Optional[int] = None,
+                      actualizar: bool = True) -> pd.DataFrame:
+        """
+        Lista priorizada de niños que requieren seguimiento
+
+        Args:
+            hoy: Fecha de referencia (default: ahora)
+            top: Limitar a los N de mayor prioridad
+            actualizar: Procesar antes las consultas nuevas
+
+        Returns:
+            DataFrame ordenado por prioridad con métricas, señales
+            (caida_hb, pendiente_negativa, riesgo_en_aumento, cred_vencido),
+            dias_desde_ultima y motivos legibles
+        """
+        if actualizar:
+            self.actualizar()
+        if self._metricas.empty:
+            return pd.DataFrame()
+
+        m = self._metricas
+        hoy = pd.Timestamp(hoy or datetime.now())
+        dias_desde = (hoy - pd.to_datetime(m['fecha_ultima'])).dt.days.to_numpy()
+
+        # Edad actual estimada (la última registrada + tiempo transcurrido)
+        edad_actual = m['edad_meses'].fillna(24).to_numpy() + dias_desde / 30.4
+        sin_cred = (m['asiste_cred'] == False).to_numpy()  # noqa: E712 (None = sin dato)
+        cred_vencido = (dias_desde > self._intervalo_cred(edad_actual) + GRACIA_CRED_DIAS) | sin_cred
+
+        caida = np.nan_to_num(-m['delta_hb'].to_numpy(), nan=0.0)
+        descenso = np.nan_to_num(-m['pendiente_hb_mes'].to_numpy(), nan=0.0)
+        subida_riesgo = np.nan_to_num(m['delta_riesgo'].to_numpy(), nan=0.0)
+        anemia = (m['tiene_anemia'] == True).to_numpy()  # noqa: E712
+
+        senales = pd.DataFrame({
+            'caida_hb': caida >= UMBRAL_CAIDA_HB,
+            'pendiente_negativa': -descenso <= UMBRAL_PENDIENTE_HB,
+            'riesgo_en_aumento': subida_riesgo >= UMBRAL_SUBIDA_RIESGO,
+            'cred_vencido': cred_vencido,
+        }, index=m.index)
+
+        prioridad = (
+            PESOS_PRIORIDAD['caida_hb'] * caida * senales['caida_hb'] +
+            PESOS_PRIORIDAD['pendiente_hb'] * descenso * senales['pendiente_negativa'] +
+            PESOS_PRIORIDAD['subida_riesgo'] * subida_riesgo * senales['riesgo_en_aumento'] +
+            PESOS_PRIORIDAD['cred_vencido'] * senales['cred_vencido'] +
+            PESOS_PRIORIDAD['anemia_actual'] * anemia * senales.any(axis=1)
+        )
+
+        lista = m.assign(dias_desde_ultima=dias_desde, prioridad=prioridad.round(2)).join(senales)
+        lista = lista[senales.any(axis=1)].sort_values(['prioridad', 'dias_desde_ultima'], ascending=False)
+        if top:
+            lista = lista.head(top)
+
+        lista['motivos'] = [self._motivos(fila) for fila in lista.itertuples()]
+        return lista.reset_index()
+
+    @staticmethod
+    def _motivos(fila) -> List[str]:
+        motivos = []
+        if fila.caida_hb:
+            motivos.append(f"🩸 Hb bajó {-fila.delta_hb:.1f} g/dL")
+        if fila.pendiente_negativa:
+            motivos.append(f"📉 Tendencia Hb {fila.pendiente_hb_mes:+.2f} g/dL/mes")
+        if fila.riesgo_en_aumento:
+            motivos.append(f"⚠️ Riesgo +{fila.delta_riesgo * 100:.0f} pp")
+        if fila.cred_vencido:
+            motivos.append(f"📅 CRED vencido ({fila.dias_desde_ultima} días sin control)")
+        return motivos
+
+
+# Instancia global (singleton pattern)
+_detector_instance = None
+
+
+def get_detector_cambios() -> DetectorCambios:
+    """Factory para obtener instancia única del detector de cambios"""
+    global _detector_instance
+    if _detector_instance is None:
+        _detector_instance = DetectorCambios()
+    return _detector_instance
@@ -0,0 +1,282 @@
+"""
+services/simulador_poblacional.py
+Simulador de Intervenciones a Escala Poblacional
+Aplica escenarios (suplementación, menús, adherencia, CRED) sobre filas
+reales del SIEN como arrays vectorizados y re-evalúa el riesgo proyectado
+con el predictor por lote
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+import logging
+
+from services.predictor import anemia_predictor
+from services.simulator import SimuladorIntervencion
+from utils.data_loader import data_loader
+
+logger = logging.getLogger(__name__)
+
+
+# Columnas SIEN → claves que entiende el predictor
+MAPEO_COLUMNAS_SIEN = {
+    'EdadMeses': 'edad_meses',
+    'Hemoglobina': 'hemoglobina',
+    'AlturaREN': 'altitud',
+    'suplementacion_bin': 'recibe_suplemento',
+    'cred_bin': 'asiste_cred',
+    'Juntos_num': 'tiene_juntos',
+    'SIS_num': 'tiene_sis',
+    'Qaliwarma_num': 'tiene_qaliwarma',
+    'DepartamentoREN': 'departamento',
+    'ProvinciaREN': 'provincia',
+    'DistritoREN': 'distrito',
+}
+
+
+class SimuladorPoblacional:
+    """
+    Simula escenarios de intervención sobre la cohorte SIEN completa
+    y estima casos de anemia evitados por región
+    """
+
+    # Escenarios predefinidos (coberturas objetivo como fracción 0-1)
+    ESCENARIOS = {
+        'statu_quo': {
+            'cobertura_suplemento': None,
+            'adopcion_menu': 0.0,
+            'adherencia': 'media',
+            'asistencia_cred': None
+        },
+        'suplementacion_universal': {
+            'cobertura_suplemento': 0.90,
+            'adopcion_menu': 0.0,
+            'adherencia': 'media',
+            'asistencia_cred': None
+        },
+        'menus_comunitarios': {
+            'cobertura_suplemento': None,
+            'adopcion_menu': 0.60,
+            'adherencia': 'media',
+            'asistencia_cred': None
+        },
+        'cred_reforzado': {
+            'cobertura_suplemento': None,
+            'adopcion_menu': 0.0,
+            'adherencia': 'alta',
+            'asistencia_cred': 0.90
+        },
+        'intervencion_integral': {
+            'cobertura_suplemento': 0.90,
+            'adopcion_menu': 0.60,
+            'adherencia': 'alta',
+            'asistencia_cred': 0.90
+        },
+    }
+
+    # Sin seguimiento CRED la adherencia efectiva al suplemento cae
+    FACTOR_SIN_CRED = 0.7
+
+    def __init__(self, predictor=None, cohorte: Optional[pd.DataFrame] = None):
+        """
+        Args:
+            predictor: Instancia de AnemiaPredictor (default: global)
+            cohorte: DataFrame SIEN ya cargado (default: sien_nacional_procesado.csv)
+        """
+        self.predictor = predictor or anemia_predictor
+        self.parametros = SimuladorIntervencion()
+        self._cohorte = self._normalizar_cohorte(cohorte) if cohorte is not None else None
+        self._cache_base = {}
+
+    @property
+    def cohorte(self) -> pd.DataFrame:
+        """Cohorte SIEN normalizada (carga perezosa)"""
+        if self._cohorte is None:
+            df = data_loader.load_sien_nacional()
+            if df is None:
+                raise FileNotFoundError("sien_nacional_procesado.csv no disponible")
+            self._cohorte = self._normalizar_cohorte(df)
+        return self._cohorte
+
+    @staticmethod
+    def _normalizar_cohorte(df: pd.DataFrame) -> pd.DataFrame:
+        """Renombra columnas SIEN y completa valores por defecto"""
+        df = df.rename(columns={k: v for k, v in MAPEO_COLUMNAS_SIEN.items() if k in df.columns})
+
+        defectos = {
+            'edad_meses': 12, 'hemoglobina': np.nan, 'altitud': 0,
+            'recibe_suplemento': 0, 'asiste_cred': 1, 'area_rural': 0,
+            'departamento': 'OTRO'
+        }
+        for col, valor in defectos.items():
+            if col not in df.columns:
+                df[col] = valor
+
+        df = df[df['hemoglobina'].notna()].copy()
+        df['altitud'] = df['altitud'].fillna(1500)
+        for col in ['recibe_suplemento', 'asiste_cred', 'area_rural']:
+            df[col] = df[col].fillna(0).astype(bool)
+        df['departamento'] = df['departamento'].astype(str).str.upper()
+        return df.reset_index(drop=True)
+
+    def filtrar(self, departamento: Optional[str] = None, distrito: Optional[str] = None,
+                edad_min: int = 6, edad_max: int = 59) -> pd.DataFrame:
+        """Filtra la cohorte por departamento, distrito y banda de edad"""
+        df = self.cohorte
+        mascara = df['edad_meses'].between(edad_min, edad_max).to_numpy().copy()
+        if departamento:
+            mascara &= (df['departamento'] == departamento.upper()).to_numpy()
+        if distrito and 'distrito' in df.columns:
+            mascara &= (df['distrito'].astype(str).str.upper() == distrito.upper()).to_numpy()
+        return df[mascara]
+
+    def _proyectar(self, df: pd.DataFrame, suplemento: np.ndarray, menu: np.ndarray,
+                   cred: np.ndarray, adherencia: str, meses: int) -> np.ndarray:
+        """Hb proyectada a `meses` con los parámetros de SimuladorIntervencion"""
+        p = self.parametros
+        semanas = meses * 30 / 7
+
+        edad = df['edad_meses'].to_numpy()
+        factor_edad = np.select(
+            [(edad >= 6) & (edad <= 11), (edad >= 12) & (edad <= 23)],
+            [p.FACTOR_EDAD['6-11_meses'], p.FACTOR_EDAD['12-23_meses']],
+            default=p.FACTOR_EDAD['24-59_meses']
+        )
+        factor_adherencia = p.FACTOR_ADHERENCIA.get(adherencia, 1.0)
+        factor_cred = np.where(cred, 1.0, self.FACTOR_SIN_CRED)
+
+        incremento = (
+            suplemento * p.INCREMENTO_BASE_SUPLEMENTACION * factor_cred +
+            menu * p.INCREMENTO_BASE_ALIMENTACION
+        ) * factor_adherencia * factor_edad * (semanas / 6.0)
+
+        return df['hemoglobina'].to_numpy(dtype=float) + incremento
+
+    def _casos_esperados(self, df: pd.DataFrame, hb_proyectada: np.ndarray,
+                         suplemento: np.ndarray, cred: np.ndarray) -> np.ndarray:
+        """
+        Probabilidad de anemia por niño con el predictor por lote
+
+        Se puntúa con la cobertura del escenario (suplemento / CRED), no con
+        la actual: un niño recién cubierto deja de sumar esos factores de riesgo.
+        """
+        futuros = df.assign(hemoglobina=hb_proyectada,
+                            recibe_suplemento=np.asarray(suplemento).astype(bool),
+                            asiste_cred=np.asarray(cred).astype(bool))
+        pred = self.predictor.predecir_ml_lote(futuros)
+        if pred is not None:
+            return pred['probabilidad'].to_numpy()
+
+        # Sin modelo ML: criterio clínico OMS sobre Hb ajustada por altitud
+        hb_ajustada = self.predictor.ajustar_hemoglobina_altitud_lote(
+            hb_proyectada, df['altitud'].to_numpy()
+        )
+        return (hb_ajustada < 11.0).astype(float)
+
+    def simular(self, escenario, departamento: Optional[str] = None,
+                distrito: Optional[str] = None, edad_min: int = 6, edad_max: int = 59,
+                meses: int = 3, agrupar_por: str = 'departamento',
+                semilla: Optional[int] = 42) -> pd.DataFrame:
+        """
+        Aplica un escenario a la cohorte filtrada
+
+        Args:
+            escenario: Nombre en ESCENARIOS o dict con cobertura_suplemento,
+                       adopcion_menu, adherencia ('alta'|'media'|'baja') y
+                       asistencia_cred (None = mantener situación actual)
+            departamento, distrito, edad_min, edad_max: Filtros de cohorte
+            meses: Horizonte de proyección
+            agrupar_por: Columna de región para el reporte
+            semilla: Semilla para asignar qué niños alcanza la intervención
+
+        Returns:
+            DataFrame por región con niños, casos esperados (base y escenario),
+            casos evitados y prevalencias proyectadas
+        """
+        nombre = escenario if isinstance(escenario, str) else escenario.get('nombre', 'personalizado')
+        params = self.ESCENARIOS[escenario] if isinstance(escenario, str) else escenario
+
+        df = self.filtrar(departamento, distrito, edad_min, edad_max)
+        if df.empty:
+            return pd.DataFrame()
+
+        rng = np.random.default_rng(semilla)
+        n = len(df)
+
+        # Situación actual (statu quo), cacheada por filtro
+        clave = (departamento, distrito, edad_min, edad_max, meses)
+        if clave not in self._cache_base:
+            suplemento_base, cred_base = df['recibe_suplemento'].to_numpy(), df['asiste_cred'].to_numpy()
+            hb_base = self._proyectar(df, suplemento_base, np.zeros(n), cred_base, 'media', meses)
+            self._cache_base[clave] = self._casos_esperados(df, hb_base, suplemento_base, cred_base)
+        prob_base = self._cache_base[clave]
+
+        suplemento = self._asignar(df['recibe_suplemento'].to_numpy(),
+                                   params.get('cobertura_suplemento'), rng)
+        cred = self._asignar(df['asiste_cred'].to_numpy(),
+                             params.get('asistencia_cred'), rng)
+        menu = rng.random(n) < params.get('adopcion_menu', 0.0)
+
+        hb_escenario = self._proyectar(df, suplemento, menu, cred,
+                                       params.get('adherencia', 'media'), meses)
+        prob_escenario = self._casos_esperados(df, hb_escenario, suplemento, cred)
+
+        resumen = pd.DataFrame({
+            'region': df[agrupar_por].to_numpy() if agrupar_por in df.columns else 'TOTAL',
+            'ninos': 1,
+            'casos_base': prob_base,
+            'casos_escenario': prob_escenario,
+        }).groupby('region', sort=False).sum()
+
+        resumen['casos_evitados'] = resumen['casos_base'] - resumen['casos_escenario']
+        resumen['prevalencia_base_pct'] = resumen['casos_base'] / resumen['ninos'] * 100
+        resumen['prevalencia_escenario_pct'] = resumen['casos_escenario'] / resumen['ninos'] * 100
+        resumen['escenario'] = nombre
+
+        logger.info(f"🌎 Escenario '{nombre}': {n:,} niños, "
+                    f"{resumen['casos_evitados'].sum():,.0f} casos evitados a {meses} meses")
+
+        return resumen.reset_index().round(2).sort_values('casos_evitados', ascending=False)
+
+    @staticmethod
+    def _asignar(actual: np.ndarray, cobertura: Optional[float],
+                 rng: np.random.Generator) -> np.ndarray:
+        """
+        Eleva la cobertura actual hasta `cobertura` sorteando entre quienes
+        aún no la tienen (None = mantener situación actual)
+        """
+        actual = actual.astype(bool)
+        if cobertura is None or len(actual) == 0:
+            return actual
+        cobertura_actual = actual.mean()
+        if cobertura <= cobertura_actual:
+            return actual
+        p_nuevos = (cobertura - cobertura_actual) / (1 - cobertura_actual)
+        return actual | (rng.random(len(actual)) < p_nuevos)
+
+    def comparar_escenarios(self, escenarios: Optional[List] = None, **filtros) -> pd.DataFrame:
+        """
+        Ejecuta varios escenarios con los mismos filtros
+
+        Returns:
+            DataFrame largo (región × escenario) con casos evitados
+        """
+        escenarios = escenarios or [e for e in self.ESCENARIOS if e != 'statu_quo']
+        resultados = [self.simular(e, **filtros) for e in escenarios]
+        resultados = [r for r in resultados if not r.empty]
+        if not resultados:
+            return pd.DataFrame()
+        return pd.concat(resultados, ignore_index=True)
+
+
+# Instancia global (singleton pattern)
+_simulador_poblacional_instance = None
+
+
+def get_simulador_poblacional() -> SimuladorPoblacional:
+    """Factory para obtener instancia única del simulador poblacional"""
+    global _simulador_poblacional_instance
+    if _simulador_poblacional_instance is None:
+        _simulador_poblacional_instance = SimuladorPoblacional()
+        logger.info("🌎 Simulador poblacional creado (primera vez)")
+    return _simulador_poblacional_instance
@@ -5,6 +5,7 @@ Calcula el cambio esperado en hemoglobina según intervenciones
 """
 
 import numpy as np
+import pandas as pd
 from datetime import datetime, timedelta
 
 class SimuladorIntervencion:
@@ -57,12 +58,7 @@ class SimuladorIntervencion:
         """
 
         # Determinar grupo etario
-        if 6 <= edad_meses <= 11:
-            grupo_edad = '6-11_meses'
-        elif 12 <= edad_meses <= 23:
-            grupo_edad = '12-23_meses'
-        else:
-            grupo_edad = '24-59_meses'
+        grupo_edad = self._grupo_edad(edad_meses)
 
         # Calcular incremento esperado
         incremento_total = 0.0
@@ -124,6 +120,78 @@ class SimuladorIntervencion:
             'adherencia': adherencia
         }
 
+    @staticmethod
+    def _grupo_edad(edad_meses):
+        """Determina el grupo etario usado en FACTOR_EDAD"""
+        if 6 <= edad_meses <= 11:
+            return '6-11_meses'
+        elif 12 <= edad_meses <= 23:
+            return '12-23_meses'
+        return '24-59_meses'
+
+    def simular_grilla(self, hb_actual, semanas=range(0, 9), grupos_edad=None):
+        """
+        Evalúa la grilla cartesiana completa de escenarios en un solo
+        cálculo vectorizado (broadcasting):
+        suplementación × alimentación × adherencia × grupo etario × semana
+
+        Args:
+            hb_actual: Hemoglobina actual en g/dL
+            semanas: Semanas a proyectar (default 0 a 8)
+            grupos_edad: Subconjunto de FACTOR_EDAD (default: todos)
+
+        Returns:
+            DataFrame ordenado con una fila por combinación. Igual que en
+            simular_escenario, incremento_suplementacion e
+            incremento_alimentacion son el aporte a 6 semanas; solo
+            incremento_total se escala por semana / 6
+        """
+        grupos_edad = list(grupos_edad or self.FACTOR_EDAD)
+        niveles_adherencia = list(self.FACTOR_ADHERENCIA)
+
+        supl = np.array([False, True])
+        alim = np.array([False, True])
+        f_adh = np.array([self.FACTOR_ADHERENCIA[a] for a in niveles_adherencia])
+        f_edad = np.array([self.FACTOR_EDAD[g] for g in grupos_edad])
+        sem = np.asarray(list(semanas), dtype=float)
+
+        # Ejes: (supl, alim, adherencia, grupo_edad, semana)
+        factor = f_adh[None, None, :, None, None] * f_edad[None, None, None, :, None]
+        forma = (len(supl), len(alim), len(f_adh), len(f_edad), len(sem))
+        inc_supl = np.broadcast_to(
+            supl[:, None, None, None, None] * self.INCREMENTO_BASE_SUPLEMENTACION * factor, forma
+        )
+        inc_alim = np.broadcast_to(
+            alim[None, :, None, None, None] * self.INCREMENTO_BASE_ALIMENTACION * factor, forma
+        )
+        inc_total = (inc_supl + inc_alim) * (sem / 6.0)[None, None, None, None, :]
+
+        idx = np.meshgrid(
+            np.arange(len(supl)), np.arange(len(alim)), np.arange(len(f_adh)),
+            np.arange(len(f_edad)), np.arange(len(sem)), indexing='ij'
+        )
+        grilla = pd.DataFrame({
+            'suplementacion': supl[idx[0].ravel()],
+            'alimentacion_mejorada': alim[idx[1].ravel()],
+            'adherencia': np.array(niveles_adherencia)[idx[2].ravel()],
+            'grupo_edad': np.array(grupos_edad)[idx[3].ravel()],
+            'semana': sem[idx[4].ravel()].astype(int),
+            'incremento_suplementacion': inc_supl.ravel(),
+            'incremento_alimentacion': inc_alim.ravel(),
+            'incremento_total': inc_total.ravel(),
+        })
+        grilla['hb_proyectada'] = hb_actual + grilla['incremento_total']
+
+        condiciones = [
+            grilla['incremento_total'] >= 0.5,
+            grilla['incremento_total'] >= 0.3,
+            grilla['incremento_total'] >= 0.15
+        ]
+        grilla['nivel_mejora'] = np.select(condiciones, ["Excelente", "Muy Bueno", "Moderado"], default="Limitado")
+        grilla['emoji'] = np.select(condiciones, ["⭐⭐⭐", "⭐⭐", "⭐"], default="⚠️")
+
+        return grilla
+
     def comparar_escenarios(self, hb_actual, edad_meses):
         """
         Compara múltiples escenarios de intervención
@@ -131,41 +199,38 @@ class SimuladorIntervencion:
         Returns:
             dict con comparación de escenarios
         """
-
         escenarios = {
-            'sin_intervencion': self.simular_escenario(
-                hb_actual, edad_meses,
-                suplementacion=False,
-                alimentacion_mejorada=False,
-                adherencia='alta'
-            ),
-            'solo_suplementacion': self.simular_escenario(
-                hb_actual, edad_meses,
-                suplementacion=True,
-                alimentacion_mejorada=False,
-                adherencia='alta'
-            ),
-            'solo_alimentacion': self.simular_escenario(
-                hb_actual, edad_meses,
-                suplementacion=False,
-                alimentacion_mejorada=True,
-                adherencia='alta'
-            ),
-            'intervencion_completa': self.simular_escenario(
-                hb_actual, edad_meses,
-                suplementacion=True,
-                alimentacion_mejorada=True,
-                adherencia='alta'
-            ),
-            'intervencion_adherencia_media': self.simular_escenario(
-                hb_actual, edad_meses,
-                suplementacion=True,
-                alimentacion_mejorada=True,
-                adherencia='media'
-            )
+            'sin_intervencion': (False, False, 'alta'),
+            'solo_suplementacion': (True, False, 'alta'),
+            'solo_alimentacion': (False, True, 'alta'),
+            'intervencion_completa': (True, True, 'alta'),
+            'intervencion_adherencia_media': (True, True, 'media')
         }
 
-        return escenarios
+        grupo_edad = self._grupo_edad(edad_meses)
+        grilla = self.simular_grilla(
+            hb_actual, semanas=[6], grupos_edad=[grupo_edad]
+        ).set_index(['suplementacion', 'alimentacion_mejorada', 'adherencia'])
+
+        fecha_proyeccion = (datetime.now() + timedelta(weeks=6)).strftime('%d/%m/%Y')
+        resultados = {}
+        for nombre, clave in escenarios.items():
+            fila = grilla.loc[clave]
+            resultados[nombre] = {
+                'hb_actual': hb_actual,
+                'hb_proyectada': fila['hb_proyectada'],
+                'incremento_total': fila['incremento_total'],
+                'incremento_suplementacion': fila['incremento_suplementacion'],
+                'incremento_alimentacion': fila['incremento_alimentacion'],
+                'nivel_mejora': fila['nivel_mejora'],
+                'emoji': fila['emoji'],
+                'semanas': 6,
+                'fecha_proyeccion': fecha_proyeccion,
+                'grupo_edad': grupo_edad,
+                'adherencia': clave[2]
+            }
+
+        return resultados
 
     def generar_timeline(self, hb_actual, edad_meses, suplementacion=True, alimentacion_mejorada=True, adherencia='alta'):
         """
@@ -174,27 +239,17 @@ class SimuladorIntervencion:
         Returns:
             DataFrame con evolución proyectada
         """
-
-        import pandas as pd
-
-        semanas = list(range(0, 9))  # 0 a 8 semanas
-        proyecciones = []
-
-        for semana in semanas:
-            if semana == 0:
-                hb_proyectada = hb_actual
-            else:
-                resultado = self.simular_escenario(
-                    hb_actual, edad_meses,
-                    suplementacion, alimentacion_mejorada,
-                    adherencia, semana
-                )
-                hb_proyectada = resultado['hb_proyectada']
-
-            proyecciones.append({
-                'semana': semana,
-                'hemoglobina': hb_proyectada,
-                'fecha': (datetime.now() + timedelta(weeks=semana)).strftime('%d/%m')
-            })
-
-        return pd.DataFrame(proyecciones)
\ No newline at end of file
+        grilla = self.simular_grilla(hb_actual, semanas=range(0, 9),
+                                     grupos_edad=[self._grupo_edad(edad_meses)])
+        timeline = grilla[
+            (grilla['suplementacion'] == bool(suplementacion)) &
+            (grilla['alimentacion_mejorada'] == bool(alimentacion_mejorada)) &
+            (grilla['adherencia'] == adherencia)
+        ]
+
+        hoy = datetime.now()
+        return pd.DataFrame({
+            'semana': timeline['semana'].to_numpy(),
+            'hemoglobina': timeline['hb_proyectada'].to_numpy(),
+            'fecha': [(hoy + timedelta(weeks=int(w))).strftime('%d/%m') for w in timeline['semana']]
+        })
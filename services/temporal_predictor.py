@@ -8,8 +8,9 @@ Fecha: 2025-10-17
 Datatón Exprésate Perú con Datos 2025
 """
 import numpy as np
+import pandas as pd
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence
 import logging
 
 
@@ -32,6 +33,15 @@ class TemporalPredictor:
     FACTOR_ALTITUD = 1.2            # >3000m
     FACTOR_RURAL = 1.15             # Área rural
     
+    # Distribuciones por defecto para la proyección estocástica (Monte Carlo)
+    # ('normal', media, desviación) o ('beta', alfa, beta)
+    DISTRIBUCIONES_MC = {
+        'tasa_mejora_supl': ('normal', TASA_MEJORA_SUPL, 0.08),
+        'tasa_deterioro_base': ('normal', TASA_DETERIORO_BASE, 0.05),
+        'tasa_deterioro_leve': ('normal', TASA_DETERIORO_LEVE, 0.03),
+        'adherencia': ('beta', 8.0, 2.0),   # media 0.8
+    }
+    
     def __init__(self, modelo_actual):
         """
         Inicializa predictor temporal
@@ -80,68 +90,299 @@ class TemporalPredictor:
             # 4. Identificar factores de deterioro
             factores = self._identificar_factores_deterioro(datos_nino, hb_actual)
             
-            # 5. Generar calendario de controles
-            controles = self._generar_calendario_controles(meses, hb_actual, hb_proyectada)
+            return self._construir_proyeccion(
+                meses, prob_actual, prob_futura, hb_actual, hb_proyectada, factores
+            )
+            
+        except Exception as e:
+            logger.error(f"Error en predicción temporal: {e}")
+            return self._resultado_fallback(datos_nino, meses)
+    
+    def predecir_horizontes(self, datos_nino: Dict,
+                            horizontes: Sequence[int] = (1, 2, 3, 4, 5, 6)) -> Dict:
+        """
+        Predice la probabilidad de anemia para varios horizontes con una
+        sola llamada al modelo
+        
+        Apila la fila actual y una fila por horizonte (con la hemoglobina
+        proyectada) en una misma matriz y la evalúa con predecir_ml_lote.
+        
+        Args:
+            datos_nino: Dict con datos actuales del niño
+            horizontes: Meses a proyectar (ej. [1, 2, 3, 4, 5, 6])
+            
+        Returns:
+            Dict con 'trayectoria' (mes a mes, incluye mes 0 para gráficos y
+            calendarios) y 'proyecciones' (mes → mismo formato que predecir_futuro)
+        """
+        horizontes = sorted({int(m) for m in horizontes})
+        
+        try:
+            hb_actual = datos_nino['hemoglobina']
+            
+            # 1. Proyectar hemoglobina para todos los horizontes a la vez
+            hb_proyectadas = self._proyectar_hemoglobina(
+                hb_actual=hb_actual,
+                tiene_suplemento=datos_nino.get('recibe_suplemento', False),
+                asiste_cred=datos_nino.get('asiste_cred', True),
+                edad_meses=datos_nino.get('edad_meses', 12),
+                area_rural=datos_nino.get('area_rural', False),
+                altitud=datos_nino.get('altitud', 0),
+                meses=np.asarray(horizontes)
+            )
+            
+            # 2. Matriz única: fila actual + una fila por horizonte
+            filas = pd.DataFrame([datos_nino] * (len(horizontes) + 1))
+            filas['hemoglobina'] = np.concatenate([[hb_actual], hb_proyectadas])
+            
+            pred = self.modelo.predecir_ml_lote(filas)
+            if pred is not None:
+                probabilidades = pred['probabilidad'].to_numpy()
+                prob_actual = float(probabilidades[0])
+                probs_futuras = probabilidades[1:]
+            else:
+                prob_actual = self.modelo.calcular_riesgo(datos_nino)['probabilidad_anemia']
+                probs_futuras = np.full(len(horizontes), prob_actual * 1.2)
+            
+            # 3. Factores de deterioro (no dependen del horizonte)
+            factores = self._identificar_factores_deterioro(datos_nino, hb_actual)
+            
+            proyecciones = {
+                meses: self._construir_proyeccion(
+                    meses, prob_actual, float(prob), hb_actual, float(hb), factores
+                )
+                for meses, hb, prob in zip(horizontes, hb_proyectadas, probs_futuras)
+            }
             
-            # 6. Determinar tendencia
-            tendencia = self._determinar_tendencia(hb_actual, hb_proyectada, prob_actual, prob_futura)
+            # 4. Trayectoria mes a mes
+            hoy = datetime.now()
+            trayectoria = [{
+                'mes': 0,
+                'fecha': hoy.strftime('%d/%m/%Y'),
+                'hemoglobina': round(hb_actual, 2),
+                'probabilidad': round(prob_actual, 4),
+                'severidad': self._clasificar_severidad_futura(hb_actual)
+            }]
+            for meses, proyeccion in proyecciones.items():
+                trayectoria.append({
+                    'mes': meses,
+                    'fecha': (hoy + timedelta(days=30 * meses)).strftime('%d/%m/%Y'),
+                    'hemoglobina': proyeccion['hemoglobina_proyectada'],
+                    'probabilidad': proyeccion['probabilidad_futura'],
+                    'severidad': proyeccion['severidad_futura']
+                })
             
             return {
-                'meses_proyeccion': meses,
+                'horizontes': horizontes,
                 'probabilidad_actual': round(prob_actual, 4),
-                'probabilidad_futura': round(min(0.99, prob_futura), 4),
                 'hemoglobina_actual': round(hb_actual, 2),
-                'hemoglobina_proyectada': round(hb_proyectada, 2),
-                'delta_hemoglobina': round(hb_proyectada - hb_actual, 2),
-                'factores_deterioro': factores,
-                'controles_recomendados': controles,
-                'tendencia': tendencia['etiqueta'],
-                'tendencia_emoji': tendencia['emoji'],
-                'tendencia_color': tendencia.get('color', '#95a5a6'),
-                'cambio_probabilidad': round((prob_futura - prob_actual) * 100, 1),
-                'severidad_futura': self._clasificar_severidad_futura(hb_proyectada),
-                'nivel_urgencia': self._calcular_urgencia(hb_proyectada, prob_futura)
+                'trayectoria': trayectoria,
+                'proyecciones': proyecciones
             }
             
         except Exception as e:
-            logger.error(f"Error en predicción temporal: {e}")
-            return self._resultado_fallback(datos_nino, meses)
+            logger.error(f"Error en predicción multi-horizonte: {e}")
+            proyecciones = {m: self._resultado_fallback(datos_nino, m) for m in horizontes}
+            return {
+                'horizontes': horizontes,
+                'probabilidad_actual': 0.50,
+                'hemoglobina_actual': datos_nino.get('hemoglobina', 11.0),
+                'trayectoria': [],
+                'proyecciones': proyecciones
+            }
     
-    def _proyectar_hemoglobina(self, hb_actual: float, tiene_suplemento: bool,
-                                asiste_cred: bool, edad_meses: int, area_rural: bool,
-                                altitud: int, meses: int) -> float:
+    def predecir_bandas(self, cohorte, horizontes: Sequence[int] = (1, 2, 3, 4, 5, 6),
+                        n_simulaciones: int = 1000,
+                        percentiles: Sequence[float] = (5, 25, 50, 75, 95),
+                        distribuciones: Optional[Dict] = None,
+                        semilla: Optional[int] = None,
+                        filas_por_lote: int = 250_000) -> pd.DataFrame:
         """
-        Simula evolución de hemoglobina basado en factores de riesgo
-        Usa modelo epidemiológico simple pero efectivo
+        Proyección estocástica: bandas de incertidumbre de Hb y probabilidad
+        
+        Muestrea tasas de cambio y adherencia (ver DISTRIBUCIONES_MC) para
+        n_simulaciones escenarios por niño, evalúa todas las muestras con
+        predecir_ml_lote y resume cada mes con percentiles. Ninguna llamada
+        al modelo recibe más de `filas_por_lote` filas (niños × simulaciones
+        × horizontes): la cohorte se agrupa en lotes de niños y, si un solo
+        niño ya supera el límite, sus simulaciones se evalúan en varios
+        tramos. Así la memoria queda acotada aunque la cohorte tenga 10k
+        niños × 1k simulaciones.
+        
+        Args:
+            cohorte: Dict de un niño o DataFrame con una fila por niño
+            horizontes: Meses a proyectar
+            n_simulaciones: Muestras Monte Carlo por niño
+            percentiles: Percentiles a reportar (0-100)
+            distribuciones: Reemplazos parciales de DISTRIBUCIONES_MC
+            semilla: Semilla del generador aleatorio (reproducibilidad)
+            filas_por_lote: Máximo de filas evaluadas por llamada al modelo
+            
+        Returns:
+            DataFrame con una fila por (niño, mes) y columnas hb_p{q} y
+            prob_p{q} para cada percentil (prob_* es NaN si no hay modelo ML)
         """
-        # Tasa base de cambio
-        if tiene_suplemento and asiste_cred:
-            tasa_mensual = self.TASA_MEJORA_SUPL
-        elif tiene_suplemento and not asiste_cred:
-            tasa_mensual = -self.TASA_DETERIORO_LEVE
-        else:
-            tasa_mensual = self.TASA_DETERIORO_BASE
+        if isinstance(cohorte, dict):
+            cohorte = pd.DataFrame([cohorte])
         
-        # Aplicar factores multiplicadores de riesgo
-        factor_total = 1.0
+        meses = np.asarray(sorted({int(m) for m in horizontes}))
+        dist = {**self.DISTRIBUCIONES_MC, **(distribuciones or {})}
+        rng = np.random.default_rng(semilla)
         
-        if 6 <= edad_meses <= 24:
-            factor_total *= self.FACTOR_EDAD_CRITICA
+        n_meses = len(meses)
+        filas_nino = n_simulaciones * n_meses
+        ninos_por_lote = max(1, filas_por_lote // filas_nino)
         
-        if altitud > 3000:
-            factor_total *= self.FACTOR_ALTITUD
+        resultados = []
+        for inicio in range(0, len(cohorte), ninos_por_lote):
+            lote = cohorte.iloc[inicio:inicio + ninos_por_lote]
+            n_lote = len(lote)
+            
+            # (niños, simulaciones, meses)
+            hb = self._proyectar_hemoglobina_muestras(lote, meses, n_simulaciones, dist, rng)
+            
+            # Tramos de a lo sumo filas_por_lote filas sobre (niño, simulación, mes)
+            hb_plano = hb.ravel()
+            prob = np.full(hb_plano.size, np.nan)
+            for desde in range(0, hb_plano.size, filas_por_lote):
+                hasta = min(desde + filas_por_lote, hb_plano.size)
+                filas = lote.iloc[np.arange(desde, hasta) // filas_nino].reset_index(drop=True)
+                filas['hemoglobina'] = hb_plano[desde:hasta]
+                pred = self.modelo.predecir_ml_lote(filas)
+                if pred is None:
+                    break
+                prob[desde:hasta] = pred['probabilidad'].to_numpy()
+            prob = prob.reshape(hb.shape)
+            
+            hb_pct = np.percentile(hb, percentiles, axis=1)      # (percentiles, niños, meses)
+            prob_pct = np.percentile(prob, percentiles, axis=1)
+            
+            bloque = pd.DataFrame({
+                'indice': np.repeat(lote.index.to_numpy(), n_meses),
+                'mes': np.tile(meses, n_lote),
+            })
+            for k, q in enumerate(percentiles):
+                bloque[f'hb_p{q:g}'] = hb_pct[k].ravel().round(2)
+            for k, q in enumerate(percentiles):
+                bloque[f'prob_p{q:g}'] = prob_pct[k].ravel().round(4)
+            resultados.append(bloque)
         
-        if area_rural:
-            factor_total *= self.FACTOR_RURAL
+        logger.info(f"🎲 Bandas Monte Carlo: {len(cohorte):,} niños × {n_simulaciones:,} simulaciones")
+        
+        if not resultados:
+            return pd.DataFrame(columns=['indice', 'mes'])
+        return pd.concat(resultados, ignore_index=True)
+    
+    def _proyectar_hemoglobina_muestras(self, lote: pd.DataFrame, meses: np.ndarray,
+                                        n_simulaciones: int, dist: Dict,
+                                        rng: np.random.Generator) -> np.ndarray:
+        """
+        Versión estocástica de _proyectar_hemoglobina para un lote de niños
+        
+        Returns:
+            Array (niños, simulaciones, meses) con Hb proyectada
+        """
+        n = len(lote)
+        forma = (n, n_simulaciones, 1)
+        
+        def muestrear(nombre):
+            tipo, a, b = dist[nombre]
+            if tipo == 'beta':
+                return rng.beta(a, b, size=forma)
+            return rng.normal(a, b, size=forma)
+        
+        def columna(nombre, defecto):
+            if nombre in lote.columns:
+                return lote[nombre].to_numpy()[:, None, None]
+            return np.full((n, 1, 1), defecto)
+        
+        tiene_suplemento = columna('recibe_suplemento', False).astype(bool)
+        asiste_cred = columna('asiste_cred', True).astype(bool)
+        edad_meses = columna('edad_meses', 12).astype(float)
+        altitud = columna('altitud', 0).astype(float)
+        area_rural = columna('area_rural', False).astype(bool)
+        
+        tasa_deterioro = muestrear('tasa_deterioro_base')
+        adherencia = muestrear('adherencia')
+        
+        # Con suplemento, la fracción no adherente evoluciona como sin intervención
+        tasa_supl = np.where(asiste_cred, muestrear('tasa_mejora_supl'), -muestrear('tasa_deterioro_leve'))
+        tasa_mensual = np.where(
+            tiene_suplemento,
+            adherencia * tasa_supl + (1 - adherencia) * tasa_deterioro,
+            tasa_deterioro
+        )
         
-        # Calcular delta
-        delta_hb = tasa_mensual * meses * factor_total
+        factor_total = (
+            np.where((edad_meses >= 6) & (edad_meses <= 24), self.FACTOR_EDAD_CRITICA, 1.0) *
+            np.where(altitud > 3000, self.FACTOR_ALTITUD, 1.0) *
+            np.where(area_rural, self.FACTOR_RURAL, 1.0)
+        )
+        
+        hb = columna('hemoglobina', 11.0).astype(float) + tasa_mensual * factor_total * meses[None, None, :]
+        return np.clip(hb, 6.0, 16.0)
+    
+    def _construir_proyeccion(self, meses: int, prob_actual: float, prob_futura: float,
+                              hb_actual: float, hb_proyectada: float,
+                              factores: List[str]) -> Dict:
+        """Arma el dict de proyección a partir de probabilidades y Hb ya calculadas"""
+        # Generar calendario de controles
+        controles = self._generar_calendario_controles(meses, hb_actual, hb_proyectada)
+        
+        # Determinar tendencia
+        tendencia = self._determinar_tendencia(hb_actual, hb_proyectada, prob_actual, prob_futura)
+        
+        return {
+            'meses_proyeccion': meses,
+            'probabilidad_actual': round(prob_actual, 4),
+            'probabilidad_futura': round(min(0.99, prob_futura), 4),
+            'hemoglobina_actual': round(hb_actual, 2),
+            'hemoglobina_proyectada': round(hb_proyectada, 2),
+            'delta_hemoglobina': round(hb_proyectada - hb_actual, 2),
+            'factores_deterioro': factores,
+            'controles_recomendados': controles,
+            'tendencia': tendencia['etiqueta'],
+            'tendencia_emoji': tendencia['emoji'],
+            'tendencia_color': tendencia.get('color', '#95a5a6'),
+            'cambio_probabilidad': round((prob_futura - prob_actual) * 100, 1),
+            'severidad_futura': self._clasificar_severidad_futura(hb_proyectada),
+            'nivel_urgencia': self._calcular_urgencia(hb_proyectada, prob_futura)
+        }
+    
+    def _proyectar_hemoglobina(self, hb_actual, tiene_suplemento, asiste_cred,
+                                edad_meses, area_rural, altitud, meses):
+        """
+        Simula evolución de hemoglobina basado en factores de riesgo
+        Usa modelo epidemiológico simple pero efectivo
+        
+        Acepta escalares o arrays NumPy (se aplica broadcasting entre
+        argumentos); con entradas escalares retorna un float.
+        """
+        tiene_suplemento = np.asarray(tiene_suplemento, dtype=bool)
+        asiste_cred = np.asarray(asiste_cred, dtype=bool)
+        edad_meses = np.asarray(edad_meses, dtype=float)
+        altitud = np.asarray(altitud, dtype=float)
+        
+        # Tasa base de cambio
+        tasa_mensual = np.where(
+            tiene_suplemento,
+            np.where(asiste_cred, self.TASA_MEJORA_SUPL, -self.TASA_DETERIORO_LEVE),
+            self.TASA_DETERIORO_BASE
+        )
+        
+        # Aplicar factores multiplicadores de riesgo
+        factor_total = (
+            np.where((edad_meses >= 6) & (edad_meses <= 24), self.FACTOR_EDAD_CRITICA, 1.0) *
+            np.where(altitud > 3000, self.FACTOR_ALTITUD, 1.0) *
+            np.where(np.asarray(area_rural, dtype=bool), self.FACTOR_RURAL, 1.0)
+        )
         
-        # Proyectar Hb futura
-        hb_futura = hb_actual + delta_hb
+        # Calcular delta y proyectar Hb futura
+        hb_futura = np.asarray(hb_actual, dtype=float) + tasa_mensual * np.asarray(meses) * factor_total
         
         # Limitar a rango fisiológico
-        return max(6.0, min(16.0, hb_futura))
+        hb_futura = np.clip(hb_futura, 6.0, 16.0)
+        return float(hb_futura) if hb_futura.ndim == 0 else hb_futura
     
     def _identificar_factores_deterioro(self, datos: Dict, hb_actual: float) -> List[str]:
         """Identifica factores que aceleran deterioro o impiden mejora"""
@@ -3,26 +3,213 @@
 Sistema de tracking de adherencia a menús
 Métrica clave: % de menús que las madres realmente preparan
 Objetivo: +15pp vs baseline (ENDES 2023)
+
+Los registros se guardan en SQLite (WAL, data/logs/adherencia.db) indexado
+por caso_id y menu_id. Cada alta actualiza, en la misma transacción, los
+contadores preparados/totales global, por paciente, por menú, por tipo de
+menú y por día: las métricas se leen de esos agregados sin recorrer los
+registros. El CSV anterior (data/logs/adherencia_menus.csv) se importa la
+primera vez.
 """
 
+import os
 import csv
-import pandas as pd
+import sqlite3
+import logging
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+from utils.sqlite_wal import AlmacenSQLite
+
+logger = logging.getLogger(__name__)
 
 
 BASELINE_ADHERENCIA = 57.3  # ENDES 2023 (ejemplo - ajustar con datos reales)
+MEJORA_OBJETIVO_PP = 15.0
+
+ADHERENCIA_CSV_PATH = Path('data/logs/adherencia_menus.csv')
+ADHERENCIA_DB_PATH = Path(os.getenv("ADHERENCIA_DB", "data/logs/adherencia.db"))
+
+TIPOS_MENU = ['desayuno', 'almuerzo', 'cena']
+
+# Dimensiones de los contadores incrementales
+DIM_GLOBAL, DIM_PACIENTE, DIM_MENU, DIM_TIPO, DIM_DIA = 'global', 'paciente', 'menu', 'tipo', 'dia'
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS registros (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    caso_id TEXT NOT NULL,
+    menu_id TEXT NOT NULL,
+    menu_tipo TEXT,
+    preparado INTEGER NOT NULL,
+    comentario TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_registros_caso ON registros (caso_id);
+CREATE INDEX IF NOT EXISTS idx_registros_menu ON registros (menu_id);
+CREATE TABLE IF NOT EXISTS agregados (
+    dimension TEXT NOT NULL,
+    clave TEXT NOT NULL,
+    n_preparados INTEGER NOT NULL,
+    n_totales INTEGER NOT NULL,
+    PRIMARY KEY (dimension, clave)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT);
+"""
+
+
+def _metricas(n_preparados: int, n_totales: int) -> Dict:
+    return {
+        'adherencia_pct': round(n_preparados / n_totales * 100, 1) if n_totales else 0,
+        'n_preparados': int(n_preparados),
+        'n_totales': int(n_totales),
+    }
+
+
+class AdherenciaStore(AlmacenSQLite):
+    """
+    Registros de adherencia + contadores por dimensión
+
+    Una conexión por hilo (sesiones Streamlit); las escrituras usan
+    BEGIN IMMEDIATE para serializarse entre hilos y procesos.
+    """
+
+    def __init__(self, ruta: Path = ADHERENCIA_DB_PATH, csv_anterior: Optional[Path] = ADHERENCIA_CSV_PATH):
+        """
+        Args:
+            ruta: Archivo SQLite
+            csv_anterior: Log CSV a importar (None = no importar)
+        """
+        super().__init__(ruta, ESQUEMA)
+        if csv_anterior is not None:
+            self._migrar_csv(Path(csv_anterior))
+
+    # ════════════════════════════════════════════════════════════════════
+    # ESCRITURA
+    # ════════════════════════════════════════════════════════════════════
+
+    @staticmethod
+    def _insertar(conn: sqlite3.Connection, timestamp: str, caso_id: str, menu_id: str,
+                  menu_tipo: str, preparado: int, comentario: str):
+        conn.execute(
+            "INSERT INTO registros (timestamp, caso_id, menu_id, menu_tipo, preparado, comentario)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (timestamp, caso_id, menu_id, menu_tipo, preparado, comentario)
+        )
+        claves = [(DIM_GLOBAL, ''), (DIM_PACIENTE, caso_id), (DIM_MENU, menu_id),
+                  (DIM_TIPO, menu_tipo or ''), (DIM_DIA, timestamp[:10])]
+        conn.executemany(
+            "INSERT INTO agregados (dimension, clave, n_preparados, n_totales) VALUES (?, ?, ?, 1)"
+            " ON CONFLICT (dimension, clave) DO UPDATE SET"
+            " n_preparados = n_preparados + excluded.n_preparados, n_totales = n_totales + 1",
+            [(dimension, clave, preparado) for dimension, clave in claves]
+        )
+
+    def registrar(self, caso_id: str, menu_id: str, menu_tipo: str, preparado: bool,
+                  comentario: str = "", timestamp: Optional[str] = None):
+        """Agrega un registro y actualiza los contadores (una transacción)"""
+        with self._transaccion() as conn:
+            self._insertar(conn, timestamp or datetime.now().isoformat(), caso_id, menu_id,
+                           menu_tipo, 1 if preparado else 0, comentario or '')
+
+    def _migrar_csv(self, log_file: Path):
+        """Importa una sola vez el log CSV del sistema anterior"""
+        conn = self._conexion()
+        if conn.execute("SELECT 1 FROM meta WHERE clave = 'migrado_csv'").fetchone():
+            return
+
+        with self._transaccion() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE clave = 'migrado_csv'").fetchone():
+                return
+            n = 0
+            if log_file.exists():
+                with open(log_file, newline='', encoding='utf-8') as f:
+                    for fila in csv.DictReader(f):
+                        try:
+                            self._insertar(conn, fila['timestamp'], fila['caso_id'], fila['menu_id'],
+                                           fila.get('menu_tipo', ''), int(float(fila['preparado'])),
+                                           fila.get('comentario') or '')
+                            n += 1
+                        except (KeyError, ValueError):
+                            continue
+            conn.execute("INSERT INTO meta (clave, valor) VALUES ('migrado_csv', ?)",
+                         (datetime.now().isoformat(),))
+        if n:
+            logger.info(f"✅ Adherencia: {n} registros importados desde {log_file}")
+
+    # ════════════════════════════════════════════════════════════════════
+    # LECTURA
+    # ════════════════════════════════════════════════════════════════════
+
+    def contador(self, dimension: str, clave: str = '') -> Dict:
+        """Métricas de una clave (paciente, menú, tipo o día) en O(1)"""
+        fila = self._conexion().execute(
+            "SELECT n_preparados, n_totales FROM agregados WHERE dimension = ? AND clave = ?",
+            (dimension, clave)
+        ).fetchone()
+        return _metricas(*fila) if fila else _metricas(0, 0)
+
+    def contadores(self, dimension: str) -> pd.DataFrame:
+        """Todas las claves de una dimensión (clave, n_preparados, n_totales)"""
+        return pd.read_sql_query(
+            "SELECT clave, n_preparados, n_totales FROM agregados WHERE dimension = ? ORDER BY clave",
+            self._conexion(), params=(dimension,)
+        )
+
+    def registros_paciente(self, caso_id: str) -> pd.DataFrame:
+        """Registros de un caso (índice por caso_id)"""
+        return pd.read_sql_query(
+            "SELECT timestamp, menu_id, menu_tipo, preparado, comentario FROM registros"
+            " WHERE caso_id = ? ORDER BY id",
+            self._conexion(), params=(caso_id,)
+        )
 
+    def registros_desde(self, desde_id: int = 0, caso_ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        Registros con id > `desde_id` (para procesos incrementales)
 
-def registrar_adherencia(caso_id: str, 
-                        menu_id: str, 
+        Args:
+            desde_id: Último id ya procesado
+            caso_ids: Solo estos casos (usa el índice por caso_id)
+
+        Returns:
+            DataFrame con id, caso_id, timestamp y preparado
+        """
+        consulta, parametros = "SELECT id, caso_id, timestamp, preparado FROM registros WHERE id > ?", [desde_id]
+        if caso_ids is not None:
+            caso_ids = [str(c) for c in caso_ids]
+            consulta += f" AND caso_id IN ({', '.join('?' * len(caso_ids))})" if caso_ids else " AND 0"
+            parametros.extend(caso_ids)
+        return pd.read_sql_query(consulta + " ORDER BY id", self._conexion(), params=parametros)
+
+
+# Instancia global (singleton pattern)
+_adherencia_instance = None
+_adherencia_lock = threading.Lock()
+
+
+def get_adherencia_store() -> AdherenciaStore:
+    """Factory para obtener instancia única del almacén de adherencia"""
+    global _adherencia_instance
+    if _adherencia_instance is None:
+        with _adherencia_lock:
+            if _adherencia_instance is None:
+                _adherencia_instance = AdherenciaStore()
+    return _adherencia_instance
+
+
+def registrar_adherencia(caso_id: str,
+                        menu_id: str,
                         menu_tipo: str,
                         preparado: bool,
                         comentario: str = ""):
     """
     Registra si la madre preparó el menú
-    
+
     Args:
         caso_id: ID único del caso
         menu_id: ID del menú (ej: "desayuno_andino")
@@ -30,35 +217,13 @@ def registrar_adherencia(caso_id: str,
         preparado: True si lo preparó
         comentario: Feedback opcional de la madre
     """
-    log_file = Path('data/logs/adherencia_menus.csv')
-    log_file.parent.mkdir(parents=True, exist_ok=True)
-    
-    # Crear archivo si no existe
-    if not log_file.exists():
-        with open(log_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                'timestamp', 'caso_id', 'menu_id', 'menu_tipo', 
-                'preparado', 'comentario'
-            ])
-    
-    # Agregar registro
-    with open(log_file, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            datetime.now().isoformat(),
-            caso_id,
-            menu_id,
-            menu_tipo,
-            1 if preparado else 0,
-            comentario
-        ])
+    get_adherencia_store().registrar(caso_id, menu_id, menu_tipo, preparado, comentario)
 
 
 def calcular_adherencia_global() -> Dict:
     """
     Calcula métricas de adherencia global
-    
+
     Returns:
         {
             'adherencia_pct': 72.5,
@@ -69,21 +234,10 @@ def calcular_adherencia_global() -> Dict:
             'por_tipo_menu': {...}
         }
     """
-    log_file = Path('data/logs/adherencia_menus.csv')
-    
-    if not log_file.exists():
-        return {
-            'adherencia_pct': 0.0,
-            'n_preparados': 0,
-            'n_totales': 0,
-            'mejora_vs_baseline': -BASELINE_ADHERENCIA,
-            'objetivo_cumplido': False,
-            'por_tipo_menu': {}
-        }
-    
-    df = pd.read_csv(log_file)
-    
-    if len(df) == 0:
+    store = get_adherencia_store()
+    total = store.contador(DIM_GLOBAL)
+
+    if total['n_totales'] == 0:
         return {
             'adherencia_pct': 0.0,
             'n_preparados': 0,
@@ -92,33 +246,23 @@ def calcular_adherencia_global() -> Dict:
             'objetivo_cumplido': False,
             'por_tipo_menu': {}
         }
-    
-    n_preparados = df['preparado'].sum()
-    n_totales = len(df)
-    
-    adherencia_pct = (n_preparados / n_totales) * 100
+
+    adherencia_pct = total['n_preparados'] / total['n_totales'] * 100
     mejora = adherencia_pct - BASELINE_ADHERENCIA
-    objetivo_cumplido = mejora >= 15.0
-    
+
     # Adherencia por tipo de menú
     por_tipo = {}
-    for tipo in ['desayuno', 'almuerzo', 'cena']:
-        df_tipo = df[df['menu_tipo'] == tipo]
-        if len(df_tipo) > 0:
-            prep_tipo = df_tipo['preparado'].sum()
-            pct_tipo = (prep_tipo / len(df_tipo)) * 100
-            por_tipo[tipo] = {
-                'adherencia_pct': round(pct_tipo, 1),
-                'n_preparados': int(prep_tipo),
-                'n_totales': len(df_tipo)
-            }
-    
+    for tipo in TIPOS_MENU:
+        metricas_tipo = store.contador(DIM_TIPO, tipo)
+        if metricas_tipo['n_totales'] > 0:
+            por_tipo[tipo] = metricas_tipo
+
     return {
         'adherencia_pct': round(adherencia_pct, 1),
-        'n_preparados': int(n_preparados),
-        'n_totales': int(n_totales),
+        'n_preparados': total['n_preparados'],
+        'n_totales': total['n_totales'],
         'mejora_vs_baseline': round(mejora, 1),
-        'objetivo_cumplido': objetivo_cumplido,
+        'objetivo_cumplido': mejora >= MEJORA_OBJETIVO_PP,
         'baseline': BASELINE_ADHERENCIA,
         'por_tipo_menu': por_tipo
     }
@@ -126,52 +270,28 @@ def calcular_adherencia_global() -> Dict:
 
 def calcular_adherencia_por_paciente(caso_id: str) -> Dict:
     """Calcula adherencia individual de un paciente"""
-    log_file = Path('data/logs/adherencia_menus.csv')
-    
-    if not log_file.exists():
-        return {'adherencia_pct': 0, 'n_preparados': 0, 'n_totales': 0}
-    
-    df = pd.read_csv(log_file)
-    df_paciente = df[df['caso_id'] == caso_id]
-    
-    if len(df_paciente) == 0:
-        return {'adherencia_pct': 0, 'n_preparados': 0, 'n_totales': 0}
-    
-    n_prep = df_paciente['preparado'].sum()
-    n_tot = len(df_paciente)
-    pct = (n_prep / n_tot) * 100
-    
-    return {
-        'adherencia_pct': round(pct, 1),
-        'n_preparados': int(n_prep),
-        'n_totales': int(n_tot)
-    }
+    return get_adherencia_store().contador(DIM_PACIENTE, caso_id)
+
+
+def calcular_adherencia_por_menu(menu_id: str) -> Dict:
+    """Calcula adherencia de un menú (ej: "almuerzo_sangrecita")"""
+    return get_adherencia_store().contador(DIM_MENU, menu_id)
 
 
 def exportar_reporte_adherencia(output_path: str = "data/reports/adherencia_menus.csv"):
     """Exporta reporte detallado de adherencia"""
-    log_file = Path('data/logs/adherencia_menus.csv')
-    
-    if not log_file.exists():
+    df_resumen = get_adherencia_store().contadores(DIM_DIA)
+
+    if df_resumen.empty:
         return None
-    
-    df = pd.read_csv(log_file)
-    
-    # Agregar columnas calculadas
-    df['fecha'] = pd.to_datetime(df['timestamp']).dt.date
-    df['hora'] = pd.to_datetime(df['timestamp']).dt.hour
-    
-    # Agrupar por fecha
-    df_resumen = df.groupby('fecha').agg({
-        'preparado': ['sum', 'count', 'mean']
-    }).reset_index()
-    
-    df_resumen.columns = ['fecha', 'n_preparados', 'n_totales', 'adherencia_pct']
-    df_resumen['adherencia_pct'] = df_resumen['adherencia_pct'] * 100
-    
+
+    # Resumen por fecha (desde los contadores diarios)
+    df_resumen = df_resumen.rename(columns={'clave': 'fecha'})
+    df_resumen['adherencia_pct'] = df_resumen['n_preparados'] / df_resumen['n_totales'] * 100
+
     # Guardar
     output_file = Path(output_path)
     output_file.parent.mkdir(parents=True, exist_ok=True)
     df_resumen.to_csv(output_file, index=False)
-    
+
     return output_file
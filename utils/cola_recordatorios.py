@@ -0,0 +1,429 @@
+"""
+utils/cola_recordatorios.py
+Cola persistente de recordatorios programados (CRED / seguimiento)
+
+Los recordatorios son trabajos en una tabla SQLite (WAL) indexada por
+(estado, due_at): un worker reclama en lotes los que ya vencieron con un
+lease, los envía y los marca enviados; si falla se reintentan con backoff
+exponencial y, si el worker muere, el lease vence y otro los retoma. Cada
+reclamo lee solo las filas vencidas por el índice, así que la cola puede
+tener millones de recordatorios futuros sin recorrerlos.
+
+Un recordatorio es único por (paciente, tipo de control, fecha del
+control): programarlo dos veces no genera dos envíos.
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from utils.sqlite_wal import AlmacenSQLite
+
+logger = logging.getLogger(__name__)
+
+
+RECORDATORIOS_DB_PATH = Path(os.getenv("RECORDATORIOS_DB", "data/notificaciones/recordatorios.db"))
+
+CANALES = ('email', 'sms', 'whatsapp')
+ESTADO_PENDIENTE, ESTADO_EN_PROCESO, ESTADO_ENVIADO, ESTADO_FALLIDO = \
+    'pendiente', 'en_proceso', 'enviado', 'fallido'
+
+LEASE_SEGUNDOS = 300
+MAX_INTENTOS = 5
+BACKOFF_BASE_SEGUNDOS = 60  # 1 min, 2 min, 4 min, ...
+HORA_ENVIO = 9  # los recordatorios se envían a las 9:00 del día que toca
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id_paciente TEXT NOT NULL,
+    tipo_control TEXT NOT NULL,
+    fecha_control TEXT NOT NULL,
+    due_at INTEGER NOT NULL,
+    canal TEXT NOT NULL,
+    destino TEXT NOT NULL,
+    payload TEXT,
+    estado TEXT NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    lease_until INTEGER,
+    worker TEXT,
+    ultimo_error TEXT,
+    creado INTEGER NOT NULL,
+    enviado_at INTEGER,
+    secuencia_envio INTEGER,
+    UNIQUE (id_paciente, tipo_control, fecha_control)
+);
+CREATE INDEX IF NOT EXISTS idx_trabajos_estado_due ON trabajos (estado, due_at);
+CREATE INDEX IF NOT EXISTS idx_trabajos_lease ON trabajos (lease_until) WHERE estado = 'en_proceso';
+"""
+
+
+def _epoch(valor) -> int:
+    if valor is None:
+        return int(time.time())
+    if isinstance(valor, (int, float)):
+        return int(valor)
+    if isinstance(valor, datetime):
+        return int(valor.timestamp())
+    if isinstance(valor, date):
+        return int(datetime(valor.year, valor.month, valor.day).timestamp())
+    return int(datetime.fromisoformat(str(valor)).timestamp())
+
+
+def parsear_fecha(valor) -> date:
+    """Fecha de control en date (acepta date, ISO o dd/mm/YYYY)"""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor)
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texto[:10], formato).date()
+        except ValueError:
+            continue
+    return datetime.fromisoformat(texto).date()
+
+
+def momento_envio(fecha_control: date, dias_anticipacion: int = 1) -> int:
+    """Epoch del envío: HORA_ENVIO del día (fecha - anticipación), nunca en el pasado"""
+    dia = fecha_control - timedelta(days=dias_anticipacion)
+    return max(_epoch(datetime(dia.year, dia.month, dia.day, HORA_ENVIO)), _epoch(None))
+
+
+class ColaRecordatorios(AlmacenSQLite):
+    """
+    Cola de trabajos de recordatorio en SQLite
+
+    Una conexión por hilo; reclamar y actualizar trabajos usa BEGIN
+    IMMEDIATE, así varios workers (hilos o procesos) no se pisan.
+    """
+
+    def __init__(self, ruta: Path = RECORDATORIOS_DB_PATH, max_intentos: int = MAX_INTENTOS):
+        """
+        Args:
+            ruta: Archivo SQLite
+            max_intentos: Intentos antes de marcar un trabajo como fallido
+        """
+        self.max_intentos = max_intentos
+        super().__init__(ruta, ESQUEMA, row_factory=sqlite3.Row)
+        self._migrar_secuencia_envio()
+
+    def _migrar_secuencia_envio(self):
+        """
+        Bases anteriores: agrega secuencia_envio y numera los ya enviados
+        en el orden (enviado_at, id) que usaba el cursor previo
+        """
+        conn = self._conexion()
+        if not any(c['name'] == 'secuencia_envio' for c in conn.execute("PRAGMA table_info(trabajos)")):
+            with self._transaccion() as conn:
+                if not any(c['name'] == 'secuencia_envio' for c in conn.execute("PRAGMA table_info(trabajos)")):
+                    conn.execute("ALTER TABLE trabajos ADD COLUMN secuencia_envio INTEGER")
+                    conn.execute(
+                        "UPDATE trabajos SET secuencia_envio = s.n FROM ("
+                        " SELECT id, ROW_NUMBER() OVER (ORDER BY enviado_at, id) AS n"
+                        " FROM trabajos WHERE estado = 'enviado') AS s WHERE trabajos.id = s.id"
+                    )
+                    conn.execute("DROP INDEX IF EXISTS idx_trabajos_enviado")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_secuencia ON trabajos (secuencia_envio)")
+
+    # ════════════════════════════════════════════════════════════════════
+    # PROGRAMACIÓN
+    # ════════════════════════════════════════════════════════════════════
+
+    @staticmethod
+    def _fila(trabajo: Dict[str, Any], ahora: int) -> tuple:
+        if trabajo['canal'] not in CANALES:
+            raise ValueError(f"Canal no soportado: {trabajo['canal']} (usar {', '.join(CANALES)})")
+        fecha_control = parsear_fecha(trabajo['fecha_control'])
+        due_at = trabajo.get('due_at')
+        due_at = _epoch(due_at) if due_at is not None else momento_envio(fecha_control)
+        return (str(trabajo['id_paciente']), trabajo['tipo_control'], fecha_control.isoformat(), due_at,
+                trabajo['canal'], str(trabajo['destino']),
+                json.dumps(trabajo.get('payload') or {}, ensure_ascii=False, default=str), ahora)
+
+    def programar(self, id_paciente: str, tipo_control: str, fecha_control, canal: str,
+                  destino: str, due_at=None, payload: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Programa un recordatorio
+
+        Args:
+            id_paciente: DNI / identificador (clave de deduplicación)
+            tipo_control: 'Control inmediato', 'Seguimiento 1 mes', ...
+            fecha_control: Fecha del control (date, ISO o dd/mm/YYYY)
+            canal: 'email' | 'sms' | 'whatsapp'
+            destino: Email o teléfono
+            due_at: Momento del envío (default: HORA_ENVIO del día anterior)
+            payload: Datos para armar el mensaje (nombre, variante, objetivo...)
+
+        Returns:
+            True si se creó, False si ya existía (paciente, tipo, fecha)
+        """
+        return self.programar_lote([{
+            'id_paciente': id_paciente, 'tipo_control': tipo_control, 'fecha_control': fecha_control,
+            'canal': canal, 'destino': destino, 'due_at': due_at, 'payload': payload,
+        }]) == 1
+
+    def programar_lote(self, trabajos: Iterable[Dict[str, Any]]) -> int:
+        """Programa muchos recordatorios en una transacción; devuelve cuántos eran nuevos"""
+        ahora = _epoch(None)
+        filas = [self._fila(t, ahora) for t in trabajos]
+        with self._transaccion() as conn:
+            antes = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO trabajos (id_paciente, tipo_control, fecha_control, due_at,"
+                " canal, destino, payload, creado) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", filas
+            )
+            return conn.total_changes - antes
+
+    def cancelar(self, id_paciente: str, tipo_control: Optional[str] = None) -> int:
+        """Cancela (borra) los recordatorios pendientes de un paciente"""
+        consulta = "DELETE FROM trabajos WHERE id_paciente = ? AND estado = 'pendiente'"
+        parametros = [id_paciente]
+        if tipo_control:
+            consulta += " AND tipo_control = ?"
+            parametros.append(tipo_control)
+        with self._transaccion() as conn:
+            return conn.execute(consulta, parametros).rowcount
+
+    # ════════════════════════════════════════════════════════════════════
+    # WORKER
+    # ════════════════════════════════════════════════════════════════════
+
+    def reclamar(self, worker: str, limite: int = 100, lease_segundos: int = LEASE_SEGUNDOS,
+                 ahora=None) -> List[Dict[str, Any]]:
+        """
+        Toma hasta `limite` trabajos vencidos, en orden de due_at
+
+        Los trabajos cuyo lease venció (worker caído) vuelven a pendiente
+        antes de reclamar.
+        """
+        ahora = _epoch(ahora)
+        with self._transaccion() as conn:
+            conn.execute(
+                "UPDATE trabajos SET estado = CASE WHEN intentos >= ? THEN 'fallido' ELSE 'pendiente' END,"
+                " ultimo_error = 'lease vencido', lease_until = NULL, worker = NULL"
+                " WHERE estado = 'en_proceso' AND lease_until < ?",
+                (self.max_intentos, ahora)
+            )
+            filas = conn.execute(
+                "UPDATE trabajos SET estado = 'en_proceso', lease_until = ?, worker = ?, intentos = intentos + 1"
+                " WHERE id IN (SELECT id FROM trabajos WHERE estado = 'pendiente' AND due_at <= ?"
+                "              ORDER BY due_at LIMIT ?)"
+                " RETURNING id, id_paciente, tipo_control, fecha_control, due_at, canal, destino, payload, intentos",
+                (ahora + lease_segundos, worker, ahora, limite)
+            ).fetchall()
+
+        trabajos = [dict(f) for f in filas]
+        for trabajo in trabajos:
+            trabajo['payload'] = json.loads(trabajo['payload'] or '{}')
+        trabajos.sort(key=lambda t: t['due_at'])
+        return trabajos
+
+    def completar(self, ids: Iterable[int], worker: Optional[str] = None):
+        """
+        Marca trabajos como enviados (solo si el lease sigue siendo de `worker`)
+
+        secuencia_envio se asigna dentro de la transacción BEGIN IMMEDIATE:
+        sigue el orden de commit entre workers, así un cursor sobre ella
+        (enviados_desde) no se salta lotes que confirman más tarde.
+        """
+        ahora = _epoch(None)
+        consulta = ("UPDATE trabajos SET estado = 'enviado', enviado_at = ?, secuencia_envio = ?,"
+                    " lease_until = NULL WHERE id = ? AND estado = 'en_proceso'")
+        if worker:
+            consulta += " AND worker = ?"
+        with self._transaccion() as conn:
+            base = conn.execute("SELECT COALESCE(MAX(secuencia_envio), 0) FROM trabajos").fetchone()[0]
+            conn.executemany(consulta, [
+                (ahora, base + k, i) + ((worker,) if worker else ())
+                for k, i in enumerate(ids, start=1)
+            ])
+
+    def fallar(self, errores: Dict[int, str], worker: Optional[str] = None):
+        """
+        Registra envíos fallidos: vuelven a pendiente con backoff exponencial
+        o quedan 'fallido' al agotar max_intentos
+        """
+        ahora = _epoch(None)
+        consulta = (
+            "UPDATE trabajos SET ultimo_error = ?, lease_until = NULL, worker = NULL,"
+            " estado = CASE WHEN intentos >= ? THEN 'fallido' ELSE 'pendiente' END,"
+            " due_at = ? + ? * (1 << (intentos - 1))"
+            " WHERE id = ? AND estado = 'en_proceso'"
+        )
+        if worker:
+            consulta += " AND worker = ?"
+        filas = [
+            (str(error)[:500], self.max_intentos, ahora, BACKOFF_BASE_SEGUNDOS, i) + ((worker,) if worker else ())
+            for i, error in errores.items()
+        ]
+        with self._transaccion() as conn:
+            conn.executemany(consulta, filas)
+
+    # ════════════════════════════════════════════════════════════════════
+    # CONSULTA
+    # ════════════════════════════════════════════════════════════════════
+
+    def resumen(self) -> Dict[str, int]:
+        """Trabajos por estado (+ vencidos sin enviar)"""
+        conn = self._conexion()
+        conteo = {estado: n for estado, n in conn.execute(
+            "SELECT estado, COUNT(*) FROM trabajos GROUP BY estado")}
+        conteo['vencidos'] = conn.execute(
+            "SELECT COUNT(*) FROM trabajos WHERE estado = 'pendiente' AND due_at <= ?", (_epoch(None),)
+        ).fetchone()[0]
+        return conteo
+
+    def trabajos_paciente(self, id_paciente: str) -> List[Dict[str, Any]]:
+        """Recordatorios de un paciente (todos los estados)"""
+        filas = self._conexion().execute(
+            "SELECT id, tipo_control, fecha_control, due_at, canal, estado, intentos, ultimo_error"
+            " FROM trabajos WHERE id_paciente = ? ORDER BY fecha_control",
+            (id_paciente,)
+        ).fetchall()
+        return [dict(f) for f in filas]
+
+    def enviados_desde(self, secuencia: int = 0, limite: int = 5000) -> List[Dict[str, Any]]:
+        """
+        Recordatorios enviados después del cursor `secuencia`, en orden de commit
+
+        Para procesos incrementales (análisis A/B): la secuencia_envio del
+        último trabajo devuelto es el cursor de la siguiente llamada.
+        """
+        filas = self._conexion().execute(
+            "SELECT id, id_paciente, tipo_control, fecha_control, canal, payload, enviado_at, secuencia_envio"
+            " FROM trabajos WHERE estado = 'enviado' AND secuencia_envio > ? ORDER BY secuencia_envio LIMIT ?",
+            (secuencia, limite)
+        ).fetchall()
+        trabajos = [dict(f) for f in filas]
+        for trabajo in trabajos:
+            trabajo['payload'] = json.loads(trabajo['payload'] or '{}')
+        return trabajos
+
+    def secuencia_hasta(self, enviado_at: int, id_trabajo: int) -> int:
+        """Secuencia equivalente a un cursor antiguo (enviado_at, id)"""
+        return self._conexion().execute(
+            "SELECT COALESCE(MAX(secuencia_envio), 0) FROM trabajos"
+            " WHERE estado = 'enviado' AND (enviado_at, id) <= (?, ?)", (enviado_at, id_trabajo)
+        ).fetchone()[0]
+
+
+# ════════════════════════════════════════════════════════════════════════
+# ENVÍO
+# ════════════════════════════════════════════════════════════════════════
+
+def enviar_lote_por_defecto(trabajos: List[Dict[str, Any]]) -> Dict[int, Optional[str]]:
+    """
+    Envía un lote con los canales existentes
+
+    email → SistemaNotificaciones.enviar_recordatorios_lote (pool SMTP, todo
+    el lote por las mismas conexiones)
+    sms / whatsapp → SistemaNudges.enviar_recordatorios_masivo (despachador
+    asíncrono, con la variante A/B asignada al programar)
+
+    Returns:
+        {id_trabajo: None si se envió, mensaje de error si falló}
+    """
+    from utils.notificaciones import get_sistema_notificaciones
+    from utils.nudges import SistemaNudges
+
+    resultados = {}
+
+    emails = [t for t in trabajos if t['canal'] == 'email']
+    if emails:
+        try:
+            resumen = get_sistema_notificaciones().enviar_recordatorios_lote([
+                {
+                    'email_destino': t['destino'],
+                    'nombre_paciente': t['payload'].get('nombre', 'su niño/a'),
+                    'fecha_control': parsear_fecha(t['fecha_control']).strftime('%d/%m/%Y'),
+                    'tipo_control': t['tipo_control'],
+                    'objetivo': t['payload'].get('objetivo') or 'Control de crecimiento y hemoglobina',
+                }
+                for t in emails
+            ])
+            for i, trabajo in enumerate(emails):
+                resultados[trabajo['id']] = resumen['errores'].get(i)
+        except Exception as e:
+            resultados.update({t['id']: str(e) for t in emails})
+
+    mensajes = [t for t in trabajos if t['canal'] != 'email']
+    if mensajes:
+        try:
+            resumen = SistemaNudges().enviar_recordatorios_masivo([
+                {
+                    'telefono': t['destino'],
+                    'nombre_paciente': t['payload'].get('nombre', 'su niño/a'),
+                    'tipo_control': t['tipo_control'],
+                    'dias': max((parsear_fecha(t['fecha_control']) - date.today()).days, 0),
+                    'variante': t['payload'].get('variante'),
+                }
+                for t in mensajes
+            ])
+            for trabajo, resultado in zip(mensajes, resumen['resultados']):
+                resultados[trabajo['id']] = resultado['error']
+        except Exception as e:
+            resultados.update({t['id']: str(e) for t in mensajes})
+    return resultados
+
+
+def procesar_vencidos(cola: 'ColaRecordatorios', enviar_lote: Callable = enviar_lote_por_defecto,
+                      worker: Optional[str] = None, lote: int = 100,
+                      lease_segundos: int = LEASE_SEGUNDOS) -> Dict[str, int]:
+    """
+    Una pasada del worker: reclama, envía y confirma lotes hasta vaciar los vencidos
+
+    Returns:
+        Dict con enviados y fallidos
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    totales = {'enviados': 0, 'fallidos': 0}
+    while True:
+        trabajos = cola.reclamar(worker, lote, lease_segundos)
+        if not trabajos:
+            return totales
+        resultados = enviar_lote(trabajos)
+        enviados = [t['id'] for t in trabajos if resultados.get(t['id'], 'sin resultado') is None]
+        errores = {t['id']: resultados.get(t['id']) or 'sin resultado'
+                   for t in trabajos if resultados.get(t['id'], 'sin resultado') is not None}
+        cola.completar(enviados, worker)
+        if errores:
+            cola.fallar(errores, worker)
+        totales['enviados'] += len(enviados)
+        totales['fallidos'] += len(errores)
+
+
+def ejecutar_worker(cola: Optional['ColaRecordatorios'] = None, enviar_lote: Callable = enviar_lote_por_defecto,
+                    intervalo_segundos: float = 30, lote: int = 100, detener: Optional[threading.Event] = None):
+    """Bucle del worker: procesa vencidos y duerme `intervalo_segundos` entre pasadas"""
+    cola = cola or get_cola_recordatorios()
+    detener = detener or threading.Event()
+    logger.info(f"🔄 Worker de recordatorios iniciado ({cola.ruta})")
+    while not detener.is_set():
+        totales = procesar_vencidos(cola, enviar_lote, lote=lote)
+        if totales['enviados'] or totales['fallidos']:
+            logger.info(f"📨 Recordatorios: {totales['enviados']} enviados, {totales['fallidos']} con error")
+        detener.wait(intervalo_segundos)
+
+
+# Instancia global (singleton pattern)
+_cola_instance = None
+_cola_lock = threading.Lock()
+
+
+def get_cola_recordatorios() -> ColaRecordatorios:
+    """Factory para obtener instancia única de la cola de recordatorios"""
+    global _cola_instance
+    if _cola_instance is None:
+        with _cola_lock:
+            if _cola_instance is None:
+                _cola_instance = ColaRecordatorios()
+    return _cola_instance
@@ -0,0 +1,418 @@
+"""
+utils/despachador_mensajes.py
+Despachador asíncrono de mensajes salientes (WhatsApp / SMS)
+
+Envía campañas a miles de cuidadores en paralelo con asyncio:
+
+- límite de concurrencia por canal (semáforo) y límite de tasa por canal
+  (token bucket: `tasa` mensajes/s con ráfagas de hasta `rafaga`)
+- transportes intercambiables: simulado (MVP, no sale a la red) o HTTP
+  (API del proveedor o el servidor local de prueba de
+  scripts/benchmark_despachador.py); los 429/5xx se reintentan con backoff
+- el log A/B de nudges (data/logs/nudges_ab_test.csv) se escribe por
+  bloques en un hilo aparte, no una fila por mensaje
+- el resumen trae throughput y latencias (p50/p95/máx) por canal
+"""
+
+import os
+import ssl
+import csv
+import json
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+NUDGES_LOG_PATH = Path('data/logs/nudges_ab_test.csv')
+COLUMNAS_LOG_NUDGES = ['timestamp', 'telefono', 'variante', 'canal', 'tipo_control', 'dias', 'status']
+TAMANO_BLOQUE_LOG = 500
+
+# Límites por canal (ajustar al contrato con el proveedor)
+LIMITES_CANAL = {
+    'whatsapp': {'concurrencia': 20, 'tasa': 80.0, 'rafaga': 80},
+    'sms': {'concurrencia': 10, 'tasa': 30.0, 'rafaga': 30},
+}
+MAX_REINTENTOS = 2
+BACKOFF_BASE_SEGUNDOS = 0.5
+
+
+class ErrorTransitorio(Exception):
+    """Fallo que vale la pena reintentar (429, 5xx, red)"""
+
+
+class TokenBucket:
+    """Limitador de tasa: `tasa` fichas/s, acumula hasta `capacidad`"""
+
+    def __init__(self, tasa: float, capacidad: Optional[float] = None):
+        self.tasa = tasa
+        self.capacidad = capacidad or tasa
+        self._fichas = self.capacidad
+        self._ultimo = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def adquirir(self):
+        async with self._lock:
+            while True:
+                ahora = time.monotonic()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.tasa)
+                self._ultimo = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                await asyncio.sleep((1 - self._fichas) / self.tasa)
+
+
+# ════════════════════════════════════════════════════════════════════════
+# TRANSPORTES
+# ════════════════════════════════════════════════════════════════════════
+
+class TransporteSimulado:
+    """Transporte del MVP: no envía nada, solo marca el mensaje como simulado"""
+
+    status = 'simulado'
+
+    async def enviar(self, mensaje: Dict[str, Any]):
+        await asyncio.sleep(0)
+
+    async def cerrar(self):
+        pass
+
+
+class TransporteHTTP:
+    """
+    POST JSON {canal, destino, texto} a la API de un proveedor
+
+    Cliente HTTP/1.1 mínimo sobre asyncio (sin dependencias) con un pool de
+    conexiones keep-alive de hasta `max_conexiones`.
+    """
+
+    status = 'success'
+
+    def __init__(self, url: str, token: Optional[str] = None, max_conexiones: int = 20,
+                 timeout_segundos: float = 10):
+        partes = urlsplit(url)
+        self.host = partes.hostname
+        self.https = partes.scheme == 'https'
+        self.puerto = partes.port or (443 if self.https else 80)
+        self.ruta = partes.path or '/'
+        self.token = token
+        self.timeout = timeout_segundos
+        self._libres: asyncio.LifoQueue = None
+        self._cupos: asyncio.Semaphore = None
+        self._max_conexiones = max_conexiones
+
+    def _inicializar(self):
+        if self._cupos is None:
+            self._libres = asyncio.LifoQueue()
+            self._cupos = asyncio.Semaphore(self._max_conexiones)
+
+    async def _abrir(self):
+        contexto = ssl.create_default_context() if self.https else None
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.puerto, ssl=contexto), self.timeout)
+
+    async def _cerrar_conexion(self, writer: asyncio.StreamWriter):
+        writer.close()
+        try:
+            await asyncio.wait_for(writer.wait_closed(), self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            pass
+
+    @staticmethod
+    async def _leer_respuesta(reader: asyncio.StreamReader) -> tuple:
+        linea = await reader.readline()
+        if not linea:
+            raise ConnectionResetError("conexión cerrada por el servidor")
+        codigo = int(linea.split()[1])
+        cabeceras = {}
+        while True:
+            linea = await reader.readline()
+            if linea in (b'\r\n', b'\n', b''):
+                break
+            clave, _, valor = linea.decode('latin-1').partition(':')
+            cabeceras[clave.strip().lower()] = valor.strip()
+
+        if cabeceras.get('transfer-encoding', '').lower() == 'chunked':
+            cuerpo = b''
+            while True:
+                tamano = int((await reader.readline()).split(b';')[0], 16)
+                if tamano == 0:
+                    await reader.readline()
+                    break
+                cuerpo += await reader.readexactly(tamano)
+                await reader.readline()
+        elif 'content-length' in cabeceras:
+            cuerpo = await reader.readexactly(int(cabeceras['content-length']))
+        elif codigo < 200 or codigo in (204, 304):
+            cuerpo = b''
+        else:
+            # Sin Content-Length ni chunked: el cuerpo termina cuando el
+            # servidor cierra, así que la conexión no vuelve al pool
+            cuerpo = await reader.read()
+            cabeceras['connection'] = 'close'
+        return codigo, cabeceras, cuerpo
+
+    async def enviar(self, mensaje: Dict[str, Any]):
+        self._inicializar()
+        cuerpo = json.dumps({'canal': mensaje['canal'], 'destino': mensaje['destino'],
+                             'texto': mensaje['texto']}, ensure_ascii=False).encode('utf-8')
+        cabeceras = [f"POST {self.ruta} HTTP/1.1", f"Host: {self.host}",
+                     "Content-Type: application/json", f"Content-Length: {len(cuerpo)}",
+                     "Connection: keep-alive"]
+        if self.token:
+            cabeceras.append(f"Authorization: Bearer {self.token}")
+        solicitud = ("\r\n".join(cabeceras) + "\r\n\r\n").encode('latin-1') + cuerpo
+
+        async with self._cupos:
+            try:
+                reader, writer = self._libres.get_nowait()
+            except asyncio.QueueEmpty:
+                reader, writer = await self._abrir()
+            try:
+                writer.write(solicitud)
+                await writer.drain()
+                codigo, cabeceras_resp, _ = await asyncio.wait_for(self._leer_respuesta(reader), self.timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                await self._cerrar_conexion(writer)
+                raise ErrorTransitorio(f"red: {e!r}") from e
+
+            if cabeceras_resp.get('connection', '').lower() == 'close':
+                await self._cerrar_conexion(writer)
+            else:
+                self._libres.put_nowait((reader, writer))
+
+        if codigo == 429 or codigo >= 500:
+            raise ErrorTransitorio(f"HTTP {codigo}")
+        if codigo >= 400:
+            raise RuntimeError(f"HTTP {codigo}")
+
+    async def cerrar(self):
+        """Cierra las conexiones (el pool se recrea en el próximo event loop)"""
+        if self._libres is None:
+            return
+        while not self._libres.empty():
+            _, writer = self._libres.get_nowait()
+            await self._cerrar_conexion(writer)
+        self._libres = self._cupos = None
+
+
+def transportes_desde_entorno() -> Dict[str, Any]:
+    """
+    Transporte por canal según variables de entorno
+
+    WHATSAPP_API_URL / WHATSAPP_API_TOKEN y SMS_API_URL / SMS_API_TOKEN;
+    sin URL el canal usa TransporteSimulado.
+    """
+    transportes = {}
+    for canal in LIMITES_CANAL:
+        url = os.getenv(f"{canal.upper()}_API_URL")
+        transportes[canal] = (TransporteHTTP(url, os.getenv(f"{canal.upper()}_API_TOKEN"),
+                                             max_conexiones=LIMITES_CANAL[canal]['concurrencia'])
+                              if url else TransporteSimulado())
+    return transportes
+
+
+# ════════════════════════════════════════════════════════════════════════
+# LOG POR BLOQUES
+# ════════════════════════════════════════════════════════════════════════
+
+def escribir_filas_log(filas: List[list], log_file: Path = NUDGES_LOG_PATH):
+    """Agrega un bloque de filas al log A/B (crea el encabezado si falta)"""
+    if not filas:
+        return
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    nuevo = not log_file.exists()
+    with open(log_file, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if nuevo:
+            writer.writerow(COLUMNAS_LOG_NUDGES)
+        writer.writerows(filas)
+
+
+class _LogPorBloques:
+    """Acumula filas del log y las escribe por bloques en un hilo, en orden"""
+
+    def __init__(self, log_file: Optional[Path], tamano_bloque: int):
+        self.log_file = log_file
+        self.tamano_bloque = tamano_bloque
+        self._buffer: List[list] = []
+        self._ultima: Optional[asyncio.Task] = None
+
+    def agregar(self, fila: list):
+        if self.log_file is None:
+            return
+        self._buffer.append(fila)
+        if len(self._buffer) >= self.tamano_bloque:
+            self._volcar()
+
+    def _volcar(self):
+        bloque, self._buffer = self._buffer, []
+        if not bloque:
+            return
+        anterior = self._ultima
+
+        async def escribir():
+            if anterior is not None:
+                await anterior
+            await asyncio.to_thread(escribir_filas_log, bloque, self.log_file)
+
+        self._ultima = asyncio.ensure_future(escribir())
+
+    async def cerrar(self):
+        self._volcar()
+        if self._ultima is not None:
+            await self._ultima
+
+
+# ════════════════════════════════════════════════════════════════════════
+# DESPACHADOR
+# ════════════════════════════════════════════════════════════════════════
+
+class DespachadorMensajes:
+    """Fan-out asíncrono por canal con concurrencia y tasa limitadas"""
+
+    def __init__(self, transportes: Optional[Dict[str, Any]] = None,
+                 limites: Optional[Dict[str, Dict[str, float]]] = None,
+                 log_file: Optional[Path] = NUDGES_LOG_PATH,
+                 tamano_bloque_log: int = TAMANO_BLOQUE_LOG,
+                 max_reintentos: int = MAX_REINTENTOS,
+                 backoff_base: float = BACKOFF_BASE_SEGUNDOS):
+        """
+        Args:
+            transportes: {canal: transporte} (default: transportes_desde_entorno())
+            limites: {canal: {'concurrencia', 'tasa', 'rafaga'}} (default: LIMITES_CANAL)
+            log_file: Log A/B de nudges (None = no registrar)
+            tamano_bloque_log: Filas acumuladas antes de escribir
+            max_reintentos: Reintentos ante ErrorTransitorio
+            backoff_base: Espera inicial entre reintentos (se duplica)
+        """
+        self.transportes = transportes or transportes_desde_entorno()
+        self.limites = {**LIMITES_CANAL, **(limites or {})}
+        self.log_file = log_file
+        self.tamano_bloque_log = tamano_bloque_log
+        self.max_reintentos = max_reintentos
+        self.backoff_base = backoff_base
+
+    async def _enviar_uno(self, mensaje: Dict[str, Any], transporte, semaforo: asyncio.Semaphore,
+                          bucket: TokenBucket) -> tuple:
+        """(error o None, latencia en s, reintentos)"""
+        for intento in range(self.max_reintentos + 1):
+            await bucket.adquirir()
+            async with semaforo:
+                inicio = time.perf_counter()
+                try:
+                    await transporte.enviar(mensaje)
+                    return None, time.perf_counter() - inicio, intento
+                except ErrorTransitorio as e:
+                    error = str(e)
+                except Exception as e:
+                    return str(e), time.perf_counter() - inicio, intento
+            if intento < self.max_reintentos:
+                await asyncio.sleep(self.backoff_base * (2 ** intento))
+        return error, time.perf_counter() - inicio, self.max_reintentos
+
+    async def despachar(self, mensajes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Envía todos los mensajes respetando los límites de cada canal
+
+        Args:
+            mensajes: Dicts con canal ('whatsapp' | 'sms'), destino, texto y
+                      opcionalmente variante, tipo_control, dias (para el log A/B)
+
+        Returns:
+            Dict con 'resultados' (error o None por mensaje, mismo orden),
+            'por_canal' (enviados, fallidos, reintentos, duracion_s,
+            mensajes_por_segundo, latencia_p50_ms, latencia_p95_ms,
+            latencia_max_ms) y 'duracion_s' total
+        """
+        log = _LogPorBloques(self.log_file, self.tamano_bloque_log)
+        controles = {}
+        for canal in {m['canal'] for m in mensajes}:
+            if canal not in self.transportes:
+                raise ValueError(f"Canal sin transporte configurado: {canal}")
+            limite = self.limites[canal]
+            controles[canal] = (asyncio.Semaphore(int(limite['concurrencia'])),
+                                TokenBucket(limite['tasa'], limite.get('rafaga')))
+
+        metricas = {canal: {'latencias': [], 'fallidos': 0, 'reintentos': 0, 'inicio': None, 'fin': None}
+                    for canal in controles}
+        resultados: List[Optional[str]] = [None] * len(mensajes)
+
+        async def tarea(indice: int, mensaje: Dict[str, Any]):
+            canal = mensaje['canal']
+            m = metricas[canal]
+            m['inicio'] = m['inicio'] or time.perf_counter()
+            semaforo, bucket = controles[canal]
+            transporte = self.transportes[canal]
+            error, latencia, reintentos = await self._enviar_uno(mensaje, transporte, semaforo, bucket)
+            m['fin'] = time.perf_counter()
+            m['reintentos'] += reintentos
+            if error is None:
+                m['latencias'].append(latencia)
+            else:
+                m['fallidos'] += 1
+            resultados[indice] = error
+            log.agregar([
+                datetime.now().isoformat(), mensaje['destino'], mensaje.get('variante', ''),
+                canal.upper() if canal == 'sms' else 'WhatsApp', mensaje.get('tipo_control', ''),
+                mensaje.get('dias', ''), transporte.status if error is None else 'error'
+            ])
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(tarea(i, m) for i, m in enumerate(mensajes)))
+        await log.cerrar()
+        duracion = time.perf_counter() - inicio
+
+        por_canal = {}
+        for canal, m in metricas.items():
+            latencias = np.array(m['latencias']) * 1000
+            duracion_canal = (m['fin'] - m['inicio']) if m['inicio'] else 0.0
+            por_canal[canal] = {
+                'enviados': len(latencias),
+                'fallidos': m['fallidos'],
+                'reintentos': m['reintentos'],
+                'duracion_s': round(duracion_canal, 3),
+                'mensajes_por_segundo': round(len(latencias) / duracion_canal, 1) if duracion_canal > 0 else 0.0,
+                'latencia_p50_ms': round(float(np.percentile(latencias, 50)), 1) if len(latencias) else None,
+                'latencia_p95_ms': round(float(np.percentile(latencias, 95)), 1) if len(latencias) else None,
+                'latencia_max_ms': round(float(latencias.max()), 1) if len(latencias) else None,
+            }
+            logger.info(f"📨 {canal}: {por_canal[canal]['enviados']} enviados, {m['fallidos']} fallidos, "
+                        f"{por_canal[canal]['mensajes_por_segundo']} msg/s, "
+                        f"p95 {por_canal[canal]['latencia_p95_ms']} ms")
+
+        return {'resultados': resultados, 'por_canal': por_canal, 'duracion_s': round(duracion, 3)}
+
+    async def cerrar(self):
+        for transporte in self.transportes.values():
+            await transporte.cerrar()
+
+    def despachar_sync(self, mensajes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        despachar() para código síncrono (Streamlit, worker de recordatorios)
+
+        Si el hilo ya tiene un event loop en marcha (p. ej. una ruta de
+        FastAPI en api.py), asyncio.run fallaría: la campaña corre en su
+        propio loop en un hilo aparte. El código async debe usar despachar().
+        """
+        async def ejecutar():
+            try:
+                return await self.despachar(mensajes)
+            finally:
+                await self.cerrar()
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(ejecutar())
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="despachador") as pool:
+            return pool.submit(asyncio.run, ejecutar()).result()
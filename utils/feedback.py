@@ -1,30 +1,221 @@
 """
 utils/feedback.py
 Sistema de feedback y métrica de comprensión
+
+Cada feedback es un evento en un log append-only (SQLite WAL en
+data/feedback/feedback.db). En la misma transacción se actualizan los
+contadores muy_claro / dudas / no_entendí, que cuentan el último feedback de
+cada caso (como antes, cuando un caso sobrescribía su JSON): la métrica de
+comprensión es O(1) y la exportación recorre el log con un cursor sin
+cargarlo en memoria. Los JSON antiguos de data/feedback/ se importan la
+primera vez.
 """
+import os
+import csv
 import json
+import sqlite3
+import logging
+import threading
 from datetime import datetime
 from pathlib import Path
-import pandas as pd
+from typing import Dict, Optional
+
+from utils.sqlite_wal import AlmacenSQLite
+
+logger = logging.getLogger(__name__)
+
+
+FEEDBACK_DIR = Path("data/feedback")
+FEEDBACK_DB_PATH = Path(os.getenv("FEEDBACK_DB", str(FEEDBACK_DIR / "feedback.db")))
+
+COLUMNAS_EVENTO = ['caso_id', 'timestamp', 'comprension_score', 'fue_util', 'preparó_menu', 'comentario']
+OBJETIVO_COMPRENSION_PCT = 80
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS eventos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    caso_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    comprension_score INTEGER NOT NULL,
+    fue_util INTEGER,
+    preparo_menu INTEGER,
+    comentario TEXT
+);
+CREATE TABLE IF NOT EXISTS ultimo_por_caso (
+    caso_id TEXT PRIMARY KEY,
+    evento_id INTEGER NOT NULL,
+    comprension_score INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contadores (comprension_score INTEGER PRIMARY KEY, n INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT);
+"""
+
+
+def _bool(valor) -> Optional[int]:
+    return None if valor is None else int(bool(valor))
+
+
+class FeedbackLog(AlmacenSQLite):
+    """
+    Log de eventos de feedback con contadores mantenidos al escribir
+
+    Una conexión por hilo; las escrituras usan BEGIN IMMEDIATE
+    (utils/sqlite_wal.AlmacenSQLite).
+    """
+
+    def __init__(self, ruta: Path = FEEDBACK_DB_PATH, directorio_json: Optional[Path] = FEEDBACK_DIR):
+        """
+        Args:
+            ruta: Archivo SQLite
+            directorio_json: Feedback JSON antiguo a importar (None = no importar)
+        """
+        super().__init__(ruta, ESQUEMA)
+        if directorio_json is not None:
+            self._migrar_json(Path(directorio_json))
+
+    # ════════════════════════════════════════════════════════════════════
+    # ESCRITURA
+    # ════════════════════════════════════════════════════════════════════
+
+    @staticmethod
+    def _registrar(conn: sqlite3.Connection, feedback: Dict) -> int:
+        """Inserta el evento y mueve el contador del caso (O(1))"""
+        caso_id, score = feedback['caso_id'], int(feedback['comprension_score'])
+        cursor = conn.execute(
+            "INSERT INTO eventos (caso_id, timestamp, comprension_score, fue_util, preparo_menu, comentario)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (caso_id, feedback['timestamp'], score, _bool(feedback.get('fue_util')),
+             _bool(feedback.get('preparó_menu')), feedback.get('comentario') or '')
+        )
+        evento_id = cursor.lastrowid
+
+        anterior = conn.execute(
+            "SELECT comprension_score FROM ultimo_por_caso WHERE caso_id = ?", (caso_id,)
+        ).fetchone()
+        if anterior is not None:
+            conn.execute("UPDATE contadores SET n = n - 1 WHERE comprension_score = ?", (anterior[0],))
+        conn.execute(
+            "INSERT INTO ultimo_por_caso (caso_id, evento_id, comprension_score) VALUES (?, ?, ?)"
+            " ON CONFLICT (caso_id) DO UPDATE SET evento_id = excluded.evento_id,"
+            " comprension_score = excluded.comprension_score",
+            (caso_id, evento_id, score)
+        )
+        conn.execute(
+            "INSERT INTO contadores (comprension_score, n) VALUES (?, 1)"
+            " ON CONFLICT (comprension_score) DO UPDATE SET n = n + 1",
+            (score,)
+        )
+        return evento_id
+
+    def agregar(self, feedback: Dict) -> Dict:
+        """Agrega un evento de feedback (dict con COLUMNAS_EVENTO)"""
+        with self._transaccion() as conn:
+            self._registrar(conn, feedback)
+        return feedback
+
+    def _migrar_json(self, directorio: Path):
+        """Importa una sola vez los {caso_id}.json del sistema anterior"""
+        conn = self._conexion()
+        if conn.execute("SELECT 1 FROM meta WHERE clave = 'migrado_json'").fetchone():
+            return
+
+        feedbacks = []
+        for archivo in sorted(directorio.glob("*.json")) if directorio.exists() else []:
+            try:
+                with open(archivo, 'r') as f:
+                    feedbacks.append(json.load(f))
+            except Exception:
+                continue
+        feedbacks.sort(key=lambda f: f.get('timestamp', ''))
+
+        with self._transaccion() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE clave = 'migrado_json'").fetchone():
+                return
+            for feedback in feedbacks:
+                if 'caso_id' in feedback and 'comprension_score' in feedback:
+                    self._registrar(conn, feedback)
+            conn.execute("INSERT INTO meta (clave, valor) VALUES ('migrado_json', ?)",
+                         (datetime.now().isoformat(),))
+        if feedbacks:
+            logger.info(f"✅ Feedback: {len(feedbacks)} JSON importados a {self.ruta}")
+
+    # ════════════════════════════════════════════════════════════════════
+    # LECTURA
+    # ════════════════════════════════════════════════════════════════════
+
+    def contadores(self) -> Dict[int, int]:
+        """{comprension_score: casos} según el último feedback de cada caso"""
+        filas = self._conexion().execute("SELECT comprension_score, n FROM contadores").fetchall()
+        return {score: n for score, n in filas}
+
+    def exportar_csv(self, ruta: Path, solo_ultimo: bool = True, lote: int = 5000) -> int:
+        """
+        Escribe el log a CSV recorriéndolo por bloques
+
+        Args:
+            ruta: Archivo CSV de salida
+            solo_ultimo: Solo el último feedback de cada caso (False = todos los eventos)
+            lote: Filas leídas por bloque
+
+        Returns:
+            Filas exportadas
+        """
+        consulta = ("SELECT caso_id, timestamp, comprension_score, fue_util, preparo_menu, comentario"
+                    " FROM eventos")
+        if solo_ultimo:
+            consulta += " WHERE id IN (SELECT evento_id FROM ultimo_por_caso)"
+        consulta += " ORDER BY id"
+
+        n = 0
+        cursor = self._conexion().execute(consulta)
+        with open(ruta, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNAS_EVENTO)
+            while True:
+                filas = cursor.fetchmany(lote)
+                if not filas:
+                    break
+                writer.writerows(
+                    (caso, ts, score,
+                     None if util is None else bool(util),
+                     None if menu is None else bool(menu),
+                     comentario)
+                    for caso, ts, score, util, menu, comentario in filas
+                )
+                n += len(filas)
+        return n
+
+
+# Instancia global (singleton pattern)
+_feedback_instance = None
+_feedback_lock = threading.Lock()
+
+
+def get_feedback_log() -> FeedbackLog:
+    """Factory para obtener instancia única del log de feedback"""
+    global _feedback_instance
+    if _feedback_instance is None:
+        with _feedback_lock:
+            if _feedback_instance is None:
+                _feedback_instance = FeedbackLog()
+    return _feedback_instance
+
 
 def guardar_feedback(caso_id: str, comprension: int, util: bool,
                      preparó_menu: bool = None, comentario: str = ""):
     """
     Guarda feedback del usuario
-    
+
     Args:
         caso_id: ID único del caso
         comprension: 0 (no entendí), 50 (dudas), 100 (muy claro)
         util: Boolean si fue útil
         preparó_menu: Boolean si preparó el menú (para HU-02)
         comentario: Texto libre opcional
-    
+
     Returns:
         Dict con el feedback guardado
     """
-    feedback_dir = Path("data/feedback")
-    feedback_dir.mkdir(parents=True, exist_ok=True)
-
     feedback = {
         'caso_id': caso_id,
         'timestamp': datetime.now().isoformat(),
@@ -33,106 +224,33 @@ def guardar_feedback(caso_id: str, comprension: int, util: bool,
         'preparó_menu': preparó_menu,
         'comentario': comentario
     }
-
-    # Guardar archivo individual
-    archivo = feedback_dir / f"{caso_id}.json"
-    with open(archivo, 'w') as f:
-        json.dump(feedback, f, indent=2)
-    
-    # ✨ AGREGAR: También guardar en log consolidado
-    log_file = feedback_dir / "feedback_log.csv"
-    
-    # Crear archivo si no existe
-    if not log_file.exists():
-        import csv
-        with open(log_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['timestamp', 'caso_id', 'comprension', 'util', 'comentario'])
-    
-    # Agregar registro
-    import csv
-    with open(log_file, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            feedback['timestamp'],
-            caso_id,
-            comprension,
-            util,
-            comentario
-        ])
-
-    return feedback
-
-# ... (resto del código igual)
+    return get_feedback_log().agregar(feedback)
 
 
 def calcular_metrica_comprension():
     """Calcula % de comprensión global (objetivo: 80-90%)"""
-    feedback_dir = Path("data/feedback")
-    
-    if not feedback_dir.exists():
-        return {
-            'comprension_pct': 0,
-            'n_total': 0,
-            'n_muy_claro': 0,
-            'n_dudas': 0,
-            'n_no_entendí': 0,
-            'objetivo_cumplido': False
-        }
-    
-    feedbacks = []
-    for archivo in feedback_dir.glob("*.json"):
-        try:
-            with open(archivo, 'r') as f:
-                feedbacks.append(json.load(f))
-        except:
-            continue
-    
-    if not feedbacks:
-        return {
-            'comprension_pct': 0,
-            'n_total': 0,
-            'n_muy_claro': 0,
-            'n_dudas': 0,
-            'n_no_entendí': 0,
-            'objetivo_cumplido': False
-        }
-    
-    n_muy_claro = len([f for f in feedbacks if f['comprension_score'] == 100])
-    n_dudas = len([f for f in feedbacks if f['comprension_score'] == 50])
-    n_no_entendí = len([f for f in feedbacks if f['comprension_score'] == 0])
-    
-    comprension_pct = (n_muy_claro / len(feedbacks)) * 100
-    
+    contadores = get_feedback_log().contadores()
+
+    n_total = sum(contadores.values())
+    n_muy_claro = contadores.get(100, 0)
+    comprension_pct = (n_muy_claro / n_total) * 100 if n_total else 0
+
     return {
         'comprension_pct': round(comprension_pct, 1),
-        'n_total': len(feedbacks),
+        'n_total': n_total,
         'n_muy_claro': n_muy_claro,
-        'n_dudas': n_dudas,
-        'n_no_entendí': n_no_entendí,
-        'objetivo_cumplido': comprension_pct >= 80
+        'n_dudas': contadores.get(50, 0),
+        'n_no_entendí': contadores.get(0, 0),
+        'objetivo_cumplido': n_total > 0 and comprension_pct >= OBJETIVO_COMPRENSION_PCT
     }
 
-def exportar_feedbacks_csv():
-    """Exporta todos los feedbacks a CSV para análisis"""
-    feedback_dir = Path("data/feedback")
-    
-    if not feedback_dir.exists():
-        return None
-    
-    feedbacks = []
-    for archivo in feedback_dir.glob("*.json"):
-        try:
-            with open(archivo, 'r') as f:
-                feedbacks.append(json.load(f))
-        except:
-            continue
-    
-    if not feedbacks:
+def exportar_feedbacks_csv(todos_los_eventos: bool = False):
+    """Exporta los feedbacks a CSV para análisis (streaming desde el log)"""
+    output_path = FEEDBACK_DIR / "feedbacks_export.csv"
+    n = get_feedback_log().exportar_csv(output_path, solo_ultimo=not todos_los_eventos)
+
+    if n == 0:
+        output_path.unlink(missing_ok=True)
         return None
-    
-    df = pd.DataFrame(feedbacks)
-    output_path = feedback_dir / "feedbacks_export.csv"
-    df.to_csv(output_path, index=False)
-    
+
     return output_path
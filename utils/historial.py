@@ -1,23 +1,394 @@
 """
 utils/historial.py
 Sistema de historial y resumen de cambios entre consultas
+
+Las consultas se guardan en SQLite (modo WAL) indexado por paciente y
+fecha: cada alta es una transacción atómica, varios procesos/hilos pueden
+escribir el mismo DNI sin perder consultas y las consultas de cohorte
+(p. ej. niños cuya Hb bajó este trimestre) son una sola query. Los JSON
+antiguos de data/historial/{dni}.json se importan la primera vez.
 """
+import os
 import json
-from datetime import datetime
+import sqlite3
+import logging
+import threading
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from utils.sqlite_wal import AlmacenSQLite
+
+logger = logging.getLogger(__name__)
+
+
+HISTORIAL_DIR = Path("data/historial")
+HISTORIAL_DB_PATH = Path(os.getenv("HISTORIAL_DB", str(HISTORIAL_DIR / "historial.db")))
+
+# Retención configurable (0 = sin límite). Por defecto 5 años: el niño sale
+# del rango 6-59 meses y su historial deja de usarse
+MAX_CONSULTAS_POR_PACIENTE = int(os.getenv("HISTORIAL_MAX_CONSULTAS", "0"))
+DIAS_RETENCION_HISTORIAL = float(os.getenv("HISTORIAL_DIAS_RETENCION", "1825"))
+# get_historial_store() aplica la retención como máximo una vez por intervalo
+INTERVALO_RETENCION = timedelta(days=1)
+
+CAMPOS_SNAPSHOT = ['hemoglobina', 'hemoglobina_ajustada', 'score_riesgo', 'tiene_anemia',
+                   'severidad', 'edad_meses', 'recibe_suplemento', 'asiste_cred']
+CAMPOS_BOOLEANOS = ('tiene_anemia', 'recibe_suplemento', 'asiste_cred')
+COLUMNAS_HB = ('hemoglobina', 'hemoglobina_ajustada')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS consultas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id_paciente TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    hemoglobina REAL,
+    hemoglobina_ajustada REAL,
+    score_riesgo REAL,
+    tiene_anemia INTEGER,
+    severidad TEXT,
+    edad_meses INTEGER,
+    recibe_suplemento INTEGER,
+    asiste_cred INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_consultas_paciente_fecha ON consultas (id_paciente, fecha);
+CREATE INDEX IF NOT EXISTS idx_consultas_fecha ON consultas (fecha);
+CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT);
+"""
+
+
+def _iso(valor) -> Optional[str]:
+    """Fecha/datetime/str → ISO 8601 comparable como texto"""
+    if valor is None:
+        return None
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return str(valor)
+
+
+class HistorialStore(AlmacenSQLite):
+    """
+    Historial de consultas en SQLite WAL
+
+    Una conexión por hilo (Streamlit atiende sesiones en hilos); las
+    escrituras usan BEGIN IMMEDIATE para serializarse entre procesos.
+    """
+
+    def __init__(self, ruta: Path = HISTORIAL_DB_PATH,
+                 max_consultas: int = MAX_CONSULTAS_POR_PACIENTE,
+                 dias_retencion: float = DIAS_RETENCION_HISTORIAL,
+                 directorio_json: Optional[Path] = HISTORIAL_DIR):
+        """
+        Args:
+            ruta: Archivo SQLite
+            max_consultas: Consultas a conservar por paciente (0 = todas)
+            dias_retencion: Antigüedad máxima de una consulta (0 = sin límite)
+            directorio_json: Historial JSON antiguo a importar (None = no importar)
+        """
+        self.max_consultas = max_consultas
+        self.dias_retencion = dias_retencion
+        self._proxima_retencion: Optional[datetime] = None
+        super().__init__(ruta, ESQUEMA, row_factory=sqlite3.Row)
+        if directorio_json is not None:
+            self._migrar_json(Path(directorio_json))
+
+    # ════════════════════════════════════════════════════════════════════
+    # ESCRITURA
+    # ════════════════════════════════════════════════════════════════════
+
+    @staticmethod
+    def _fila(id_paciente: str, snapshot: Dict) -> tuple:
+        valores = []
+        for campo in CAMPOS_SNAPSHOT:
+            valor = snapshot.get(campo)
+            valores.append(int(bool(valor)) if campo in CAMPOS_BOOLEANOS and valor is not None else valor)
+        return (str(id_paciente), _iso(snapshot.get('fecha') or datetime.now()), *valores)
+
+    def _insertar(self, conn: sqlite3.Connection, filas: List[tuple]):
+        conn.executemany(
+            f"INSERT INTO consultas (id_paciente, fecha, {', '.join(CAMPOS_SNAPSHOT)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(CAMPOS_SNAPSHOT))})",
+            filas
+        )
+
+    def _recortar_pacientes(self, conn: sqlite3.Connection, ids: Iterable[str]):
+        """Aplica max_consultas a los pacientes recién escritos"""
+        if self.max_consultas <= 0:
+            return
+        for id_paciente in set(ids):
+            conn.execute(
+                "DELETE FROM consultas WHERE id_paciente = ? AND id NOT IN ("
+                " SELECT id FROM consultas WHERE id_paciente = ? ORDER BY fecha DESC, id DESC LIMIT ?)",
+                (id_paciente, id_paciente, self.max_consultas)
+            )
+
+    def agregar(self, id_paciente: str, snapshot: Dict) -> Dict:
+        """Agrega una consulta (transacción atómica con su retención por paciente)"""
+        fila = self._fila(id_paciente, snapshot)
+        with self._transaccion() as conn:
+            self._insertar(conn, [fila])
+            self._recortar_pacientes(conn, [fila[0]])
+        return {'fecha': fila[1], **dict(zip(CAMPOS_SNAPSHOT, (snapshot.get(c) for c in CAMPOS_SNAPSHOT)))}
+
+    def agregar_lote(self, consultas: Iterable[tuple]) -> int:
+        """
+        Agrega muchas consultas en una sola transacción
+
+        Args:
+            consultas: Iterable de (id_paciente, snapshot)
+
+        Returns:
+            Número de consultas insertadas
+        """
+        filas = [self._fila(id_paciente, snapshot) for id_paciente, snapshot in consultas]
+        with self._transaccion() as conn:
+            self._insertar(conn, filas)
+            self._recortar_pacientes(conn, (f[0] for f in filas))
+        return len(filas)
+
+    def aplicar_retencion(self) -> int:
+        """
+        Elimina consultas más antiguas que dias_retencion y las que exceden
+        max_consultas por paciente
+
+        Returns:
+            Consultas eliminadas
+        """
+        ahora = datetime.now()
+        with self._transaccion() as conn:
+            eliminadas = 0
+            if self.dias_retencion > 0:
+                limite = _iso(datetime.now() - timedelta(days=self.dias_retencion))
+                eliminadas += conn.execute("DELETE FROM consultas WHERE fecha < ?", (limite,)).rowcount
+            if self.max_consultas > 0:
+                eliminadas += conn.execute(
+                    "DELETE FROM consultas WHERE id IN ("
+                    " SELECT id FROM (SELECT id, ROW_NUMBER() OVER ("
+                    "  PARTITION BY id_paciente ORDER BY fecha DESC, id DESC) AS rn FROM consultas)"
+                    " WHERE rn > ?)",
+                    (self.max_consultas,)
+                ).rowcount
+            conn.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('ultima_retencion', ?)",
+                         (_iso(ahora),))
+            if eliminadas:
+                # Los procesos incrementales (DetectorCambios) recalculan todo al ver esta marca
+                conn.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('marca_retencion', ?)",
+                             (_iso(ahora),))
+        self._proxima_retencion = ahora + INTERVALO_RETENCION
+
+        if eliminadas:
+            logger.info(f"🧹 Retención historial: {eliminadas} consultas eliminadas")
+        return eliminadas
+
+    def aplicar_retencion_programada(self) -> Optional[int]:
+        """
+        Aplica la retención si pasó INTERVALO_RETENCION desde la última
+        (registrada en meta, compartida entre procesos)
+
+        Returns:
+            Consultas eliminadas, o None si aún no tocaba
+        """
+        if self.dias_retencion <= 0 and self.max_consultas <= 0:
+            return None
+        ahora = datetime.now()
+        if self._proxima_retencion is not None and ahora < self._proxima_retencion:
+            return None
+
+        fila = self._conexion().execute("SELECT valor FROM meta WHERE clave = 'ultima_retencion'").fetchone()
+        if fila is not None:
+            proxima = datetime.fromisoformat(fila[0]) + INTERVALO_RETENCION
+            if ahora < proxima:
+                self._proxima_retencion = proxima
+                return None
+        return self.aplicar_retencion()
+
+    def marca_retencion(self) -> Optional[str]:
+        """Fecha de la última retención que eliminó consultas (None = nunca)"""
+        fila = self._conexion().execute("SELECT valor FROM meta WHERE clave = 'marca_retencion'").fetchone()
+        return fila[0] if fila else None
+
+    def _migrar_json(self, directorio: Path):
+        """Importa una sola vez los historiales JSON por DNI"""
+        conn = self._conexion()
+        if conn.execute("SELECT 1 FROM meta WHERE clave = 'migrado_json'").fetchone():
+            return
+
+        consultas = []
+        for archivo in sorted(directorio.glob("*.json")):
+            try:
+                with open(archivo, 'r') as f:
+                    consultas.extend((archivo.stem, snapshot) for snapshot in json.load(f))
+            except Exception as e:
+                logger.warning(f"⚠️ Historial JSON ilegible {archivo.name}: {e}")
+
+        with self._transaccion() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE clave = 'migrado_json'").fetchone():
+                return
+            self._insertar(conn, [self._fila(id_paciente, s) for id_paciente, s in consultas])
+            conn.execute("INSERT INTO meta (clave, valor) VALUES ('migrado_json', ?)", (_iso(datetime.now()),))
+
+        if consultas:
+            logger.info(f"📥 Historial JSON importado: {len(consultas)} consultas")
+
+    # ════════════════════════════════════════════════════════════════════
+    # LECTURA
+    # ════════════════════════════════════════════════════════════════════
+
+    @staticmethod
+    def _snapshot(fila: sqlite3.Row) -> Dict:
+        snapshot = {'fecha': fila['fecha']}
+        for campo in CAMPOS_SNAPSHOT:
+            valor = fila[campo]
+            snapshot[campo] = bool(valor) if campo in CAMPOS_BOOLEANOS and valor is not None else valor
+        return snapshot
+
+    def historial(self, id_paciente: str, limite: Optional[int] = None) -> List[Dict]:
+        """Consultas del paciente en orden cronológico (las `limite` más recientes)"""
+        filas = self._conexion().execute(
+            "SELECT * FROM (SELECT * FROM consultas WHERE id_paciente = ? "
+            "ORDER BY fecha DESC, id DESC LIMIT ?) ORDER BY fecha, id",
+            (str(id_paciente), -1 if limite is None else limite)
+        ).fetchall()
+        return [self._snapshot(f) for f in filas]
+
+    def consultas_periodo(self, desde=None, hasta=None,
+                          ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        Todas las consultas de un rango de fechas [desde, hasta)
+
+        Returns:
+            DataFrame con id_paciente, fecha y los campos del snapshot
+        """
+        condiciones, parametros = self._filtros(desde, hasta, ids)
+        return self._tipar(pd.read_sql_query(
+            f"SELECT id_paciente, fecha, {', '.join(CAMPOS_SNAPSHOT)} FROM consultas "
+            f"{condiciones} ORDER BY id_paciente, fecha, id",
+            self._conexion(), params=parametros
+        ))
+
+    def tendencias_cohorte(self, desde=None, hasta=None, ids: Optional[Iterable[str]] = None,
+                           columna: str = 'hemoglobina', min_consultas: int = 2) -> pd.DataFrame:
+        """
+        Primera y última medición de cada paciente en el rango, en una sola query
+
+        Args:
+            desde, hasta: Rango [desde, hasta) (fecha, datetime o ISO)
+            ids: Restringir a estos pacientes
+            columna: 'hemoglobina' o 'hemoglobina_ajustada'
+            min_consultas: Mínimo de consultas en el rango
+
+        Returns:
+            DataFrame con id_paciente, n_consultas, fecha_inicial, hb_inicial,
+            fecha_final, hb_final, delta_hb y dias
+        """
+        if columna not in COLUMNAS_HB:
+            raise ValueError(f"Columna inválida: {columna}")
+
+        condiciones, parametros = self._filtros(desde, hasta, ids, f"{columna} IS NOT NULL")
+        df = pd.read_sql_query(
+            f"""
+            WITH v AS (
+                SELECT id_paciente, fecha, {columna} AS hb,
+                       ROW_NUMBER() OVER (PARTITION BY id_paciente ORDER BY fecha, id) AS rn_asc,
+                       ROW_NUMBER() OVER (PARTITION BY id_paciente ORDER BY fecha DESC, id DESC) AS rn_desc,
+                       COUNT(*) OVER (PARTITION BY id_paciente) AS n
+                FROM consultas {condiciones}
+            )
+            SELECT id_paciente, MAX(n) AS n_consultas,
+                   MAX(CASE WHEN rn_asc = 1 THEN fecha END) AS fecha_inicial,
+                   MAX(CASE WHEN rn_asc = 1 THEN hb END) AS hb_inicial,
+                   MAX(CASE WHEN rn_desc = 1 THEN fecha END) AS fecha_final,
+                   MAX(CASE WHEN rn_desc = 1 THEN hb END) AS hb_final
+            FROM v GROUP BY id_paciente HAVING MAX(n) >= ?
+            """,
+            self._conexion(), params=[*parametros, min_consultas]
+        )
+        df['delta_hb'] = (df['hb_final'] - df['hb_inicial']).round(2)
+        df['dias'] = (pd.to_datetime(df['fecha_final'], format='ISO8601') -
+                      pd.to_datetime(df['fecha_inicial'], format='ISO8601')).dt.days
+        return df
+
+    def pacientes_con_caida(self, desde=None, hasta=None, umbral_g_dl: float = 0.5,
+                            columna: str = 'hemoglobina') -> pd.DataFrame:
+        """Pacientes cuya Hb bajó al menos `umbral_g_dl` dentro del rango"""
+        tendencias = self.tendencias_cohorte(desde, hasta, columna=columna)
+        return tendencias[tendencias['delta_hb'] <= -umbral_g_dl].sort_values('delta_hb').reset_index(drop=True)
+
+    def ultimas_consultas(self, ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Consulta más reciente de cada paciente (o de los indicados)"""
+        condiciones, parametros = self._filtros(None, None, ids)
+        return self._tipar(pd.read_sql_query(
+            f"SELECT id_paciente, fecha, {', '.join(CAMPOS_SNAPSHOT)} FROM ("
+            f" SELECT *, ROW_NUMBER() OVER (PARTITION BY id_paciente ORDER BY fecha DESC, id DESC) AS rn"
+            f" FROM consultas {condiciones}) WHERE rn = 1 ORDER BY id_paciente",
+            self._conexion(), params=parametros
+        ))
+
+    @staticmethod
+    def _tipar(df: pd.DataFrame) -> pd.DataFrame:
+        """Banderas 0/1 de SQLite → booleanos (nullable)"""
+        for campo in CAMPOS_BOOLEANOS:
+            df[campo] = df[campo].astype('boolean')
+        return df
+
+    def pacientes_modificados(self, desde_id: int = 0) -> tuple:
+        """
+        Pacientes con consultas nuevas desde `desde_id` (para procesos incrementales)
+
+        Returns:
+            (lista de id_paciente, id máximo actual)
+        """
+        conn = self._conexion()
+        maximo = conn.execute("SELECT COALESCE(MAX(id), 0) FROM consultas").fetchone()[0]
+        filas = conn.execute(
+            "SELECT DISTINCT id_paciente FROM consultas WHERE id > ? AND id <= ?", (desde_id, maximo)
+        ).fetchall()
+        return [f[0] for f in filas], maximo
+
+    @staticmethod
+    def _filtros(desde, hasta, ids, *extra) -> tuple:
+        condiciones, parametros = list(extra), []
+        if desde is not None:
+            condiciones.append("fecha >= ?")
+            parametros.append(_iso(desde))
+        if hasta is not None:
+            condiciones.append("fecha < ?")
+            parametros.append(_iso(hasta))
+        if ids is not None:
+            ids = [str(i) for i in ids]
+            condiciones.append(f"id_paciente IN ({', '.join('?' * len(ids))})" if ids else "0")
+            parametros.extend(ids)
+        return ("WHERE " + " AND ".join(condiciones)) if condiciones else "", parametros
+
+
+# Instancia global (singleton pattern)
+_historial_instance = None
+_historial_lock = threading.Lock()
+
+
+def get_historial_store() -> HistorialStore:
+    """Factory para obtener instancia única del historial"""
+    global _historial_instance
+    with _historial_lock:
+        if _historial_instance is None:
+            _historial_instance = HistorialStore()
+        try:
+            _historial_instance.aplicar_retencion_programada()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Retención del historial pospuesta: {e}")
+    return _historial_instance
+
 
 def guardar_consulta(id_paciente: str, datos_consulta: Dict):
     """
-    Guarda snapshot de consulta en JSON ligero
+    Guarda snapshot de consulta en el historial (transacción atómica)
     
     Args:
         id_paciente: DNI o ID único del paciente
         datos_consulta: Diccionario con datos de la consulta
     """
-    historial_dir = Path("data/historial")
-    historial_dir.mkdir(parents=True, exist_ok=True)
-    
     snapshot = {
         'fecha': datetime.now().isoformat(),
         'hemoglobina': datos_consulta.get('hemoglobina'),
@@ -30,36 +401,14 @@ def guardar_consulta(id_paciente: str, datos_consulta: Dict):
         'asiste_cred': datos_consulta.get('asiste_cred')
     }
     
-    archivo = historial_dir / f"{id_paciente}.json"
-    
-    # Cargar historial existente
-    try:
-        with open(archivo, 'r') as f:
-            historial = json.load(f)
-    except:
-        historial = []
-    
-    historial.append(snapshot)
-    
-    # Mantener solo últimas 12 consultas (1 año aprox)
-    historial = historial[-12:]
-    
-    with open(archivo, 'w') as f:
-        json.dump(historial, f, indent=2)
-    
-    return snapshot
+    return get_historial_store().agregar(id_paciente, snapshot)
 
 def obtener_historial(id_paciente: str) -> List[Dict]:
     """Obtiene historial completo del paciente"""
-    archivo = Path(f"data/historial/{id_paciente}.json")
-    
-    if not archivo.exists():
-        return []
-    
     try:
-        with open(archivo, 'r') as f:
-            return json.load(f)
-    except:
+        return get_historial_store().historial(id_paciente)
+    except Exception as e:
+        logger.error(f"❌ Error leyendo historial de {id_paciente}: {e}")
         return []
 
 def generar_resumen_cambios(id_paciente: str) -> Optional[Dict]:
@@ -82,7 +431,6 @@ def generar_resumen_cambios(id_paciente: str) -> Optional[Dict]:
     delta_riesgo = actual['score_riesgo'] - anterior['score_riesgo']
     
     # Calcular días transcurridos
-    from datetime import datetime
     fecha_anterior = datetime.fromisoformat(anterior['fecha'])
     fecha_actual = datetime.fromisoformat(actual['fecha'])
     dias_transcurridos = (fecha_actual - fecha_anterior).days
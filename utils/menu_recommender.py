@@ -8,7 +8,8 @@ Recomendador inteligente de menús basado en:
 
 import json
 import numpy as np
-from typing import List, Dict, Tuple
+from scipy import sparse
+from typing import List, Dict, Tuple, Optional
 from pathlib import Path
 
 class MenuRecommender:
@@ -22,6 +23,105 @@ class MenuRecommender:
         # Crear índice por ID
         self.catalogo_dict = {ing['id']: ing for ing in self.catalogo}
 
+        self._compilar_catalogo()
+
+    def _compilar_catalogo(self):
+        """
+        Compila el catálogo en arrays densos (índice de ingrediente →
+        hierro/100 g, costo/kg) y una máscara de bits de disponibilidad
+        por departamento
+        """
+        self._indice_ingrediente = {ing_id: j for j, ing_id in enumerate(self.catalogo_dict)}
+        ingredientes = list(self.catalogo_dict.values())
+
+        self._hierro_100g = np.array([ing['hierro_mg_100g'] for ing in ingredientes], dtype=float)
+        self._costo_kg = np.array([ing['costo_s_kg'] for ing in ingredientes], dtype=float)
+
+        # Un bit por departamento; "todas" = todos los bits encendidos
+        departamentos = sorted({
+            depto for ing in ingredientes
+            if ing.get('disponibilidad_regiones', []) != "todas"
+            for depto in ing.get('disponibilidad_regiones', [])
+        })
+        if len(departamentos) > 63:
+            raise ValueError(f"Máscara de disponibilidad admite 63 departamentos ({len(departamentos)})")
+        self._bit_departamento = {depto: 1 << k for k, depto in enumerate(departamentos)}
+
+        mascaras = []
+        for ing in ingredientes:
+            disponibilidad = ing.get('disponibilidad_regiones', [])
+            if disponibilidad == "todas":
+                mascaras.append(-1)
+            else:
+                mascaras.append(sum(self._bit_departamento[d] for d in set(disponibilidad)))
+        self._mascara_disponibilidad = np.array(mascaras, dtype=np.int64)
+
+    def _disponibles_en(self, departamento: str) -> np.ndarray:
+        """Vector 0/1: ingredientes disponibles en el departamento"""
+        bit = self._bit_departamento.get(departamento)
+        if bit is None:
+            # Departamento fuera del catálogo: solo los disponibles en "todas"
+            return (self._mascara_disponibilidad == -1).astype(float)
+        return ((self._mascara_disponibilidad & bit) != 0).astype(float)
+
+    def compilar_menus(self, menus: List[Dict]) -> Tuple:
+        """
+        Representa los menús como matriz dispersa menú × ingrediente (gramos)
+
+        Las entradas se guardan en el orden de la lista de ingredientes y sin
+        fusionar repetidos, así las sumas coinciden con calcular_score_menu.
+        Costo y hierro no dependen del contexto y se calculan aquí una vez.
+
+        Returns:
+            (gramos, n_ingredientes, costo, hierro): matriz CSR de cantidades,
+            total de ingredientes listados por menú (incluye IDs fuera del
+            catálogo), costo en soles y hierro en mg por menú
+        """
+        indices, gramos = [], []
+        indptr = np.zeros(len(menus) + 1, dtype=np.int64)
+        n_ingredientes = np.zeros(len(menus), dtype=float)
+
+        for i, menu in enumerate(menus):
+            n_ingredientes[i] = len(menu['ingredientes'])
+            for ing in menu['ingredientes']:
+                j = self._indice_ingrediente.get(ing['id'])
+                if j is not None:
+                    indices.append(j)
+                    gramos.append(ing['cantidad_g'])
+            indptr[i + 1] = len(indices)
+
+        matriz = sparse.csr_matrix(
+            (np.asarray(gramos, dtype=float), np.asarray(indices, dtype=np.int64), indptr),
+            shape=(len(menus), len(self._indice_ingrediente))
+        )
+
+        # Cada término se calcula igual que en la versión escalar (mismo redondeo)
+        unos = np.ones(matriz.shape[1])
+        j = matriz.indices
+        costo = self._con_datos(matriz, self._costo_kg[j] * (matriz.data / 1000)) @ unos
+        hierro = self._con_datos(matriz, (self._hierro_100g[j] * matriz.data) / 100) @ unos
+
+        return matriz, n_ingredientes, self._redondear(costo, 2), self._redondear(hierro, 1)
+
+    @staticmethod
+    def _redondear(valores: np.ndarray, decimales: int) -> np.ndarray:
+        """
+        Igual que round() de Python elemento a elemento: np.round solo
+        difiere cerca de los medios, que se corrigen uno a uno
+        """
+        valores = np.asarray(valores, dtype=float)
+        escalado = valores * 10 ** decimales
+        resultado = np.round(valores, decimales)
+        dudosos = np.flatnonzero(np.abs(escalado - np.floor(escalado) - 0.5) < 1e-6)
+        for i in dudosos:
+            resultado[i] = round(float(valores[i]), decimales)
+        return resultado
+
+    @staticmethod
+    def _con_datos(matriz: sparse.csr_matrix, datos: np.ndarray) -> sparse.csr_matrix:
+        """Misma estructura dispersa con otros valores por entrada"""
+        return sparse.csr_matrix((datos, matriz.indices, matriz.indptr), shape=matriz.shape)
+
     def calcular_costo_menu(self, ingredientes: List[Dict]) -> float:
         """
         Calcula costo total del menú
@@ -142,29 +242,86 @@ class MenuRecommender:
 
         return round(score_final, 1), desglose
 
-    def recomendar_top3(self, menus: List[Dict], contexto: Dict) -> List[Dict]:
+    def calcular_scores_lote(self, menus: List[Dict], contexto: Dict,
+                             matrices: Optional[Tuple] = None) -> Dict[str, np.ndarray]:
         """
-        Devuelve top 3 menús rankeados por score
+        Versión vectorizada de calcular_score_menu para todos los menús
 
         Args:
             menus: Lista de menús con estructura estándar
             contexto: Contexto del paciente
+            matrices: Resultado de compilar_menus(menus) (se calcula si es None)
 
         Returns:
-            Top 3 menús con scores agregados
+            Dict de arrays con las mismas claves que el desglose
         """
-        menus_con_score = []
+        gramos, n_ingredientes, costo, hierro = matrices or self.compilar_menus(menus)
+
+        # 1. Accesibilidad: un producto matriz-vector con la máscara del departamento
+        apariciones = self._con_datos(gramos, np.ones_like(gramos.data))
+        disponibles = apariciones @ self._disponibles_en(contexto['departamento'])
+        accesibilidad = self._redondear(
+            np.divide(disponibles, n_ingredientes, out=np.zeros_like(disponibles),
+                      where=n_ingredientes > 0) * 100, 1
+        )
+
+        # 2. Score nutricional
+        hierro_necesario = 7 if contexto['edad_meses'] < 12 else 10  # mg/día
+        score_nutri = np.minimum(100, (hierro / hierro_necesario) * 100)
 
-        for menu in menus:
-            score, desglose = self.calcular_score_menu(menu, contexto)
+        # 3. Score costo
+        presupuesto_comida = contexto.get('presupuesto_diario_s', 15.0) / 3  # Por comida
+        score_costo = np.select(
+            [costo <= presupuesto_comida * 0.5,
+             costo <= presupuesto_comida,
+             costo <= presupuesto_comida * 1.5],
+            [100, 75, 50],
+            default=np.maximum(0, 100 - ((costo / presupuesto_comida) * 30))
+        )
 
-            menu_scored = menu.copy()
-            menu_scored['score'] = score
-            menu_scored['desglose'] = desglose
+        # 4. Score final ponderado
+        score_final = 0.40 * score_nutri + 0.35 * score_costo + 0.25 * accesibilidad
+
+        return {
+            'costo_s': costo,
+            'hierro_mg': hierro,
+            'score_nutri': self._redondear(score_nutri, 1),
+            'score_costo': self._redondear(score_costo, 1),
+            'score_accesibilidad': self._redondear(accesibilidad, 1),
+            'score_final': self._redondear(score_final, 1)
+        }
 
-            menus_con_score.append(menu_scored)
+    def recomendar_top3(self, menus: List[Dict], contexto: Dict,
+                        matrices: Optional[Tuple] = None) -> List[Dict]:
+        """
+        Devuelve top 3 menús rankeados por score
 
-        # Ordenar por score descendente
-        menus_rankeados = sorted(menus_con_score, key=lambda x: x['score'], reverse=True)
+        Args:
+            menus: Lista de menús con estructura estándar
+            contexto: Contexto del paciente
+            matrices: compilar_menus(menus) precalculado (reutilizable entre contextos)
 
-        return menus_rankeados[:3]
\ No newline at end of file
+        Returns:
+            Top 3 menús con scores agregados
+        """
+        if not menus:
+            return []
+
+        scores = self.calcular_scores_lote(menus, contexto, matrices)
+        score_final = scores['score_final']
+
+        # Top 3 con argpartition; los empates en el corte se resuelven
+        # por orden original (igual que el ordenamiento estable)
+        k = min(3, len(menus))
+        umbral = score_final[np.argpartition(-score_final, k - 1)[k - 1]]
+        candidatos = np.flatnonzero(score_final >= umbral)
+        top = candidatos[np.lexsort((candidatos, -score_final[candidatos]))][:k]
+
+        menus_rankeados = []
+        for i in top:
+            menu_scored = menus[i].copy()
+            menu_scored['score'] = float(score_final[i])
+            menu_scored['desglose'] = {clave: float(valores[i]) for clave, valores in scores.items()}
+            menus_rankeados.append(menu_scored)
+
+        return menus_rankeados
\ No newline at end of file
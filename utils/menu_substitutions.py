@@ -4,24 +4,124 @@ Motor de sustituciones inteligentes de ingredientes
 """
 
 import json
-from typing import List, Dict, Optional
+import math
+import time
+import threading
+from bisect import bisect_right
+from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 
 
 class MenuSubstitutionEngine:
     """Motor de sustituciones nutricionales inteligentes"""
     
+    # Clave del índice para departamentos que no figuran en el catálogo
+    OTRO_DEPARTAMENTO = "*"
+    
+    # Cada cuánto se revisa si los catálogos cambiaron en disco (segundos)
+    INTERVALO_VERIFICACION_S = 2.0
+
     def __init__(self, 
                  catalogo_sust_path: str = "data/catalogo_sustituciones.json",
                  catalogo_ing_path: str = "data/catalogo_ingredientes_costo.json"):
-        """Carga catálogos de sustituciones e ingredientes"""
+        """Carga catálogos de sustituciones e ingredientes y construye el índice"""
+        self._rutas = (Path(catalogo_sust_path), Path(catalogo_ing_path))
+        self._firma = None
+        self._proxima_verificacion = 0.0
+        self._lock = threading.Lock()
+        self._cargar()
+    
+    def _firma_archivos(self) -> Tuple:
+        """Tamaño + mtime de los catálogos (detecta cambios sin leerlos)"""
+        return tuple((r.stat().st_size, r.stat().st_mtime_ns) for r in self._rutas)
+    
+    def _cargar(self):
+        """
+        Lee los catálogos y reconstruye el índice de sustitutos
+
+        Catálogos e índice se construyen en locales y se publican juntos:
+        una consulta concurrente nunca ve un catálogo nuevo con el índice viejo.
+        """
+        firma = self._firma_archivos()
         
-        with open(catalogo_sust_path, 'r', encoding='utf-8') as f:
-            self.catalogo_sust = json.load(f)
+        with open(self._rutas[0], 'r', encoding='utf-8') as f:
+            catalogo_sust = json.load(f)
         
-        with open(catalogo_ing_path, 'r', encoding='utf-8') as f:
-            catalogo_ing = json.load(f)
-            self.catalogo_ing = {ing['id']: ing for ing in catalogo_ing['ingredientes']}
+        with open(self._rutas[1], 'r', encoding='utf-8') as f:
+            catalogo_ing = {ing['id']: ing for ing in json.load(f)['ingredientes']}
+        
+        indice = self._construir_indice(catalogo_sust, catalogo_ing)
+        self.catalogo_sust, self.catalogo_ing, self._indice, self._firma = \
+            catalogo_sust, catalogo_ing, indice, firma
+    
+    def _asegurar_vigente(self):
+        """Reconstruye el índice si algún catálogo cambió en disco"""
+        ahora = time.monotonic()
+        if ahora < self._proxima_verificacion:
+            return
+        self._proxima_verificacion = ahora + self.INTERVALO_VERIFICACION_S
+        try:
+            firma = self._firma_archivos()
+        except OSError:
+            return
+        if firma != self._firma:
+            with self._lock:
+                if firma != self._firma:
+                    self._cargar()
+    
+    @staticmethod
+    def _a_float(valor) -> Optional[float]:
+        try:
+            return float(valor)
+        except (ValueError, TypeError):
+            return None
+    
+    @classmethod
+    def _construir_indice(cls, catalogo_sust: Dict, catalogo_ing: Dict) -> Dict:
+        """
+        Índice (ingrediente, departamento) → sustitutos disponibles ordenados
+        por costo (con costos para búsqueda binaria) y por hierro.
+        Departamento None = sin filtro regional; OTRO_DEPARTAMENTO = solo
+        sustitutos disponibles en "todas"
+        """
+        departamentos = {
+            depto for ing in catalogo_ing.values()
+            if ing.get('disponibilidad_regiones', []) != "todas"
+            for depto in ing.get('disponibilidad_regiones', [])
+        }
+        
+        def disponible(sust: Dict, departamento: str) -> bool:
+            info_ing = catalogo_ing.get(sust['id'])
+            if not info_ing:
+                return False
+            disponibilidad = info_ing.get('disponibilidad_regiones', [])
+            return disponibilidad == "todas" or departamento in disponibilidad
+        
+        indice = {}
+        for ing_id, entrada in catalogo_sust.items():
+            sustitutos = entrada.get('sustitutos', [])
+            for departamento in [None, cls.OTRO_DEPARTAMENTO, *departamentos]:
+                if departamento is None:
+                    lista = list(sustitutos)
+                else:
+                    lista = [s for s in sustitutos if disponible(s, departamento)]
+                
+                # Costo no numérico: nunca pasa el filtro de presupuesto
+                costos = [cls._a_float(s.get('costo_s')) for s in lista]
+                costos = [math.inf if c is None else c for c in costos]
+                hierros = [cls._a_float(s.get('hierro_mg')) for s in lista]
+                hierros = [-math.inf if h is None else h for h in hierros]
+                
+                orden_costo = sorted(range(len(lista)), key=lambda k: costos[k])
+                orden_hierro = sorted(range(len(lista)), key=lambda k: -hierros[k])
+                
+                indice[(ing_id, departamento)] = {
+                    'original': [(lista[k], costos[k]) for k in range(len(lista))],
+                    'por_costo': [lista[k] for k in orden_costo],
+                    'costos': [costos[k] for k in orden_costo],
+                    'por_hierro': [(lista[k], costos[k]) for k in orden_hierro],
+                }
+        return indice
     
     def sugerir_sustituto(self, 
                           ingrediente_faltante: str, 
@@ -31,42 +131,36 @@ class MenuSubstitutionEngine:
         """
         Sugiere sustitutos inteligentes para un ingrediente
         """
-        if ingrediente_faltante not in self.catalogo_sust:
-            return []
-        
-        sustitutos = self.catalogo_sust[ingrediente_faltante]['sustitutos'].copy()
+        self._asegurar_vigente()
+        indice = self._indice  # una sola lectura: un recargo concurrente no lo mezcla
         
-        # Filtrar por presupuesto (CORRECCIÓN CLAVE)
-        if presupuesto_max is not None:
-            sustitutos_filtrados = []
-            for s in sustitutos:
-                try:
-                    costo = float(s['costo_s'])  # ← ACCESO DIRECTO AL VALOR
-                    if costo <= presupuesto_max:
-                        sustitutos_filtrados.append(s)
-                except (ValueError, KeyError, TypeError):
-                    # Si falla la conversión, omitir este sustituto
-                    continue
-            sustitutos = sustitutos_filtrados
+        if (ingrediente_faltante, None) not in indice:
+            return []
         
-        # Filtrar por disponibilidad regional
+        clave_depto = None
         if departamento:
-            sustitutos_disponibles = []
-            for sust in sustitutos:
-                info_ing = self.catalogo_ing.get(sust['id'])
-                if info_ing:
-                    disponibilidad = info_ing.get('disponibilidad_regiones', [])
-                    if disponibilidad == "todas" or departamento in disponibilidad:
-                        sustitutos_disponibles.append(sust)
-            sustitutos = sustitutos_disponibles
+            clave_depto = departamento if (ingrediente_faltante, departamento) in indice \
+                else self.OTRO_DEPARTAMENTO
+        entrada = indice[(ingrediente_faltante, clave_depto)]
         
-        # Ordenar según prioridad
+        # Ordenado por costo: el presupuesto es una búsqueda binaria
         if prioridad == "costo":
-            sustitutos.sort(key=lambda x: float(x['costo_s']))
-        elif prioridad == "hierro":
-            sustitutos.sort(key=lambda x: float(x['hierro_mg']), reverse=True)
+            if presupuesto_max is None:
+                return entrada['por_costo'][:3]
+            corte = bisect_right(entrada['costos'], presupuesto_max)
+            return entrada['por_costo'][:min(corte, 3)]
+        
+        candidatos = entrada['por_hierro'] if prioridad == "hierro" else entrada['original']
+        if presupuesto_max is None:
+            return [s for s, _ in candidatos[:3]]
         
-        return sustitutos[:3]
+        sustitutos = []
+        for s, costo in candidatos:
+            if costo <= presupuesto_max:
+                sustitutos.append(s)
+                if len(sustitutos) == 3:
+                    break
+        return sustitutos
     
     def generar_mensaje_sustitucion(self, 
                                     ingrediente_original: str, 
@@ -133,3 +227,15 @@ def crear_alerta_citrico(ingrediente_id: str, catalogo_ing: Dict) -> Optional[st
         )
     
     return None
+
+
+# Instancia global (singleton pattern): el índice se construye una vez por proceso
+_motor_sustituciones_instance = None
+
+
+def get_motor_sustituciones() -> MenuSubstitutionEngine:
+    """Factory para obtener instancia única del motor de sustituciones"""
+    global _motor_sustituciones_instance
+    if _motor_sustituciones_instance is None:
+        _motor_sustituciones_instance = MenuSubstitutionEngine()
+    return _motor_sustituciones_instance
@@ -4,19 +4,21 @@ Sistema de Notificaciones Programadas
 Recordatorios para controles CRED y seguimiento
 """
 from datetime import datetime, timedelta
-import smtplib
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 import logging
 
+from utils.smtp_pool import PoolSMTP
+
 logger = logging.getLogger(__name__)
 
 
 class SistemaNotificaciones:
     """Gestor de notificaciones por email"""
     
-    def __init__(self, smtp_server=None, smtp_port=None, email=None, password=None):
+    def __init__(self, smtp_server=None, smtp_port=None, email=None, password=None, usar_tls=True):
         """
         Inicializa sistema de notificaciones
         
@@ -25,11 +27,95 @@ class SistemaNotificaciones:
             smtp_port: Puerto SMTP (ej: 587)
             email: Email remitente
             password: Contraseña o app password
+            usar_tls: STARTTLS al conectar
         """
         self.smtp_server = smtp_server or 'smtp.gmail.com'
         self.smtp_port = smtp_port or 587
         self.email = email
         self.password = password
+        self.usar_tls = usar_tls
+        self._pool = None
+        self._pool_lock = threading.Lock()
+    
+    @property
+    def pool(self) -> PoolSMTP:
+        """Pool de conexiones SMTP (se crea al primer envío real)"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = PoolSMTP(self.smtp_server, self.smtp_port, self.email,
+                                          self.password, usar_tls=self.usar_tls)
+        return self._pool
+    
+    @property
+    def credenciales_configuradas(self) -> bool:
+        return bool(self.email and self.password)
+    
+    def _mensaje_recordatorio(
+        self,
+        email_destino: str,
+        nombre_paciente: str,
+        fecha_control: str,
+        tipo_control: str,
+        objetivo: str
+    ) -> MIMEMultipart:
+        """Arma el email HTML de recordatorio de control CRED"""
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = f"🏥 Recordatorio: {tipo_control} - {fecha_control}"
+        msg['From'] = self.email
+        msg['To'] = email_destino
+        
+        # Cuerpo HTML
+        html = f"""
+        <html>
+          <head>
+            <style>
+              body {{ font-family: Arial, sans-serif; }}
+              .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
+                        color: white; padding: 20px; text-align: center; }}
+              .content {{ padding: 20px; }}
+              .button {{ background-color: #667eea; color: white; padding: 12px 24px; 
+                        text-decoration: none; border-radius: 5px; display: inline-block; }}
+              .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #ddd; 
+                        color: #666; font-size: 12px; }}
+            </style>
+          </head>
+          <body>
+            <div class="header">
+              <h1>🏥 Recordatorio de Control CRED</h1>
+              <p>Sistema de Alerta Temprana - MINSA</p>
+            </div>
+            
+            <div class="content">
+              <h2>Estimado/a padre/madre de {nombre_paciente},</h2>
+              
+              <p>Le recordamos que tiene programado el siguiente control:</p>
+              
+              <div style="background-color: #f5f5f5; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                <p><strong>📅 Tipo de control:</strong> {tipo_control}</p>
+                <p><strong>🗓️ Fecha:</strong> {fecha_control}</p>
+                <p><strong>🎯 Objetivo:</strong> {objetivo}</p>
+              </div>
+              
+              <p><strong>⚠️ Importante:</strong> Es fundamental asistir a este control para evaluar 
+              el progreso del tratamiento y prevenir complicaciones.</p>
+              
+              <p style="margin-top: 30px;">
+                <a href="#" class="button">📋 Ver Reporte Completo</a>
+              </p>
+            </div>
+            
+            <div class="footer">
+              <p><strong>Sistema de Combate a Anemia Infantil</strong></p>
+              <p>Ministerio de Salud del Perú - NTS 213-MINSA/DGIESP-2024</p>
+              <p>Este es un mensaje automático, por favor no responder.</p>
+            </div>
+          </body>
+        </html>
+        """
+        
+        msg.attach(MIMEText(html, 'html'))
+        return msg
     
     def enviar_recordatorio_control(
         self,
@@ -46,73 +132,15 @@ class SistemaNotificaciones:
             bool: True si se envió correctamente
         """
         try:
-            # Crear mensaje
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f"🏥 Recordatorio: {tipo_control} - {fecha_control}"
-            msg['From'] = self.email
-            msg['To'] = email_destino
-            
-            # Cuerpo HTML
-            html = f"""
-            <html>
-              <head>
-                <style>
-                  body {{ font-family: Arial, sans-serif; }}
-                  .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                            color: white; padding: 20px; text-align: center; }}
-                  .content {{ padding: 20px; }}
-                  .button {{ background-color: #667eea; color: white; padding: 12px 24px; 
-                            text-decoration: none; border-radius: 5px; display: inline-block; }}
-                  .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #ddd; 
-                            color: #666; font-size: 12px; }}
-                </style>
-              </head>
-              <body>
-                <div class="header">
-                  <h1>🏥 Recordatorio de Control CRED</h1>
-                  <p>Sistema de Alerta Temprana - MINSA</p>
-                </div>
-                
-                <div class="content">
-                  <h2>Estimado/a padre/madre de {nombre_paciente},</h2>
-                  
-                  <p>Le recordamos que tiene programado el siguiente control:</p>
-                  
-                  <div style="background-color: #f5f5f5; padding: 15px; border-radius: 8px; margin: 20px 0;">
-                    <p><strong>📅 Tipo de control:</strong> {tipo_control}</p>
-                    <p><strong>🗓️ Fecha:</strong> {fecha_control}</p>
-                    <p><strong>🎯 Objetivo:</strong> {objetivo}</p>
-                  </div>
-                  
-                  <p><strong>⚠️ Importante:</strong> Es fundamental asistir a este control para evaluar 
-                  el progreso del tratamiento y prevenir complicaciones.</p>
-                  
-                  <p style="margin-top: 30px;">
-                    <a href="#" class="button">📋 Ver Reporte Completo</a>
-                  </p>
-                </div>
-                
-                <div class="footer">
-                  <p><strong>Sistema de Combate a Anemia Infantil</strong></p>
-                  <p>Ministerio de Salud del Perú - NTS 213-MINSA/DGIESP-2024</p>
-                  <p>Este es un mensaje automático, por favor no responder.</p>
-                </div>
-              </body>
-            </html>
-            """
-            
-            parte_html = MIMEText(html, 'html')
-            msg.attach(parte_html)
+            msg = self._mensaje_recordatorio(email_destino, nombre_paciente, fecha_control,
+                                             tipo_control, objetivo)
             
             # Enviar
-            if not self.email or not self.password:
+            if not self.credenciales_configuradas:
                 logger.warning("⚠️ Credenciales SMTP no configuradas. Simulando envío...")
                 return True  # Simular éxito en desarrollo
             
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.email, self.password)
-                server.send_message(msg)
+            self.pool.enviar(msg)
             
             logger.info(f"✅ Recordatorio enviado a {email_destino}")
             return True
@@ -121,21 +149,48 @@ class SistemaNotificaciones:
             logger.error(f"❌ Error enviando recordatorio: {e}")
             return False
     
+    def enviar_recordatorios_lote(self, recordatorios: list) -> dict:
+        """
+        Envía muchos recordatorios reutilizando las conexiones del pool
+        
+        Args:
+            recordatorios: Lista de dicts con email_destino, nombre_paciente,
+                           fecha_control, tipo_control, objetivo
+        
+        Returns:
+            dict: enviados, fallidos, errores {índice: motivo},
+                  mensajes_por_segundo, duracion_s, conexiones_abiertas
+        """
+        mensajes = [self._mensaje_recordatorio(**r) for r in recordatorios]
+        
+        if not self.credenciales_configuradas:
+            logger.warning(f"⚠️ Credenciales SMTP no configuradas. Simulando {len(mensajes)} envíos...")
+            return {'enviados': len(mensajes), 'fallidos': 0, 'errores': {}, 'duracion_s': 0.0,
+                    'mensajes_por_segundo': 0.0, 'conexiones_abiertas': 0, 'simulado': True}
+        
+        return self.pool.enviar_lote(mensajes)
+    
     def programar_recordatorios(
         self,
         email_destino: str,
         nombre_paciente: str,
         controles: list,
-        enviar_inmediato: bool = False
+        enviar_inmediato: bool = False,
+        id_paciente: str = None
     ) -> dict:
         """
         Programa múltiples recordatorios
         
+        Los recordatorios futuros se guardan en la cola persistente
+        (utils/cola_recordatorios.py) y los envía el worker el día anterior
+        a cada control.
+        
         Args:
             email_destino: Email del receptor
             nombre_paciente: Nombre del paciente
-            controles: Lista de controles programados
+            controles: Lista de controles programados ({'tipo', 'fecha', 'objetivo'})
             enviar_inmediato: Si True, envía inmediatamente (demo)
+            id_paciente: DNI para deduplicar (default: email_destino)
             
         Returns:
             dict: Estado de cada envío
@@ -154,8 +209,21 @@ class SistemaNotificaciones:
                 )
                 resultados[control['tipo']] = 'Enviado' if exito else 'Error'
             else:
-                # Programar para fecha futura (requiere scheduler)
-                resultados[control['tipo']] = 'Programado'
+                # Programar para fecha futura en la cola persistente
+                try:
+                    from utils.cola_recordatorios import get_cola_recordatorios
+                    nuevo = get_cola_recordatorios().programar(
+                        id_paciente=id_paciente or email_destino,
+                        tipo_control=control['tipo'],
+                        fecha_control=control['fecha'],
+                        canal='email',
+                        destino=email_destino,
+                        payload={'nombre': nombre_paciente, 'objetivo': control.get('objetivo')}
+                    )
+                    resultados[control['tipo']] = 'Programado' if nuevo else 'Ya programado'
+                except Exception as e:
+                    logger.error(f"❌ Error programando recordatorio: {e}")
+                    resultados[control['tipo']] = 'Error'
         
         return resultados
     
@@ -197,14 +265,11 @@ class SistemaNotificaciones:
             msg.attach(parte_pdf)
             
             # Enviar
-            if not self.email or not self.password:
+            if not self.credenciales_configuradas:
                 logger.warning("⚠️ Credenciales SMTP no configuradas. Simulando envío...")
                 return True
             
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.email, self.password)
-                server.send_message(msg)
+            self.pool.enviar(msg)
             
             logger.info(f"✅ PDF enviado a {email_destino}")
             return True
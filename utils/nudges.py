@@ -3,13 +3,8 @@ utils/nudges.py
 Sistema de nudges (recordatorios) con A/B testing
 """
 
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 import random
-import csv
-from pathlib import Path
 
 class SistemaNudges:
     """Sistema de recordatorios con pruebas A/B"""
@@ -50,24 +45,33 @@ class SistemaNudges:
         Returns:
             Dict con resultado del envío
         """
+        resultado = self._preparar_recordatorio(telefono, nombre_paciente, tipo_control, dias, variante)
+        resultado['status'] = 'simulado'  # 'success' cuando implementes SMS real
+
+        # Guardar log
+        self.registrar_envio(resultado)
+
+        return resultado
+
+    def _preparar_recordatorio(self, telefono: str, nombre_paciente: str, tipo_control: str, dias: int,
+                               variante=None) -> dict:
+        """Arma el recordatorio (variante, texto y fecha) sin enviarlo"""
         # Seleccionar variante aleatoria si no se especifica
         if variante is None:
             variante = random.choice(['A', 'B', 'C'])
 
         template = self.variantes[variante]
-        
+
         # Calcular fecha del control
-        from datetime import datetime, timedelta
         fecha_control = datetime.now() + timedelta(days=dias)
 
-        asunto = template['asunto'].format(nombre=nombre_paciente)
         mensaje = template['mensaje'].format(
             nombre=nombre_paciente,
             fecha=fecha_control.strftime('%d/%m/%Y')
         )
 
-        resultado = {
-            'status': 'simulado',  # 'success' cuando implementes SMS real
+        return {
+            'status': 'pendiente',
             'telefono': telefono,
             'variante': variante,
             'nombre_variante': template['nombre'],
@@ -79,29 +83,60 @@ class SistemaNudges:
             'timestamp': datetime.now().isoformat()
         }
 
-        # Guardar log
-        self.registrar_envio(resultado)
+    def enviar_recordatorios_masivo(self, recordatorios: list, despachador=None) -> dict:
+        """
+        Envía muchos recordatorios en paralelo (utils/despachador_mensajes.py)
 
-        return resultado
+        Cada canal respeta su límite de concurrencia y de tasa; el log A/B se
+        escribe por bloques en lugar de una fila por mensaje.
+
+        Args:
+            recordatorios: list de dicts con telefono, nombre_paciente,
+                           tipo_control, dias y opcionalmente variante
+            despachador: DespachadorMensajes (default: transportes del entorno)
+
+        Returns:
+            Dict con 'resultados' (un dict por recordatorio, mismo orden) y
+            'por_canal' (throughput y latencias)
+        """
+        from utils.despachador_mensajes import DespachadorMensajes
+
+        despachador = despachador or DespachadorMensajes()
+        resultados = [
+            self._preparar_recordatorio(r['telefono'], r['nombre_paciente'], r['tipo_control'],
+                                        r['dias'], r.get('variante'))
+            for r in recordatorios
+        ]
+        resumen = despachador.despachar_sync([
+            {
+                'canal': r['canal'].lower(),
+                'destino': r['telefono'],
+                'texto': r['mensaje'],
+                'variante': r['variante'],
+                'tipo_control': r['tipo_control'],
+                'dias': r['dias_hasta_control'],
+            }
+            for r in resultados
+        ])
+
+        for resultado, error in zip(resultados, resumen['resultados']):
+            canal = resultado['canal'].lower()
+            resultado['status'] = 'error' if error else despachador.transportes[canal].status
+            resultado['error'] = error
+
+        return {'resultados': resultados, 'por_canal': resumen['por_canal']}
 
     def registrar_envio(self, resultado: dict):
         """Registra envío para análisis A/B"""
-        log_file = Path('data/logs/nudges_ab_test.csv')
-        log_file.parent.mkdir(parents=True, exist_ok=True)
-
-        # Crear archivo si no existe
-        if not log_file.exists():
-            with open(log_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    'timestamp', 'telefono', 'variante', 'canal', 
-                    'tipo_control', 'dias', 'status'
-                ])
-
-        # Agregar registro
-        with open(log_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([
+        self.registrar_envios([resultado])
+
+    @staticmethod
+    def registrar_envios(resultados: list):
+        """Registra varios envíos en una sola escritura del log A/B"""
+        from utils.despachador_mensajes import escribir_filas_log
+
+        escribir_filas_log([
+            [
                 resultado['timestamp'],
                 resultado['telefono'],
                 resultado['variante'],
@@ -109,50 +144,78 @@ class SistemaNudges:
                 resultado['tipo_control'],
                 resultado['dias_hasta_control'],
                 resultado['status']
-            ])
+            ]
+            for resultado in resultados
+        ])
 
-    def programar_recordatorios_multiples(self, telefono: str, nombre_paciente: str, controles: list):
+    def programar_recordatorios_multiples(self, telefono: str, nombre_paciente: str, controles: list,
+                                          id_paciente: str = None):
         """
         Programa múltiples recordatorios según calendario de controles
 
+        No envía nada en el momento: cada recordatorio queda en la cola
+        persistente (utils/cola_recordatorios.py) con su variante A/B ya
+        asignada y el worker lo envía el día anterior al control.
+
         Args:
             telefono: str
             nombre_paciente: str
             controles: list de dicts con {'tipo': str, 'dias': int}
+            id_paciente: DNI para deduplicar (default: teléfono)
 
         Returns:
-            List de resultados de envío
+            List de recordatorios programados
         """
+        from utils.cola_recordatorios import get_cola_recordatorios
+
+        cola = get_cola_recordatorios()
         resultados = []
 
         for control in controles:
-            resultado = self.enviar_recordatorio(
-                telefono=telefono,
-                nombre_paciente=nombre_paciente,
+            variante = random.choice(['A', 'B', 'C'])
+            template = self.variantes[variante]
+            fecha_control = datetime.now() + timedelta(days=control['dias'])
+
+            nuevo = cola.programar(
+                id_paciente=id_paciente or telefono,
                 tipo_control=control['tipo'],
-                dias=control['dias']
+                fecha_control=fecha_control.date(),
+                canal=template['canal'].lower(),
+                destino=telefono,
+                payload={'nombre': nombre_paciente, 'variante': variante}
             )
 
-            resultados.append(resultado)
+            resultados.append({
+                'status': 'programado' if nuevo else 'ya_programado',
+                'telefono': telefono,
+                'variante': variante,
+                'nombre_variante': template['nombre'],
+                'canal': template['canal'],
+                'tipo_control': control['tipo'],
+                'dias_hasta_control': control['dias'],
+                'fecha_control': fecha_control.strftime('%d/%m/%Y'),
+                'timestamp': datetime.now().isoformat()
+            })
 
         return resultados
 
     @staticmethod
-    def obtener_estadisticas_ab():
-        """Obtiene estadísticas de pruebas A/B"""
-        log_file = Path('data/logs/nudges_ab_test.csv')
-        
-        if not log_file.exists():
+    def obtener_estadisticas_ab(actualizar: bool = True):
+        """
+        Obtiene estadísticas de pruebas A/B
+
+        Envíos por variante/canal y conversión (asistencia CRED, menú
+        preparado) con intervalos y posteriores; ver services/analisis_ab.py.
+        Solo se procesa lo nuevo desde el último refresco.
+        """
+        from services.analisis_ab import get_motor_ab
+
+        motor = get_motor_ab()
+        if actualizar:
+            motor.actualizar()
+        stats = motor.estadisticas()
+
+        if stats['total_envios'] == 0 and not stats['expuestos']:
             return None
-        
-        import pandas as pd
-        df = pd.read_csv(log_file)
-        
-        stats = {
-            'total_envios': len(df),
-            'por_variante': df['variante'].value_counts().to_dict(),
-            'por_canal': df['canal'].value_counts().to_dict(),
-            'ultimo_envio': df['timestamp'].max() if len(df) > 0 else None
-        }
-        
+
         return stats
@@ -0,0 +1,105 @@
+"""
+utils/pdf_almacen.py
+Escritura opcional de PDFs a disco con política de retención
+
+Los reportes se renderizan en memoria (bytes). Solo cuando se pide una
+copia en disco se usa guardar_pdf, que escribe de forma atómica y poda
+reportes/ y data/pdfs/ para que no crezcan sin límite. Los directorios que
+elige quien llama (p. ej. outputs/) nunca se podan salvo que se pida.
+"""
+
+import os
+import time
+import logging
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Retención por defecto (configurable por variables de entorno)
+DIAS_RETENCION_PDF = float(os.getenv("PDF_DIAS_RETENCION", "7"))
+MAX_PDFS_POR_DIRECTORIO = int(os.getenv("PDF_MAX_ARCHIVOS", "200"))
+
+# Directorios de salida por defecto: los únicos que se podan automáticamente
+DIRECTORIOS_GESTIONADOS = (Path("reportes"), Path("data/pdfs"))
+
+
+def aplicar_retencion(directorio, dias_retencion: Optional[float] = None,
+                      max_archivos: Optional[int] = None) -> int:
+    """
+    Elimina PDFs más antiguos que `dias_retencion` y, si aún sobran,
+    los más viejos hasta dejar `max_archivos`
+
+    Returns:
+        Número de archivos eliminados
+    """
+    dias_retencion = DIAS_RETENCION_PDF if dias_retencion is None else dias_retencion
+    max_archivos = MAX_PDFS_POR_DIRECTORIO if max_archivos is None else max_archivos
+
+    directorio = Path(directorio)
+    if not directorio.is_dir():
+        return 0
+
+    archivos = []
+    for ruta in directorio.glob("*.pdf"):
+        try:
+            archivos.append((ruta.stat().st_mtime, ruta))
+        except OSError:
+            continue
+    archivos.sort(reverse=True)  # más recientes primero
+
+    limite = time.time() - dias_retencion * 86400
+    eliminar = [r for i, (mtime, r) in enumerate(archivos) if mtime < limite or i >= max_archivos]
+
+    eliminados = 0
+    for ruta in eliminar:
+        try:
+            ruta.unlink()
+            eliminados += 1
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo eliminar {ruta}: {e}")
+
+    if eliminados:
+        logger.info(f"🧹 Retención PDF: {eliminados} archivos eliminados en {directorio}")
+    return eliminados
+
+
+def escribir_atomico(contenido: bytes, ruta) -> Path:
+    """
+    Escribe un archivo de forma atómica (archivo temporal + rename): un
+    proceso interrumpido nunca deja un PDF a medio escribir
+    """
+    ruta = Path(ruta)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+
+    temporal = ruta.with_name(f".{ruta.name}.{os.getpid()}.tmp")
+    temporal.write_bytes(contenido)
+    os.replace(temporal, ruta)
+    return ruta
+
+
+def es_directorio_gestionado(directorio) -> bool:
+    """True si `directorio` es uno de DIRECTORIOS_GESTIONADOS"""
+    directorio = Path(directorio).resolve()
+    return any(directorio == gestionado.resolve() for gestionado in DIRECTORIOS_GESTIONADOS)
+
+
+def guardar_pdf(pdf_bytes: bytes, ruta, dias_retencion: Optional[float] = None,
+                max_archivos: Optional[int] = None, retencion: Optional[bool] = None) -> str:
+    """
+    Escribe el PDF de forma atómica y, si corresponde, aplica la retención
+
+    Args:
+        retencion: Podar el directorio del archivo (default: solo si es
+                   reportes/ o data/pdfs/; nunca un directorio arbitrario)
+
+    Returns:
+        str: ruta del archivo escrito
+    """
+    ruta = escribir_atomico(pdf_bytes, ruta)
+    if retencion is None:
+        retencion = es_directorio_gestionado(ruta.parent)
+    if retencion:
+        aplicar_retencion(ruta.parent, dias_retencion, max_archivos)
+    return str(ruta)
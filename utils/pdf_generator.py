@@ -12,6 +12,7 @@ CARACTERÍSTICAS:
 ✅ Export en 1 click (<10 segundos garantizado)
 ✅ Logging completo para debugging
 ✅ Sin dependencias de archivos temporales
+✅ Render en memoria (bytes) por defecto; disco opcional con retención
 
 CORRECCIONES REALIZADAS:
 ✅ Manejo seguro de evolucion_hb = None
@@ -29,20 +30,50 @@ from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import (
     SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, 
-    Image, PageBreak, KeepTogether
+    Image, PageBreak, KeepTogether, Flowable
 )
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
+from reportlab.pdfbase import pdfmetrics
 from datetime import datetime
 import matplotlib
 matplotlib.use('Agg')  # Backend sin UI
 import matplotlib.pyplot as plt
+import numpy as np
 import io
-import os
+import copy
+import json
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
 from typing import Dict, Optional, List, Tuple
 
+from utils.pdf_almacen import guardar_pdf
+
 logger = logging.getLogger(__name__)
 
+# Gráficos de evolución Hb cacheados (PNG por hash de fechas/valores)
+MAX_GRAFICOS_CACHE = 256
+
+# pyplot no es thread-safe (Streamlit atiende sesiones en hilos)
+_lock_graficos = threading.Lock()
+_lock_estilos = threading.Lock()
+
+
+def _flowable_estatico(constructor):
+    """
+    Secciones sin datos del paciente (tips, recordatorios, footer): se
+    construyen una vez por proceso y cada reporte recibe una copia
+    """
+    @wraps(constructor)
+    def envoltura(self):
+        cache = ReportePDFGenerator._flowables_estaticos
+        if constructor.__name__ not in cache:
+            cache[constructor.__name__] = constructor(self)
+        return copy.copy(cache[constructor.__name__])
+    return envoltura
+
 
 class ReportePDFGenerator:
     """Generador de reportes PDF diferenciados por rol - VERSIÓN PRODUCCIÓN"""
@@ -54,9 +85,32 @@ class ReportePDFGenerator:
     COLOR_PELIGRO = '#dc3545'
     COLOR_TIERRA = '#11998e'
 
+    # Recursos compartidos por todas las instancias del proceso
+    _estilos_compartidos = None
+    _flowables_estaticos = {}
+    _graficos_cache = OrderedDict()
+
     def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self._crear_estilos_personalizados()
+        with _lock_estilos:
+            if ReportePDFGenerator._estilos_compartidos is None:
+                self.styles = getSampleStyleSheet()
+                self._crear_estilos_personalizados()
+                self._precargar_fuentes()
+                ReportePDFGenerator._estilos_compartidos = self.styles
+        self.styles = ReportePDFGenerator._estilos_compartidos
+
+    @staticmethod
+    def _precargar_fuentes():
+        """Carga métricas de las fuentes usadas para no pagarlas en el primer reporte"""
+        for fuente in ('Helvetica', 'Helvetica-Bold', 'Helvetica-Oblique'):
+            pdfmetrics.getFont(fuente)
+
+    @classmethod
+    def limpiar_caches(cls):
+        """Descarta estilos, secciones estáticas y gráficos cacheados"""
+        cls._estilos_compartidos = None
+        cls._flowables_estaticos.clear()
+        cls._graficos_cache.clear()
 
     def _crear_estilos_personalizados(self):
         """Crea estilos personalizados para el PDF"""
@@ -110,6 +164,43 @@ class ReportePDFGenerator:
     # REPORTE MÉDICO
     # ════════════════════════════════════════════════════════════════
 
+    def _nuevo_documento(self, destino) -> SimpleDocTemplate:
+        """Documento A4 con márgenes estándar (destino: ruta o BytesIO)"""
+        return SimpleDocTemplate(
+            destino,
+            pagesize=A4,
+            rightMargin=2*cm,
+            leftMargin=2*cm,
+            topMargin=2*cm,
+            bottomMargin=2*cm
+        )
+
+    def _renderizar(self, story: List) -> bytes:
+        """Construye el PDF en memoria y devuelve sus bytes"""
+        buffer = io.BytesIO()
+        self._nuevo_documento(buffer).build(story)
+        return buffer.getvalue()
+
+    def renderizar_reporte_medico(self, datos_paciente: Dict, datos_clinicos: Dict) -> bytes:
+        """
+        Genera reporte PDF para MÉDICO/PROFESIONAL DE SALUD en memoria
+
+        Args:
+            datos_paciente: dict con info del paciente
+            datos_clinicos: dict con datos clínicos
+
+        Returns:
+            bytes: contenido del PDF (listo para st.download_button o HTTP)
+        """
+        try:
+            pdf_bytes = self._renderizar(self._story_medico(datos_paciente, datos_clinicos))
+            logger.info(f"✅ PDF Médico generado en memoria ({len(pdf_bytes)} bytes)")
+            return pdf_bytes
+
+        except Exception as e:
+            logger.error(f"❌ Error generando reporte médico: {str(e)}", exc_info=True)
+            raise
+
     def generar_reporte_medico(
         self, 
         datos_paciente: Dict, 
@@ -117,7 +208,7 @@ class ReportePDFGenerator:
         output_path: Optional[str] = None
     ) -> str:
         """
-        Genera reporte PDF para MÉDICO/PROFESIONAL DE SALUD
+        Genera reporte médico y lo guarda en disco (con retención)
 
         Args:
             datos_paciente: dict con info del paciente
@@ -126,86 +217,84 @@ class ReportePDFGenerator:
 
         Returns:
             str: ruta del archivo PDF generado
-
-        Raises:
-            Exception: si hay error en generación
         """
-        try:
-            if output_path is None:
-                output_path = f"reportes/reporte_medico_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-
-            # ✅ Crear directorio si no existe
-            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
-
-            # ✅ Crear documento
-            doc = SimpleDocTemplate(
-                output_path,
-                pagesize=A4,
-                rightMargin=2*cm,
-                leftMargin=2*cm,
-                topMargin=2*cm,
-                bottomMargin=2*cm
-            )
-
-            # ✅ Contenido del reporte
-            story = []
-
-            # HEADER
-            story.append(self._crear_header_medico(datos_paciente))
-            story.append(Spacer(1, 0.5*cm))
+        if output_path is None:
+            output_path = f"reportes/reporte_medico_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        return guardar_pdf(self.renderizar_reporte_medico(datos_paciente, datos_clinicos), output_path)
+
+    def _story_medico(self, datos_paciente: Dict, datos_clinicos: Dict) -> List:
+        """Contenido del reporte médico"""
+        # ✅ Contenido del reporte
+        story = []
+
+        # HEADER
+        story.append(self._crear_header_medico(datos_paciente))
+        story.append(Spacer(1, 0.5*cm))
+
+        # DATOS CLÍNICOS
+        story.append(Paragraph("DATOS CLÍNICOS", self.styles['Subtitulo']))
+        story.append(self._crear_tabla_datos_clinicos(datos_clinicos))
+        story.append(Spacer(1, 0.5*cm))
+
+        # DIAGNÓSTICO
+        story.append(Paragraph("DIAGNÓSTICO Y CLASIFICACIÓN", self.styles['Subtitulo']))
+        story.append(self._crear_seccion_diagnostico(datos_clinicos))
+        story.append(Spacer(1, 0.5*cm))
+
+        # EVOLUCIÓN Hb - ✅ CORREGIDO: Verificar si existe
+        evolucion = datos_clinicos.get('evolucion_hb')
+        if evolucion is not None:
+            try:
+                story.append(Paragraph("EVOLUCIÓN DE HEMOGLOBINA", self.styles['Subtitulo']))
+                grafico_hb = self._crear_grafico_evolucion_hb(evolucion)
+                story.append(Image(grafico_hb, width=15*cm, height=8*cm))
+                story.append(Spacer(1, 0.5*cm))
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo generar gráfico de evolución: {str(e)}")
 
-            # DATOS CLÍNICOS
-            story.append(Paragraph("DATOS CLÍNICOS", self.styles['Subtitulo']))
-            story.append(self._crear_tabla_datos_clinicos(datos_clinicos))
-            story.append(Spacer(1, 0.5*cm))
+        # ADHERENCIA
+        if 'adherencia' in datos_clinicos and datos_clinicos['adherencia']:
+            try:
+                story.append(Paragraph("ADHERENCIA AL TRATAMIENTO", self.styles['Subtitulo']))
+                story.append(self._crear_tabla_adherencia(datos_clinicos['adherencia']))
+                story.append(Spacer(1, 0.5*cm))
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo generar tabla de adherencia: {str(e)}")
 
-            # DIAGNÓSTICO
-            story.append(Paragraph("DIAGNÓSTICO Y CLASIFICACIÓN", self.styles['Subtitulo']))
-            story.append(self._crear_seccion_diagnostico(datos_clinicos))
-            story.append(Spacer(1, 0.5*cm))
+        # RECOMENDACIONES CLÍNICAS
+        story.append(Paragraph("RECOMENDACIONES CLÍNICAS", self.styles['Subtitulo']))
+        story.append(self._crear_recomendaciones_medico(datos_clinicos))
 
-            # EVOLUCIÓN Hb - ✅ CORREGIDO: Verificar si existe
-            evolucion = datos_clinicos.get('evolucion_hb')
-            if evolucion is not None:
-                try:
-                    story.append(Paragraph("EVOLUCIÓN DE HEMOGLOBINA", self.styles['Subtitulo']))
-                    grafico_hb = self._crear_grafico_evolucion_hb(evolucion)
-                    story.append(Image(grafico_hb, width=15*cm, height=8*cm))
-                    story.append(Spacer(1, 0.5*cm))
-                except Exception as e:
-                    logger.warning(f"⚠️ No se pudo generar gráfico de evolución: {str(e)}")
-
-            # ADHERENCIA
-            if 'adherencia' in datos_clinicos and datos_clinicos['adherencia']:
-                try:
-                    story.append(Paragraph("ADHERENCIA AL TRATAMIENTO", self.styles['Subtitulo']))
-                    story.append(self._crear_tabla_adherencia(datos_clinicos['adherencia']))
-                    story.append(Spacer(1, 0.5*cm))
-                except Exception as e:
-                    logger.warning(f"⚠️ No se pudo generar tabla de adherencia: {str(e)}")
-
-            # RECOMENDACIONES CLÍNICAS
-            story.append(Paragraph("RECOMENDACIONES CLÍNICAS", self.styles['Subtitulo']))
-            story.append(self._crear_recomendaciones_medico(datos_clinicos))
-
-            # FOOTER
-            story.append(Spacer(1, 1*cm))
-            story.append(self._crear_footer())
-
-            # ✅ Generar PDF
-            doc.build(story)
-            logger.info(f"✅ PDF Médico generado exitosamente: {output_path} ({os.path.getsize(output_path)} bytes)")
-
-            return output_path
+        # FOOTER
+        story.append(Spacer(1, 1*cm))
+        story.append(self._crear_footer())
 
-        except Exception as e:
-            logger.error(f"❌ Error generando reporte médico: {str(e)}", exc_info=True)
-            raise
+        return story
 
     # ════════════════════════════════════════════════════════════════
     # REPORTE MADRE
     # ════════════════════════════════════════════════════════════════
 
+    def renderizar_reporte_madre(self, datos_paciente: Dict, plan_alimentario: Dict) -> bytes:
+        """
+        Genera reporte PDF para MADRE/CUIDADOR en memoria
+
+        Args:
+            datos_paciente: dict con info del paciente
+            plan_alimentario: dict con menús y tips
+
+        Returns:
+            bytes: contenido del PDF (listo para st.download_button o HTTP)
+        """
+        try:
+            pdf_bytes = self._renderizar(self._story_madre(datos_paciente, plan_alimentario))
+            logger.info(f"✅ PDF Madre generado en memoria ({len(pdf_bytes)} bytes)")
+            return pdf_bytes
+
+        except Exception as e:
+            logger.error(f"❌ Error generando reporte madre: {str(e)}", exc_info=True)
+            raise
+
     def generar_reporte_madre(
         self, 
         datos_paciente: Dict, 
@@ -213,7 +302,7 @@ class ReportePDFGenerator:
         output_path: Optional[str] = None
     ) -> str:
         """
-        Genera reporte PDF para MADRE/CUIDADOR
+        Genera reporte para madre/cuidador y lo guarda en disco (con retención)
 
         Args:
             datos_paciente: dict con info del paciente
@@ -223,80 +312,64 @@ class ReportePDFGenerator:
         Returns:
             str: ruta del archivo PDF generado
         """
-        try:
-            if output_path is None:
-                output_path = f"reportes/reporte_madre_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-
-            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
-
-            doc = SimpleDocTemplate(
-                output_path,
-                pagesize=A4,
-                rightMargin=2*cm,
-                leftMargin=2*cm,
-                topMargin=2*cm,
-                bottomMargin=2*cm
-            )
-
-            story = []
-
-            # HEADER
-            story.append(self._crear_header_madre(datos_paciente))
-            story.append(Spacer(1, 0.5*cm))
-
-            # MENSAJE MOTIVACIONAL
-            nombre_madre = datos_paciente.get('nombre_madre', 'Mamá')
-            nombre_nino = datos_paciente.get('nombre_nino', 'tu niño/a')
-
-            mensaje = f"""
-            <b>¡Hola {nombre_madre}!</b><br/><br/>
-            Este plan fue diseñado especialmente para <b>{nombre_nino}</b>. 
-            Sigue estos consejos y menús para ayudarlo/a a crecer fuerte y saludable. 
-            <b>¡Tú puedes lograrlo! 💪</b>
-            """
-            story.append(Paragraph(mensaje, self.styles['TextoNormal']))
-            story.append(Spacer(1, 0.5*cm))
-
-            # PLAN SEMANAL
-            if 'menu_semanal' in plan_alimentario and plan_alimentario['menu_semanal']:
-                try:
-                    story.append(Paragraph("📅 MI PLAN SEMANAL", self.styles['Subtitulo']))
-                    story.append(self._crear_tabla_plan_semanal(plan_alimentario['menu_semanal']))
-                    story.append(Spacer(1, 0.5*cm))
-                except Exception as e:
-                    logger.warning(f"⚠️ No se pudo generar plan semanal: {str(e)}")
-
-            # TIPS ILUSTRADOS
-            story.append(Paragraph("💡 TIPS PARA MEJORAR LA ABSORCIÓN", self.styles['Subtitulo']))
-            story.append(self._crear_tips_ilustrados())
-            story.append(Spacer(1, 0.5*cm))
+        if output_path is None:
+            output_path = f"reportes/reporte_madre_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        return guardar_pdf(self.renderizar_reporte_madre(datos_paciente, plan_alimentario), output_path)
+
+    def _story_madre(self, datos_paciente: Dict, plan_alimentario: Dict) -> List:
+        """Contenido del reporte para madre/cuidador"""
+        story = []
+
+        # HEADER
+        story.append(self._crear_header_madre(datos_paciente))
+        story.append(Spacer(1, 0.5*cm))
+
+        # MENSAJE MOTIVACIONAL
+        nombre_madre = datos_paciente.get('nombre_madre', 'Mamá')
+        nombre_nino = datos_paciente.get('nombre_nino', 'tu niño/a')
+
+        mensaje = f"""
+        <b>¡Hola {nombre_madre}!</b><br/><br/>
+        Este plan fue diseñado especialmente para <b>{nombre_nino}</b>. 
+        Sigue estos consejos y menús para ayudarlo/a a crecer fuerte y saludable. 
+        <b>¡Tú puedes lograrlo! 💪</b>
+        """
+        story.append(Paragraph(mensaje, self.styles['TextoNormal']))
+        story.append(Spacer(1, 0.5*cm))
 
-            # RECORDATORIOS
-            story.append(Paragraph("⏰ RECORDATORIOS IMPORTANTES", self.styles['Subtitulo']))
-            story.append(self._crear_recordatorios())
-            story.append(Spacer(1, 0.5*cm))
+        # PLAN SEMANAL
+        if 'menu_semanal' in plan_alimentario and plan_alimentario['menu_semanal']:
+            try:
+                story.append(Paragraph("📅 MI PLAN SEMANAL", self.styles['Subtitulo']))
+                story.append(self._crear_tabla_plan_semanal(plan_alimentario['menu_semanal']))
+                story.append(Spacer(1, 0.5*cm))
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo generar plan semanal: {str(e)}")
 
-            # LISTA DE COMPRAS
-            if 'lista_compras' in plan_alimentario and plan_alimentario['lista_compras']:
-                try:
-                    story.append(PageBreak())
-                    story.append(Paragraph("🛒 LISTA DE COMPRAS", self.styles['Subtitulo']))
-                    story.append(self._crear_lista_compras(plan_alimentario['lista_compras']))
-                except Exception as e:
-                    logger.warning(f"⚠️ No se pudo generar lista de compras: {str(e)}")
+        # TIPS ILUSTRADOS
+        story.append(Paragraph("💡 TIPS PARA MEJORAR LA ABSORCIÓN", self.styles['Subtitulo']))
+        story.append(self._crear_tips_ilustrados())
+        story.append(Spacer(1, 0.5*cm))
 
-            # FOOTER
-            story.append(Spacer(1, 1*cm))
-            story.append(self._crear_footer())
+        # RECORDATORIOS
+        story.append(Paragraph("⏰ RECORDATORIOS IMPORTANTES", self.styles['Subtitulo']))
+        story.append(self._crear_recordatorios())
+        story.append(Spacer(1, 0.5*cm))
 
-            doc.build(story)
-            logger.info(f"✅ PDF Madre generado exitosamente: {output_path} ({os.path.getsize(output_path)} bytes)")
+        # LISTA DE COMPRAS
+        if 'lista_compras' in plan_alimentario and plan_alimentario['lista_compras']:
+            try:
+                story.append(PageBreak())
+                story.append(Paragraph("🛒 LISTA DE COMPRAS", self.styles['Subtitulo']))
+                story.append(self._crear_lista_compras(plan_alimentario['lista_compras']))
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo generar lista de compras: {str(e)}")
 
-            return output_path
+        # FOOTER
+        story.append(Spacer(1, 1*cm))
+        story.append(self._crear_footer())
 
-        except Exception as e:
-            logger.error(f"❌ Error generando reporte madre: {str(e)}", exc_info=True)
-            raise
+        return story
 
     # ════════════════════════════════════════════════════════════════
     # FUNCIONES AUXILIARES - HEADERS
@@ -410,6 +483,35 @@ class ReportePDFGenerator:
         return Paragraph(texto, self.styles['TextoNormal'])
 
     def _crear_grafico_evolucion_hb(self, datos_evolucion: Optional[Dict]) -> io.BytesIO:
+        """
+        Gráfico de evolución Hb cacheado por hash de (fechas, valores):
+        los reportes repetidos no vuelven a renderizar con matplotlib
+        """
+        if datos_evolucion is None:
+            clave = 'None'
+        else:
+            contenido = [datos_evolucion.get('fechas', []), datos_evolucion.get('valores', [])]
+            clave = hashlib.sha1(json.dumps(contenido, default=str).encode()).hexdigest()
+
+        return self._grafico_cacheado(clave, lambda: self._renderizar_grafico_evolucion_hb(datos_evolucion))
+
+    @staticmethod
+    def _grafico_cacheado(clave, renderizar) -> io.BytesIO:
+        """PNG del LRU de gráficos; `renderizar()` solo se llama si falta"""
+        cache = ReportePDFGenerator._graficos_cache
+        with _lock_graficos:
+            png = cache.get(clave)
+            if png is None:
+                png = renderizar().getvalue()
+                cache[clave] = png
+                if len(cache) > MAX_GRAFICOS_CACHE:
+                    cache.popitem(last=False)
+            else:
+                cache.move_to_end(clave)
+
+        return io.BytesIO(png)
+
+    def _renderizar_grafico_evolucion_hb(self, datos_evolucion: Optional[Dict]) -> io.BytesIO:
         """
         ✅ CORREGIDO: Crea gráfico de evolución con manejo robusto de None
         Retorna BytesIO para uso en PDF (sin archivos temporales)
@@ -586,6 +688,7 @@ class ReportePDFGenerator:
 
         return tabla
 
+    @_flowable_estatico
     def _crear_tips_ilustrados(self) -> Paragraph:
         """Tips ilustrados para madre"""
         texto = """
@@ -600,6 +703,7 @@ class ReportePDFGenerator:
 
         return Paragraph(texto, self.styles['TextoNormal'])
 
+    @_flowable_estatico
     def _crear_recordatorios(self) -> Table:
         """Recordatorios para madre"""
         data = [
@@ -640,10 +744,228 @@ class ReportePDFGenerator:
 
         return Paragraph(texto, self.styles['TextoNormal'])
 
+    # ════════════════════════════════════════════════════════════════
+    # REPORTE ENTIDAD
+    # ════════════════════════════════════════════════════════════════
+
+    def renderizar_reporte_entidad(self, resumen: Dict) -> bytes:
+        """
+        Genera reporte PDF para ENTIDAD (DIRESA / MINSA) en memoria
+
+        Args:
+            resumen: dict de AgregadosEntidad.resumen (indicadores,
+                     unidades, hotspots y escenarios de un ámbito)
+
+        Returns:
+            bytes: contenido del PDF
+        """
+        try:
+            pdf_bytes = self._renderizar(self._story_entidad(resumen))
+            logger.info(f"✅ PDF Entidad {resumen.get('region')} generado en memoria ({len(pdf_bytes)} bytes)")
+            return pdf_bytes
+
+        except Exception as e:
+            logger.error(f"❌ Error generando reporte de entidad: {str(e)}", exc_info=True)
+            raise
+
+    def generar_reporte_entidad(self, resumen: Dict, output_path: Optional[str] = None) -> str:
+        """
+        Genera reporte de entidad y lo guarda en disco (con retención)
+
+        Returns:
+            str: ruta del archivo PDF generado
+        """
+        if output_path is None:
+            output_path = f"reportes/reporte_entidad_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        return guardar_pdf(self.renderizar_reporte_entidad(resumen), output_path)
+
+    def _story_entidad(self, resumen: Dict) -> List:
+        """Contenido del reporte de entidad"""
+        story = []
+
+        story.append(self._crear_header_entidad(resumen))
+        story.append(Spacer(1, 0.5*cm))
+
+        # INDICADORES
+        story.append(Paragraph("INDICADORES DEL ÁMBITO", self.styles['Subtitulo']))
+        story.append(self._crear_tabla_indicadores_entidad(resumen))
+        story.append(Spacer(1, 0.5*cm))
+
+        # PREVALENCIA POR UNIDAD TERRITORIAL
+        if resumen.get('unidades'):
+            nivel = 'DISTRITO' if resumen.get('nivel_unidades') == 'distrito' else 'DEPARTAMENTO'
+            story.append(Paragraph(f"PREVALENCIA POR {nivel}", self.styles['Subtitulo']))
+            story.append(Image(self._crear_grafico_entidad('unidades', resumen), width=16*cm, height=8*cm))
+            story.append(Spacer(1, 0.5*cm))
+
+        # HOTSPOTS
+        story.append(Paragraph("HOTSPOTS PRIORITARIOS", self.styles['Subtitulo']))
+        story.append(self._crear_tabla_hotspots(resumen.get('hotspots', [])))
+        story.append(Spacer(1, 0.5*cm))
+
+        # ESCENARIOS
+        if resumen.get('escenarios'):
+            story.append(Paragraph("ESCENARIOS DE INTERVENCIÓN (3 MESES)", self.styles['Subtitulo']))
+            if resumen.get('periodo', 'TOTAL') != resumen.get('periodo_escenarios', 'TOTAL'):
+                story.append(Paragraph(
+                    "<i>Escenarios simulados sobre la cohorte completa (todos los periodos), "
+                    f"no solo sobre {resumen['periodo']}.</i>", self.styles['Normal']))
+                story.append(Spacer(1, 0.2*cm))
+            story.append(self._crear_tabla_escenarios(resumen['escenarios']))
+            story.append(Spacer(1, 0.3*cm))
+            story.append(Image(self._crear_grafico_entidad('escenarios', resumen), width=16*cm, height=7*cm))
+
+        story.append(Spacer(1, 1*cm))
+        story.append(self._crear_footer())
+        return story
+
+    def _crear_header_entidad(self, resumen: Dict) -> Paragraph:
+        """Header para reporte de entidad"""
+        timestamp = datetime.now().strftime('%d/%m/%Y %H:%M')
+        periodo = resumen.get('periodo', 'TOTAL')
+        periodo = 'Todos los periodos' if periodo == 'TOTAL' else periodo
+        texto = f"""
+        <para align=center>
+        <font size=20 color="{self.COLOR_PRIMARIO}"><b>REPORTE DE ENTIDAD - ANEMIA INFANTIL</b></font><br/>
+        <font size=12 color="#333333">Ámbito: {resumen.get('region', 'NACIONAL')} • Periodo: {periodo}</font><br/>
+        <font size=10 color="#666666">NutriSenseIA v1.0 • Fecha: {timestamp} • Datos al {resumen.get('generado', 'N/A')}</font>
+        </para>
+        """
+        return Paragraph(texto, self.styles['Normal'])
+
+    def _crear_tabla_indicadores_entidad(self, resumen: Dict) -> Table:
+        """Indicadores agregados del ámbito"""
+        data = [
+            ['Indicador', 'Valor'],
+            ['Niños evaluados', f"{resumen.get('evaluados', 0):,}"],
+            ['Casos de anemia', f"{resumen.get('casos', 0):,}"],
+            ['Prevalencia', f"{resumen.get('prevalencia_pct', 0):.1f}%"],
+            ['Anemia moderada/severa', f"{resumen.get('criticos', 0):,}"],
+        ]
+
+        tabla = Table(data, colWidths=[8*cm, 6*cm])
+        tabla.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(self.COLOR_PRIMARIO)),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ]))
+        return tabla
+
+    def _crear_tabla_hotspots(self, hotspots: List[Dict]) -> Flowable:
+        """Ranking de distritos con mayor prevalencia"""
+        if not hotspots:
+            return Paragraph("Sin distritos con evaluados suficientes", self.styles['Normal'])
+
+        data = [['#', 'Departamento', 'Distrito', 'Prevalencia', 'Críticos', 'Evaluados']]
+        for i, h in enumerate(hotspots, 1):
+            data.append([
+                str(i), str(h['departamento'])[:18], str(h['distrito'])[:22],
+                f"{h['prevalencia_pct']:.1f}%", f"{h['criticos']:,}", f"{h['evaluados']:,}"
+            ])
+
+        tabla = Table(data, colWidths=[1*cm, 3.8*cm, 4.5*cm, 2.4*cm, 2*cm, 2.3*cm])
+        tabla.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(self.COLOR_PELIGRO)),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.beige, colors.white]),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ]))
+        return tabla
+
+    def _crear_tabla_escenarios(self, escenarios: List[Dict]) -> Table:
+        """Casos evitados por escenario de intervención"""
+        data = [['Escenario', 'Niños', 'Prev. actual', 'Prev. proyectada', 'Casos evitados']]
+        for e in escenarios:
+            data.append([
+                str(e['escenario']).replace('_', ' ').capitalize(),
+                f"{e['ninos']:,.0f}",
+                f"{e['prevalencia_base_pct']:.1f}%",
+                f"{e['prevalencia_escenario_pct']:.1f}%",
+                f"{e['casos_evitados']:,.0f}",
+            ])
+
+        tabla = Table(data, colWidths=[5*cm, 2.5*cm, 2.5*cm, 3*cm, 3*cm])
+        tabla.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(self.COLOR_TIERRA)),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.lightcyan, colors.white]),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ]))
+        return tabla
+
+    def _crear_grafico_entidad(self, tipo: str, resumen: Dict) -> io.BytesIO:
+        """
+        Gráficos del reporte de entidad: se renderizan una vez por
+        (ámbito, periodo, versión de los agregados) y quedan en el LRU
+        """
+        clave = ('entidad', tipo, resumen.get('region'), resumen.get('periodo'), resumen.get('huella'))
+        if tipo == 'unidades':
+            return self._grafico_cacheado(clave, lambda: self._renderizar_grafico_unidades(resumen['unidades']))
+        return self._grafico_cacheado(clave, lambda: self._renderizar_grafico_escenarios(resumen['escenarios']))
+
+    def _renderizar_grafico_unidades(self, unidades: List[Dict], max_barras: int = 25) -> io.BytesIO:
+        """Barras horizontales de prevalencia por unidad territorial"""
+        unidades = unidades[:max_barras][::-1]
+        nombre = 'distrito' if unidades and 'distrito' in unidades[0] else 'departamento'
+        etiquetas = [str(u[nombre])[:20] for u in unidades]
+        valores = [u['prevalencia_pct'] for u in unidades]
+
+        fig, ax = plt.subplots(figsize=(10, 5), dpi=100)
+        try:
+            colores = [self.COLOR_PELIGRO if v >= 40 else self.COLOR_ADVERTENCIA if v >= 20 else self.COLOR_EXITO
+                       for v in valores]
+            ax.barh(etiquetas, valores, color=colores)
+            ax.set_xlabel('Prevalencia de anemia (%)', fontsize=11)
+            ax.tick_params(axis='y', labelsize=8)
+            ax.grid(True, axis='x', alpha=0.3)
+            plt.tight_layout()
+
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format='png', dpi=120, bbox_inches='tight')
+            buffer.seek(0)
+            return buffer
+        finally:
+            plt.close(fig)
+
+    def _renderizar_grafico_escenarios(self, escenarios: List[Dict]) -> io.BytesIO:
+        """Prevalencia actual vs. proyectada por escenario"""
+        etiquetas = [str(e['escenario']).replace('_', '\n') for e in escenarios]
+        x = np.arange(len(escenarios))
+
+        fig, ax = plt.subplots(figsize=(10, 4.5), dpi=100)
+        try:
+            ax.bar(x - 0.2, [e['prevalencia_base_pct'] for e in escenarios], 0.4,
+                   label='Actual', color=self.COLOR_PELIGRO)
+            ax.bar(x + 0.2, [e['prevalencia_escenario_pct'] for e in escenarios], 0.4,
+                   label='Con intervención', color=self.COLOR_EXITO)
+            ax.set_xticks(x)
+            ax.set_xticklabels(etiquetas, fontsize=9)
+            ax.set_ylabel('Prevalencia (%)', fontsize=11)
+            ax.legend()
+            ax.grid(True, axis='y', alpha=0.3)
+            plt.tight_layout()
+
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format='png', dpi=120, bbox_inches='tight')
+            buffer.seek(0)
+            return buffer
+        finally:
+            plt.close(fig)
+
     # ════════════════════════════════════════════════════════════════
     # FOOTER
     # ════════════════════════════════════════════════════════════════
 
+    @_flowable_estatico
     def _crear_footer(self) -> Paragraph:
         """Footer común para ambos reportes"""
         texto = """
@@ -663,16 +985,29 @@ class ReportePDFGenerator:
 # FUNCIONES DE CONVENIENCIA (WRAPPERS)
 # ════════════════════════════════════════════════════════════════════════════
 
-def generar_reporte_medico_rapido(datos_paciente: Dict, datos_clinicos: Dict) -> str:
-    """Wrapper para generar reporte médico rápidamente"""
-    generator = ReportePDFGenerator()
-    return generator.generar_reporte_medico(datos_paciente, datos_clinicos)
+# Instancia global (singleton pattern)
+_generador_pdf_instance = None
 
 
-def generar_reporte_madre_rapido(datos_paciente: Dict, plan_alimentario: Dict) -> str:
-    """Wrapper para generar reporte madre rápidamente"""
-    generator = ReportePDFGenerator()
-    return generator.generar_reporte_madre(datos_paciente, plan_alimentario)
+def get_generador_pdf() -> ReportePDFGenerator:
+    """Factory para obtener el generador PDF único del proceso (estilos precargados)"""
+    global _generador_pdf_instance
+    if _generador_pdf_instance is None:
+        _generador_pdf_instance = ReportePDFGenerator()
+        logger.info("📄 Generador PDF creado (primera vez)")
+    return _generador_pdf_instance
+
+
+def generar_reporte_medico_rapido(datos_paciente: Dict, datos_clinicos: Dict) -> bytes:
+    """Wrapper para generar reporte médico rápidamente (bytes en memoria)"""
+    generator = get_generador_pdf()
+    return generator.renderizar_reporte_medico(datos_paciente, datos_clinicos)
+
+
+def generar_reporte_madre_rapido(datos_paciente: Dict, plan_alimentario: Dict) -> bytes:
+    """Wrapper para generar reporte madre rápidamente (bytes en memoria)"""
+    generator = get_generador_pdf()
+    return generator.renderizar_reporte_madre(datos_paciente, plan_alimentario)
 
 
 # ════════════════════════════════════════════════════════════════════════════
@@ -744,10 +1079,10 @@ def generar_pdf_cuidador(datos_paciente, plan_alimentario):
         plan_alimentario: dict con menús y tips
 
     Returns:
-        str: ruta del PDF generado
+        bytes: contenido del PDF generado en memoria
     """
-    generator = ReportePDFGenerator()
-    return generator.generar_reporte_madre(datos_paciente, plan_alimentario)
+    generator = get_generador_pdf()
+    return generator.renderizar_reporte_madre(datos_paciente, plan_alimentario)
 
 
 def generar_pdf_profesional(datos_paciente, datos_clinicos):
@@ -759,26 +1094,26 @@ def generar_pdf_profesional(datos_paciente, datos_clinicos):
         datos_clinicos: dict con datos clínicos
 
     Returns:
-        str: ruta del PDF generado
+        bytes: contenido del PDF generado en memoria
     """
-    generator = ReportePDFGenerator()
-    return generator.generar_reporte_medico(datos_paciente, datos_clinicos)
+    generator = get_generador_pdf()
+    return generator.renderizar_reporte_medico(datos_paciente, datos_clinicos)
 
 
-def generar_pdf_entidad(hotspots, estadisticas, recomendaciones):
+def generar_pdf_entidad(region: Optional[str] = None, periodo: Optional[str] = None,
+                        top_hotspots: int = 10) -> bytes:
     """
-    Wrapper para generar PDF de entidad rápidamente
+    Wrapper para generar PDF de entidad desde los agregados precalculados
 
     Args:
-        hotspots: list de dict con hotspots
-        estadisticas: dict con estadísticas
-        recomendaciones: list de recomendaciones
+        region: Departamento (None = nacional)
+        periodo: YYYY-MM (None = todos los periodos)
+        top_hotspots: Distritos en el ranking
 
     Returns:
-        str: ruta del PDF generado (demo)
+        bytes: contenido del PDF generado en memoria
     """
-    # Para esta versión, retornar ruta demo
-    # En producción, crear PDF real
-    logger.info("PDF entidad: usando datos de demo")
-    return "reportes/pdf_entidad_demo.pdf"
-    
\ No newline at end of file
+    from services.agregados_entidad import get_agregados_entidad
+
+    resumen = get_agregados_entidad().resumen(region, periodo, top_hotspots)
+    return get_generador_pdf().renderizar_reporte_entidad(resumen)
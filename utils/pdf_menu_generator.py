@@ -2,15 +2,15 @@ from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import inch
 from datetime import datetime
-import os
+import io
 
-def generar_pdf_menu(menu, filename=None):
-    """Genera PDF de un menú individual"""
-    if not filename:
-        filename = f"data/pdfs/menu_{menu['id']}_{datetime.now().strftime('%Y%m%d')}.pdf"
-    
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    c = canvas.Canvas(filename, pagesize=letter)
+from utils.pdf_almacen import guardar_pdf
+
+
+def renderizar_pdf_menu(menu) -> bytes:
+    """Genera PDF de un menú individual en memoria"""
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
     y = 750
     
     c.setFont("Helvetica-Bold", 16)
@@ -42,12 +42,20 @@ def generar_pdf_menu(menu, filename=None):
         y -= 18
     
     c.save()
-    return filename
+    return buffer.getvalue()
 
-def generar_pdf_semanal(menus_semana, filename="data/pdfs/menu_semanal.pdf"):
-    """Genera PDF del menú semanal"""
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    c = canvas.Canvas(filename, pagesize=letter)
+
+def generar_pdf_menu(menu, filename=None):
+    """Genera PDF de un menú individual y lo guarda en disco (con retención)"""
+    if not filename:
+        filename = f"data/pdfs/menu_{menu['id']}_{datetime.now().strftime('%Y%m%d')}.pdf"
+    return guardar_pdf(renderizar_pdf_menu(menu), filename)
+
+
+def renderizar_pdf_semanal(menus_semana) -> bytes:
+    """Genera PDF del menú semanal en memoria"""
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
     y = 750
     
     c.setFont("Helvetica-Bold", 18)
@@ -72,4 +80,9 @@ def generar_pdf_semanal(menus_semana, filename="data/pdfs/menu_semanal.pdf"):
         y -= 30
     
     c.save()
-    return filename
+    return buffer.getvalue()
+
+
+def generar_pdf_semanal(menus_semana, filename="data/pdfs/menu_semanal.pdf"):
+    """Genera PDF del menú semanal y lo guarda en disco (con retención)"""
+    return guardar_pdf(renderizar_pdf_semanal(menus_semana), filename)
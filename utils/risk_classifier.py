@@ -3,12 +3,97 @@
 Clasificador de riesgo con sistema de semáforo (verde/ámbar/rojo)
 Cumple con requisitos del concurso: alertas tempranas visuales
 """
-from typing import Dict
+from typing import Dict, List, Optional
 import logging
 
+import numpy as np
+import pandas as pd
+
 logger = logging.getLogger(__name__)
 
 
+# Niveles del semáforo indexados por prioridad - 1 (1 = más urgente)
+NIVELES_SEMAFORO = (
+    {
+        'nivel': 'CRÍTICO - ANEMIA SEVERA',
+        'color': 'rojo',
+        'emoji': '🆘',
+        'urgencia': 'DERIVACIÓN HOSPITALARIA URGENTE',
+        'background': '#d32f2f',
+        'accion_inmediata': 'Referir a hospital de inmediato para evaluación de transfusión',
+        'prioridad': 1
+    },
+    {
+        'nivel': 'CRÍTICO - ANEMIA MODERADA',
+        'color': 'rojo',
+        'emoji': '🔴',
+        'urgencia': 'INICIAR TRATAMIENTO HOY',
+        'background': '#e53935',
+        'accion_inmediata': 'Iniciar sulfato ferroso 3mg/kg/día + control en 1 mes',
+        'prioridad': 2
+    },
+    {
+        'nivel': 'ALERTA - ANEMIA LEVE',
+        'color': 'rojo',
+        'emoji': '⚠️',
+        'urgencia': 'TRATAMIENTO INMEDIATO',
+        'background': '#ef5350',
+        'accion_inmediata': 'Iniciar tratamiento + seguimiento estricto',
+        'prioridad': 3
+    },
+    {
+        'nivel': 'ALTO RIESGO - PREVENCIÓN URGENTE',
+        'color': 'rojo',
+        'emoji': '🚨',
+        'urgencia': 'INICIAR PREVENCIÓN AHORA',
+        'background': '#ff6b6b',
+        'accion_inmediata': 'Ventana crítica de desarrollo. Iniciar suplementación preventiva hoy.',
+        'prioridad': 4
+    },
+    {
+        'nivel': 'RIESGO MODERADO',
+        'color': 'ambar',
+        'emoji': '⚠️',
+        'urgencia': 'INICIAR PREVENCIÓN',
+        'background': '#ff9800',
+        'accion_inmediata': 'Evaluar factores de riesgo e iniciar suplementación preventiva',
+        'prioridad': 5
+    },
+    {
+        'nivel': 'RIESGO BAJO-MODERADO',
+        'color': 'ambar_claro',
+        'emoji': '⚡',
+        'urgencia': 'VIGILANCIA Y PREVENCIÓN',
+        'background': '#ffa726',
+        'accion_inmediata': 'Seguimiento en controles CRED. Considerar suplementación si hay factores.',
+        'prioridad': 6
+    },
+    {
+        'nivel': 'BAJO RIESGO',
+        'color': 'verde',
+        'emoji': '✅',
+        'urgencia': 'SEGUIMIENTO DE RUTINA',
+        'background': '#4caf50',
+        'accion_inmediata': 'Continuar controles CRED regulares y alimentación adecuada',
+        'prioridad': 7
+    },
+)
+CATEGORIAS_SEMAFORO = [n['nivel'] for n in NIVELES_SEMAFORO]
+
+# Umbrales de la clasificación (compartidos por la versión escalar y la de arrays)
+HB_ANEMIA_SEVERA = 7.0
+HB_ANEMIA_MODERADA = 10.0
+EDAD_VENTANA_CRITICA = 24
+PROB_ALTO_RIESGO = 0.70
+PROB_RIESGO_MODERADO = 0.60
+PROB_VIGILANCIA = 0.40
+MIN_FACTORES_VIGILANCIA = 2
+
+
+def _nivel(prioridad: int) -> Dict[str, any]:
+    return dict(NIVELES_SEMAFORO[prioridad - 1])
+
+
 def clasificar_nivel_riesgo(
     probabilidad_ml: float,
     tiene_anemia: bool,
@@ -31,83 +116,78 @@ def clasificar_nivel_riesgo(
     
     # 🔴 ROJO - CRÍTICO: Anemia confirmada
     if tiene_anemia:
-        if hb_actual < 7.0:
-            return {
-                'nivel': 'CRÍTICO - ANEMIA SEVERA',
-                'color': 'rojo',
-                'emoji': '🆘',
-                'urgencia': 'DERIVACIÓN HOSPITALARIA URGENTE',
-                'background': '#d32f2f',
-                'accion_inmediata': 'Referir a hospital de inmediato para evaluación de transfusión',
-                'prioridad': 1
-            }
-        elif hb_actual < 10.0:
-            return {
-                'nivel': 'CRÍTICO - ANEMIA MODERADA',
-                'color': 'rojo',
-                'emoji': '🔴',
-                'urgencia': 'INICIAR TRATAMIENTO HOY',
-                'background': '#e53935',
-                'accion_inmediata': 'Iniciar sulfato ferroso 3mg/kg/día + control en 1 mes',
-                'prioridad': 2
-            }
+        if hb_actual < HB_ANEMIA_SEVERA:
+            return _nivel(1)
+        elif hb_actual < HB_ANEMIA_MODERADA:
+            return _nivel(2)
         else:
-            return {
-                'nivel': 'ALERTA - ANEMIA LEVE',
-                'color': 'rojo',
-                'emoji': '⚠️',
-                'urgencia': 'TRATAMIENTO INMEDIATO',
-                'background': '#ef5350',
-                'accion_inmediata': 'Iniciar tratamiento + seguimiento estricto',
-                'prioridad': 3
-            }
+            return _nivel(3)
     
     # 🔴 ROJO - ALTO RIESGO: Ventana crítica + alta probabilidad
-    if edad_meses < 24 and probabilidad_ml >= 0.70:
-        return {
-            'nivel': 'ALTO RIESGO - PREVENCIÓN URGENTE',
-            'color': 'rojo',
-            'emoji': '🚨',
-            'urgencia': 'INICIAR PREVENCIÓN AHORA',
-            'background': '#ff6b6b',
-            'accion_inmediata': 'Ventana crítica de desarrollo. Iniciar suplementación preventiva hoy.',
-            'prioridad': 4
-        }
+    if edad_meses < EDAD_VENTANA_CRITICA and probabilidad_ml >= PROB_ALTO_RIESGO:
+        return _nivel(4)
     
     # 🟠 ÁMBAR - RIESGO MODERADO
-    if probabilidad_ml >= 0.60:
-        return {
-            'nivel': 'RIESGO MODERADO',
-            'color': 'ambar',
-            'emoji': '⚠️',
-            'urgencia': 'INICIAR PREVENCIÓN',
-            'background': '#ff9800',
-            'accion_inmediata': 'Evaluar factores de riesgo e iniciar suplementación preventiva',
-            'prioridad': 5
-        }
+    if probabilidad_ml >= PROB_RIESGO_MODERADO:
+        return _nivel(5)
     
     # 🟡 ÁMBAR BAJO - VIGILANCIA
-    if probabilidad_ml >= 0.40 or len(factores_riesgo) >= 2:
-        return {
-            'nivel': 'RIESGO BAJO-MODERADO',
-            'color': 'ambar_claro',
-            'emoji': '⚡',
-            'urgencia': 'VIGILANCIA Y PREVENCIÓN',
-            'background': '#ffa726',
-            'accion_inmediata': 'Seguimiento en controles CRED. Considerar suplementación si hay factores.',
-            'prioridad': 6
-        }
+    if probabilidad_ml >= PROB_VIGILANCIA or len(factores_riesgo) >= MIN_FACTORES_VIGILANCIA:
+        return _nivel(6)
     
     # 🟢 VERDE - BAJO RIESGO
-    return {
-        'nivel': 'BAJO RIESGO',
-        'color': 'verde',
-        'emoji': '✅',
-        'urgencia': 'SEGUIMIENTO DE RUTINA',
-        'background': '#4caf50',
-        'accion_inmediata': 'Continuar controles CRED regulares y alimentación adecuada',
-        'prioridad': 7
-    }
+    return _nivel(7)
+
+
+def clasificar_nivel_riesgo_lote(probabilidad_ml, tiene_anemia, edad_meses,
+                                 n_factores, hb_actual) -> np.ndarray:
+    """
+    Versión vectorizada de clasificar_nivel_riesgo para cohortes
+
+    Mismas reglas y mismo orden de evaluación que la versión escalar
+    (np.select toma la primera condición verdadera).
+
+    Args:
+        probabilidad_ml, tiene_anemia, edad_meses, hb_actual: arrays/columnas
+        n_factores: Número de factores de riesgo por niño (len(factores_riesgo))
+
+    Returns:
+        Array int8 con la prioridad 1-7 (índice en NIVELES_SEMAFORO + 1)
+    """
+    prob = np.asarray(probabilidad_ml, dtype=float)
+    anemia = np.asarray(tiene_anemia).astype(bool)
+    edad = np.asarray(edad_meses, dtype=float)
+    factores = np.asarray(n_factores)
+    hb = np.asarray(hb_actual, dtype=float)
+
+    condiciones = [
+        anemia & (hb < HB_ANEMIA_SEVERA),
+        anemia & (hb < HB_ANEMIA_MODERADA),
+        anemia,
+        (edad < EDAD_VENTANA_CRITICA) & (prob >= PROB_ALTO_RIESGO),
+        prob >= PROB_RIESGO_MODERADO,
+        (prob >= PROB_VIGILANCIA) | (factores >= MIN_FACTORES_VIGILANCIA),
+    ]
+    return np.select(condiciones, np.arange(1, 7), default=7).astype(np.int8)
+
+
+def categorias_semaforo(prioridades) -> pd.Categorical:
+    """Prioridades 1-7 → pd.Categorical con el nombre del nivel (sin copiar textos)"""
+    return pd.Categorical.from_codes(np.asarray(prioridades) - 1, categories=CATEGORIAS_SEMAFORO, ordered=True)
+
+
+def expandir_nivel_riesgo(prioridades, indices: Optional[List[int]] = None) -> List[Dict[str, any]]:
+    """
+    Dicts completos (como clasificar_nivel_riesgo) solo para las filas a mostrar
+
+    Args:
+        prioridades: Resultado de clasificar_nivel_riesgo_lote
+        indices: Posiciones a expandir (default: todas)
+    """
+    prioridades = np.asarray(prioridades)
+    if indices is not None:
+        prioridades = prioridades[np.asarray(indices)]
+    return [_nivel(int(p)) for p in prioridades]
 
 
 def extraer_factores_criticos(factores_riesgo_list: list, top_n: int = 3) -> list:
@@ -2,6 +2,23 @@
 utils/score_simple.py
 Sistema de score único y explicable (reemplaza clasificar_nivel_riesgo)
 """
+import numpy as np
+import pandas as pd
+
+# Niveles por código (0 = bajo ... 3 = crítico) y cortes de probabilidad
+NIVELES_SCORE = (
+    {'nivel': "RIESGO BAJO", 'emoji': "🟢", 'color': "#28a745",
+     'mensaje': "Tu bebé está bien. Mantén los controles preventivos."},
+    {'nivel': "RIESGO MODERADO", 'emoji': "🟡", 'color': "#ffc107",
+     'mensaje': "Necesita atención. Programa control CRED en 15 días."},
+    {'nivel': "RIESGO ALTO", 'emoji': "🟠", 'color': "#ff9800",
+     'mensaje': "Atención urgente. Inicia tratamiento HOY y control en 7 días."},
+    {'nivel': "RIESGO CRÍTICO", 'emoji': "🔴", 'color': "#dc3545",
+     'mensaje': "CRÍTICO. Evaluación médica inmediata + hospitalización si es necesario."},
+)
+CATEGORIAS_SCORE = [n['nivel'] for n in NIVELES_SCORE]
+CORTES_SCORE = (0.20, 0.50, 0.75)
+
 
 def calcular_score_simple(probabilidad_ml, top_factores):
     """
@@ -16,26 +33,15 @@ def calcular_score_simple(probabilidad_ml, top_factores):
     """
     
     # Convertir probabilidad a nivel
-    if probabilidad_ml < 0.20:
-        nivel = "RIESGO BAJO"
-        emoji = "🟢"
-        color = "#28a745"
-        mensaje = "Tu bebé está bien. Mantén los controles preventivos."
-    elif probabilidad_ml < 0.50:
-        nivel = "RIESGO MODERADO"
-        emoji = "🟡"
-        color = "#ffc107"
-        mensaje = "Necesita atención. Programa control CRED en 15 días."
-    elif probabilidad_ml < 0.75:
-        nivel = "RIESGO ALTO"
-        emoji = "🟠"
-        color = "#ff9800"
-        mensaje = "Atención urgente. Inicia tratamiento HOY y control en 7 días."
+    if probabilidad_ml < CORTES_SCORE[0]:
+        codigo = 0
+    elif probabilidad_ml < CORTES_SCORE[1]:
+        codigo = 1
+    elif probabilidad_ml < CORTES_SCORE[2]:
+        codigo = 2
     else:
-        nivel = "RIESGO CRÍTICO"
-        emoji = "🔴"
-        color = "#dc3545"
-        mensaje = "CRÍTICO. Evaluación médica inmediata + hospitalización si es necesario."
+        codigo = 3
+    nivel, emoji, color, mensaje = (NIVELES_SCORE[codigo][k] for k in ('nivel', 'emoji', 'color', 'mensaje'))
     
     # Explicación en lenguaje simple
     prob_pct = int(probabilidad_ml * 100)
@@ -70,3 +76,22 @@ def calcular_score_simple(probabilidad_ml, top_factores):
         'explicacion': explicacion,
         'top_3_factores': top_3_explicaciones
     }
+
+
+def calcular_score_simple_lote(probabilidad_ml) -> np.ndarray:
+    """
+    Versión vectorizada del nivel de calcular_score_simple
+
+    Returns:
+        Array int8 con el código de nivel (índice en NIVELES_SCORE); los
+        textos y la explicación se generan con calcular_score_simple solo
+        para las filas que se muestran
+    """
+    prob = np.asarray(probabilidad_ml, dtype=float)
+    condiciones = [prob < CORTES_SCORE[0], prob < CORTES_SCORE[1], prob < CORTES_SCORE[2]]
+    return np.select(condiciones, [0, 1, 2], default=3).astype(np.int8)
+
+
+def categorias_score(codigos) -> pd.Categorical:
+    """Códigos de calcular_score_simple_lote → pd.Categorical con el nivel"""
+    return pd.Categorical.from_codes(np.asarray(codigos), categories=CATEGORIAS_SCORE, ordered=True)
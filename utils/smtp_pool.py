@@ -0,0 +1,230 @@
+"""
+utils/smtp_pool.py
+Pool de conexiones SMTP autenticadas para envíos masivos
+
+Abrir una conexión, STARTTLS y login por cada mensaje cuesta más que el
+envío mismo; en una campaña de 10 000 recordatorios son 10 000 handshakes.
+El pool mantiene unas pocas conexiones abiertas y las reutiliza:
+
+- cada conexión envía hasta `max_mensajes_por_conexion` y se recicla
+  (los servidores suelen cortar después de N mensajes por sesión)
+- errores transitorios (desconexión, 4xx, timeouts) descartan la conexión
+  y se reintentan con backoff exponencial; los 5xx no se reintentan
+- enviar_lote reparte los mensajes entre hilos (uno por conexión) y
+  devuelve mensajes/segundo y fallos
+"""
+
+import os
+import time
+import queue
+import smtplib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+TAMANO_POOL = int(os.getenv("SMTP_POOL_CONEXIONES", "4"))
+MAX_MENSAJES_POR_CONEXION = int(os.getenv("SMTP_MAX_MENSAJES_CONEXION", "100"))
+MAX_REINTENTOS = 3
+BACKOFF_BASE_SEGUNDOS = 0.5
+TIMEOUT_SEGUNDOS = 30
+
+
+class ErrorPermanenteSMTP(Exception):
+    """Rechazo definitivo del servidor (5xx): no tiene sentido reintentar"""
+
+
+class _Conexion:
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.enviados = 0
+
+
+class PoolSMTP:
+    """Pool de conexiones SMTP reutilizables (thread-safe)"""
+
+    def __init__(self, servidor: str, puerto: int, email: Optional[str] = None,
+                 password: Optional[str] = None, usar_tls: bool = True,
+                 tamano: int = TAMANO_POOL,
+                 max_mensajes_por_conexion: int = MAX_MENSAJES_POR_CONEXION,
+                 max_reintentos: int = MAX_REINTENTOS,
+                 backoff_base: float = BACKOFF_BASE_SEGUNDOS):
+        """
+        Args:
+            servidor, puerto: Servidor SMTP
+            email, password: Credenciales (sin ellas no se hace login)
+            usar_tls: Hacer STARTTLS al conectar
+            tamano: Conexiones simultáneas máximas
+            max_mensajes_por_conexion: Mensajes antes de reciclar la conexión
+            max_reintentos: Reintentos ante errores transitorios
+            backoff_base: Espera inicial entre reintentos (se duplica)
+        """
+        self.servidor = servidor
+        self.puerto = puerto
+        self.email = email
+        self.password = password
+        self.usar_tls = usar_tls
+        self.tamano = tamano
+        self.max_mensajes_por_conexion = max_mensajes_por_conexion
+        self.max_reintentos = max_reintentos
+        self.backoff_base = backoff_base
+
+        self._libres: "queue.LifoQueue[_Conexion]" = queue.LifoQueue()
+        self._cupos = threading.BoundedSemaphore(tamano)
+        self._lock = threading.Lock()
+        self._stats = {'conexiones_abiertas': 0, 'enviados': 0, 'fallidos': 0, 'reintentos': 0}
+
+    # ════════════════════════════════════════════════════════════════════
+    # CONEXIONES
+    # ════════════════════════════════════════════════════════════════════
+
+    def _contar(self, clave: str, n: int = 1):
+        with self._lock:
+            self._stats[clave] += n
+
+    def _conectar(self) -> _Conexion:
+        smtp = smtplib.SMTP(self.servidor, self.puerto, timeout=TIMEOUT_SEGUNDOS)
+        try:
+            if self.usar_tls:
+                smtp.starttls()
+            if self.email and self.password:
+                smtp.login(self.email, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self._contar('conexiones_abiertas')
+        return _Conexion(smtp)
+
+    def _tomar(self) -> _Conexion:
+        """Conexión libre del pool o una nueva (bloquea si hay `tamano` en uso)"""
+        self._cupos.acquire()
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            try:
+                return self._conectar()
+            except Exception:
+                self._cupos.release()
+                raise
+
+    def _devolver(self, conexion: _Conexion, descartar: bool = False):
+        if descartar or conexion.enviados >= self.max_mensajes_por_conexion:
+            self._cerrar(conexion)
+        else:
+            self._libres.put(conexion)
+        self._cupos.release()
+
+    @staticmethod
+    def _cerrar(conexion: _Conexion):
+        try:
+            conexion.smtp.quit()
+        except Exception:
+            conexion.smtp.close()
+
+    def cerrar(self):
+        """Cierra las conexiones libres del pool"""
+        while True:
+            try:
+                self._cerrar(self._libres.get_nowait())
+            except queue.Empty:
+                return
+
+    # ════════════════════════════════════════════════════════════════════
+    # ENVÍO
+    # ════════════════════════════════════════════════════════════════════
+
+    @staticmethod
+    def _es_transitorio(error: Exception) -> bool:
+        if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+            return True
+        if isinstance(error, smtplib.SMTPResponseException):
+            return 400 <= error.smtp_code < 500
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return all(400 <= codigo < 500 for codigo, _ in error.recipients.values())
+        # SMTPException hereda de OSError: el resto (p. ej. SMTPNotSupportedError)
+        # no se arregla reintentando
+        if isinstance(error, smtplib.SMTPException):
+            return False
+        return isinstance(error, OSError)
+
+    def enviar(self, mensaje: Message):
+        """
+        Envía un mensaje reutilizando una conexión del pool
+
+        Raises:
+            ErrorPermanenteSMTP: rechazo 5xx
+            Exception: último error transitorio tras agotar los reintentos
+        """
+        for intento in range(self.max_reintentos + 1):
+            try:
+                conexion = self._tomar()
+            except Exception as e:
+                error = e
+            else:
+                try:
+                    conexion.smtp.send_message(mensaje)
+                    conexion.enviados += 1
+                    self._devolver(conexion)
+                    self._contar('enviados')
+                    return
+                except Exception as e:
+                    # Un rechazo del servidor deja la sesión utilizable (smtplib
+                    # hace RSET); una desconexión o error de socket no
+                    sesion_viva = isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused))
+                    self._devolver(conexion, descartar=not sesion_viva)
+                    error = e
+
+            if not self._es_transitorio(error):
+                self._contar('fallidos')
+                raise ErrorPermanenteSMTP(str(error)) from error
+            if intento < self.max_reintentos:
+                self._contar('reintentos')
+                time.sleep(self.backoff_base * (2 ** intento))
+
+        self._contar('fallidos')
+        raise error
+
+    def enviar_lote(self, mensajes: List[Message]) -> Dict:
+        """
+        Envía muchos mensajes en paralelo (un hilo por conexión del pool)
+
+        Returns:
+            Dict con enviados, fallidos, errores {índice: motivo},
+            duracion_s, mensajes_por_segundo y conexiones abiertas en el lote
+        """
+        conexiones_antes = self._stats['conexiones_abiertas']
+        errores = {}
+
+        def enviar_uno(indice_mensaje):
+            indice, mensaje = indice_mensaje
+            try:
+                self.enviar(mensaje)
+            except Exception as e:
+                errores[indice] = str(e)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.tamano) as ejecutor:
+            list(ejecutor.map(enviar_uno, enumerate(mensajes)))
+        duracion = time.perf_counter() - inicio
+
+        enviados = len(mensajes) - len(errores)
+        resumen = {
+            'enviados': enviados,
+            'fallidos': len(errores),
+            'errores': errores,
+            'duracion_s': round(duracion, 3),
+            'mensajes_por_segundo': round(enviados / duracion, 1) if duracion > 0 else 0.0,
+            'conexiones_abiertas': self._stats['conexiones_abiertas'] - conexiones_antes,
+        }
+        logger.info(f"📨 SMTP: {enviados} enviados, {len(errores)} fallidos "
+                    f"({resumen['mensajes_por_segundo']} msg/s, {resumen['conexiones_abiertas']} conexiones)")
+        return resumen
+
+    def estadisticas(self) -> Dict[str, int]:
+        """Contadores acumulados del pool"""
+        with self._lock:
+            return dict(self._stats)
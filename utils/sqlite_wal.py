@@ -0,0 +1,56 @@
+"""
+utils/sqlite_wal.py
+Base común de los almacenes SQLite en modo WAL
+
+Historial, feedback, adherencia, cola de recordatorios y análisis A/B
+comparten el mismo esquema de acceso: una conexión por hilo (Streamlit
+atiende sesiones en hilos) en autocommit, WAL + synchronous=NORMAL, y
+escrituras con BEGIN IMMEDIATE para serializarse entre hilos y procesos.
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+
+
+class AlmacenSQLite:
+    """Conexión SQLite WAL por hilo + transacciones BEGIN IMMEDIATE"""
+
+    def __init__(self, ruta: Path, esquema: str, row_factory: Optional[Callable] = None):
+        """
+        Args:
+            ruta: Archivo SQLite (se crea su directorio)
+            esquema: Script CREATE ... IF NOT EXISTS a aplicar al abrir
+            row_factory: Fábrica de filas (p. ej. sqlite3.Row)
+        """
+        self.ruta = Path(ruta)
+        self._row_factory = row_factory
+        self._local = threading.local()
+
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self._conexion().executescript(esquema)
+
+    def _conexion(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            if self._row_factory is not None:
+                conn.row_factory = self._row_factory
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaccion(self):
+        """BEGIN IMMEDIATE ... COMMIT (ROLLBACK si falla)"""
+        conn = self._conexion()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
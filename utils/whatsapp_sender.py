@@ -1,28 +1,51 @@
-import requests
-from datetime import datetime
+from pathlib import Path
 
-def enviar_menu_whatsapp(telefono, menu, es_semanal=False):
+# Log de menús enviados (mismas columnas que el log A/B de nudges, archivo
+# aparte para no mezclarlos con el experimento)
+WHATSAPP_MENUS_LOG_PATH = Path("data/logs/whatsapp_envios.csv")
+
+
+def enviar_menu_whatsapp(telefono, menu, es_semanal=False, despachador=None):
     """Envía menú por WhatsApp (simulado o real con API)"""
+    return enviar_menus_whatsapp([(telefono, menu, es_semanal)], despachador)[0]
+
+
+def enviar_menus_whatsapp(envios, despachador=None):
+    """
+    Envía varios menús en paralelo con DespachadorMensajes
+
+    El transporte sale del entorno (WHATSAPP_API_URL; sin URL se simula) y
+    el log se escribe por bloques, no una línea por mensaje.
+
+    Args:
+        envios: lista de (telefono, menu, es_semanal)
+        despachador: DespachadorMensajes (default: transportes del entorno)
+
+    Returns:
+        Lista de {"exito", "mensaje"} en el mismo orden
+    """
+    from utils.despachador_mensajes import DespachadorMensajes
+
     try:
-        # OPCIÓN 1: WhatsApp Business API (requiere configuración)
-        # url = "https://graph.facebook.com/v18.0/YOUR_PHONE_ID/messages"
-        # headers = {"Authorization": "Bearer YOUR_TOKEN"}
-        
-        # OPCIÓN 2: Twilio WhatsApp
-        # from twilio.rest import Client
-        # client = Client(account_sid, auth_token)
-        
-        # SIMULACIÓN PARA MVP
-        mensaje = _generar_mensaje_whatsapp(menu, es_semanal)
-        
-        # Log del envío
-        with open("data/logs/whatsapp_envios.txt", "a", encoding="utf-8") as f:
-            f.write(f"{datetime.now()} | {telefono} | {mensaje[:50]}...\n")
-        
-        return {"exito": True, "mensaje": "Enviado (simulado)"}
-    
+        despachador = despachador or DespachadorMensajes(log_file=WHATSAPP_MENUS_LOG_PATH)
+        resumen = despachador.despachar_sync([
+            {
+                'canal': 'whatsapp',
+                'destino': telefono,
+                'texto': _generar_mensaje_whatsapp(menu, es_semanal),
+                'tipo_control': 'Menú semanal' if es_semanal else 'Menú',
+            }
+            for telefono, menu, es_semanal in envios
+        ])
     except Exception as e:
-        return {"exito": False, "mensaje": str(e)}
+        return [{"exito": False, "mensaje": str(e)} for _ in envios]
+
+    status = despachador.transportes['whatsapp'].status
+    return [
+        {"exito": False, "mensaje": error} if error else
+        {"exito": True, "mensaje": "Enviado (simulado)" if status == 'simulado' else "Enviado"}
+        for error in resumen['resultados']
+    ]
 
 def _generar_mensaje_whatsapp(menu, es_semanal):
     """Genera texto del mensaje"""